@@ -3,13 +3,20 @@
 Django Admin 설정
 """
 
+import json
+
 from django.contrib import admin
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 from .models import (
     SubscriptionPlan,
     UserSubscription,
     InviteCode,
     PaymentRequest,
     UsageRecord,
+    ProfileReport,
 )
 
 
@@ -107,3 +114,54 @@ class UsageRecordAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'user__email']
     readonly_fields = ['id', 'created_at', 'updated_at']
     raw_id_fields = ['user', 'subscription']
+
+
+@admin.register(ProfileReport)
+class ProfileReportAdmin(admin.ModelAdmin):
+    """요청 프로파일 리포트 (ProfilerMiddleware가 저장, 읽기 전용)"""
+    list_display = ['method', 'path', 'status_code', 'duration_ms', 'profiler', 'trigger', 'user', 'created_at']
+    list_filter = ['profiler', 'trigger', 'method', 'created_at']
+    search_fields = ['path', 'request_id', 'user__username']
+    fields = [
+        'id', 'request_id', 'user', 'method', 'path', 'status_code', 'profiler', 'trigger',
+        'duration_ms', 'sample_count', 'created_at', 'flame_graph', 'summary_text'
+    ]
+    readonly_fields = fields
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def get_urls(self):
+        urls = [
+            path(
+                '<uuid:report_id>/speedscope/',
+                self.admin_site.admin_view(self.speedscope_view),
+                name='core_profilereport_speedscope',
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    def speedscope_view(self, request, report_id):
+        """speedscope 파일 다운로드 (https://www.speedscope.app 에서 열기)"""
+        if not self.has_view_permission(request):
+            raise Http404
+        report = get_object_or_404(ProfileReport, id=report_id)
+        if not report.speedscope:
+            raise Http404('플레임 그래프가 없는 리포트입니다 (cProfile).')
+        response = HttpResponse(json.dumps(report.speedscope), content_type='application/json')
+        response['Content-Disposition'] = f'attachment; filename="profile-{report.id}.speedscope.json"'
+        return response
+    
+    def flame_graph(self, obj):
+        if not obj.speedscope:
+            return '-'
+        url = reverse('admin:core_profilereport_speedscope', args=[obj.id])
+        return format_html('<a href="{}">speedscope JSON 다운로드</a>', url)
+    flame_graph.short_description = '플레임 그래프'
+    
+    def summary_text(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto;">{}</pre>', obj.summary)
+    summary_text.short_description = '요약'
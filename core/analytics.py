@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+프롬프트 이력 분석
+
+분석 API는 닫힌 시간대는 시간별 집계(PromptHistoryRollup)를, 아직 열린 최근 시간대는
+PromptHistory를 바로 읽어 모델/제공자/작업/품질별 지연(p50/p95), 첫 토큰 시간, 토큰, 비용을 계산합니다.
+이력 저장 경로에서는 집계를 갱신하지 않습니다 (요청마다 같은 행을 잠그고 갱신하지 않도록).
+
+- 집계 행: (정시, 모델, 제공자, 작업 유형, 품질 수준)마다 하나, 시간대가 닫힌 뒤 조회 시점에 한 번 계산
+- 지연 백분위수: 고정 구간 히스토그램을 합친 뒤 구간 안에서 선형 보간으로 추정
+- 기존 이력 재집계: python manage.py rebuild_prompt_rollups
+"""
+
+import bisect
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from .models import PromptHistory, PromptHistoryRollup
+
+logger = logging.getLogger(__name__)
+
+
+# 지연 히스토그램 구간 상한(ms), 마지막 칸은 그 이상
+LATENCY_BOUNDS_MS = (
+    50, 100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 5000, 7500,
+    10000, 15000, 20000, 30000, 45000, 60000, 90000, 120000,
+)
+
+# 분석 API 그룹 기준 (API 이름 → 집계 필드)
+GROUP_FIELDS = {
+    'model': 'model_used',
+    'provider': 'provider',
+    'task': 'task_type',
+    'quality': 'quality_level',
+}
+
+# 집계 행 키 (유일 제약과 같은 순서)
+KEY_FIELDS = ['bucket_start', 'model_used', 'provider', 'task_type', 'quality_level']
+
+# 집계에 읽는 이력 필드
+HISTORY_FIELDS = [
+    'created_at', 'model_used', 'provider', 'task_type', 'quality_level', 'latency_ms', 'ttft_ms',
+    'tokens_used', 'prompt_tokens', 'completion_tokens', 'cached_tokens', 'retries', 'cost_usd',
+]
+
+# 시간대가 끝난 뒤 집계하기까지 기다리는 시간 (끝나기 직전에 저장되어 늦게 커밋되는 이력 포함)
+ROLLUP_GRACE = timedelta(minutes=2)
+
+# 합산하는 집계 필드
+SUM_FIELDS = (
+    'request_count', 'latency_count', 'latency_sum_ms', 'ttft_count', 'ttft_sum_ms',
+    'tokens_used', 'prompt_tokens', 'completion_tokens', 'cached_tokens', 'retries', 'cost_usd',
+)
+
+
+def bucket_start(moment: datetime) -> datetime:
+    """집계 시간대 시작 (정시)"""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def empty_histogram() -> List[int]:
+    return [0] * (len(LATENCY_BOUNDS_MS) + 1)
+
+
+def observe(histogram: List[int], value_ms: float) -> List[int]:
+    """히스토그램에 값 하나 추가 (구간 수가 바뀐 기존 행은 새로 시작)"""
+    if len(histogram) != len(LATENCY_BOUNDS_MS) + 1:
+        histogram = empty_histogram()
+    histogram[bisect.bisect_left(LATENCY_BOUNDS_MS, value_ms)] += 1
+    return histogram
+
+
+def merge_histograms(histograms: Iterable[List[int]]) -> List[int]:
+    merged = empty_histogram()
+    for histogram in histograms:
+        if len(histogram) != len(merged):
+            continue
+        for i, count in enumerate(histogram):
+            merged[i] += count
+    return merged
+
+
+def histogram_percentile(histogram: List[int], pct: float) -> Optional[float]:
+    """
+    히스토그램 백분위수 추정 (pct: 0~100)
+
+    값이 속한 구간 안에서 선형 보간합니다. 마지막(상한 없는) 구간이면 그 하한을 반환합니다.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = pct / 100 * total
+    seen = 0
+    for i, count in enumerate(histogram):
+        if not count or seen + count < rank:
+            seen += count
+            continue
+        lower = LATENCY_BOUNDS_MS[i - 1] if i > 0 else 0
+        if i >= len(LATENCY_BOUNDS_MS):
+            return float(lower)
+        upper = LATENCY_BOUNDS_MS[i]
+        return round(lower + (upper - lower) * (rank - seen) / count, 1)
+    return float(LATENCY_BOUNDS_MS[-1])
+
+
+def _key(history: PromptHistory) -> tuple:
+    return (
+        bucket_start(history.created_at), history.model_used, history.provider,
+        history.task_type, history.quality_level,
+    )
+
+
+def _add(rollup: PromptHistoryRollup, history: PromptHistory):
+    rollup.request_count += 1
+    if history.latency_ms is not None:
+        rollup.latency_count += 1
+        rollup.latency_sum_ms += history.latency_ms
+        rollup.latency_histogram = observe(rollup.latency_histogram, history.latency_ms)
+    if history.ttft_ms is not None:
+        rollup.ttft_count += 1
+        rollup.ttft_sum_ms += history.ttft_ms
+        rollup.ttft_histogram = observe(rollup.ttft_histogram, history.ttft_ms)
+    rollup.tokens_used += history.tokens_used or 0
+    rollup.prompt_tokens += history.prompt_tokens or 0
+    rollup.completion_tokens += history.completion_tokens or 0
+    rollup.cached_tokens += history.cached_tokens or 0
+    rollup.retries += history.retries or 0
+    rollup.cost_usd += history.cost_usd or 0.0
+
+
+def _build(histories, batch_size: int = 2000) -> Tuple[Dict[tuple, PromptHistoryRollup], int]:
+    """이력 쿼리셋을 (시간대, 모델, 제공자, 작업 유형, 품질 수준)별 집계 행으로 (저장하지 않음)"""
+    built: Dict[tuple, PromptHistoryRollup] = {}
+    count = 0
+    for history in histories.order_by().only(*HISTORY_FIELDS).iterator(chunk_size=batch_size):
+        key = _key(history)
+        rollup = built.get(key)
+        if rollup is None:
+            rollup = built[key] = PromptHistoryRollup(
+                **dict(zip(KEY_FIELDS, key)),
+                latency_histogram=empty_histogram(), ttft_histogram=empty_histogram()
+            )
+        _add(rollup, history)
+        count += 1
+    return built, count
+
+
+def _save(rollups: Iterable[PromptHistoryRollup]):
+    """
+    집계 행 저장 (같은 키가 있으면 덮어씀)
+
+    닫힌 시간대의 이력은 더 바뀌지 않으므로 여러 워커가 같은 시간대를 동시에 만들어도 결과가 같습니다.
+    """
+    PromptHistoryRollup.objects.bulk_create(
+        rollups, batch_size=500, update_conflicts=True,
+        unique_fields=KEY_FIELDS, update_fields=[*SUM_FIELDS, 'latency_histogram', 'ttft_histogram'],
+    )
+
+
+def closed_until(now: Optional[datetime] = None) -> datetime:
+    """집계 테이블이 담당하는 구간의 끝 (이 시각 이전 시간대는 닫힘, 이후는 이력에서 바로 계산)"""
+    return bucket_start((now or timezone.now()) - ROLLUP_GRACE)
+
+
+def materialize_rollups(now: Optional[datetime] = None) -> datetime:
+    """
+    아직 집계하지 않은 닫힌 시간대를 이력에서 계산해 저장
+
+    마지막으로 저장된 시간대 다음부터 closed_until까지만 읽습니다.
+    (집계 행이 하나도 없으면 전체 이력, 처음 한 번만)
+
+    Returns:
+        closed_until 시각
+    """
+    cutoff = closed_until(now)
+    latest = (
+        PromptHistoryRollup.objects.filter(bucket_start__lt=cutoff).order_by('-bucket_start')
+        .values_list('bucket_start', flat=True).first()
+    )
+    histories = PromptHistory.objects.filter(created_at__lt=cutoff)
+    if latest is not None:
+        histories = histories.filter(created_at__gte=latest + timedelta(hours=1))
+    built, count = _build(histories)
+    if built:
+        _save(built.values())
+        logger.info(f"프롬프트 이력 집계: 이력 {count}건 → 집계 {len(built)}행")
+    return cutoff
+
+
+def rebuild_rollups(since: Optional[datetime] = None, batch_size: int = 2000) -> int:
+    """
+    PromptHistory로부터 닫힌 시간대의 집계를 다시 계산 (since 이후 시간대만, 없으면 전체)
+
+    새 행을 모두 계산한 뒤 한 트랜잭션에서 범위의 기존 행과 바꿉니다.
+    집계 행은 요청마다 갱신되지 않으므로 재계산 도중 들어온 요청은 열린 시간대에 남아 나중에 집계됩니다.
+
+    Returns:
+        집계한 이력 수
+    """
+    cutoff = closed_until()
+    histories = PromptHistory.objects.filter(created_at__lt=cutoff)
+    rollups = PromptHistoryRollup.objects.filter(bucket_start__lt=cutoff)
+    if since is not None:
+        since = bucket_start(since)
+        histories = histories.filter(created_at__gte=since)
+        rollups = rollups.filter(bucket_start__gte=since)
+
+    built, count = _build(histories, batch_size=batch_size)
+    with transaction.atomic():
+        rollups.delete()
+        _save(built.values())
+    logger.info(f"프롬프트 이력 집계 재계산: 이력 {count}건 → 집계 {len(built)}행")
+    return count
+
+
+def _row(rollup: PromptHistoryRollup) -> Dict[str, Any]:
+    return {
+        name: getattr(rollup, name)
+        for name in (*KEY_FIELDS, *SUM_FIELDS, 'latency_histogram', 'ttft_histogram')
+    }
+
+
+def _summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    totals = {field: sum(row[field] for row in rows) for field in SUM_FIELDS}
+    latency = merge_histograms(row['latency_histogram'] for row in rows)
+    ttft = merge_histograms(row['ttft_histogram'] for row in rows)
+    requests = totals['request_count']
+    return {
+        'requests': requests,
+        'latency_ms': {
+            'p50': histogram_percentile(latency, 50),
+            'p95': histogram_percentile(latency, 95),
+            'avg': round(totals['latency_sum_ms'] / totals['latency_count'], 1) if totals['latency_count'] else None,
+        },
+        'ttft_ms': {
+            'p50': histogram_percentile(ttft, 50),
+            'p95': histogram_percentile(ttft, 95),
+            'avg': round(totals['ttft_sum_ms'] / totals['ttft_count'], 1) if totals['ttft_count'] else None,
+        },
+        'tokens': {
+            'total': totals['tokens_used'],
+            'prompt': totals['prompt_tokens'],
+            'completion': totals['completion_tokens'],
+            'cached': totals['cached_tokens'],
+            'avg_per_request': round(totals['tokens_used'] / requests, 1) if requests else None,
+        },
+        'retries': totals['retries'],
+        'cost_usd': round(totals['cost_usd'], 6),
+    }
+
+
+def get_analytics(
+    since: datetime,
+    until: Optional[datetime] = None,
+    group_by: Iterable[str] = ('model',),
+    interval: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    기간 [since, until)의 집계 요약
+
+    Args:
+        since: 시작 시각 (정시로 내림)
+        until: 끝 시각 (없으면 현재)
+        group_by: GROUP_FIELDS의 키 목록 (비우면 전체 합계만)
+        interval: 'hour' | 'day'면 그룹별 시계열 포함
+
+    Returns:
+        {'total': {...}, 'groups': [{'key': {...}, ..., 'series': [...]}], ...}
+    """
+    until = until or timezone.now()
+    group_by = [name for name in group_by if name in GROUP_FIELDS]
+    fields = [GROUP_FIELDS[name] for name in group_by]
+
+    cutoff = materialize_rollups()
+    rollups = PromptHistoryRollup.objects.filter(
+        bucket_start__gte=bucket_start(since),
+        bucket_start__lt=min(until, cutoff),
+    ).order_by()
+    values = ['bucket_start', *fields, *SUM_FIELDS, 'latency_histogram', 'ttft_histogram']
+    if interval == 'day':
+        rows = list(rollups.annotate(day=TruncDay('bucket_start')).values('day', *values))
+        for row in rows:
+            row['bucket_start'] = row.pop('day')
+    else:
+        rows = list(rollups.values(*values))
+
+    # 열린 시간대는 이력에서 바로 계산
+    if until > cutoff:
+        live, _ = _build(PromptHistory.objects.filter(
+            created_at__gte=max(bucket_start(since), cutoff), created_at__lt=until
+        ))
+        for rollup in live.values():
+            row = _row(rollup)
+            if interval == 'day':
+                row['bucket_start'] = timezone.localtime(row['bucket_start']).replace(hour=0)
+            rows.append(row)
+
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(tuple(row[field] for field in fields), []).append(row)
+
+    result_groups = []
+    for key, group_rows in groups.items():
+        entry = {'key': dict(zip(group_by, key)), **_summarize(group_rows)}
+        if interval in ('hour', 'day'):
+            series: Dict[datetime, List[Dict[str, Any]]] = {}
+            for row in group_rows:
+                series.setdefault(row['bucket_start'], []).append(row)
+            entry['series'] = [
+                {'bucket_start': start.isoformat(), **_summarize(series[start])}
+                for start in sorted(series)
+            ]
+        result_groups.append(entry)
+    result_groups.sort(key=lambda entry: entry['requests'], reverse=True)
+
+    return {
+        'since': bucket_start(since).isoformat(),
+        'until': until.isoformat(),
+        'group_by': group_by,
+        'interval': interval,
+        'total': _summarize(rows),
+        'groups': result_groups,
+    }
+
+
+def parse_window(value: str, default: timedelta = timedelta(days=1)) -> timedelta:
+    """'24h', '7d', '90m' 형식의 기간 (잘못된 값이면 ValueError)"""
+    if not value:
+        return default
+    units = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+    unit = value[-1].lower()
+    if unit not in units:
+        raise ValueError(f"기간 단위는 m/h/d 중 하나여야 합니다: {value}")
+    amount = int(value[:-1])
+    if amount <= 0:
+        raise ValueError(f"기간은 0보다 커야 합니다: {value}")
+    return timedelta(**{units[unit]: amount})
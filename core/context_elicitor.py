@@ -17,6 +17,32 @@ from .intent_parser import IntentParseResult
 logger = logging.getLogger(__name__)
 
 
+# 질문 생성 응답 스키마 (strict 모드 호환: 모든 필드 required, 선택지가 없으면 빈 배열/null)
+QUESTIONS_SCHEMA = {
+    'title': 'context_questions',
+    'type': 'object',
+    'properties': {
+        'questions': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'text': {'type': 'string'},
+                    'priority': {'type': 'integer'},
+                    'rationale': {'type': 'string'},
+                    'options': {'type': 'array', 'items': {'type': 'string'}},
+                    'default': {'type': ['string', 'null']},
+                },
+                'required': ['text', 'priority', 'rationale', 'options', 'default'],
+                'additionalProperties': False,
+            },
+        },
+    },
+    'required': ['questions'],
+    'additionalProperties': False,
+}
+
+
 class QuestionItem:
     """생성된 질문을 담는 데이터 클래스"""
     
@@ -127,6 +153,7 @@ options는 선택지가 있을 경우에만 제공하세요."""
             # JSON 모드로 생성
             response_json = provider.generate_json(
                 prompt=prompt,
+                schema=QUESTIONS_SCHEMA,
                 model=model,
                 temperature=temperature,
                 system_prompt=self.SYSTEM_PROMPT
@@ -198,45 +225,50 @@ JSON 형식으로 응답하세요."""
         return "\n".join(prompt_parts)
     
     def _parse_response(self, response_json: Dict[str, Any]) -> List[QuestionItem]:
-        """LLM 응답을 QuestionItem 리스트로 변환"""
+        """LLM 응답을 QuestionItem 리스트로 변환 (잘못된 항목만 건너뜀)"""
         questions = []
         
-        try:
-            questions_data = response_json.get('questions', [])
+        questions_data = response_json.get('questions', []) if isinstance(response_json, dict) else []
+        if not isinstance(questions_data, list):
+            logger.error(f"질문 응답 파싱 실패: questions가 배열이 아님, 원본: {response_json}")
+            return []
+        
+        for q_data in questions_data:
+            if not isinstance(q_data, dict):
+                logger.warning(f"잘못된 질문 항목: {q_data}")
+                continue
             
-            for q_data in questions_data:
-                text = q_data.get('text', '')
+            text = q_data.get('text') or ''
+            rationale = q_data.get('rationale') or ''
+            options = q_data.get('options')
+            default = q_data.get('default')
+            try:
                 priority = int(q_data.get('priority', 3))
-                rationale = q_data.get('rationale', '')
-                options = q_data.get('options', [])
-                default = q_data.get('default')
-                
-                # 유효성 검사
-                if not text or not rationale:
-                    logger.warning(f"불완전한 질문 데이터: {q_data}")
-                    continue
-                
-                # priority 범위 제한
-                priority = max(1, min(5, priority))
-                
-                question = QuestionItem(
-                    text=text,
-                    priority=priority,
-                    rationale=rationale,
-                    options=options if isinstance(options, list) else [],
-                    default=default
-                )
-                
-                questions.append(question)
+            except (TypeError, ValueError):
+                priority = 3
             
-            # 우선순위 순으로 정렬
-            questions.sort(key=lambda q: q.priority)
+            # 유효성 검사
+            if not text or not rationale:
+                logger.warning(f"불완전한 질문 데이터: {q_data}")
+                continue
             
-            return questions
+            # priority 범위 제한
+            priority = max(1, min(5, priority))
+            
+            question = QuestionItem(
+                text=str(text),
+                priority=priority,
+                rationale=str(rationale),
+                options=[str(option) for option in options] if isinstance(options, list) else [],
+                default=str(default) if default not in (None, '') else None
+            )
+            
+            questions.append(question)
         
-        except Exception as e:
-            logger.error(f"질문 응답 파싱 실패: {e}, 원본: {response_json}")
-            return []
+        # 우선순위 순으로 정렬
+        questions.sort(key=lambda q: q.priority)
+        
+        return questions
     
     def _create_fallback_questions(self, intent: IntentParseResult) -> List[QuestionItem]:
         """폴백 질문 생성 (LLM 실패 시)"""
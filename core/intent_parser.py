@@ -16,6 +16,38 @@ from llm_providers.router import get_router, TaskType
 logger = logging.getLogger(__name__)
 
 
+COGNITIVE_GOALS = ['알기', '하기', '만들기', '배우기']
+SPECIFICITY_VALUES = ['LOW', 'MEDIUM', 'HIGH']
+COMPLETENESS_VALUES = ['INCOMPLETE', 'PARTIAL', 'COMPLETE']
+
+# 의도 분석 응답 스키마 (네이티브 스키마 모드 제공자는 API에서 강제, strict 모드 호환)
+INTENT_SCHEMA = {
+    'title': 'intent_analysis',
+    'type': 'object',
+    'properties': {
+        'cognitive_goal': {'type': 'string', 'enum': COGNITIVE_GOALS},
+        'specificity': {'type': 'string', 'enum': SPECIFICITY_VALUES},
+        'completeness': {'type': 'string', 'enum': COMPLETENESS_VALUES},
+        'primary_entities': {'type': 'array', 'items': {'type': 'string'}},
+        'constraints': {'type': 'array', 'items': {'type': 'string'}},
+        'confidence': {'type': 'number'},
+    },
+    'required': [
+        'cognitive_goal', 'specificity', 'completeness', 'primary_entities', 'constraints', 'confidence'
+    ],
+    'additionalProperties': False,
+}
+
+
+def _string_list(value: Any) -> List[str]:
+    """배열 필드를 문자열 리스트로 보정 (단일 문자열은 한 항목, 그 외 타입은 빈 리스트)"""
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if not isinstance(value, list):
+        return []
+    return [str(item) for item in value if item is not None and str(item).strip()]
+
+
 class IntentParseResult:
     """의도 파싱 결과를 담는 데이터 클래스"""
     
@@ -144,6 +176,7 @@ class IntentParser:
             # JSON 모드로 생성
             response_json = provider.generate_json(
                 prompt=prompt,
+                schema=INTENT_SCHEMA,
                 model=model,
                 temperature=temperature,
                 system_prompt=self.SYSTEM_PROMPT
@@ -174,26 +207,29 @@ class IntentParser:
         return "\n".join(prompt_parts)
     
     def _parse_response(self, response_json: Dict[str, Any], user_input: str) -> IntentParseResult:
-        """LLM 응답을 IntentParseResult로 변환"""
+        """LLM 응답을 IntentParseResult로 변환 (스키마 위반 필드는 기본값으로 보정)"""
         try:
+            if not isinstance(response_json, dict):
+                raise ValueError(f"객체가 아닌 응답: {type(response_json).__name__}")
+            
             # 필수 필드 검증
             cognitive_goal = response_json.get('cognitive_goal', '알기')
             specificity = response_json.get('specificity', 'MEDIUM')
             completeness = response_json.get('completeness', 'PARTIAL')
-            primary_entities = response_json.get('primary_entities', [])
-            constraints = response_json.get('constraints', [])
+            primary_entities = _string_list(response_json.get('primary_entities'))
+            constraints = _string_list(response_json.get('constraints'))
             confidence = float(response_json.get('confidence', 0.5))
             
             # 유효성 검사
-            if cognitive_goal not in ['알기', '하기', '만들기', '배우기']:
+            if cognitive_goal not in COGNITIVE_GOALS:
                 logger.warning(f"잘못된 cognitive_goal: {cognitive_goal}, 기본값 사용")
                 cognitive_goal = '알기'
             
-            if specificity not in ['LOW', 'MEDIUM', 'HIGH']:
+            if specificity not in SPECIFICITY_VALUES:
                 logger.warning(f"잘못된 specificity: {specificity}, 기본값 사용")
                 specificity = 'MEDIUM'
             
-            if completeness not in ['INCOMPLETE', 'PARTIAL', 'COMPLETE']:
+            if completeness not in COMPLETENESS_VALUES:
                 logger.warning(f"잘못된 completeness: {completeness}, 기본값 사용")
                 completeness = 'PARTIAL'
             
@@ -8,6 +8,7 @@
 import logging
 import secrets
 from datetime import timedelta
+from django.db.models import Count, Q
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
@@ -95,7 +96,7 @@ def list_invite_codes(request):
     """
     invite_codes = InviteCode.objects.filter(
         inviter=request.user
-    ).order_by('-created_at')
+    ).select_related('inviter', 'invitee').order_by('-created_at')
     
     serializer = InviteCodeSerializer(invite_codes, many=True)
     return Response(serializer.data)
@@ -195,11 +196,12 @@ def get_invite_stats(request):
     
     GET /api/invite/stats/
     """
-    total_invites = InviteCode.objects.filter(inviter=request.user).count()
-    used_invites = InviteCode.objects.filter(
-        inviter=request.user,
-        is_used=True
-    ).count()
+    counts = InviteCode.objects.filter(inviter=request.user).aggregate(
+        total=Count('id'),
+        used=Count('id', filter=Q(is_used=True)),
+    )
+    total_invites = counts['total']
+    used_invites = counts['used']
     
     # 초대를 통해 받은 보너스 토큰 계산
     received_bonus = 0
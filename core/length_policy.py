@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+생성 길이 정책
+
+구체성 레벨과 인지적 목표별 출력 토큰 목표를 정해 max_tokens와 정지 시퀀스로 강제합니다.
+프롬프트의 길이 지시(_apply_specificity_level)만으로는 "간결" 요청도 수천 토큰까지 생성될 수 있어,
+지연 시간과 비용을 줄이기 위해 API 수준에서 출력 길이를 제한합니다.
+
+- 목표: 같은 (모델, 구체성, 목표) 이력의 상위 백분위 출력 길이 (TokenEstimator)
+- 상한: 구체성 레벨별 기본 상한 × 인지적 목표 배수 (이력이 없거나 이력이 더 길 때)
+- 추론 모델은 출력 한도에 추론 토큰이 포함되므로 상한에 여유분을 더함
+- 클라이언트가 max_tokens를 지정하면 그대로 사용하고 이어쓰기 없음
+- 정책 한도에서 잘린 경우에만 이어서 생성 (llm_providers.continuation)
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from llm_providers.base import is_reasoning_model
+
+from .token_estimator import TokenEstimate
+
+logger = logging.getLogger(__name__)
+
+
+# 구체성 레벨별 출력 토큰 상한
+OUTPUT_TOKEN_CEILINGS = {
+    '짧음': 300,
+    '간결': 600,
+    '보통': 1200,
+    '구체적': 2500,
+    '매우 구체적': 4096,
+}
+DEFAULT_OUTPUT_TOKEN_CEILING = 4096
+
+# 인지적 목표별 상한 배수 (만들기/배우기는 구조화된 긴 결과물이 필요)
+GOAL_MULTIPLIERS = {
+    '알기': 1.0,
+    '하기': 1.2,
+    '만들기': 1.5,
+    '배우기': 1.3,
+}
+
+# 구체성 레벨별 정지 시퀀스 ("짧음"은 1-2문장이므로 첫 문단에서 종료)
+STOP_SEQUENCES = {
+    '짧음': ['\n\n'],
+}
+
+# 추론 모델의 추론 토큰 여유분
+REASONING_TOKEN_ALLOWANCE = 2048
+
+# 정책 한도 대비 이어쓰기 1회 한도 비율 (최소값)
+CONTINUATION_RATIO = 0.5
+MIN_CONTINUATION_TOKENS = 256
+
+
+class LengthTarget:
+    """요청의 출력 길이 설정"""
+
+    def __init__(
+        self,
+        max_tokens: Optional[int],
+        stop: Optional[List[str]] = None,
+        source: str = 'policy',
+        max_continuations: int = 0,
+        continuation_tokens: Optional[int] = None
+    ):
+        self.max_tokens = max_tokens
+        self.stop = stop
+        self.source = source
+        self.max_continuations = max_continuations
+        self.continuation_tokens = continuation_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'max_tokens': self.max_tokens,
+            'stop': self.stop,
+            'source': self.source,
+            'max_continuations': self.max_continuations,
+        }
+
+
+class LengthPolicy:
+    """
+    구체성/인지적 목표 기반 출력 길이 정책
+
+    Args:
+        enabled: 비활성화 시 클라이언트 max_tokens만 사용 (정지 시퀀스/이어쓰기 없음)
+        max_continuations: 정책 한도에서 잘렸을 때 최대 이어쓰기 횟수
+    """
+
+    def __init__(self, enabled: bool = True, max_continuations: int = 1):
+        self.enabled = enabled
+        self.max_continuations = max_continuations
+
+    def ceiling(self, model: str, specificity_level: Optional[str], cognitive_goal: Optional[str]) -> int:
+        """구체성/목표별 출력 토큰 상한"""
+        ceiling = OUTPUT_TOKEN_CEILINGS.get(specificity_level, DEFAULT_OUTPUT_TOKEN_CEILING)
+        ceiling = int(ceiling * GOAL_MULTIPLIERS.get(cognitive_goal, 1.0))
+        if is_reasoning_model(model):
+            ceiling += REASONING_TOKEN_ALLOWANCE
+        return ceiling
+
+    def resolve(
+        self,
+        model: str,
+        specificity_level: Optional[str] = None,
+        cognitive_goal: Optional[str] = None,
+        requested_max_tokens: Optional[int] = None,
+        estimate: Optional[TokenEstimate] = None
+    ) -> LengthTarget:
+        """
+        요청의 출력 길이 설정 결정
+
+        Args:
+            model: 사용할 모델
+            specificity_level: 구체성 레벨 값
+            cognitive_goal: 인지적 목표
+            requested_max_tokens: 클라이언트가 지정한 max_tokens
+            estimate: 사전 토큰 추정 (이력 기반 제안 max_tokens)
+
+        Returns:
+            LengthTarget
+        """
+        if requested_max_tokens is not None:
+            return LengthTarget(requested_max_tokens, source='request')
+        if not self.enabled:
+            return LengthTarget(None, source='disabled')
+
+        ceiling = self.ceiling(model, specificity_level, cognitive_goal)
+        learned = estimate.suggested_max_tokens if estimate else None
+        if learned:
+            max_tokens = min(learned, ceiling)
+            source = 'history' if learned <= ceiling else 'ceiling'
+        else:
+            max_tokens = ceiling
+            source = 'ceiling'
+
+        return LengthTarget(
+            max_tokens=max_tokens,
+            stop=STOP_SEQUENCES.get(specificity_level),
+            source=source,
+            max_continuations=self.max_continuations,
+            continuation_tokens=max(MIN_CONTINUATION_TOKENS, int(max_tokens * CONTINUATION_RATIO))
+        )
+
+
+# 전역 정책 인스턴스
+_policy_instance: Optional[LengthPolicy] = None
+
+
+def get_length_policy() -> LengthPolicy:
+    """전역 LengthPolicy 인스턴스 가져오기 (싱글톤)"""
+    global _policy_instance
+    if _policy_instance is None:
+        config = settings.PROMPT_MATE
+        _policy_instance = LengthPolicy(
+            enabled=config.get('LENGTH_POLICY_ENABLED', True),
+            max_continuations=config.get('LENGTH_MAX_CONTINUATIONS', 1),
+        )
+    return _policy_instance
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+요청 경로 CPU 마이크로 벤치마크 명령어
+
+매 요청마다 실행되는 순수 파이썬 경로(프롬프트 합성/최적화/압축, 토큰 추정, Intent/질문 프롬프트 구성과
+응답 파싱, 생성 응답 직렬화)를 한국어/영어 입력과 증가하는 크기(세션 컨텍스트, RAG 컨텍스트 블록)로
+timeit 측정하고, 저장된 기준선 대비 회귀를 표시합니다.
+
+LLM/DB 호출 없이 실행되며, 측정 중에는 로그 출력을 끕니다 (출력 I/O가 측정을 흔들지 않도록).
+
+사용법:
+    python manage.py benchmark_hotpaths
+    python manage.py benchmark_hotpaths --filter synthesize --filter optimize
+    python manage.py benchmark_hotpaths --save-baseline
+    python manage.py benchmark_hotpaths --threshold 15 --fail-on-regression
+"""
+
+import json
+import logging
+import statistics
+import timeit
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# 입력 크기 배수 (컨텍스트 항목 수, RAG 대화 수, 응답 길이에 곱함)
+SIZES = [1, 8, 32]
+
+LANGUAGES = ['ko', 'en']
+
+SAMPLE_TEXT = {
+    'ko': (
+        '신제품 출시를 앞두고 보도자료와 고객 안내 메일을 준비하고 있습니다. '
+        '주요 기능은 배터리 수명 개선, 무게 감소, 방수 기능이며 출시일은 다음 달 15일입니다. '
+        '기존 고객에게는 업그레이드 할인 20%를 제공하고, 언론에는 체험 기기를 배포할 예정입니다. '
+    ),
+    'en': (
+        'We are preparing a press release and a customer announcement email ahead of the product launch. '
+        'Key features are longer battery life, reduced weight and water resistance, shipping on the 15th. '
+        'Existing customers get a 20% upgrade discount and reviewers will receive evaluation units. '
+    ),
+}
+
+SAMPLE_INPUT = {
+    'ko': '신제품 출시 보도자료 초안을 작성하고 기존 고객용 안내 메일도 만들어줘',
+    'en': 'Write a draft press release for the product launch and an email for existing customers',
+}
+
+
+def _intent(lang: str, size: int):
+    from core.intent_parser import IntentParseResult
+
+    words = SAMPLE_TEXT[lang].split()
+    return IntentParseResult(
+        cognitive_goal='만들기',
+        specificity='HIGH',
+        completeness='PARTIAL',
+        primary_entities=[words[i % len(words)] for i in range(3 * size)],
+        constraints=[f'{words[i % len(words)]} {i}' for i in range(2 * size)],
+        confidence=0.82,
+    )
+
+
+def _session_context(lang: str, size: int) -> Dict[str, Any]:
+    """세션에 누적된 답변 컨텍스트 (항목 수가 size에 비례)"""
+    context = {
+        'expertise_level': '중급',
+        'purpose': '업무용',
+        'length': '1000자 내외',
+        'format_preference': '마크다운',
+    }
+    for i in range(4 * size):
+        context[f'answer_{i}'] = SAMPLE_TEXT[lang][: 60 + (i % 5) * 20]
+    return context
+
+
+def _rag_block(lang: str, size: int) -> str:
+    """RAGManager.get_relevant_context 형식의 관련 대화 블록 (대화 수가 size에 비례)"""
+    parts = ['[관련 대화 기록]']
+    for i in range(1, 2 * size + 1):
+        parts.append(f'\n--- 대화 {i} (유사도: 0.{90 - i % 20}) ---\n{(SAMPLE_TEXT[lang] * 3)[:500]}\n')
+    return '\n'.join(parts)
+
+
+def _synthesized(lang: str, size: int) -> str:
+    """RAG 블록을 포함한 합성 프롬프트 (session_manager.synthesize_prompt 결과와 같은 형태)"""
+    from core.prompt_synthesizer import get_prompt_synthesizer
+
+    prompt = get_prompt_synthesizer().synthesize(_intent(lang, size), _session_context(lang, size), SAMPLE_INPUT[lang])
+    return f'{_rag_block(lang, size)}\n\n[현재 질문]\n{prompt}\n\n위 관련 대화 기록을 참고하여 답변해주세요.'
+
+
+def build_cases() -> List[Tuple[str, Callable[[], Any]]]:
+    """(벤치마크 이름, 인자 없는 호출) 목록 (입력은 미리 만들어 측정에서 제외)"""
+    from core.context_elicitor import get_context_elicitor
+    from core.intent_parser import get_intent_parser
+    from core.prompt_synthesizer import get_prompt_synthesizer
+    from core.serializers import LLMGenerateResponseSerializer
+
+    synthesizer = get_prompt_synthesizer()
+    parser = get_intent_parser()
+    elicitor = get_context_elicitor()
+
+    cases = []
+    for lang in LANGUAGES:
+        for size in SIZES:
+            suffix = f'[{lang}-x{size}]'
+            intent = _intent(lang, size)
+            context = _session_context(lang, size)
+            user_input = SAMPLE_INPUT[lang]
+            synthesized = _synthesized(lang, size)
+            long_input = SAMPLE_TEXT[lang] * size
+            history = [SAMPLE_TEXT[lang][:80 + i] for i in range(2 * size)]
+            previous_answers = [
+                {'question': f'질문 {i}', 'answer': SAMPLE_TEXT[lang][:100]} for i in range(2 * size)
+            ]
+            intent_json = {
+                'cognitive_goal': '만들기',
+                'specificity': 'HIGH',
+                'completeness': 'PARTIAL',
+                'primary_entities': intent.primary_entities,
+                'constraints': intent.constraints,
+                'confidence': 0.82,
+            }
+            response_data = {
+                'session_id': str(uuid.UUID(int=size)),
+                'prompt_history_id': str(uuid.UUID(int=size + 1)),
+                'model_used': 'gpt-4o-mini',
+                'provider': 'OpenAIProvider',
+                'response': SAMPLE_TEXT[lang] * (10 * size),
+                'tokens_used': 1200 * size,
+                'quality_level': 'balanced',
+                'references': [{'id': str(i), 'url': f'https://example.com/{i}', 'title': f'참고자료 {i}'}
+                               for i in range(min(10, size))],
+                'cascade': None,
+                'token_estimate': {'input_tokens': 800, 'output_tokens': 1200 * size, 'max_tokens': 4096},
+            }
+
+            cases += [
+                (f'synthesize{suffix}',
+                 lambda i=intent, c=context, u=user_input: synthesizer.synthesize(i, c, u)),
+                (f'optimize{suffix}', lambda p=synthesized: synthesizer.optimize(p)),
+                (f'compress{suffix}', lambda p=synthesized: synthesizer._compress(p, 300)),
+                (f'estimate_tokens{suffix}', lambda p=synthesized: synthesizer.estimate_tokens(p)),
+                (f'intent_build_prompt{suffix}', lambda u=long_input, h=history: parser._build_prompt(u, h)),
+                (f'intent_parse_response{suffix}', lambda j=intent_json, u=long_input: parser._parse_response(j, u)),
+                (f'intent_fallback{suffix}', lambda u=long_input: parser._create_fallback_intent(u)),
+                (f'context_build_prompt{suffix}',
+                 lambda i=intent, c=context, a=previous_answers: elicitor._build_prompt(i, c, a)),
+                (f'generate_serializer{suffix}',
+                 lambda d=response_data: LLMGenerateResponseSerializer(d).data),
+            ]
+    return cases
+
+
+def measure(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, float]:
+    """호출당 시간(µs): 반복 측정의 최소/중앙값"""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    # autorange는 0.2초 기준이므로 min_time에 맞춰 반복 횟수 조정
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    runs = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {'min_us': min(runs), 'median_us': statistics.median(runs), 'loops': number}
+
+
+class Command(BaseCommand):
+    help = '요청 경로 순수 파이썬 함수 CPU 벤치마크 (한국어/영어, 입력 크기별, 기준선 비교)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filter', action='append', dest='filters', help='이름에 포함된 벤치마크만 실행 (여러 번 지정 가능)')
+        parser.add_argument('--repeat', type=int, default=5, help='반복 측정 횟수 (기본 5)')
+        parser.add_argument('--min-time', type=float, default=0.1, help='측정 1회당 최소 시간(초, 기본 0.1)')
+        parser.add_argument(
+            '--baseline',
+            default=str(Path(settings.BASE_DIR) / 'benchmark_baseline.json'),
+            help='비교/저장할 기준선 파일 (기본 BASE_DIR/benchmark_baseline.json)'
+        )
+        parser.add_argument('--save-baseline', action='store_true', help='이번 결과를 기준선으로 저장')
+        parser.add_argument('--threshold', type=float, default=25.0, help='회귀로 볼 느려짐(%%, 기본 25)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='회귀가 있으면 실패 종료')
+        parser.add_argument('--json', action='store_true', help='JSON으로 출력')
+
+    def handle(self, *args, **options):
+        cases = build_cases()
+        if options['filters']:
+            cases = [(name, func) for name, func in cases if any(f in name for f in options['filters'])]
+        if not cases:
+            raise CommandError('실행할 벤치마크가 없습니다.')
+
+        results = {}
+        logging.disable(logging.CRITICAL)
+        try:
+            for name, func in cases:
+                results[name] = measure(func, options['repeat'], options['min_time'])
+        finally:
+            logging.disable(logging.NOTSET)
+
+        baseline = {}
+        baseline_path = Path(options['baseline'])
+        if baseline_path.exists():
+            try:
+                baseline = json.loads(baseline_path.read_text(encoding='utf-8')).get('results', {})
+            except ValueError as e:
+                raise CommandError(f'기준선 파일을 읽을 수 없습니다 ({baseline_path}): {e}')
+
+        # 최소값 기준 비교 (스케줄링 잡음이 가장 적음)
+        regressions = []
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous and previous.get('min_us'):
+                result['change_pct'] = (result['min_us'] - previous['min_us']) / previous['min_us'] * 100
+                if result['change_pct'] > options['threshold']:
+                    regressions.append(name)
+
+        if options['json']:
+            self.stdout.write(json.dumps({'results': results, 'regressions': regressions}, ensure_ascii=False, indent=2))
+        else:
+            self.stdout.write(f'{"벤치마크":<36} {"최소(µs)":>12} {"중앙(µs)":>12} {"반복":>8} {"기준선 대비":>12}')
+            for name, result in results.items():
+                change = f'{result["change_pct"]:+.1f}%' if 'change_pct' in result else '-'
+                line = (f'{name:<36} {result["min_us"]:>12.1f} {result["median_us"]:>12.1f} '
+                        f'{result["loops"]:>8} {change:>12}')
+                self.stdout.write(self.style.ERROR(line) if name in regressions else line)
+            if baseline:
+                summary = f'\n기준선 대비 {options["threshold"]:.0f}% 넘게 느려진 벤치마크: {len(regressions)}개'
+                self.stdout.write(self.style.ERROR(summary) if regressions else self.style.SUCCESS(summary))
+            else:
+                self.stdout.write('\n기준선 없음 (--save-baseline으로 저장)')
+
+        if options['save_baseline']:
+            if options['filters'] and baseline:
+                # 일부만 실행한 경우 나머지 기준선은 유지
+                merged = dict(baseline)
+                merged.update(results)
+            else:
+                merged = results
+            stored = {name: {k: v for k, v in r.items() if k != 'change_pct'} for name, r in merged.items()}
+            baseline_path.write_text(json.dumps({'results': stored}, ensure_ascii=False, indent=2), encoding='utf-8')
+            if not options['json']:
+                self.stdout.write(self.style.SUCCESS(f'기준선 저장: {baseline_path}'))
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'기준선 대비 회귀 {len(regressions)}건: {", ".join(regressions)}')
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 부하 테스트 명령어
+
+실행 중인 서버에 실제 세션 흐름(의도 파싱 → 컨텍스트 질문 → 프롬프트 합성 → LLM 생성)을
+동시 가상 사용자로 반복 요청하고, 엔드포인트별 RPS, p50/p95/p99 지연, 에러율, DB 쿼리 수를 보고합니다.
+저장된 기준선(baseline)과 비교해 회귀를 표시합니다.
+
+가상 사용자 시나리오:
+    anonymous           익명 사용자 (RAG 없음)
+    anonymous_internet  익명 사용자 + 인터넷 모드
+    user_rag            로그인 사용자 (생성 시 RAG 사용)
+    user_rag_internet   로그인 사용자 + 인터넷 모드
+
+대상 서버는 가짜 제공자와 쿼리 수 헤더를 켜고 실행합니다:
+    LLM_FAKE_MODE=True QUERY_COUNT_HEADER=True python manage.py runserver --noreload
+
+사용법:
+    python manage.py loadtest --create-users
+    python manage.py loadtest --concurrency 50 --duration 60 --scenario anonymous --scenario user_rag
+    python manage.py loadtest --save-baseline
+    python manage.py loadtest --fail-on-regression --max-regression 15
+"""
+
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from prompt_mate.query_count_middleware import QUERY_COUNT_HEADER
+
+# 시나리오: (로그인 여부, 인터넷 모드)
+SCENARIOS = {
+    'anonymous': (False, False),
+    'anonymous_internet': (False, True),
+    'user_rag': (True, False),
+    'user_rag_internet': (True, True),
+}
+
+# 흐름 순서대로의 엔드포인트 (보고 순서)
+FLOW_ENDPOINTS = ['intent/parse', 'context/questions', 'prompt/synthesize', 'llm/generate']
+
+SAMPLE_INPUTS = [
+    '신제품 출시 보도자료 초안을 작성해줘',
+    '파이썬으로 CSV 파일을 읽어서 월별 매출 합계를 구하는 코드를 알려줘',
+    '우리 팀 주간 회의록을 요약하고 다음 주 할 일을 정리해줘',
+    '고객 불만 이메일에 정중하게 답장하는 글을 써줘',
+    '머신러닝 모델의 과적합을 줄이는 방법을 비교해서 설명해줘',
+    'Write a product description for a lightweight hiking backpack',
+    'Explain the difference between processes and threads with examples',
+    'Summarize the key risks of migrating our database to the cloud',
+]
+
+USER_PREFIX = 'loadtest-user-'
+DEFAULT_PASSWORD = 'loadtest-password-123'
+
+# 기준선 비교 지표: (지표, 클수록 나쁜지)
+COMPARED_METRICS = [
+    ('rps', False),
+    ('p50_ms', True),
+    ('p95_ms', True),
+    ('p99_ms', True),
+    ('error_rate', True),
+    ('avg_queries', True),
+]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """최근접 순위(nearest-rank) 백분위수"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class EndpointStats:
+    """엔드포인트별 지연/상태 코드/쿼리 수 집계"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.queries: List[int] = []
+        self.errors = 0
+
+    def record(self, latency_ms: float, status: Any, ok: bool, queries: Optional[int] = None):
+        self.latencies.append(latency_ms)
+        self.statuses[str(status)] += 1
+        if not ok:
+            self.errors += 1
+        if queries is not None:
+            self.queries.append(queries)
+
+    def to_dict(self, wall_seconds: float) -> Dict[str, Any]:
+        requests = len(self.latencies)
+        return {
+            'requests': requests,
+            'rps': requests / wall_seconds if wall_seconds else 0.0,
+            'p50_ms': percentile(self.latencies, 50),
+            'p95_ms': percentile(self.latencies, 95),
+            'p99_ms': percentile(self.latencies, 99),
+            'max_ms': max(self.latencies) if self.latencies else None,
+            'error_rate': self.errors / requests if requests else 0.0,
+            'statuses': dict(self.statuses),
+            'avg_queries': sum(self.queries) / len(self.queries) if self.queries else None,
+            'max_queries': max(self.queries) if self.queries else None,
+        }
+
+
+class Command(BaseCommand):
+    help = 'API 세션 흐름 부하 테스트 (엔드포인트별 RPS/지연/에러율/DB 쿼리 수, 기준선 비교)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='대상 서버 (기본 http://127.0.0.1:8000)')
+        parser.add_argument('--concurrency', type=int, default=10, help='동시 가상 사용자 수 (기본 10)')
+        parser.add_argument('--duration', type=float, default=30.0, help='실행 시간(초, 기본 30)')
+        parser.add_argument('--flows', type=int, default=0, help='가상 사용자당 최대 흐름 수 (0이면 시간까지 반복)')
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            dest='scenarios',
+            choices=list(SCENARIOS),
+            help='실행할 시나리오 (여러 번 지정 가능, 기본: 전체를 가상 사용자에 골고루 배정)'
+        )
+        parser.add_argument('--users', type=int, default=0, help='로그인 사용자 풀 크기 (기본: 동시 사용자 수)')
+        parser.add_argument(
+            '--create-users',
+            action='store_true',
+            help=f'로그인 시나리오용 사용자({USER_PREFIX}N)를 DB에 생성 (서버와 같은 DB여야 함)'
+        )
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help='부하 테스트 사용자 비밀번호')
+        parser.add_argument('--timeout', type=float, default=60.0, help='요청 타임아웃(초, 기본 60)')
+        parser.add_argument('--seed', type=int, default=0, help='입력/시나리오 선택 시드')
+        parser.add_argument(
+            '--baseline',
+            default=str(Path(settings.BASE_DIR) / 'loadtest_baseline.json'),
+            help='비교/저장할 기준선 파일 (기본 BASE_DIR/loadtest_baseline.json)'
+        )
+        parser.add_argument('--save-baseline', action='store_true', help='이번 결과를 기준선으로 저장')
+        parser.add_argument('--max-regression', type=float, default=20.0, help='회귀로 볼 변화율(%%, 기본 20)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='회귀가 있으면 실패 종료')
+        parser.add_argument('--json', action='store_true', help='JSON으로 출력')
+
+    def handle(self, *args, **options):
+        try:
+            import httpx
+        except ImportError:
+            raise CommandError('httpx 패키지가 필요합니다. pip install httpx 실행 필요')
+
+        scenarios = options['scenarios'] or list(SCENARIOS)
+        concurrency = max(1, options['concurrency'])
+        needs_users = any(SCENARIOS[name][0] for name in scenarios)
+        usernames = []
+        if needs_users:
+            usernames = [f'{USER_PREFIX}{i}' for i in range(options['users'] or concurrency)]
+            if options['create_users']:
+                self._create_users(usernames, options['password'])
+
+        self.stats: Dict[str, EndpointStats] = {}
+        self.flows: Dict[str, Counter] = {name: Counter() for name in scenarios}
+
+        started = time.perf_counter()
+        asyncio.run(self._run(httpx, scenarios, usernames, concurrency, options))
+        wall_seconds = time.perf_counter() - started
+
+        result = self._result(scenarios, concurrency, wall_seconds, options)
+        baseline = self._load_baseline(options['baseline'])
+        regressions = self._compare(result, baseline, options['max_regression']) if baseline else []
+
+        if options['json']:
+            self.stdout.write(json.dumps(
+                {**result, 'baseline': options['baseline'] if baseline else None, 'regressions': regressions},
+                ensure_ascii=False, indent=2
+            ))
+        else:
+            self._report(result, baseline, regressions)
+
+        if options['save_baseline']:
+            Path(options['baseline']).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+            if not options['json']:
+                self.stdout.write(self.style.SUCCESS(f'\n기준선 저장: {options["baseline"]}'))
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'기준선 대비 회귀 {len(regressions)}건')
+
+    def _create_users(self, usernames: List[str], password: str):
+        """로그인 시나리오용 사용자 생성 (이미 있으면 비밀번호만 맞춤)"""
+        from core.models import CustomUser
+
+        for username in usernames:
+            user, created = CustomUser.objects.get_or_create(
+                username=username,
+                defaults={'email': f'{username}@loadtest.local', 'email_verified': True}
+            )
+            if created or not user.check_password(password):
+                user.set_password(password)
+                user.save(update_fields=['password'])
+        self.stdout.write(f'부하 테스트 사용자 {len(usernames)}명 준비 완료')
+
+    async def _run(self, httpx, scenarios: List[str], usernames: List[str], concurrency: int, options):
+        deadline = time.perf_counter() + options['duration']
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        await asyncio.gather(*[
+            self._virtual_user(
+                httpx, index, scenarios[index % len(scenarios)], usernames, deadline, limits, options
+            )
+            for index in range(concurrency)
+        ])
+
+    async def _virtual_user(self, httpx, index: int, scenario: str, usernames: List[str],
+                            deadline: float, limits, options):
+        """가상 사용자 한 명: (필요하면 로그인 후) 마감 시간까지 세션 흐름 반복"""
+        logged_in, internet_mode = SCENARIOS[scenario]
+        rng = random.Random(options['seed'] * 1000003 + index)
+        # 가상 사용자별 클라이언트 (세션 쿠키 분리)
+        async with httpx.AsyncClient(
+            base_url=options['base_url'], timeout=options['timeout'], limits=limits
+        ) as client:
+            if logged_in:
+                username = usernames[index % len(usernames)]
+                body = await self._request(httpx, client, 'auth/login', {
+                    'username': username, 'password': options['password']
+                })
+                if body is None:
+                    self.flows[scenario]['login_failed'] += 1
+                    return
+
+            completed = 0
+            while time.perf_counter() < deadline and (not options['flows'] or completed < options['flows']):
+                ok = await self._flow(httpx, client, rng, internet_mode)
+                self.flows[scenario]['completed' if ok else 'failed'] += 1
+                completed += 1
+
+    async def _flow(self, httpx, client, rng: random.Random, internet_mode: bool) -> bool:
+        """세션 흐름 한 번 (중간 단계가 실패하면 중단)"""
+        user_input = rng.choice(SAMPLE_INPUTS)
+
+        body = await self._request(httpx, client, 'intent/parse', {'user_input': user_input})
+        if body is None:
+            return False
+        session_id = body['session_id']
+
+        body = await self._request(httpx, client, 'context/questions', {
+            'session_id': session_id, 'intent_id': body['intent']['id']
+        })
+        if body is None:
+            return False
+
+        body = await self._request(httpx, client, 'prompt/synthesize', {
+            'session_id': session_id, 'user_input': user_input
+        })
+        if body is None:
+            return False
+
+        body = await self._request(httpx, client, 'llm/generate', {
+            'session_id': session_id,
+            'prompt': body['synthesized_prompt'],
+            'user_input': user_input,
+            'internet_mode': internet_mode,
+        })
+        return body is not None
+
+    async def _request(self, httpx, client, endpoint: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """POST 요청 한 번을 계측 (성공 시 JSON 본문, 실패 시 None)"""
+        stats = self.stats.setdefault(endpoint, EndpointStats())
+        started = time.perf_counter()
+        try:
+            response = await client.post(f'/api/{endpoint}/', json=payload)
+        except httpx.HTTPError as e:
+            stats.record((time.perf_counter() - started) * 1000, type(e).__name__, ok=False)
+            return None
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        queries = response.headers.get(QUERY_COUNT_HEADER)
+        ok = response.is_success
+        stats.record(latency_ms, response.status_code, ok, int(queries) if queries is not None else None)
+        if not ok:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def _result(self, scenarios: List[str], concurrency: int, wall_seconds: float, options) -> Dict[str, Any]:
+        endpoints = sorted(self.stats, key=lambda e: FLOW_ENDPOINTS.index(e) if e in FLOW_ENDPOINTS else -1)
+        total_requests = sum(len(s.latencies) for s in self.stats.values())
+        return {
+            'base_url': options['base_url'],
+            'concurrency': concurrency,
+            'scenarios': scenarios,
+            'wall_seconds': wall_seconds,
+            'total_requests': total_requests,
+            'total_rps': total_requests / wall_seconds if wall_seconds else 0.0,
+            'flows': {name: dict(counts) for name, counts in self.flows.items()},
+            'endpoints': {name: self.stats[name].to_dict(wall_seconds) for name in endpoints},
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def _load_baseline(self, path: str) -> Optional[Dict[str, Any]]:
+        baseline_path = Path(path)
+        if not baseline_path.exists():
+            return None
+        try:
+            return json.loads(baseline_path.read_text(encoding='utf-8'))
+        except ValueError as e:
+            raise CommandError(f'기준선 파일을 읽을 수 없습니다 ({path}): {e}')
+
+    def _compare(self, result: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[Dict[str, Any]]:
+        """기준선 대비 회귀 목록 (지표가 나쁜 방향으로 max_regression% 넘게 변한 경우)"""
+        regressions = []
+        for endpoint, current in result['endpoints'].items():
+            previous = baseline.get('endpoints', {}).get(endpoint)
+            if not previous:
+                continue
+            for metric, higher_is_worse in COMPARED_METRICS:
+                before, after = previous.get(metric), current.get(metric)
+                if before is None or after is None:
+                    continue
+                if metric == 'error_rate':
+                    # 에러율은 비율 자체가 작아 절대 차이(퍼센트 포인트)로 판단
+                    change = (after - before) * 100
+                elif before:
+                    change = (after - before) / before * 100
+                else:
+                    continue
+                worse = change if higher_is_worse else -change
+                if worse > max_regression:
+                    regressions.append({
+                        'endpoint': endpoint, 'metric': metric, 'baseline': before, 'current': after, 'change_pct': change
+                    })
+        return regressions
+
+    def _report(self, result: Dict[str, Any], baseline: Optional[Dict[str, Any]], regressions: List[Dict[str, Any]]):
+        self.stdout.write(self.style.SUCCESS(
+            f'{result["base_url"]}: 동시 사용자 {result["concurrency"]}명, {result["wall_seconds"]:.1f}초, '
+            f'요청 {result["total_requests"]}건 ({result["total_rps"]:.1f} RPS)'
+        ))
+        for name, counts in result['flows'].items():
+            self.stdout.write(
+                f'  {name}: 완료 {counts.get("completed", 0)}, 실패 {counts.get("failed", 0)}'
+                + (f', 로그인 실패 {counts["login_failed"]}' if counts.get('login_failed') else '')
+            )
+
+        def fmt(value, spec='.0f'):
+            return '-' if value is None else format(value, spec)
+
+        self.stdout.write(
+            f'\n{"엔드포인트":<20} {"요청":>6} {"RPS":>7} {"p50":>7} {"p95":>7} {"p99":>7} {"에러율":>7} {"쿼리":>6}  상태'
+        )
+        for endpoint, s in result['endpoints'].items():
+            statuses = ', '.join(f'{code}:{count}' for code, count in sorted(s['statuses'].items()))
+            self.stdout.write(
+                f'{endpoint:<20} {s["requests"]:>6} {s["rps"]:>7.1f} {fmt(s["p50_ms"]):>7} {fmt(s["p95_ms"]):>7} '
+                f'{fmt(s["p99_ms"]):>7} {s["error_rate"] * 100:>6.1f}% {fmt(s["avg_queries"], ".1f"):>6}  {statuses}'
+            )
+
+        if baseline is None:
+            self.stdout.write('\n기준선 없음 (--save-baseline으로 저장)')
+            return
+        self.stdout.write(f'\n기준선({baseline.get("recorded_at", "?")}) 대비:')
+        for endpoint, current in result['endpoints'].items():
+            previous = baseline.get('endpoints', {}).get(endpoint)
+            if not previous:
+                continue
+            changes = []
+            for metric, _ in COMPARED_METRICS:
+                before, after = previous.get(metric), current.get(metric)
+                if before is None or after is None:
+                    continue
+                if metric == 'error_rate':
+                    changes.append(f'{metric} {(after - before) * 100:+.1f}pp')
+                elif before:
+                    changes.append(f'{metric} {(after - before) / before * 100:+.0f}%')
+            self.stdout.write(f'  {endpoint:<20} ' + ', '.join(changes))
+        if regressions:
+            self.stdout.write(self.style.ERROR(f'\n회귀 {len(regressions)}건:'))
+            for r in regressions:
+                self.stdout.write(self.style.ERROR(
+                    f'  {r["endpoint"]} {r["metric"]}: {r["baseline"]:.3g} → {r["current"]:.3g}'
+                ))
+        else:
+            self.stdout.write(self.style.SUCCESS('회귀 없음'))
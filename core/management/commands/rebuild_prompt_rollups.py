@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+프롬프트 이력 집계 재계산 명령어
+
+PromptHistory로부터 닫힌 시간대의 시간별 집계(PromptHistoryRollup)를 다시 만듭니다.
+집계가 어긋났을 때(이력 삭제, 구간 변경 등) 사용합니다. 서비스 중에 실행해도 됩니다.
+
+사용법:
+    python manage.py rebuild_prompt_rollups            # 전체
+    python manage.py rebuild_prompt_rollups --days 7   # 최근 7일 시간대만
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'PromptHistory로부터 분석용 시간별 집계 재계산'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=0, help='최근 N일 시간대만 재계산 (0이면 전체)')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] > 0 else None
+        count = rebuild_rollups(since=since)
+        scope = f"최근 {options['days']}일" if since else '전체'
+        self.stdout.write(self.style.SUCCESS(f'완료! {scope} 이력 {count:,}건을 다시 집계했습니다.'))
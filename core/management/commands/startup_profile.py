@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+시작 시간 프로파일 명령어
+
+새 파이썬 프로세스에서 `-X importtime`으로 Django 초기화와 지정 모듈 임포트를 수행하고,
+모듈별 임포트 시간을 보고합니다.
+
+사용법:
+    python manage.py startup_profile
+    python manage.py startup_profile --top 40 --module core.views --module prompt_mate.urls
+    python manage.py startup_profile --project-only
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# import time:  self [us] | cumulative | imported package
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+PROJECT_PREFIXES = ('core', 'llm_providers', 'prompt_mate')
+
+
+class Command(BaseCommand):
+    help = '모듈별 임포트 시간 보고 (콜드 스타트 프로파일)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--module',
+            action='append',
+            dest='modules',
+            help='Django 초기화 후 임포트할 모듈 (여러 번 지정 가능, 기본: prompt_mate.urls)'
+        )
+        parser.add_argument('--top', type=int, default=25, help='표시할 모듈 수 (기본 25)')
+        parser.add_argument(
+            '--sort',
+            choices=['cumulative', 'self'],
+            default='cumulative',
+            help='정렬 기준 (기본 cumulative)'
+        )
+        parser.add_argument('--project-only', action='store_true', help='프로젝트 모듈만 표시')
+        parser.add_argument('--json', action='store_true', help='JSON으로 출력')
+
+    def handle(self, *args, **options):
+        modules = options['modules'] or ['prompt_mate.urls']
+        code = 'import django; django.setup()\n' + ''.join(f'import {m}\n' for m in modules)
+
+        env = os.environ.copy()
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'prompt_mate.settings')
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=str(settings.BASE_DIR),
+            env=env,
+            capture_output=True,
+            text=True
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            raise CommandError(f'프로파일 대상 임포트 실패:\n{result.stderr[-2000:]}')
+
+        entries = []
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append({
+                'module': name,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+                'depth': (len(indent) - 1) // 2,
+            })
+
+        # 최상위 임포트의 누적 시간 합 = 전체 임포트 시간
+        total_import_ms = sum(e['cumulative_ms'] for e in entries if e['depth'] == 0)
+
+        shown = entries
+        if options['project_only']:
+            shown = [e for e in entries if e['module'].split('.')[0] in PROJECT_PREFIXES]
+        key = 'cumulative_ms' if options['sort'] == 'cumulative' else 'self_ms'
+        shown = sorted(shown, key=lambda e: e[key], reverse=True)[:options['top']]
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'modules': modules,
+                'wall_ms': wall_ms,
+                'total_import_ms': total_import_ms,
+                'module_count': len(entries),
+                'top': shown,
+            }, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'프로세스 시작~임포트 완료: {wall_ms:.0f}ms '
+            f'(임포트 {total_import_ms:.0f}ms, 모듈 {len(entries)}개)'
+        ))
+        self.stdout.write(f'\n{"누적(ms)":>10} {"자체(ms)":>10}  모듈')
+        for e in shown:
+            self.stdout.write(f'{e["cumulative_ms"]:>10.1f} {e["self_ms"]:>10.1f}  {e["module"]}')
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_add_email_verification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompthistory',
+            name='finish_reason',
+            field=models.CharField(blank=True, help_text='생성 종료 사유 (stop/length/cancelled 등)', max_length=30, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_prompthistory_finish_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompthistory',
+            name='cognitive_goal',
+            field=models.CharField(blank=True, help_text='인지적 목표 (알기/하기/만들기/배우기)', max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='completion_tokens',
+            field=models.IntegerField(blank=True, help_text='출력 토큰 수 (출력 길이 예측용)', null=True),
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='prompt_tokens',
+            field=models.IntegerField(blank=True, help_text='입력 토큰 수', null=True),
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='specificity_level',
+            field=models.CharField(blank=True, help_text='요청 구체성 레벨', max_length=20, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='prompthistory',
+            index=models.Index(fields=['model_used', 'specificity_level', 'cognitive_goal', '-created_at'], name='prompt_hist_model_u_ab6bcd_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_prompthistory_token_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompthistory',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict, help_text='단계별 소요 시간(ms, 저장 시점까지의 트레이스 span 합계)'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_prompthistory_stage_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileReport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('request_id', models.CharField(db_index=True, help_text='요청 ID (트레이스 ID, Server-Timing/OTLP 트레이스와 연결)', max_length=64)),
+                ('method', models.CharField(help_text='HTTP 메서드', max_length=10)),
+                ('path', models.CharField(help_text='요청 경로', max_length=500)),
+                ('status_code', models.IntegerField(blank=True, help_text='응답 상태 코드', null=True)),
+                ('profiler', models.CharField(choices=[('sampling', '샘플링'), ('cprofile', 'cProfile')], help_text='프로파일러 종류', max_length=20)),
+                ('trigger', models.CharField(choices=[('header', '헤더'), ('query', '쿼리 파라미터'), ('sample', '무작위 샘플')], help_text='프로파일링 사유', max_length=20)),
+                ('duration_ms', models.FloatField(help_text='프로파일링 구간 소요 시간(ms)')),
+                ('sample_count', models.IntegerField(default=0, help_text='수집한 스택 샘플 수 (샘플링 프로파일러)')),
+                ('summary', models.TextField(blank=True, help_text='상위 함수 요약 (샘플링: 자체/누적 샘플, cProfile: pstats 누적 시간순)')),
+                ('speedscope', models.JSONField(blank=True, help_text='speedscope 파일 형식 플레임 그래프 (샘플링 프로파일러)', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, help_text='요청 사용자', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='profile_reports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'profile_reports',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at'], name='profile_rep_created_e4f205_idx'), models.Index(fields=['path', '-created_at'], name='profile_rep_path_859c41_idx')],
+            },
+        ),
+    ]
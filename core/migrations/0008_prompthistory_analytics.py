@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_profilereport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompthistory',
+            name='cached_tokens',
+            field=models.IntegerField(default=0, help_text='입력 토큰 중 제공자 프롬프트 캐시에서 읽은 토큰 수'),
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='cost_usd',
+            field=models.FloatField(default=0.0, help_text='추정 비용 (USD, 추가 호출 포함)'),
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='latency_ms',
+            field=models.FloatField(blank=True, help_text='요청 준비부터 응답 생성 완료까지 걸린 시간(ms)', null=True),
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='retries',
+            field=models.IntegerField(default=0, help_text='첫 호출 이후 추가 제공자 호출 수 (캐스케이드 승격, 이어쓰기)'),
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='route',
+            field=models.CharField(default='direct', help_text='생성 경로 (direct/hedged/cascade/stream)', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='task_type',
+            field=models.CharField(default='final_generation', help_text='라우터 작업 유형', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='ttft_ms',
+            field=models.FloatField(blank=True, help_text='첫 토큰까지 걸린 시간(ms, 스트리밍이 아니면 latency_ms와 같음)', null=True),
+        ),
+        migrations.CreateModel(
+            name='PromptHistoryRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('bucket_start', models.DateTimeField(help_text='집계 시간대 시작 (정시)')),
+                ('model_used', models.CharField(help_text='사용된 모델명', max_length=100)),
+                ('provider', models.CharField(help_text='LLM 제공자', max_length=50)),
+                ('task_type', models.CharField(help_text='라우터 작업 유형', max_length=30)),
+                ('quality_level', models.CharField(help_text='품질 수준', max_length=20)),
+                ('request_count', models.IntegerField(default=0, help_text='요청 수')),
+                ('latency_count', models.IntegerField(default=0, help_text='지연 시간이 기록된 요청 수')),
+                ('latency_sum_ms', models.FloatField(default=0.0, help_text='지연 시간 합계(ms)')),
+                ('latency_histogram', models.JSONField(default=list, help_text='지연 시간 구간별 요청 수')),
+                ('ttft_count', models.IntegerField(default=0, help_text='첫 토큰 시간이 기록된 요청 수')),
+                ('ttft_sum_ms', models.FloatField(default=0.0, help_text='첫 토큰 시간 합계(ms)')),
+                ('ttft_histogram', models.JSONField(default=list, help_text='첫 토큰 시간 구간별 요청 수')),
+                ('tokens_used', models.BigIntegerField(default=0, help_text='전체 토큰 수')),
+                ('prompt_tokens', models.BigIntegerField(default=0, help_text='입력 토큰 수')),
+                ('completion_tokens', models.BigIntegerField(default=0, help_text='출력 토큰 수')),
+                ('cached_tokens', models.BigIntegerField(default=0, help_text='캐시 입력 토큰 수')),
+                ('retries', models.IntegerField(default=0, help_text='추가 제공자 호출 수')),
+                ('cost_usd', models.FloatField(default=0.0, help_text='추정 비용 합계 (USD)')),
+            ],
+            options={
+                'db_table': 'prompt_history_rollups',
+                'ordering': ['-bucket_start'],
+                'indexes': [models.Index(fields=['-bucket_start'], name='prompt_hist_bucket__d3e9f5_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='prompthistoryrollup',
+            constraint=models.UniqueConstraint(fields=('bucket_start', 'model_used', 'provider', 'task_type', 'quality_level'), name='unique_prompt_history_rollup'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_prompthistory_analytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CostLedgerEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('request_id', models.CharField(blank=True, help_text='요청 ID (트레이스 ID)', max_length=64)),
+                ('category', models.CharField(choices=[('llm', 'LLM 호출'), ('embedding', '임베딩'), ('search', '검색')], help_text='과금 항목', max_length=20)),
+                ('stage', models.CharField(blank=True, help_text='호출한 요청 단계 (트레이스 span 이름, 예: intent.parse)', max_length=50)),
+                ('provider', models.CharField(help_text='제공자', max_length=50)),
+                ('model', models.CharField(help_text='모델명', max_length=100)),
+                ('operation', models.CharField(help_text='호출 종류 (generate/embed/search_request 등)', max_length=30)),
+                ('prompt_tokens', models.IntegerField(default=0, help_text='입력 토큰 수')),
+                ('completion_tokens', models.IntegerField(default=0, help_text='출력 토큰 수')),
+                ('cached_tokens', models.IntegerField(default=0, help_text='캐시 입력 토큰 수')),
+                ('cost_usd', models.FloatField(default=0.0, help_text='추정 비용 (USD)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(blank=True, help_text='연관 세션', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cost_entries', to='core.session')),
+                ('user', models.ForeignKey(blank=True, help_text='요청 사용자 (익명은 null)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cost_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'cost_ledger',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at'], name='cost_ledger_created_2d53cb_idx'), models.Index(fields=['session', 'created_at'], name='cost_ledger_session_806a74_idx'), models.Index(fields=['user', 'created_at'], name='cost_ledger_user_id_817b52_idx')],
+            },
+        ),
+    ]
@@ -465,6 +465,71 @@ class PromptHistory(models.Model):
         default='balanced',
         help_text="품질 수준 (low/balanced/high)"
     )
+    finish_reason = models.CharField(
+        max_length=30,
+        null=True,
+        blank=True,
+        help_text="생성 종료 사유 (stop/length/cancelled 등)"
+    )
+    prompt_tokens = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="입력 토큰 수"
+    )
+    completion_tokens = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="출력 토큰 수 (출력 길이 예측용)"
+    )
+    specificity_level = models.CharField(
+        max_length=20,
+        null=True,
+        blank=True,
+        help_text="요청 구체성 레벨"
+    )
+    cognitive_goal = models.CharField(
+        max_length=20,
+        null=True,
+        blank=True,
+        help_text="인지적 목표 (알기/하기/만들기/배우기)"
+    )
+    stage_timings = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="단계별 소요 시간(ms, 저장 시점까지의 트레이스 span 합계)"
+    )
+    task_type = models.CharField(
+        max_length=30,
+        default='final_generation',
+        help_text="라우터 작업 유형"
+    )
+    route = models.CharField(
+        max_length=20,
+        default='direct',
+        help_text="생성 경로 (direct/hedged/cascade/stream)"
+    )
+    latency_ms = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="요청 준비부터 응답 생성 완료까지 걸린 시간(ms)"
+    )
+    ttft_ms = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="첫 토큰까지 걸린 시간(ms, 스트리밍이 아니면 latency_ms와 같음)"
+    )
+    cached_tokens = models.IntegerField(
+        default=0,
+        help_text="입력 토큰 중 제공자 프롬프트 캐시에서 읽은 토큰 수"
+    )
+    retries = models.IntegerField(
+        default=0,
+        help_text="첫 호출 이후 추가 제공자 호출 수 (캐스케이드 승격, 이어쓰기)"
+    )
+    cost_usd = models.FloatField(
+        default=0.0,
+        help_text="추정 비용 (USD, 추가 호출 포함)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -475,12 +540,58 @@ class PromptHistory(models.Model):
             models.Index(fields=['-created_at']),
             models.Index(fields=['session', '-created_at']),
             models.Index(fields=['model_used']),
+            models.Index(fields=['model_used', 'specificity_level', 'cognitive_goal', '-created_at']),
         ]
     
     def __str__(self):
         return f"Prompt ({self.model_used}) - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
 
+class PromptHistoryRollup(models.Model):
+    """
+    프롬프트 이력 시간별 집계 모델
+    
+    시간대가 닫힌 뒤 (시간, 모델, 제공자, 작업 유형, 품질 수준)별로 한 번 계산해 저장합니다 (core.analytics).
+    분석 API는 이력 테이블 전체를 훑지 않고 이 테이블의 기간 범위와 열린 최근 시간대의 이력만 읽습니다.
+    지연 백분위수는 고정 구간 히스토그램(core.analytics.LATENCY_BOUNDS_MS)으로 추정합니다.
+    """
+    id = models.BigAutoField(primary_key=True)
+    bucket_start = models.DateTimeField(help_text="집계 시간대 시작 (정시)")
+    model_used = models.CharField(max_length=100, help_text="사용된 모델명")
+    provider = models.CharField(max_length=50, help_text="LLM 제공자")
+    task_type = models.CharField(max_length=30, help_text="라우터 작업 유형")
+    quality_level = models.CharField(max_length=20, help_text="품질 수준")
+    request_count = models.IntegerField(default=0, help_text="요청 수")
+    latency_count = models.IntegerField(default=0, help_text="지연 시간이 기록된 요청 수")
+    latency_sum_ms = models.FloatField(default=0.0, help_text="지연 시간 합계(ms)")
+    latency_histogram = models.JSONField(default=list, help_text="지연 시간 구간별 요청 수")
+    ttft_count = models.IntegerField(default=0, help_text="첫 토큰 시간이 기록된 요청 수")
+    ttft_sum_ms = models.FloatField(default=0.0, help_text="첫 토큰 시간 합계(ms)")
+    ttft_histogram = models.JSONField(default=list, help_text="첫 토큰 시간 구간별 요청 수")
+    tokens_used = models.BigIntegerField(default=0, help_text="전체 토큰 수")
+    prompt_tokens = models.BigIntegerField(default=0, help_text="입력 토큰 수")
+    completion_tokens = models.BigIntegerField(default=0, help_text="출력 토큰 수")
+    cached_tokens = models.BigIntegerField(default=0, help_text="캐시 입력 토큰 수")
+    retries = models.IntegerField(default=0, help_text="추가 제공자 호출 수")
+    cost_usd = models.FloatField(default=0.0, help_text="추정 비용 합계 (USD)")
+    
+    class Meta:
+        db_table = 'prompt_history_rollups'
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['bucket_start', 'model_used', 'provider', 'task_type', 'quality_level'],
+                name='unique_prompt_history_rollup'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['-bucket_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.model_used} {self.bucket_start.strftime('%Y-%m-%d %H:00')} ({self.request_count}건)"
+
+
 class Feedback(models.Model):
     """
     피드백 모델
@@ -901,3 +1012,127 @@ class UsageRecord(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.year}년 {self.month}월 ({self.total_tokens:,} 토큰)"
+
+
+class ProfileReport(models.Model):
+    """
+    요청 프로파일 리포트 모델
+    
+    ProfilerMiddleware가 프로파일링한 요청의 결과를 저장합니다.
+    (샘플링 프로파일러는 speedscope 플레임 그래프 JSON, cProfile은 pstats 텍스트)
+    """
+    PROFILER_CHOICES = [
+        ('sampling', '샘플링'),
+        ('cprofile', 'cProfile'),
+    ]
+    TRIGGER_CHOICES = [
+        ('header', '헤더'),
+        ('query', '쿼리 파라미터'),
+        ('sample', '무작위 샘플'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    request_id = models.CharField(
+        max_length=64,
+        db_index=True,
+        help_text="요청 ID (트레이스 ID, Server-Timing/OTLP 트레이스와 연결)"
+    )
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        related_name='profile_reports',
+        null=True,
+        blank=True,
+        help_text="요청 사용자"
+    )
+    method = models.CharField(max_length=10, help_text="HTTP 메서드")
+    path = models.CharField(max_length=500, help_text="요청 경로")
+    status_code = models.IntegerField(null=True, blank=True, help_text="응답 상태 코드")
+    profiler = models.CharField(max_length=20, choices=PROFILER_CHOICES, help_text="프로파일러 종류")
+    trigger = models.CharField(max_length=20, choices=TRIGGER_CHOICES, help_text="프로파일링 사유")
+    duration_ms = models.FloatField(help_text="프로파일링 구간 소요 시간(ms)")
+    sample_count = models.IntegerField(default=0, help_text="수집한 스택 샘플 수 (샘플링 프로파일러)")
+    summary = models.TextField(
+        blank=True,
+        help_text="상위 함수 요약 (샘플링: 자체/누적 샘플, cProfile: pstats 누적 시간순)"
+    )
+    speedscope = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="speedscope 파일 형식 플레임 그래프 (샘플링 프로파일러)"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'profile_reports'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['path', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f}ms) - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class CostLedgerEntry(models.Model):
+    """
+    비용 원장 모델
+    
+    요청 중 발생한 과금 호출(LLM, 임베딩, 검색 수수료) 한 건마다 한 행을 기록합니다.
+    CostLedgerMiddleware가 요청이 끝날 때 모아서 저장하며, 세션/사용자/일별 비용 집계에 사용합니다.
+    """
+    CATEGORY_CHOICES = [
+        ('llm', 'LLM 호출'),
+        ('embedding', '임베딩'),
+        ('search', '검색'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        related_name='cost_entries',
+        null=True,
+        blank=True,
+        help_text="요청 사용자 (익명은 null)"
+    )
+    session = models.ForeignKey(
+        Session,
+        on_delete=models.SET_NULL,
+        related_name='cost_entries',
+        null=True,
+        blank=True,
+        help_text="연관 세션"
+    )
+    request_id = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="요청 ID (트레이스 ID)"
+    )
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, help_text="과금 항목")
+    stage = models.CharField(
+        max_length=50,
+        blank=True,
+        help_text="호출한 요청 단계 (트레이스 span 이름, 예: intent.parse)"
+    )
+    provider = models.CharField(max_length=50, help_text="제공자")
+    model = models.CharField(max_length=100, help_text="모델명")
+    operation = models.CharField(max_length=30, help_text="호출 종류 (generate/embed/search_request 등)")
+    prompt_tokens = models.IntegerField(default=0, help_text="입력 토큰 수")
+    completion_tokens = models.IntegerField(default=0, help_text="출력 토큰 수")
+    cached_tokens = models.IntegerField(default=0, help_text="캐시 입력 토큰 수")
+    cost_usd = models.FloatField(default=0.0, help_text="추정 비용 (USD)")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'cost_ledger'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['session', 'created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.category} {self.model} ${self.cost_usd:.6f} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
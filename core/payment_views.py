@@ -167,7 +167,7 @@ def get_payment_status(request):
     """
     payment_requests = PaymentRequest.objects.filter(
         user=request.user
-    ).order_by('-requested_at')[:5]  # 최근 5개만
+    ).select_related('user', 'plan', 'approved_by').order_by('-requested_at')[:5]  # 최근 5개만
     
     serializer = PaymentRequestSerializer(payment_requests, many=True)
     return Response(serializer.data)
@@ -275,7 +275,7 @@ def list_pending_payments(request):
     """
     pending_requests = PaymentRequest.objects.filter(
         status__in=['pending', 'deposit_confirmed']
-    ).order_by('-requested_at')
+    ).select_related('user', 'plan', 'approved_by').order_by('-requested_at')
     
     serializer = PaymentRequestSerializer(pending_requests, many=True)
     return Response(serializer.data)
@@ -13,6 +13,7 @@ from enum import Enum
 from django.conf import settings
 
 from .intent_parser import IntentParseResult
+from llm_providers.tokenizer import get_tokenizer
 
 logger = logging.getLogger(__name__)
 
@@ -324,7 +325,7 @@ class PromptSynthesizer:
         optimized = '\n'.join(unique_lines)
         
         # 3. 토큰 예산 초과 시 압축
-        estimated_tokens = len(optimized) // 4  # 근사치
+        estimated_tokens = self.estimate_tokens(optimized)
         if estimated_tokens > self.token_budget:
             logger.warning(f"토큰 예산 초과: {estimated_tokens} > {self.token_budget}, 압축 진행")
             optimized = self._compress(optimized, self.token_budget)
@@ -344,16 +345,17 @@ class PromptSynthesizer:
         
         compressed_sections = []
         current_tokens = 0
-        target_chars = token_budget * 4  # 토큰 → 문자 근사
+        # 섹션 토큰 수는 한 번에 계산
+        section_token_counts = get_tokenizer().count_batch(sections)
         
-        for section in sections:
-            section_tokens = len(section) // 4
+        for section, section_tokens in zip(sections, section_token_counts):
             if current_tokens + section_tokens <= token_budget:
                 compressed_sections.append(section)
                 current_tokens += section_tokens
             else:
-                # 남은 예산 내에서 축약
-                remaining = target_chars - (current_tokens * 4)
+                # 남은 예산 내에서 축약 (섹션의 토큰당 문자 수로 환산)
+                chars_per_token = len(section) / max(1, section_tokens)
+                remaining = int((token_budget - current_tokens) * chars_per_token)
                 if remaining > 100:  # 최소 100자는 있어야 의미 있음
                     compressed = section[:remaining] + "..."
                     compressed_sections.append(compressed)
@@ -363,11 +365,7 @@ class PromptSynthesizer:
     
     def estimate_tokens(self, text: str) -> int:
         """텍스트의 토큰 수 추정"""
-        # 한글/영문 혼합 고려
-        korean_chars = len([c for c in text if '가' <= c <= '힣'])
-        other_chars = len(text) - korean_chars
-        estimated = (korean_chars * 2) + (other_chars // 4)
-        return max(1, estimated)
+        return get_tokenizer().count(text)
 
 
 # 전역 Synthesizer 인스턴스
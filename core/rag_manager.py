@@ -6,27 +6,98 @@ Pinecone을 사용한 벡터 검색 및 대화 메모리 관리
 OpenAI Embeddings를 사용하여 대화 내용을 임베딩
 """
 
+import functools
 import json
 import logging
 import os
+import threading
 from typing import List, Dict, Any, Optional
 from django.conf import settings
 from django.core.cache import cache
 
-try:
-    from pinecone import Pinecone, ServerlessSpec
-    PINECONE_AVAILABLE = True
-except ImportError:
-    PINECONE_AVAILABLE = False
-    logging.warning("Pinecone이 설치되지 않았습니다. 'pip install pinecone-client'를 실행하세요.")
-
-from openai import OpenAI
-
+from llm_providers.pricing import estimate_embedding_cost
+from llm_providers.single_flight import get_single_flight, make_key
+from prompt_mate.cost_ledger import record_cost
+from prompt_mate.metrics import CACHE_REQUESTS
+from prompt_mate.tracing import span
 from .models import ConversationMemory, Conversation, Message, CustomUser
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def _import_pinecone():
+    """pinecone SDK 지연 임포트 (RAGManager를 처음 만들 때까지 임포트 비용을 미룸, 없으면 None)"""
+    try:
+        import pinecone
+        return pinecone
+    except ImportError:
+        logger.warning("Pinecone이 설치되지 않았습니다. 'pip install pinecone-client'를 실행하세요.")
+        return None
+
+
+# 프로세스 전역 SDK 클라이언트/인덱스 핸들 (요청마다 새 클라이언트 생성 및 list_indexes 호출 방지)
+_clients: Dict[str, Any] = {}
+_pinecone_indexes: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _get_openai_client(api_key: str):
+    """OpenAI 클라이언트 (API 키별로 한 번 생성해 연결 풀 재사용)"""
+    key = f"openai:{api_key}"
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                from openai import OpenAI
+                client = _clients[key] = OpenAI(api_key=api_key)
+    return client
+
+
+def _import_fake_backend():
+    from llm_providers import fake_provider
+    return fake_provider
+
+
+def _import_cassette():
+    from llm_providers import cassette
+    return cassette
+
+
+def _get_fake_embedding_client(dim: int):
+    """가짜 임베딩 클라이언트 (FAKE_LLM_MODE, 프로세스당 한 번 생성)"""
+    key = f"fake:{dim}"
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                fake_provider = _import_fake_backend()
+                client = _clients[key] = fake_provider.FakeEmbeddingClient(
+                    dim=dim,
+                    latency=fake_provider.LatencyProfile(
+                        kind='fixed',
+                        base_ms=settings.PROMPT_MATE.get('FAKE_EMBEDDING_LATENCY_MS', 50.0),
+                        per_token_ms=0
+                    ),
+                    seed=settings.PROMPT_MATE.get('FAKE_LLM_SEED', 0)
+                )
+    return client
+
+
+def _get_pinecone_client(api_key: str):
+    """Pinecone 클라이언트 (API 키별로 한 번 생성)"""
+    key = f"pinecone:{api_key}"
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = _import_pinecone().Pinecone(api_key=api_key)
+    return client
+
+
 class RAGManager:
     """
     RAG Manager 클래스
@@ -51,21 +122,36 @@ class RAGManager:
         self.pinecone = None
         self.index = None
         
+        # 가짜 모드: 결정적 임베딩 + 메모리 벡터 인덱스 (네트워크 없음)
+        if settings.PROMPT_MATE.get('FAKE_LLM_MODE', False):
+            self.client = _get_fake_embedding_client(self.EMBEDDING_DIM)
+            self.index = _import_fake_backend().get_fake_vector_index()
+            return
+        
+        # 카세트 재생 모드: 녹화된 임베딩 + 메모리 벡터 인덱스 (네트워크 없음)
+        cassette_mode = settings.PROMPT_MATE.get('LLM_CASSETTE_MODE', '')
+        if cassette_mode == 'replay':
+            self.client = _import_cassette().wrap_embedding_client(None, settings.PROMPT_MATE)
+            self.index = _import_fake_backend().get_fake_vector_index()
+            return
+        
         # OpenAI API 키 확인
         api_key = getattr(settings, 'OPENAI_API_KEY', '')
         if api_key:
-            self.client = OpenAI(api_key=api_key)
+            self.client = _get_openai_client(api_key)
+            if cassette_mode == 'record':
+                self.client = _import_cassette().wrap_embedding_client(self.client, settings.PROMPT_MATE)
         else:
             logger.warning("OpenAI API 키가 설정되지 않았습니다. RAG 기능이 제한됩니다.")
         
         # Pinecone 초기화
-        if PINECONE_AVAILABLE:
+        pinecone = _import_pinecone()
+        if pinecone:
             pinecone_api_key = os.getenv('PINECONE_API_KEY') or getattr(settings, 'PINECONE_API_KEY', '')
             if pinecone_api_key:
                 try:
-                    self.pinecone = Pinecone(api_key=pinecone_api_key)
+                    self.pinecone = _get_pinecone_client(pinecone_api_key)
                     self._initialize_index()
-                    logger.info("Pinecone 초기화 완료")
                 except Exception as e:
                     logger.error(f"Pinecone 초기화 실패: {e}")
                     self.pinecone = None
@@ -86,12 +172,24 @@ class RAGManager:
             return "global"
     
     def _initialize_index(self):
-        """Pinecone 인덱스 초기화"""
+        """Pinecone 인덱스 초기화 (프로세스당 한 번 확인/연결 후 재사용)"""
         if not self.pinecone:
             return
         
         index_name = self._get_index_name()
+        self.index = _pinecone_indexes.get(index_name)
+        if self.index is not None:
+            return
         
+        with _clients_lock:
+            self.index = _pinecone_indexes.get(index_name)
+            if self.index is None:
+                self._connect_index(index_name)
+                if self.index is not None:
+                    _pinecone_indexes[index_name] = self.index
+    
+    def _connect_index(self, index_name: str):
+        """인덱스 존재 확인(없으면 생성) 후 연결"""
         try:
             # 인덱스 목록 확인
             existing_indexes = [index.name for index in self.pinecone.list_indexes()]
@@ -103,7 +201,7 @@ class RAGManager:
                     name=index_name,
                     dimension=self.EMBEDDING_DIM,
                     metric="cosine",
-                    spec=ServerlessSpec(
+                    spec=_import_pinecone().ServerlessSpec(
                         cloud="aws",
                         region="us-east-1"
                     )
@@ -133,24 +231,37 @@ class RAGManager:
             return None
         
         try:
-            # 캐시 키
-            cache_key = f"embedding_{hash(text)}"
+            # 캐시 키 (hash()는 프로세스마다 달라지므로 워커 간 공유 가능한 안정 키 사용)
+            request_key = make_key(self.EMBEDDING_MODEL, text)
+            cache_key = f"embedding_{request_key}"
             cached = cache.get(cache_key)
+            CACHE_REQUESTS.inc(cache='embedding', result='hit' if cached is not None else 'miss')
             if cached is not None:
                 return cached
             
-            # OpenAI API 호출
-            response = self.client.embeddings.create(
-                model=self.EMBEDDING_MODEL,
-                input=text
-            )
-            
-            embedding = response.data[0].embedding
-            
-            # 캐시 저장 (1시간)
-            cache.set(cache_key, embedding, 3600)
+            def _embed():
+                # OpenAI API 호출
+                with span('rag.embedding', model=self.EMBEDDING_MODEL):
+                    response = self.client.embeddings.create(
+                        model=self.EMBEDDING_MODEL,
+                        input=text
+                    )
+                    usage = getattr(response, 'usage', None)
+                    tokens = getattr(usage, 'prompt_tokens', 0) or 0
+                    record_cost(
+                        'embedding', 'openai', self.EMBEDDING_MODEL, 'embed',
+                        estimate_embedding_cost(self.EMBEDDING_MODEL, tokens), prompt_tokens=tokens
+                    )
+                embedding = response.data[0].embedding
+                
+                # 캐시 저장 (1시간)
+                cache.set(cache_key, embedding, 3600)
+                return embedding
             
-            return embedding
+            # 동일 텍스트의 동시 임베딩 요청은 하나의 호출로 병합
+            if settings.PROMPT_MATE.get('SINGLE_FLIGHT_ENABLED', True):
+                return get_single_flight().do(f"embedding:{request_key}", _embed)
+            return _embed()
         
         except Exception as e:
             logger.error(f"임베딩 생성 실패: {e}")
@@ -226,10 +337,11 @@ class RAGManager:
                     if message:
                         metadata['message_id'] = str(message.id)
                     
-                    self.index.upsert(
-                        vectors=[(vector_id, embedding, metadata)],
-                        namespace=namespace
-                    )
+                    with span('rag.upsert'):
+                        self.index.upsert(
+                            vectors=[(vector_id, embedding, metadata)],
+                            namespace=namespace
+                        )
                     
                     logger.info(f"Pinecone에 벡터 추가: {vector_id}, 네임스페이스: {namespace}")
                 except Exception as e:
@@ -271,19 +383,28 @@ class RAGManager:
             namespace = self._get_namespace()
             
             # Pinecone 검색
-            search_results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                namespace=namespace,
-                include_metadata=True
-            )
+            with span('rag.query', top_k=top_k):
+                search_results = self.index.query(
+                    vector=query_embedding,
+                    top_k=top_k,
+                    namespace=namespace,
+                    include_metadata=True
+                )
             
             results = []
             if search_results.matches:
+                # 매치마다 개별 조회하지 않고 한 번에 로드
+                memories = {
+                    str(memory.id): memory
+                    for memory in ConversationMemory.objects.select_related('conversation').filter(
+                        id__in=[match.id for match in search_results.matches]
+                    )
+                }
                 for match in search_results.matches:
                     try:
-                        memory_id = match.id
-                        memory = ConversationMemory.objects.get(id=memory_id)
+                        memory = memories.get(str(match.id))
+                        if memory is None:
+                            raise ConversationMemory.DoesNotExist
                         
                         # 유사도 점수 (Pinecone은 cosine similarity를 0-1로 반환)
                         similarity = float(match.score) if match.score else 0.0
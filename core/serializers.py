@@ -39,7 +39,9 @@ class ConversationSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'last_message_at', 'created_at', 'updated_at']
     
     def get_message_count(self, obj):
-        return obj.messages.count()
+        # ConversationViewSet은 message_count를 annotate해서 넘김 (없으면 개별 조회)
+        count = getattr(obj, 'message_count', None)
+        return count if count is not None else obj.messages.count()
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -130,9 +132,13 @@ class PromptHistorySerializer(serializers.ModelSerializer):
             'id', 'session', 'prompt_hash', 'original_prompt',
             'synthesized_prompt', 'model_used', 'provider',
             'response', 'tokens_used', 'temperature',
-            'quality_level', 'created_at'
+            'quality_level', 'stage_timings', 'task_type', 'route',
+            'latency_ms', 'ttft_ms', 'cached_tokens', 'retries', 'cost_usd', 'created_at'
+        ]
+        read_only_fields = [
+            'id', 'prompt_hash', 'stage_timings', 'task_type', 'route',
+            'latency_ms', 'ttft_ms', 'cached_tokens', 'retries', 'cost_usd', 'created_at'
         ]
-        read_only_fields = ['id', 'prompt_hash', 'created_at']
 
 
 class FeedbackSerializer(serializers.ModelSerializer):
@@ -249,6 +255,12 @@ class LLMGenerateRequestSerializer(serializers.Serializer):
         allow_blank=True,
         help_text="선호하는 모델 (선택적)"
     )
+    cascade = serializers.BooleanField(
+        required=False,
+        allow_null=True,
+        default=None,
+        help_text="캐스케이드 모드 (저렴한 모델부터 시도, 미지정 시 서버 설정)"
+    )
 
 
 class LLMGenerateResponseSerializer(serializers.Serializer):
@@ -266,6 +278,16 @@ class LLMGenerateResponseSerializer(serializers.Serializer):
         default=list,
         help_text="인터넷 모드 참고자료"
     )
+    cascade = serializers.DictField(
+        required=False,
+        allow_null=True,
+        help_text="캐스케이드 단계/비용 절감 정보"
+    )
+    token_estimate = serializers.DictField(
+        required=False,
+        allow_null=True,
+        help_text="사전 토큰 추정 (입력/예상 출력/제안 max_tokens)"
+    )
 
 
 class FeedbackRequestSerializer(serializers.Serializer):
@@ -9,6 +9,8 @@ plainplan.md의 8.1 원리 기반
 import logging
 from typing import Dict, Any, Optional, List
 from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from .models import (
     Session, Intent, Question, PromptHistory, Feedback,
@@ -18,10 +20,25 @@ from .intent_parser import IntentParseResult, get_intent_parser
 from .context_elicitor import QuestionItem, get_context_elicitor
 from .prompt_synthesizer import get_prompt_synthesizer, SpecificityLevel
 from .rag_manager import get_rag_manager
+from llm_providers.pricing import estimate_cost
+from prompt_mate import cost_ledger, tracing
+from prompt_mate.tracing import span
 
 logger = logging.getLogger(__name__)
 
 
+def _related_count(model):
+    """세션별 model 행 수 서브쿼리 (없으면 0)"""
+    rows = (
+        model.objects.filter(session=OuterRef('pk'))
+        .order_by()
+        .values('session')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
 class SessionManager:
     """
     Session Manager 클래스
@@ -51,7 +68,7 @@ class SessionManager:
         """
         if session_id:
             try:
-                self.session = Session.objects.get(id=session_id)
+                self.session = Session.objects.select_related('user', 'conversation').get(id=session_id)
                 logger.info(f"기존 세션 로드: {session_id}")
             except Session.DoesNotExist:
                 logger.warning(f"세션 {session_id}를 찾을 수 없어 새로 생성")
@@ -62,6 +79,8 @@ class SessionManager:
         
         self.user = user or self.session.user
         self.conversation = conversation or self.session.conversation
+        # 이후 과금 호출을 이 세션/사용자의 비용으로 기록
+        cost_ledger.attach(session_id=self.session.id, user_id=self.user.pk if self.user else None)
         
         self.intent_parser = get_intent_parser()
         self.context_elicitor = get_context_elicitor()
@@ -123,19 +142,21 @@ class SessionManager:
         logger.info(f"세션 {self.session_id}: 사용자 입력 파싱")
         
         # Intent 파싱
-        intent_result = self.intent_parser.parse(user_input)
+        with span('intent.parse'):
+            intent_result = self.intent_parser.parse(user_input)
         
         # DB에 저장
-        intent_model = Intent.objects.create(
-            session=self.session,
-            user_input=user_input,
-            cognitive_goal=intent_result.cognitive_goal,
-            specificity=intent_result.specificity,
-            completeness=intent_result.completeness,
-            primary_entities=intent_result.primary_entities,
-            constraints=intent_result.constraints,
-            confidence=intent_result.confidence
-        )
+        with span('db.intent'):
+            intent_model = Intent.objects.create(
+                session=self.session,
+                user_input=user_input,
+                cognitive_goal=intent_result.cognitive_goal,
+                specificity=intent_result.specificity,
+                completeness=intent_result.completeness,
+                primary_entities=intent_result.primary_entities,
+                constraints=intent_result.constraints,
+                confidence=intent_result.confidence
+            )
         
         logger.info(f"Intent 저장 완료: {intent_model.id}")
         
@@ -176,23 +197,25 @@ class SessionManager:
             )
         
         # 질문 생성
-        questions = self.context_elicitor.generate_questions(
-            intent=intent,
-            existing_context=self.session.context
-        )
+        with span('questions.generate'):
+            questions = self.context_elicitor.generate_questions(
+                intent=intent,
+                existing_context=self.session.context
+            )
         
         # DB에 저장
-        recent_intent_model = self.session.intents.first()
-        if recent_intent_model:
-            for q_item in questions:
-                Question.objects.create(
-                    intent=recent_intent_model,
-                    text=q_item.text,
-                    priority=q_item.priority,
-                    rationale=q_item.rationale,
-                    options=q_item.options,
-                    default_value=q_item.default or ""
-                )
+        with span('db.questions', count=len(questions)):
+            recent_intent_model = self.session.intents.first()
+            if recent_intent_model:
+                for q_item in questions:
+                    Question.objects.create(
+                        intent=recent_intent_model,
+                        text=q_item.text,
+                        priority=q_item.priority,
+                        rationale=q_item.rationale,
+                        options=q_item.options,
+                        default_value=q_item.default or ""
+                    )
         
         logger.info(f"질문 {len(questions)}개 생성 및 저장 완료")
         
@@ -273,13 +296,14 @@ class SessionManager:
             )
         
         # 기본 프롬프트 합성
-        synthesized = self.prompt_synthesizer.synthesize(
-            intent=intent,
-            context=self.session.context,
-            user_input=user_input,
-            output_format=output_format,
-            specificity_level=specificity_level
-        )
+        with span('prompt.synthesize'):
+            synthesized = self.prompt_synthesizer.synthesize(
+                intent=intent,
+                context=self.session.context,
+                user_input=user_input,
+                output_format=output_format,
+                specificity_level=specificity_level
+            )
         
         # 커스텀 지침 추가
         if self.user:
@@ -301,11 +325,12 @@ class SessionManager:
         
         # RAG 컨텍스트 추가
         if use_rag and self.rag_manager:
-            rag_context = self.rag_manager.get_relevant_context(
-                query=user_input,
-                top_k=3,
-                min_similarity=0.7
-            )
+            with span('rag.context'):
+                rag_context = self.rag_manager.get_relevant_context(
+                    query=user_input,
+                    top_k=3,
+                    min_similarity=0.7
+                )
             if rag_context:
                 synthesized = f"""{rag_context}
 
@@ -328,7 +353,20 @@ class SessionManager:
         response: str,
         tokens_used: int = 0,
         temperature: float = 0.7,
-        quality_level: str = 'balanced'
+        quality_level: str = 'balanced',
+        finish_reason: Optional[str] = None,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        specificity_level: Optional[str] = None,
+        cognitive_goal: Optional[str] = None,
+        stage_timings: Optional[Dict[str, float]] = None,
+        task_type: str = 'final_generation',
+        route: str = 'direct',
+        latency_ms: Optional[float] = None,
+        ttft_ms: Optional[float] = None,
+        cached_tokens: int = 0,
+        retries: int = 0,
+        cost_usd: Optional[float] = None
     ) -> PromptHistory:
         """
         프롬프트 이력 저장 (대화 기록에도 저장 및 RAG 메모리 추가)
@@ -342,6 +380,19 @@ class SessionManager:
             tokens_used: 사용된 토큰 수
             temperature: 온도
             quality_level: 품질 수준
+            finish_reason: 생성 종료 사유 (스트리밍 취소 시 'cancelled')
+            prompt_tokens: 입력 토큰 수
+            completion_tokens: 출력 토큰 수
+            specificity_level: 구체성 레벨 값
+            cognitive_goal: 인지적 목표
+            stage_timings: 단계별 소요 시간(ms) (없으면 현재 요청 트레이스에서 가져옴)
+            task_type: 라우터 작업 유형
+            route: 생성 경로 (direct/hedged/cascade/stream)
+            latency_ms: 응답 생성까지 걸린 시간(ms)
+            ttft_ms: 첫 토큰까지 걸린 시간(ms)
+            cached_tokens: 프롬프트 캐시에서 읽은 입력 토큰 수
+            retries: 첫 호출 이후 추가 제공자 호출 수
+            cost_usd: 추정 비용 (없으면 토큰 수와 가격표로 계산)
         
         Returns:
             PromptHistory 객체
@@ -351,50 +402,73 @@ class SessionManager:
         # 프롬프트 해시
         prompt_hash = hashlib.sha256(synthesized_prompt.encode('utf-8')).hexdigest()
         
-        history = PromptHistory.objects.create(
-            session=self.session,
-            prompt_hash=prompt_hash,
-            original_prompt=original_prompt,
-            synthesized_prompt=synthesized_prompt,
-            model_used=model_used,
-            provider=provider,
-            response=response,
-            tokens_used=tokens_used,
-            temperature=temperature,
-            quality_level=quality_level
-        )
+        if stage_timings is None:
+            stage_timings = tracing.stage_timings()
+        if cost_usd is None:
+            cost_usd = estimate_cost(
+                model_used, prompt_tokens or 0, completion_tokens or 0, tokens_used, cached_tokens or 0
+            )
+        
+        with span('db.history'):
+            history = PromptHistory.objects.create(
+                session=self.session,
+                prompt_hash=prompt_hash,
+                original_prompt=original_prompt,
+                synthesized_prompt=synthesized_prompt,
+                model_used=model_used,
+                provider=provider,
+                response=response,
+                tokens_used=tokens_used,
+                temperature=temperature,
+                quality_level=quality_level,
+                finish_reason=finish_reason,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                specificity_level=specificity_level,
+                cognitive_goal=cognitive_goal,
+                stage_timings=stage_timings,
+                task_type=task_type,
+                route=route,
+                latency_ms=latency_ms,
+                ttft_ms=ttft_ms,
+                cached_tokens=cached_tokens or 0,
+                retries=retries,
+                cost_usd=cost_usd
+            )
         
         logger.info(f"프롬프트 이력 저장: {history.id}")
         
         # 대화 메시지로 저장
         if self.conversation and self.user:
-            # 사용자 메시지
-            user_message = Message.objects.create(
-                conversation=self.conversation,
-                role='user',
-                content=original_prompt,
-                metadata={'tokens': tokens_used // 2}  # 대략적인 추정
-            )
-            
-            # AI 응답 메시지
-            assistant_message = Message.objects.create(
-                conversation=self.conversation,
-                role='assistant',
-                content=response,
-                metadata={
-                    'model': model_used,
-                    'provider': provider,
-                    'tokens': tokens_used // 2,
-                    'temperature': temperature
-                }
-            )
+            with span('db.messages'):
+                # 사용자 메시지
+                user_message = Message.objects.create(
+                    conversation=self.conversation,
+                    role='user',
+                    content=original_prompt,
+                    metadata={'tokens': tokens_used // 2}  # 대략적인 추정
+                )
+                
+                # AI 응답 메시지
+                assistant_message = Message.objects.create(
+                    conversation=self.conversation,
+                    role='assistant',
+                    content=response,
+                    metadata={
+                        'model': model_used,
+                        'provider': provider,
+                        'tokens': tokens_used // 2,
+                        'temperature': temperature
+                    }
+                )
             
             # RAG 메모리에 추가
             if self.rag_manager:
-                self.rag_manager.add_conversation_to_memory(
-                    conversation=self.conversation,
-                    message=assistant_message
-                )
+                with span('rag.memory'):
+                    self.rag_manager.add_conversation_to_memory(
+                        conversation=self.conversation,
+                        message=assistant_message
+                    )
                 logger.info("RAG 메모리에 대화 추가")
         
         return history
@@ -443,7 +517,12 @@ class SessionManager:
         return feedback
     
     def get_session_summary(self) -> Dict[str, Any]:
-        """세션 요약 정보 반환"""
+        """세션 요약 정보 반환 (관련 객체 수는 서브쿼리로 한 번에 집계)"""
+        counts = Session.objects.filter(pk=self.session.pk).annotate(
+            intents_count=_related_count(Intent),
+            prompt_history_count=_related_count(PromptHistory),
+            feedbacks_count=_related_count(Feedback),
+        ).values('intents_count', 'prompt_history_count', 'feedbacks_count').first() or {}
         return {
             'session_id': self.session_id,
             'created_at': self.session.created_at.isoformat(),
@@ -452,9 +531,9 @@ class SessionManager:
             'task': self.session.task,
             'context_size': len(self.session.context),
             'constraints_count': len(self.session.constraints),
-            'intents_count': self.session.intents.count(),
-            'prompt_history_count': self.session.prompt_history.count(),
-            'feedbacks_count': self.session.feedbacks.count(),
+            'intents_count': counts.get('intents_count', 0),
+            'prompt_history_count': counts.get('prompt_history_count', 0),
+            'feedbacks_count': counts.get('feedbacks_count', 0),
             'user_preferences': self.session.user_preferences,
         }
 
@@ -21,6 +21,7 @@ from .serializers import (
     UsageStatsResponseSerializer,
     ModelAvailabilityResponseSerializer
 )
+from llm_providers.capabilities import selectable_models
 
 logger = logging.getLogger(__name__)
 
@@ -55,11 +56,11 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """현재 사용자의 구독만 조회"""
-        return UserSubscription.objects.filter(user=self.request.user)
+        return UserSubscription.objects.filter(user=self.request.user).select_related('plan')
     
     def get_object(self):
         """사용자의 현재 구독 가져오기"""
-        subscription, _ = UserSubscription.objects.get_or_create(
+        subscription, _ = UserSubscription.objects.select_related('plan').get_or_create(
             user=self.request.user,
             defaults={'plan': get_or_create_free_plan()}
         )
@@ -68,7 +69,7 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def current(self, request):
         """현재 사용자의 구독 정보 조회"""
-        subscription, created = UserSubscription.objects.get_or_create(
+        subscription, created = UserSubscription.objects.select_related('plan').get_or_create(
             user=request.user,
             defaults={'plan': get_or_create_free_plan()}
         )
@@ -93,7 +94,7 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
             )
         
         # 현재 구독 가져오기 또는 생성
-        subscription, created = UserSubscription.objects.get_or_create(
+        subscription, created = UserSubscription.objects.select_related('plan').get_or_create(
             user=request.user,
             defaults={'plan': get_or_create_free_plan()}
         )
@@ -124,7 +125,7 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def usage(self, request):
         """사용량 통계 조회"""
-        subscription, _ = UserSubscription.objects.get_or_create(
+        subscription, _ = UserSubscription.objects.select_related('plan').get_or_create(
             user=request.user,
             defaults={'plan': get_or_create_free_plan()}
         )
@@ -148,7 +149,7 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def available_models(self, request):
         """사용 가능한 모델 목록 조회"""
-        subscription, _ = UserSubscription.objects.get_or_create(
+        subscription, _ = UserSubscription.objects.select_related('plan').get_or_create(
             user=request.user,
             defaults={'plan': get_or_create_free_plan()}
         )
@@ -156,14 +157,8 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
         allowed_models = subscription.plan.allowed_models
         available_models = []
         
-        # 모든 모델 목록 (현재 지원하는 모델들)
-        all_models = [
-            'gpt-5-nano',
-            'gpt-5-mini',
-            'gpt-5',
-            'gpt-4.1',
-            'gpt-4.1-mini'
-        ]
+        # 사용자에게 노출하는 모델 목록 (능력 레지스트리)
+        all_models = selectable_models()
         
         for model in all_models:
             is_available = model in allowed_models
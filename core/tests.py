@@ -1,3 +1,1108 @@
-from django.test import TestCase
+# -*- coding: utf-8 -*-
+"""
+API 엔드포인트 쿼리 예산 테스트
 
-# Create your tests here.
+core/urls.py의 모든 경로를 크기가 다른 픽스처 데이터(SIZES)로 호출해
+엔드포인트별 DB 쿼리 수가 데이터 크기와 무관하고 정해진 예산 이하인지 확인합니다.
+(N+1, 반복 조회 회귀 방지. 실패 메시지에 실행된 SQL 전체를 표시)
+
+LLM/임베딩은 가짜 제공자(FAKE_LLM_MODE, 지연 0)를 사용하므로 네트워크 없이 실행됩니다.
+
+그 밖에 쿼리 예산으로 드러나지 않는 동작(준비 상태, 플랜 캐시 무효화 등)을 확인합니다.
+"""
+
+import importlib.util
+import inspect
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from llm_providers.fake_provider import FakeProvider
+from prompt_mate import memory, profiling, warmup
+from prompt_mate.profiler_middleware import PROFILE_ID_HEADER, ProfilerMiddleware
+from prompt_mate.warmup import preload
+
+from .length_policy import (
+    DEFAULT_OUTPUT_TOKEN_CEILING, GOAL_MULTIPLIERS, OUTPUT_TOKEN_CEILINGS, REASONING_TOKEN_ALLOWANCE, LengthPolicy
+)
+from .management.commands.loadtest import FLOW_ENDPOINTS
+from .models import (
+    Conversation, CostLedgerEntry, CustomUser, Feedback, Intent, InviteCode, Message,
+    PaymentRequest, ProfileReport, PromptHistory, PromptHistoryRollup, Question, Session, SubscriptionPlan,
+    UserCustomInstructions, UserSubscription
+)
+from .token_estimator import DEFAULT_OUTPUT_TOKENS, TokenEstimate, TokenEstimator
+from .usage_decorator import update_usage
+
+# 픽스처 크기 (목록 엔드포인트의 한 페이지보다 작은 값과 큰 값)
+SIZES = (1, 25)
+
+PASSWORD = 'query-budget-password-123'
+
+FAKE_PROMPT_MATE = {
+    **settings.PROMPT_MATE,
+    'FAKE_LLM_MODE': True,
+    'FAKE_LLM_LATENCY_PROFILE': 'fixed',
+    'FAKE_LLM_LATENCY_MS': 0.0,
+    'FAKE_LLM_PER_TOKEN_MS': 0.0,
+    'FAKE_LLM_SPIKE_RATE': 0.0,
+    'FAKE_LLM_ERROR_RATES': 'rate_limit=0,timeout=0,malformed_json=0',
+    'FAKE_EMBEDDING_LATENCY_MS': 0.0,
+    'LLM_CASSETTE_MODE': '',
+}
+
+
+def reset_llm_singletons():
+    """설정이 바뀐 뒤 라우터/파서 싱글톤을 다시 만들도록 초기화"""
+    from llm_providers import router
+    from . import context_elicitor, intent_parser
+
+    router._router_instance = None
+    intent_parser._parser_instance = None
+    context_elicitor._elicitor_instance = None
+
+
+def seed(user, other, admin, plan, size):
+    """user 소유 데이터를 종류별로 size개씩 생성하고 각 경로에 쓸 ID 반환"""
+    conversations = Conversation.objects.bulk_create([
+        Conversation(user=user, title=f'대화 {i}', last_message_at=timezone.now()) for i in range(size)
+    ])
+    Message.objects.bulk_create([
+        Message(conversation=conversation, role=role, content=f'{role} 메시지 {i}')
+        for i, conversation in enumerate(conversations) for role in ('user', 'assistant')
+    ] + [
+        Message(conversation=conversations[0], role='user', content=f'추가 메시지 {i}') for i in range(size)
+    ])
+    sessions = Session.objects.bulk_create([
+        Session(user=user, conversation=conversations[i], task=f'작업 {i}') for i in range(size)
+    ])
+    session = sessions[0]
+    intents = Intent.objects.bulk_create([
+        Intent(session=session, user_input=f'입력 {i}', cognitive_goal='알기', specificity='MEDIUM',
+               completeness='PARTIAL', primary_entities=['엔티티'], constraints=[], confidence=0.9)
+        for i in range(size)
+    ])
+    Question.objects.bulk_create([
+        Question(intent=intents[0], text=f'질문 {i}', priority=1 + i % 5, rationale='이유', options=['a', 'b'])
+        for i in range(size)
+    ])
+    histories = PromptHistory.objects.bulk_create([
+        PromptHistory(session=session, prompt_hash=f'{i:064d}', original_prompt=f'원본 {i}',
+                      synthesized_prompt=f'합성 {i}', model_used='gpt-5-nano', provider='OpenAIProvider',
+                      response=f'응답 {i}', tokens_used=100)
+        for i in range(size)
+    ])
+    CostLedgerEntry.objects.bulk_create([
+        CostLedgerEntry(user=user, session=sessions[i % len(sessions)], category='llm', stage=f'stage.{i}',
+                        provider='openai', model='gpt-5-nano', operation='generate', prompt_tokens=50,
+                        completion_tokens=50, cost_usd=0.0001)
+        for i in range(size)
+    ])
+    Feedback.objects.bulk_create([
+        Feedback(session=session, prompt_history=histories[i], feedback_text=f'피드백 {i}', sentiment='positive')
+        for i in range(size)
+    ])
+    invite_codes = InviteCode.objects.bulk_create([
+        InviteCode(code=f'USED{i:08d}', inviter=user, invitee=other if i == 0 else None, is_used=i == 0)
+        for i in range(size)
+    ] + [InviteCode(code=f'OTHER{i:07d}', inviter=other) for i in range(size)])
+    paid_plans = SubscriptionPlan.objects.bulk_create([
+        SubscriptionPlan(name=f'paid-{i}', display_name=f'유료 {i}', plan_type='basic', price=1000 + i,
+                         monthly_limit=1000000, allowed_models=['gpt-5-nano', 'gpt-5-mini'])
+        for i in range(size)
+    ])
+    payments = PaymentRequest.objects.bulk_create([
+        PaymentRequest(user=user, plan=paid_plans[i], status='pending') for i in range(size)
+    ])
+    UserCustomInstructions.objects.create(user=user, instructions='항상 존댓말로 답변하세요.')
+
+    # RAG 메모리 (가짜 벡터 인덱스에도 추가)
+    from .rag_manager import get_rag_manager
+    rag_manager = get_rag_manager(user=user)
+    for i in range(size):
+        rag_manager.add_conversation_to_memory(
+            conversation=conversations[0],
+            message=Message.objects.create(conversation=conversations[0], role='assistant',
+                                           content=f'신제품 출시 보도자료 작성 방법 {i}')
+        )
+
+    return {
+        'conversation': conversations[0].id,
+        'session': session.id,
+        'intent': intents[0].id,
+        'history': histories[0].id,
+        'message': Message.objects.filter(conversation=conversations[0]).first().id,
+        'free_plan': plan.id,
+        'paid_plan': paid_plans[0].id,
+        'payment': payments[0].id,
+        'invite_code': invite_codes[size].code,
+        'verification_token': user.email_verification_token,
+    }
+
+
+# (이름, 로그인 사용자('anon'|'user'|'admin'), HTTP 메서드, 경로, 요청 본문, 쿼리 예산)
+# 경로/본문의 {키}는 seed()가 돌려준 ID로 채움
+ENDPOINTS = [
+    # ViewSets
+    ('sessions-list', 'anon', 'get', '/api/sessions/', None, 2),
+    ('sessions-detail', 'anon', 'get', '/api/sessions/{session}/', None, 1),
+    ('sessions-summary', 'anon', 'get', '/api/sessions/{session}/summary/', None, 2),
+    ('sessions-cost', 'user', 'get', '/api/sessions/{session}/cost/', None, 4),
+    ('sessions-set-goal', 'anon', 'post', '/api/sessions/{session}/set_goal/', {'goal': '보도자료'}, 2),
+    ('intents-list', 'anon', 'get', '/api/intents/?session_id={session}', None, 2),
+    ('intents-detail', 'anon', 'get', '/api/intents/{intent}/', None, 1),
+    ('questions-list', 'anon', 'get', '/api/questions/?intent_id={intent}', None, 2),
+    ('prompt-history-list', 'anon', 'get', '/api/prompt-history/?session_id={session}', None, 2),
+    ('prompt-history-detail', 'anon', 'get', '/api/prompt-history/{history}/', None, 1),
+    ('feedbacks-list', 'anon', 'get', '/api/feedbacks/?session_id={session}', None, 2),
+    ('conversations-list', 'user', 'get', '/api/conversations/', None, 4),
+    ('conversations-detail', 'user', 'get', '/api/conversations/{conversation}/', None, 3),
+    ('conversations-messages', 'user', 'get', '/api/conversations/{conversation}/messages/', None, 4),
+    ('conversations-rename', 'user', 'patch', '/api/conversations/{conversation}/rename/', {'title': '새 제목'}, 4),
+    ('conversations-create', 'user', 'post', '/api/conversations/', {'title': '새 대화'}, 4),
+    ('messages-list', 'user', 'get', '/api/messages/', None, 4),
+    ('messages-detail', 'user', 'get', '/api/messages/{message}/', None, 3),
+    ('custom-instructions-list', 'user', 'get', '/api/custom-instructions/', None, 4),
+    ('subscription-plans-list', 'anon', 'get', '/api/subscription-plans/', None, 2),
+    ('subscriptions-current', 'user', 'get', '/api/subscriptions/current/', None, 4),
+    ('subscriptions-usage', 'user', 'get', '/api/subscriptions/usage/', None, 4),
+    ('subscriptions-available-models', 'user', 'get', '/api/subscriptions/available_models/', None, 4),
+    ('subscriptions-change', 'user', 'post', '/api/subscriptions/change/', {'plan_id': '{free_plan}'}, 6),
+    # Authentication
+    ('auth-register', 'anon', 'post', '/api/auth/register/',
+     {'username': 'new-user', 'email': 'new@example.com', 'password': PASSWORD}, 12),
+    ('auth-login', 'anon', 'post', '/api/auth/login/', {'username': 'budget-user', 'password': PASSWORD}, 9),
+    ('auth-logout', 'user', 'post', '/api/auth/logout/', None, 4),
+    ('auth-me', 'user', 'get', '/api/auth/me/', None, 2),
+    ('auth-update', 'user', 'patch', '/api/auth/update/', {'bio': '소개'}, 3),
+    ('auth-verify-email', 'anon', 'get', '/api/auth/verify-email/?token={verification_token}', None, 2),
+    ('auth-resend-verification', 'user', 'post', '/api/auth/resend-verification/', None, 3),
+    # Custom API Views
+    ('intent-parse', 'anon', 'post', '/api/intent/parse/', {'user_input': '신제품 출시 보도자료를 작성해줘'}, 5),
+    ('context-questions', 'anon', 'post', '/api/context/questions/',
+     {'session_id': '{session}', 'intent_id': '{intent}'}, 7),
+    ('context-answer', 'anon', 'post', '/api/context/answer/',
+     {'session_id': '{session}', 'question_text': '질문 0', 'answer': '업무용'}, 4),
+    ('prompt-synthesize', 'anon', 'post', '/api/prompt/synthesize/', {'session_id': '{session}'}, 5),
+    ('llm-generate-anonymous', 'anon', 'post', '/api/llm/generate/',
+     {'session_id': '{session}', 'user_input': '보도자료 작성'}, 13),
+    ('llm-generate-user', 'user', 'post', '/api/llm/generate/',
+     {'session_id': '{session}', 'user_input': '보도자료 작성'}, 28),
+    ('llm-generate-stream-user', 'user', 'post', '/api/llm/generate/stream/',
+     {'session_id': '{session}', 'user_input': '보도자료 작성'}, 28),
+    ('feedback-create', 'anon', 'post', '/api/feedback/',
+     {'session_id': '{session}', 'feedback_text': '좋아요', 'sentiment': 'positive', 'prompt_history_id': '{history}'}, 4),
+    ('llm-router-stats', 'admin', 'get', '/api/llm/router/stats/', None, 2),
+    ('analytics-prompts', 'admin', 'get', '/api/analytics/prompts/?window=7d&group_by=model,quality&interval=hour',
+     None, 6),
+    ('costs-daily', 'user', 'get', '/api/costs/daily/?days=7', None, 4),
+    ('health-ready', 'anon', 'get', '/api/health/ready/', None, 0),
+    ('debug-memory', 'admin', 'get', '/api/debug/memory/', None, 2),
+    # Payment
+    ('payment-account', 'user', 'get', '/api/payment/account/', None, 2),
+    ('payment-request', 'user', 'post', '/api/payment/request/', {'plan_id': '{paid_plan}'}, 4),
+    ('payment-deposit-confirm', 'user', 'post', '/api/payment/deposit/confirm/',
+     {'payment_request_id': '{payment}'}, 6),
+    ('payment-status', 'user', 'get', '/api/payment/status/', None, 3),
+    ('payment-admin-pending', 'admin', 'get', '/api/payment/admin/pending/', None, 3),
+    ('payment-admin-approve', 'admin', 'post', '/api/payment/admin/approve/',
+     {'payment_request_id': '{payment}', 'approve': True}, 8),
+    # Invite
+    ('invite-create', 'user', 'post', '/api/invite/create/', {}, 4),
+    ('invite-list', 'user', 'get', '/api/invite/list/', None, 3),
+    ('invite-use', 'user', 'post', '/api/invite/use/', {'code': '{invite_code}'}, 11),
+    ('invite-stats', 'user', 'get', '/api/invite/stats/', None, 4),
+]
+
+
+def _fill(value, ids):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {key: _fill(item, ids) for key, item in value.items()}
+    return value
+
+
+@override_settings(PROMPT_MATE=FAKE_PROMPT_MATE)
+class QueryBudgetTests(TestCase):
+    """엔드포인트별 쿼리 수가 데이터 크기와 무관하고 예산 이하인지 확인"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        reset_llm_singletons()
+
+    @classmethod
+    def tearDownClass(cls):
+        reset_llm_singletons()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.plan = SubscriptionPlan.objects.create(
+            name='free', display_name='무료 플랜', plan_type='free', price=0,
+            monthly_limit=10 ** 9, allowed_models=['gpt-5-nano']
+        )
+        cls.user = CustomUser.objects.create_user(
+            username='budget-user', email='budget@example.com', password=PASSWORD,
+            email_verification_token='verify-token'
+        )
+        cls.other = CustomUser.objects.create_user(username='budget-other', email='other@example.com', password=PASSWORD)
+        cls.admin = CustomUser.objects.create_superuser(username='budget-admin', email='admin@example.com', password=PASSWORD)
+        for user in (cls.user, cls.other, cls.admin):
+            UserSubscription.objects.create(user=user, plan=cls.plan)
+        # 워밍업은 워커당 한 번이므로 이미 워밍업된 워커 기준으로 측정
+        preload()
+
+    def _reset_process_state(self):
+        """크기 사이에 결과가 달라지지 않도록 프로세스 캐시와 가짜 벡터 인덱스 비우기"""
+        from llm_providers.fake_provider import get_fake_vector_index
+        from .usage_decorator import clear_plan_cache
+
+        cache.clear()
+        clear_plan_cache()
+        index = get_fake_vector_index()
+        for user in (self.user, self.other, self.admin):
+            index.delete(delete_all=True, namespace=f'user_{user.id}')
+
+    def _measure(self, login, method, path, data):
+        self.client.logout()
+        if login != 'anon':
+            self.client.force_login(self.admin if login == 'admin' else self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(
+                path, data=data, content_type='application/json'
+            ) if data is not None else getattr(self.client, method)(path)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        return response, queries
+
+    def test_query_budget_independent_of_data_size(self):
+        for name, login, method, path, data, budget in ENDPOINTS:
+            with self.subTest(endpoint=name):
+                counts = {}
+                for size in SIZES:
+                    savepoint = transaction.savepoint()
+                    try:
+                        self._reset_process_state()
+                        ids = seed(self.user, self.other, self.admin, self.plan, size)
+                        response, queries = self._measure(login, method, _fill(path, ids), _fill(data, ids))
+                    finally:
+                        transaction.savepoint_rollback(savepoint)
+
+                    self.assertLess(
+                        response.status_code, 500,
+                        f'{name} (size={size}) 실패: {response.status_code} {getattr(response, "content", b"")[:500]}'
+                    )
+                    sql = '\n'.join(f'  {i}. {q["sql"]}' for i, q in enumerate(queries.captured_queries, 1))
+                    self.assertLessEqual(
+                        len(queries), budget,
+                        f'{name} (size={size}): 쿼리 {len(queries)}개 > 예산 {budget}개\n{sql}'
+                    )
+                    counts[size] = (len(queries), sql)
+
+                sizes = list(counts)
+                self.assertEqual(
+                    counts[sizes[0]][0], counts[sizes[-1]][0],
+                    f'{name}: 데이터 크기에 따라 쿼리 수가 달라짐 '
+                    f'(size={sizes[0]}: {counts[sizes[0]][0]}개, size={sizes[-1]}: {counts[sizes[-1]][0]}개)\n'
+                    f'size={sizes[0]}:\n{counts[sizes[0]][1]}\nsize={sizes[-1]}:\n{counts[sizes[-1]][1]}'
+                )
+
+
+class ReadinessTests(TestCase):
+    """준비 상태 프로브는 부팅 훅이 표시한 상태만 읽음"""
+
+    def setUp(self):
+        self._saved_state = dict(warmup._state)
+
+    def tearDown(self):
+        warmup._state.update(self._saved_state)
+
+    def test_probe_is_unavailable_until_boot_hook_marks_ready(self):
+        warmup._state.update(status='pending', pid=None, steps=[])
+        with mock.patch.object(warmup, 'preload') as preload_mock:
+            response = self.client.get('/api/health/ready/')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(preload_mock.called)
+
+        warmup.mark_ready()
+        self.assertEqual(self.client.get('/api/health/ready/').status_code, 200)
+
+
+class FreePlanCacheTests(TestCase):
+    """무료 플랜 프로세스 캐시의 공유 캐시 버전 무효화"""
+
+    def setUp(self):
+        from .usage_decorator import clear_plan_cache
+
+        cache.clear()
+        clear_plan_cache()
+
+    def test_other_worker_plan_change_invalidates_process_cache(self):
+        from .usage_decorator import PLAN_VERSION_CACHE_KEY, get_or_create_free_plan
+
+        plan = get_or_create_free_plan()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_or_create_free_plan().pk, plan.pk)
+
+        # 다른 워커가 플랜을 바꿔 공유 캐시의 버전만 바뀐 경우
+        SubscriptionPlan.objects.filter(pk=plan.pk).update(monthly_limit=1234)
+        cache.set(PLAN_VERSION_CACHE_KEY, 'changed-elsewhere', None)
+        self.assertEqual(get_or_create_free_plan().monthly_limit, 1234)
+
+
+class ServerTimingHeaderTests(TestCase):
+    """Server-Timing 헤더는 스태프 요청에만 (SERVER_TIMING_ENABLED가 꺼진 기본값)"""
+
+    def test_header_only_for_staff(self):
+        from prompt_mate.tracing_middleware import SERVER_TIMING_HEADER
+
+        self.assertNotIn(SERVER_TIMING_HEADER, self.client.get('/api/conversations/'))
+
+        user = CustomUser.objects.create_user(username='member', email='member@example.com', password=PASSWORD)
+        self.client.force_login(user)
+        self.assertNotIn(SERVER_TIMING_HEADER, self.client.get('/api/conversations/'))
+
+        staff = CustomUser.objects.create_user(
+            username='staff', email='staff@example.com', password=PASSWORD, is_staff=True
+        )
+        self.client.force_login(staff)
+        self.assertIn('total;dur=', self.client.get('/api/conversations/')[SERVER_TIMING_HEADER])
+
+
+class MetricsEndpointTests(TestCase):
+    """/metrics는 토큰 또는 스태프 로그인이 있어야 열림"""
+
+    def test_denied_without_token_or_staff(self):
+        with override_settings(PROMPT_MATE={**settings.PROMPT_MATE, 'METRICS_ENABLED': True, 'METRICS_TOKEN': ''}):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+            user = CustomUser.objects.create_user(username='member', email='member@example.com', password=PASSWORD)
+            self.client.force_login(user)
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+            staff = CustomUser.objects.create_user(
+                username='staff', email='staff@example.com', password=PASSWORD, is_staff=True
+            )
+            self.client.force_login(staff)
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_bearer_token(self):
+        with override_settings(PROMPT_MATE={**settings.PROMPT_MATE, 'METRICS_ENABLED': True, 'METRICS_TOKEN': 'scrape'}):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').status_code, 200)
+
+        with override_settings(PROMPT_MATE={**settings.PROMPT_MATE, 'METRICS_ENABLED': False, 'METRICS_TOKEN': 'scrape'}):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').status_code, 404)
+
+
+def histogram_quantile(text: str, name: str, q: float) -> float:
+    """렌더링된 누적 버킷에서 q 분위가 속한 버킷 상한 (Prometheus histogram_quantile의 버킷 선택과 같음)"""
+    buckets = []
+    for line in text.splitlines():
+        if line.startswith(f'{name}_bucket'):
+            bound = line.split('le="', 1)[1].split('"', 1)[0]
+            buckets.append((float(bound), int(line.rsplit(' ', 1)[1])))
+    total = buckets[-1][1]
+    for bound, cumulative in buckets:
+        if cumulative >= q * total:
+            return bound
+    return float('inf')
+
+
+class HistogramPercentileTests(SimpleTestCase):
+    """히스토그램 버킷으로 계산한 백분위와 워커 간 병합"""
+
+    # 100개 중 90개는 50ms 이하, 9개는 0.5s 이하, 1개는 20s
+    SAMPLES = [0.04] * 90 + [0.3] * 9 + [20.0]
+
+    def _registry(self, samples):
+        from prompt_mate.metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        histogram = registry.histogram('test_latency_seconds', 'test', ['route'])
+        for value in samples:
+            histogram.observe(value, route='r')
+        return registry
+
+    def test_percentile_buckets(self):
+        from prompt_mate.metrics import render_text
+
+        text = render_text(self._registry(self.SAMPLES).snapshot())
+        self.assertEqual(histogram_quantile(text, 'test_latency_seconds', 0.5), 0.05)
+        self.assertEqual(histogram_quantile(text, 'test_latency_seconds', 0.9), 0.05)
+        self.assertEqual(histogram_quantile(text, 'test_latency_seconds', 0.95), 0.5)
+        self.assertEqual(histogram_quantile(text, 'test_latency_seconds', 0.99), 0.5)
+        self.assertEqual(histogram_quantile(text, 'test_latency_seconds', 1.0), 30.0)
+        self.assertIn('test_latency_seconds_count{route="r"} 100', text)
+
+    def test_merged_workers_keep_percentiles(self):
+        from prompt_mate.metrics import _merge, render_text
+
+        merged = {}
+        for part in (self.SAMPLES[::2], self.SAMPLES[1::2]):
+            for name, metric in self._registry(part).snapshot().items():
+                _merge(merged, name, metric)
+        single = render_text(self._registry(self.SAMPLES).snapshot())
+        self.assertEqual(render_text(merged), single)
+
+    def test_nearest_rank_percentile(self):
+        from llm_providers.instrumentation import percentile
+
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7.0], 99), 7.0)
+        self.assertIsNone(percentile([], 50))
+
+
+class PromptAnalyticsRollupTests(TestCase):
+    """닫힌 시간대는 집계 행으로, 열린 시간대는 이력에서 바로 계산"""
+
+    def setUp(self):
+        self.session = Session.objects.create(task='분석')
+        self.now = timezone.now()
+
+    def _history(self, created_at, latency_ms):
+        history = PromptHistory.objects.create(
+            session=self.session, prompt_hash=f'{PromptHistory.objects.count():064d}',
+            original_prompt='원본', synthesized_prompt='합성',
+            model_used='gpt-5-nano', provider='OpenAIProvider', response='응답', tokens_used=100,
+            latency_ms=latency_ms, cost_usd=0.001
+        )
+        PromptHistory.objects.filter(pk=history.pk).update(created_at=created_at)
+
+    def test_saving_history_does_not_touch_rollups(self):
+        from .analytics import get_analytics
+
+        self._history(self.now, 800)
+        self.assertFalse(PromptHistoryRollup.objects.exists())
+
+        result = get_analytics(since=self.now - timedelta(hours=1))
+        self.assertEqual(result['total']['requests'], 1)
+        self.assertEqual(result['total']['cost_usd'], 0.001)
+        # 열린 시간대는 저장하지 않음
+        self.assertFalse(PromptHistoryRollup.objects.exists())
+
+    def test_closed_hours_materialized_once_and_combined_with_live(self):
+        from .analytics import bucket_start, get_analytics
+
+        closed = bucket_start(self.now) - timedelta(hours=3)
+        for latency in (100, 200, 300):
+            self._history(closed + timedelta(minutes=10), latency)
+        self._history(self.now, 5000)
+
+        result = get_analytics(since=self.now - timedelta(hours=6), interval='hour')
+        self.assertEqual(result['total']['requests'], 4)
+        rollup = PromptHistoryRollup.objects.get(bucket_start=closed)
+        self.assertEqual((rollup.request_count, rollup.latency_count, rollup.latency_sum_ms), (3, 3, 600.0))
+        self.assertEqual(len(result['groups'][0]['series']), 2)
+
+        # 이미 집계된 시간대는 다시 읽지 않음
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_analytics(since=self.now - timedelta(hours=6))['total']['requests'], 4)
+        self.assertFalse(any(query['sql'].startswith('INSERT') for query in queries.captured_queries))
+        self.assertEqual(PromptHistoryRollup.objects.get(bucket_start=closed).request_count, 3)
+
+    def test_rebuild_replaces_closed_hours_only(self):
+        from .analytics import bucket_start, get_analytics, rebuild_rollups
+
+        closed = bucket_start(self.now) - timedelta(hours=2)
+        self._history(closed, 100)
+        self._history(self.now, 200)
+        get_analytics(since=self.now - timedelta(hours=6))
+        PromptHistoryRollup.objects.filter(bucket_start=closed).update(request_count=99)
+
+        self.assertEqual(rebuild_rollups(), 1)
+        self.assertEqual(PromptHistoryRollup.objects.get(bucket_start=closed).request_count, 1)
+        self.assertEqual(PromptHistoryRollup.objects.count(), 1)
+        self.assertEqual(get_analytics(since=self.now - timedelta(hours=6))['total']['requests'], 2)
+
+
+class CostLedgerTests(TestCase):
+    """요청 원장 저장과 세션/일별 비용 집계"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='payer', email='payer@example.com', password=PASSWORD)
+        self.sessions = [Session.objects.create(user=self.user, task=f'작업 {i}') for i in range(2)]
+
+    def _entry(self, session, cost, category='llm', stage='llm.generate', model='gpt-5-nano', user=None):
+        return CostLedgerEntry.objects.create(
+            user=user or self.user, session=session, category=category, stage=stage, provider='openai',
+            model=model, operation='generate', cost_usd=cost
+        )
+
+    def test_request_without_billable_calls_writes_nothing(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/conversations/').status_code, 200)
+        self.assertFalse([query['sql'] for query in queries.captured_queries if 'cost_ledger' in query['sql']])
+
+    def test_save_ledger_single_insert_and_daily_cache(self):
+        from prompt_mate.cost_ledger import (
+            CostLedger, activate, deactivate, get_user_daily_cost, record_cost, save_ledger
+        )
+
+        self.assertEqual(get_user_daily_cost(self.user.pk), 0.0)
+        ledger = CostLedger('ledger-test')
+        ledger.attach(session_id=self.sessions[0].pk, user_id=self.user.pk)
+        token = activate(ledger)
+        try:
+            record_cost('llm', 'openai', 'gpt-5-nano', 'generate', 0.002, stage='prompt.synthesize')
+            record_cost('embedding', 'openai', 'text-embedding-3-small', 'embed', 0.0005, stage='rag.context')
+        finally:
+            deactivate(token)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(save_ledger(ledger), 2)
+        with self.assertNumQueries(0):
+            self.assertAlmostEqual(get_user_daily_cost(self.user.pk), 0.0025)
+        self.assertEqual(CostLedgerEntry.objects.filter(request_id='ledger-test').count(), 2)
+
+        # 저장된 뒤 늦게 들어온 기록은 바로 저장
+        record_cost('llm', 'openai', 'gpt-5-nano', 'generate', 0.001, ledger=ledger)
+        self.assertEqual(CostLedgerEntry.objects.filter(request_id='ledger-test').count(), 3)
+
+    def test_session_cost_summary_breakdowns(self):
+        from prompt_mate.cost_ledger import session_cost_summary
+
+        session = self.sessions[0]
+        self._entry(session, 0.003, stage='llm.generate', model='gpt-5')
+        self._entry(session, 0.001, stage='intent.parse')
+        self._entry(session, 0.0002, category='embedding', stage='rag.context', model='text-embedding-3-small')
+        self._entry(self.sessions[1], 1.0)
+
+        with self.assertNumQueries(1):
+            summary = session_cost_summary(session.pk)
+        self.assertEqual((summary['total_usd'], summary['calls']), (0.0042, 3))
+        self.assertEqual(
+            [(entry['key'], entry['calls'], entry['cost_usd']) for entry in summary['by_category']],
+            [('llm', 2, 0.004), ('embedding', 1, 0.0002)]
+        )
+        self.assertEqual([entry['key'] for entry in summary['by_stage']], ['llm.generate', 'intent.parse', 'rag.context'])
+        self.assertEqual(summary['by_model'][0], {'key': 'gpt-5', 'calls': 1, 'cost_usd': 0.003})
+
+    def test_daily_costs_counts_multi_day_sessions_once(self):
+        from prompt_mate.cost_ledger import daily_costs
+
+        other = CustomUser.objects.create_user(username='other-payer', email='other@example.com', password=PASSWORD)
+        self._entry(self.sessions[0], 0.01)
+        self._entry(self.sessions[1], 0.03)
+        yesterday = self._entry(self.sessions[0], 0.02)
+        CostLedgerEntry.objects.filter(pk=yesterday.pk).update(created_at=timezone.now() - timedelta(days=1))
+        self._entry(None, 0.5, user=other)
+
+        result = daily_costs(user=self.user, days=7)
+        self.assertEqual([(day['cost_usd'], day['sessions']) for day in result['daily']], [(0.02, 1), (0.04, 2)])
+        self.assertEqual(result['daily'][-1]['cost_per_session'], 0.02)
+        self.assertEqual((result['total_usd'], result['sessions'], result['cost_per_session']), (0.06, 2, 0.03))
+
+        # 전체 사용자: 세션에 연결되지 않은 호출은 총액에만 포함
+        everyone = daily_costs(days=1)
+        self.assertEqual((everyone['total_usd'], everyone['sessions']), (0.54, 2))
+
+    def test_session_budget_counts_stored_and_current_request_cost(self):
+        from prompt_mate.cost_ledger import CostBudgetPolicy, CostLedger, activate, deactivate, record_cost
+
+        self._entry(self.sessions[0], 0.009)
+        policy = CostBudgetPolicy(session_budget_usd=0.01)
+        ledger = CostLedger('budget-test')
+        ledger.attach(session_id=self.sessions[0].pk)
+        token = activate(ledger)
+        try:
+            self.assertIsNone(policy.exceeded())
+            record_cost('llm', 'openai', 'gpt-5-nano', 'generate', 0.002, stage='')
+            with self.assertNumQueries(0):
+                self.assertEqual(policy.exceeded(), 'session')
+        finally:
+            deactivate(token)
+
+
+@override_settings(PROMPT_MATE=FAKE_PROMPT_MATE)
+class StreamingGenerateTests(TestCase):
+    """스트리밍 생성 취소 시 부분 응답 저장과 과금"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        reset_llm_singletons()
+
+    @classmethod
+    def tearDownClass(cls):
+        reset_llm_singletons()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        plan = SubscriptionPlan.objects.create(
+            name='free', display_name='무료 플랜', plan_type='free', price=0,
+            monthly_limit=10 ** 9, allowed_models=['gpt-5-nano']
+        )
+        cls.user = CustomUser.objects.create_user(username='streamer', email='streamer@example.com', password=PASSWORD)
+        UserSubscription.objects.create(user=cls.user, plan=plan)
+
+    def setUp(self):
+        cache.clear()
+        self.session = Session.objects.create(user=self.user, task='보도자료')
+        Intent.objects.create(
+            session=self.session, user_input='보도자료 작성', cognitive_goal='알기', specificity='MEDIUM',
+            completeness='PARTIAL', primary_entities=['보도자료'], constraints=[], confidence=0.9
+        )
+        self.client.force_login(self.user)
+
+    def _start_stream(self):
+        response = self.client.post(
+            '/api/llm/generate/stream/', data={'session_id': str(self.session.pk), 'user_input': '보도자료 작성'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response, iter(response.streaming_content)
+
+    def test_cancelled_stream_is_billed(self):
+        response, chunks = self._start_stream()
+        for _ in range(3):
+            next(chunks)
+        response.close()
+
+        history = PromptHistory.objects.get(session=self.session)
+        self.assertEqual(history.finish_reason, 'cancelled')
+        self.assertGreater(history.tokens_used, 0)
+        entry = CostLedgerEntry.objects.get(session=self.session, operation='generate_stream')
+        self.assertEqual(entry.completion_tokens, history.completion_tokens)
+
+    def test_cancel_closes_upstream_and_saves_partial_response(self):
+        streams = []
+        original = FakeProvider.generate_stream
+
+        def capture(provider, *args, **kwargs):
+            stream = original(provider, *args, **kwargs)
+            streams.append(stream)
+            return stream
+
+        with mock.patch.object(FakeProvider, 'generate_stream', autospec=True, side_effect=capture), \
+                mock.patch('core.views.update_usage', wraps=update_usage) as usage:
+            response, chunks = self._start_stream()
+            received = [json.loads(next(chunks).decode().split('data: ', 1)[1]) for _ in range(3)]
+            response.close()
+
+        stream = streams[0]
+        # 업스트림 제너레이터까지 닫힘
+        self.assertEqual(inspect.getgeneratorstate(stream._source), inspect.GEN_CLOSED)
+
+        history = PromptHistory.objects.get(session=self.session)
+        self.assertEqual(history.finish_reason, 'cancelled')
+        partial = ''.join(event['text'] for event in received[1:])
+        self.assertTrue(partial)
+        self.assertTrue(history.response.startswith(partial))
+        self.assertEqual(history.response, stream.content)
+
+        # 사용량은 실제 생성된 토큰만큼만 반영
+        generated = stream._counter(stream.prompt) + stream._counter(history.response)
+        self.assertEqual(history.tokens_used, generated)
+        usage.assert_called_once_with(self.user, generated, model_name=history.model_used)
+
+
+class LengthPolicyTests(SimpleTestCase):
+    """구체성/인지적 목표별 출력 상한과 정지 시퀀스"""
+
+    def test_ceiling_and_stop_for_each_specificity_and_goal(self):
+        policy = LengthPolicy(max_continuations=2)
+        for specificity, ceiling in OUTPUT_TOKEN_CEILINGS.items():
+            for goal, multiplier in GOAL_MULTIPLIERS.items():
+                with self.subTest(specificity=specificity, goal=goal):
+                    target = policy.resolve('gpt-4.1', specificity_level=specificity, cognitive_goal=goal)
+                    self.assertEqual(target.max_tokens, int(ceiling * multiplier))
+                    self.assertEqual(target.source, 'ceiling')
+                    self.assertEqual(target.stop, ['\n\n'] if specificity == '짧음' else None)
+                    self.assertEqual(target.max_continuations, 2)
+
+    def test_reasoning_model_gets_allowance_and_unknown_level_default(self):
+        policy = LengthPolicy()
+        self.assertEqual(policy.ceiling('gpt-5-nano', '짧음', '알기'), 300 + REASONING_TOKEN_ALLOWANCE)
+        self.assertEqual(policy.ceiling('gpt-4.1', None, None), DEFAULT_OUTPUT_TOKEN_CEILING)
+
+    def test_history_estimate_is_capped_by_ceiling(self):
+        policy = LengthPolicy()
+        shorter = policy.resolve('gpt-4.1', '보통', '알기', estimate=TokenEstimate(100, 200, suggested_max_tokens=400))
+        self.assertEqual((shorter.max_tokens, shorter.source), (400, 'history'))
+        self.assertEqual(shorter.continuation_tokens, 256)
+        longer = policy.resolve('gpt-4.1', '보통', '알기', estimate=TokenEstimate(100, 200, suggested_max_tokens=5000))
+        self.assertEqual((longer.max_tokens, longer.source), (1200, 'ceiling'))
+        self.assertEqual(longer.continuation_tokens, 600)
+
+    def test_request_max_tokens_and_disabled_policy_never_continue(self):
+        target = LengthPolicy().resolve('gpt-4.1', '짧음', '알기', requested_max_tokens=50)
+        self.assertEqual((target.max_tokens, target.stop, target.max_continuations), (50, None, 0))
+        target = LengthPolicy(enabled=False).resolve('gpt-4.1', '짧음', '알기')
+        self.assertEqual((target.max_tokens, target.stop, target.max_continuations), (None, None, 0))
+
+    @override_settings(PROMPT_MATE={**settings.PROMPT_MATE, 'LENGTH_MAX_CONTINUATIONS': 3})
+    def test_max_continuations_setting(self):
+        from . import length_policy
+
+        length_policy._policy_instance = None
+        try:
+            target = length_policy.get_length_policy().resolve('gpt-4.1', '보통', '알기')
+        finally:
+            length_policy._policy_instance = None
+        self.assertEqual(target.max_continuations, 3)
+
+
+class TokenEstimatorTests(TestCase):
+    """이력 기반 출력 토큰 추정, 통계 캐시, 사용량 확인"""
+
+    def setUp(self):
+        cache.clear()
+        self.session = Session.objects.create(task='추정')
+        self.estimator = TokenEstimator(min_samples=20, cache_ttl=300)
+
+    def _seed(self, completion_tokens):
+        start = PromptHistory.objects.count()
+        PromptHistory.objects.bulk_create([
+            PromptHistory(
+                session=self.session, prompt_hash=f'{start + i:064d}', original_prompt='원본',
+                synthesized_prompt='합성', model_used='gpt-5-nano', provider='OpenAIProvider', response='응답',
+                tokens_used=tokens, completion_tokens=tokens, specificity_level='보통', cognitive_goal='알기'
+            )
+            for i, tokens in enumerate(completion_tokens)
+        ])
+
+    def _estimate(self):
+        return self.estimator.estimate('질문', 'gpt-5-nano', specificity_level='보통', cognitive_goal='알기')
+
+    def test_default_below_min_samples(self):
+        self._seed([50] * 19)
+        estimate = self._estimate()
+
+        self.assertEqual(estimate.source, 'default')
+        self.assertEqual(estimate.output_tokens, DEFAULT_OUTPUT_TOKENS['보통'])
+        self.assertIsNone(estimate.suggested_max_tokens)
+        self.assertEqual(estimate.samples, 0)
+
+    def test_history_percentiles(self):
+        self._seed(range(10, 410, 10))
+        estimate = self._estimate()
+
+        self.assertEqual(estimate.source, 'model_specificity_goal')
+        self.assertEqual(estimate.samples, 40)
+        # p90 = 360, p99 = 400 → 400 × 1.25
+        self.assertEqual(estimate.output_tokens, 360)
+        self.assertEqual(estimate.suggested_max_tokens, 500)
+        # 요청 max_tokens가 예측의 상한
+        capped = self.estimator.estimate('질문', 'gpt-5-nano', '보통', '알기', max_tokens=100)
+        self.assertEqual((capped.output_tokens, capped.suggested_max_tokens), (100, 100))
+
+    def test_group_stats_are_cached_until_invalidated(self):
+        self._seed([50] * 19)
+        self.assertEqual(self._estimate().source, 'default')
+
+        # 샘플 부족도 캐시되므로 새 이력은 캐시가 만료/삭제될 때까지 반영되지 않음
+        self._seed([50])
+        with self.assertNumQueries(0):
+            self.assertEqual(self._estimate().source, 'default')
+
+        cache.clear()
+        estimate = self._estimate()
+        self.assertEqual((estimate.source, estimate.output_tokens), ('model_specificity_goal', 50))
+
+    def test_usage_limit_checks_estimate(self):
+        plan = SubscriptionPlan.objects.create(
+            name='free', display_name='무료 플랜', plan_type='free', price=0,
+            monthly_limit=1000, allowed_models=['gpt-5-nano']
+        )
+        user = CustomUser.objects.create_user(username='estimator', email='estimator@example.com', password=PASSWORD)
+        UserSubscription.objects.create(user=user, plan=plan)
+        session = Session.objects.create(user=user, task='추정')
+        Intent.objects.create(
+            session=session, user_input='질문', cognitive_goal='알기', specificity='MEDIUM',
+            completeness='PARTIAL', primary_entities=['질문'], constraints=[], confidence=0.9
+        )
+        self.client.force_login(user)
+
+        def post(output_tokens):
+            estimate = TokenEstimate(input_tokens=400, output_tokens=output_tokens)
+            with override_settings(PROMPT_MATE=FAKE_PROMPT_MATE), \
+                    mock.patch('core.views.get_token_estimator') as estimator:
+                estimator.return_value.estimate.return_value = estimate
+                reset_llm_singletons()
+                try:
+                    return self.client.post(
+                        '/api/llm/generate/', data={'session_id': str(session.pk), 'user_input': '질문'},
+                        content_type='application/json'
+                    )
+                finally:
+                    reset_llm_singletons()
+
+        # 입력 400 + 예상 출력 700 > 남은 1000 토큰 → 생성 전에 거절
+        response = post(700)
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('필요 토큰: 1,100', response.json()['error'])
+        self.assertFalse(PromptHistory.objects.filter(session=session).exists())
+
+        response = post(500)
+        self.assertEqual(response.status_code, 200)
+
+
+PROFILER_PROMPT_MATE = {**settings.PROMPT_MATE, 'PROFILER_ENABLED': True, 'PROFILE_RETENTION': 2}
+
+
+@override_settings(PROMPT_MATE=PROFILER_PROMPT_MATE)
+class ProfilerMiddlewareTests(TestCase):
+    """스태프 요청만 프로파일링하고 보관 개수만큼 리포트 유지"""
+
+    def setUp(self):
+        profiling._policy = None
+        self.addCleanup(setattr, profiling, '_policy', None)
+
+    def _login(self, is_staff):
+        user = CustomUser.objects.create_user(
+            username=f'profiler-{is_staff}', email=f'profiler-{is_staff}@example.com', password=PASSWORD,
+            is_staff=is_staff
+        )
+        self.client.force_login(user)
+        return user
+
+    def test_non_staff_header_is_ignored(self):
+        self._login(is_staff=False)
+        response = self.client.get('/api/conversations/', HTTP_X_PROFILE='1')
+
+        self.assertNotIn(PROFILE_ID_HEADER, response)
+        self.assertFalse(ProfileReport.objects.exists())
+
+    def test_staff_report_id_in_header(self):
+        staff = self._login(is_staff=True)
+        response = self.client.get('/api/conversations/', HTTP_X_PROFILE='cprofile')
+
+        report = ProfileReport.objects.get()
+        self.assertEqual(response[PROFILE_ID_HEADER], str(report.id))
+        self.assertEqual((report.user, report.trigger, report.profiler), (staff, 'header', 'cprofile'))
+        self.assertEqual((report.method, report.path, report.status_code), ('GET', '/api/conversations/', 200))
+
+    def test_prune_keeps_retention(self):
+        self._login(is_staff=True)
+        ids = [self.client.get('/api/conversations/?__profile=1')[PROFILE_ID_HEADER] for _ in range(4)]
+
+        self.assertEqual(
+            sorted(str(pk) for pk in ProfileReport.objects.values_list('id', flat=True)), sorted(ids[-2:])
+        )
+
+    @override_settings(PROMPT_MATE={**settings.PROMPT_MATE, 'PROFILER_ENABLED': False})
+    def test_middleware_removed_when_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilerMiddleware(lambda request: None)
+
+
+class SamplingProfilerTests(SimpleTestCase):
+    """speedscope 'sampled' 파일 형식"""
+
+    def test_speedscope_shape(self):
+        profiler = profiling.SamplingProfiler(interval_ms=1)
+        profiler.start()
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+        profiler.stop()
+
+        data = profiler.to_speedscope('GET /busy')
+        self.assertEqual(data['$schema'], profiling.SPEEDSCOPE_SCHEMA)
+        self.assertEqual(data['activeProfileIndex'], 0)
+        frames = data['shared']['frames']
+        self.assertTrue(all(set(frame) == {'name', 'file', 'line'} for frame in frames))
+
+        profile = data['profiles'][0]
+        self.assertEqual((profile['type'], profile['name'], profile['unit']), ('sampled', 'GET /busy', 'milliseconds'))
+        self.assertGreater(len(profile['samples']), 0)
+        self.assertEqual(len(profile['samples']), len(profile['weights']))
+        self.assertTrue(all(0 <= i < len(frames) for stack in profile['samples'] for i in stack))
+        self.assertAlmostEqual(profile['endValue'], sum(profile['weights']), places=1)
+        self.assertIn('test_speedscope_shape', {frame['name'] for frame in frames})
+
+
+class _Leak:
+    """객체 수 증가 확인용"""
+
+
+@override_settings(PROMPT_MATE={**settings.PROMPT_MATE, 'MEMORY_WATERMARK_SECONDS': 0})
+class MemoryDiagnosticsTests(TestCase):
+    """관리자 전용 메모리 진단 API와 스냅샷/객체 수 증가분"""
+
+    URL = '/api/debug/memory/'
+
+    def setUp(self):
+        memory._diagnostics = None
+        self.addCleanup(setattr, memory, '_diagnostics', None)
+        self.addCleanup(tracemalloc.stop)
+        self.admin = CustomUser.objects.create_user(
+            username='memory-admin', email='memory-admin@example.com', password=PASSWORD, is_staff=True
+        )
+
+    def _post(self, **data):
+        return self.client.post(self.URL, data=data, content_type='application/json')
+
+    def test_admin_only(self):
+        self.assertIn(self.client.get(self.URL).status_code, (401, 403))
+        self.assertIn(self._post().status_code, (401, 403))
+
+        member = CustomUser.objects.create_user(username='member', email='member@example.com', password=PASSWORD)
+        self.client.force_login(member)
+        self.assertEqual(self.client.get(self.URL).status_code, 403)
+        self.assertEqual(self.client.delete(self.URL).status_code, 403)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(self.URL).status_code, 200)
+
+    def test_second_snapshot_shows_allocation_since_previous(self):
+        self.client.force_login(self.admin)
+        first = self._post(limit=200).json()
+        self.assertEqual(first['since_previous'], [])
+
+        self.allocated = [bytearray(1024) for _ in range(2000)]
+        second = self._post(limit=200).json()
+
+        self.assertTrue(second['since_previous'])
+        here = [entry for entry in second['since_previous'] if entry['location'].startswith(__file__)]
+        self.assertTrue(here)
+        self.assertGreaterEqual(max(entry['size_diff_kb'] for entry in here), 1500)
+
+    def test_object_growth_deltas(self):
+        diagnostics = memory.MemoryDiagnostics()
+        self.assertEqual(diagnostics.object_growth()['growth'], [])
+
+        self.leaked = [_Leak() for _ in range(500)]
+        growth = {entry['type']: entry for entry in diagnostics.object_growth(limit=1000)['growth']}
+
+        entry = growth[f'{__name__}._Leak']
+        self.assertEqual(entry['delta'], 500)
+        self.assertEqual(entry['count'], 500)
+
+    def test_delete_stops_tracing(self):
+        self.client.force_login(self.admin)
+        self._post()
+        self.assertTrue(tracemalloc.is_tracing())
+
+        self.assertEqual(self.client.delete(self.URL).status_code, 204)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertFalse(self.client.get(self.URL).json()['tracemalloc']['has_baseline'])
+
+    def test_bad_key_type(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self._post(key_type='bogus').status_code, 400)
+        self.assertEqual(self._post(limit='many').status_code, 400)
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+class BenchmarkHotpathsCommandTests(SimpleTestCase):
+    """벤치마크 명령 스모크 테스트 (JSON 출력, 기준선 회귀 표시)"""
+
+    def _run(self, baseline, *args):
+        out = StringIO()
+        call_command(
+            'benchmark_hotpaths', '--repeat', '1', '--min-time', '0', '--filter', 'estimate_tokens[ko-x1]',
+            '--filter', 'synthesize[en-x1]', '--json', '--baseline', baseline, *args, stdout=out
+        )
+        return json.loads(out.getvalue())
+
+    def test_json_output_and_seeded_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            result = self._run(baseline, '--save-baseline')
+
+            self.assertEqual(set(result), {'results', 'regressions'})
+            self.assertEqual(set(result['results']), {'estimate_tokens[ko-x1]', 'synthesize[en-x1]'})
+            for measured in result['results'].values():
+                self.assertEqual(set(measured), {'min_us', 'median_us', 'loops'})
+                self.assertGreater(measured['min_us'], 0)
+            self.assertEqual(result['regressions'], [])
+
+            # 기준선을 훨씬 빠르게 조작하면 회귀로 표시
+            with open(baseline, encoding='utf-8') as f:
+                stored = json.load(f)
+            stored['results']['synthesize[en-x1]']['min_us'] /= 1000
+            with open(baseline, 'w', encoding='utf-8') as f:
+                json.dump(stored, f)
+
+            result = self._run(baseline)
+            # --repeat 1 측정은 흔들리므로 조작한 항목이 포함되는지만 확인
+            self.assertIn('synthesize[en-x1]', result['regressions'])
+            self.assertGreater(result['results']['synthesize[en-x1]']['change_pct'], 25)
+            with self.assertRaises(CommandError):
+                self._run(baseline, '--fail-on-regression')
+
+
+@skipUnless(importlib.util.find_spec('httpx'), 'httpx 필요 (pip install httpx)')
+@override_settings(PROMPT_MATE={**FAKE_PROMPT_MATE, 'QUERY_COUNT_HEADER': True})
+class LoadtestCommandTests(LiveServerTestCase):
+    """부하 테스트 명령 스모크 테스트 (가짜 제공자 서버, JSON 출력, 기준선 회귀 표시)"""
+
+    @classmethod
+    def setUpClass(cls):
+        reset_llm_singletons()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        reset_llm_singletons()
+
+    def setUp(self):
+        cache.clear()
+        SubscriptionPlan.objects.create(
+            name='free', display_name='무료 플랜', plan_type='free', price=0,
+            monthly_limit=10 ** 9, allowed_models=['gpt-5-nano']
+        )
+
+    def _run(self, baseline, *args):
+        out = StringIO()
+        call_command(
+            'loadtest', '--base-url', self.live_server_url, '--duration', '1', '--concurrency', '2',
+            '--scenario', 'anonymous', '--json', '--baseline', baseline, *args, stdout=out
+        )
+        return json.loads(out.getvalue())
+
+    def test_json_output_and_seeded_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            result = self._run(baseline, '--save-baseline')
+
+            self.assertEqual(set(result), {
+                'base_url', 'concurrency', 'scenarios', 'wall_seconds', 'total_requests', 'total_rps', 'flows',
+                'endpoints', 'recorded_at', 'baseline', 'regressions'
+            })
+            self.assertIsNone(result['baseline'])
+            self.assertGreater(result['flows']['anonymous'].get('completed', 0), 0)
+            self.assertEqual(list(result['endpoints'])[:4], FLOW_ENDPOINTS)
+            endpoint = result['endpoints']['llm/generate']
+            self.assertEqual(endpoint['error_rate'], 0.0)
+            self.assertIsNotNone(endpoint['p95_ms'])
+            self.assertIsNotNone(endpoint['avg_queries'])
+
+            # 기준선 지연을 크게 줄여 두면 회귀로 표시되고 --fail-on-regression은 실패
+            with open(baseline, encoding='utf-8') as f:
+                stored = json.load(f)
+            stored['endpoints']['llm/generate']['p50_ms'] /= 100
+            with open(baseline, 'w', encoding='utf-8') as f:
+                json.dump(stored, f)
+
+            result = self._run(baseline)
+            self.assertEqual(result['baseline'], baseline)
+            self.assertIn(('llm/generate', 'p50_ms'), {(r['endpoint'], r['metric']) for r in result['regressions']})
+            with self.assertRaises(CommandError):
+                self._run(baseline, '--fail-on-regression')
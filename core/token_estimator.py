@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+사전 토큰 추정기
+
+생성 전에 요청의 토큰 사용량을 추정해 사용량 한도 확인(admission)과 출력 길이 제한에 사용합니다.
+
+- 입력 토큰: 공용 토크나이저로 정확히 계산
+- 출력 토큰: PromptHistory에 기록된 실제 출력 토큰 수의 분포를
+  (모델, 구체성 레벨, 인지적 목표) → (모델, 구체성 레벨) → (구체성 레벨) 순으로 찾아 예측
+  샘플이 부족하면 구체성 레벨별 기본값 사용
+- max_tokens 제안: 관측된 상위 백분위 출력 길이에 여유를 둔 값 (충분한 이력이 있을 때만)
+
+그룹별 통계는 Django 캐시에 잠시 보관해 요청마다 이력을 조회하지 않습니다.
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from llm_providers.instrumentation import percentile
+from llm_providers.tokenizer import get_tokenizer
+from prompt_mate.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+# 이력이 없을 때 구체성 레벨별 예상 출력 토큰 수
+DEFAULT_OUTPUT_TOKENS = {
+    '짧음': 150,
+    '간결': 300,
+    '보통': 600,
+    '구체적': 1000,
+    '매우 구체적': 1500,
+}
+FALLBACK_OUTPUT_TOKENS = 1000
+
+# 사용량 확인에 쓰는 출력 예측 백분위 / max_tokens 제안 백분위와 여유 배수
+ADMISSION_PERCENTILE = 90
+MAX_TOKENS_PERCENTILE = 99
+MAX_TOKENS_HEADROOM = 1.25
+MIN_SUGGESTED_MAX_TOKENS = 256
+
+CACHE_KEY_PREFIX = 'token_estimate'
+
+
+class TokenEstimate:
+    """사전 토큰 추정 결과"""
+
+    def __init__(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        suggested_max_tokens: Optional[int] = None,
+        source: str = 'default',
+        samples: int = 0
+    ):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.suggested_max_tokens = suggested_max_tokens
+        self.source = source
+        self.samples = samples
+
+    def cap_output(self, max_tokens: Optional[int]):
+        """출력 토큰 한도가 정해지면 예상 출력을 한도 이내로 제한"""
+        if max_tokens is not None:
+            self.output_tokens = min(self.output_tokens, max_tokens)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'total_tokens': self.total_tokens,
+            'suggested_max_tokens': self.suggested_max_tokens,
+            'source': self.source,
+            'samples': self.samples,
+        }
+
+
+class TokenEstimator:
+    """
+    이력 기반 토큰 추정기
+
+    Args:
+        history_size: 그룹별로 참고할 최근 이력 수
+        min_samples: 이력 통계를 사용하기 위한 최소 샘플 수
+        cache_ttl: 그룹별 통계 캐시 시간 (초)
+    """
+
+    def __init__(self, history_size: int = 200, min_samples: int = 20, cache_ttl: int = 300):
+        self.history_size = history_size
+        self.min_samples = min_samples
+        self.cache_ttl = cache_ttl
+
+    def estimate(
+        self,
+        prompt: str,
+        model: str,
+        specificity_level: Optional[str] = None,
+        cognitive_goal: Optional[str] = None,
+        max_tokens: Optional[int] = None
+    ) -> TokenEstimate:
+        """
+        요청의 토큰 사용량 추정
+
+        Args:
+            prompt: 최종 프롬프트
+            model: 사용할 모델
+            specificity_level: 구체성 레벨 값
+            cognitive_goal: 인지적 목표
+            max_tokens: 요청에 지정된 최대 출력 토큰 수 (있으면 예측의 상한)
+
+        Returns:
+            TokenEstimate
+        """
+        input_tokens = get_tokenizer().count(prompt, model)
+
+        stats, source = self._find_stats(model, specificity_level, cognitive_goal)
+        if stats:
+            output_tokens = stats['admission']
+            suggested = stats['max_tokens']
+            samples = stats['samples']
+        else:
+            output_tokens = DEFAULT_OUTPUT_TOKENS.get(specificity_level, FALLBACK_OUTPUT_TOKENS)
+            suggested = None
+            samples = 0
+
+        if max_tokens is not None:
+            output_tokens = min(output_tokens, max_tokens)
+            suggested = max_tokens
+
+        return TokenEstimate(
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            suggested_max_tokens=suggested,
+            source=source,
+            samples=samples
+        )
+
+    def _find_stats(
+        self,
+        model: str,
+        specificity_level: Optional[str],
+        cognitive_goal: Optional[str]
+    ) -> Tuple[Optional[Dict[str, int]], str]:
+        """구체적인 그룹부터 샘플이 충분한 통계 찾기"""
+        groups = []
+        if specificity_level and cognitive_goal:
+            groups.append(('model_specificity_goal', {
+                'model_used': model,
+                'specificity_level': specificity_level,
+                'cognitive_goal': cognitive_goal,
+            }))
+        if specificity_level:
+            groups.append(('model_specificity', {'model_used': model, 'specificity_level': specificity_level}))
+            groups.append(('specificity', {'specificity_level': specificity_level}))
+        groups.append(('model', {'model_used': model}))
+
+        for source, filters in groups:
+            stats = self._get_group_stats(filters)
+            if stats:
+                return stats, source
+        return None, 'default'
+
+    def _get_group_stats(self, filters: Dict[str, str]) -> Optional[Dict[str, int]]:
+        """그룹의 출력 토큰 통계 (캐시, 샘플 부족 시 None)"""
+        raw_key = '|'.join(f'{k}={v}' for k, v in sorted(filters.items()))
+        cache_key = f"{CACHE_KEY_PREFIX}:{hashlib.md5(raw_key.encode('utf-8')).hexdigest()}"
+
+        cached = cache.get(cache_key)
+        CACHE_REQUESTS.inc(cache='token_estimate', result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            # 샘플 부족도 캐시 ({}), 이력이 쌓이면 TTL 후 다시 계산
+            return cached or None
+
+        try:
+            values = self._load_completion_tokens(filters)
+        except Exception as e:
+            logger.warning(f"출력 토큰 이력 조회 실패, 기본값 사용: {e}")
+            return None
+
+        stats = {}
+        if len(values) >= self.min_samples:
+            stats = {
+                'samples': len(values),
+                'median': int(percentile(values, 50)),
+                'admission': int(percentile(values, ADMISSION_PERCENTILE)),
+                'max_tokens': max(
+                    MIN_SUGGESTED_MAX_TOKENS,
+                    int(percentile(values, MAX_TOKENS_PERCENTILE) * MAX_TOKENS_HEADROOM)
+                ),
+            }
+        cache.set(cache_key, stats, self.cache_ttl)
+        return stats or None
+
+    def _load_completion_tokens(self, filters: Dict[str, str]) -> List[int]:
+        """그룹의 최근 출력 토큰 수 (취소/에러 응답 제외)"""
+        from .models import PromptHistory
+
+        return list(
+            PromptHistory.objects
+            .filter(completion_tokens__gt=0, **filters)
+            .exclude(finish_reason__in=['cancelled', 'error'])
+            .order_by('-created_at')
+            .values_list('completion_tokens', flat=True)[:self.history_size]
+        )
+
+
+# 전역 추정기 인스턴스
+_estimator_instance: Optional[TokenEstimator] = None
+
+
+def get_token_estimator() -> TokenEstimator:
+    """전역 TokenEstimator 인스턴스 가져오기 (싱글톤)"""
+    global _estimator_instance
+    if _estimator_instance is None:
+        config = settings.PROMPT_MATE
+        _estimator_instance = TokenEstimator(
+            history_size=config.get('TOKEN_ESTIMATE_HISTORY', 200),
+            min_samples=config.get('TOKEN_ESTIMATE_MIN_SAMPLES', 20),
+            cache_ttl=config.get('TOKEN_ESTIMATE_CACHE_TTL', 300),
+        )
+    return _estimator_instance
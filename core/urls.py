@@ -17,7 +17,13 @@ from .views import (
     AnswerQuestionView,
     PromptSynthesizeView,
     LLMGenerateView,
+    LLMGenerateStreamView,
     FeedbackCreateView,
+    RouterStatsView,
+    ReadinessView,
+    MemoryDiagnosticsView,
+    PromptAnalyticsView,
+    DailyCostView,
     ConversationViewSet,
     MessageViewSet,
     UserCustomInstructionsViewSet,
@@ -82,7 +88,13 @@ urlpatterns = [
     path('context/answer/', AnswerQuestionView.as_view(), name='context-answer'),
     path('prompt/synthesize/', PromptSynthesizeView.as_view(), name='prompt-synthesize'),
     path('llm/generate/', LLMGenerateView.as_view(), name='llm-generate'),
+    path('llm/generate/stream/', LLMGenerateStreamView.as_view(), name='llm-generate-stream'),
     path('feedback/', FeedbackCreateView.as_view(), name='feedback-create'),
+    path('llm/router/stats/', RouterStatsView.as_view(), name='llm-router-stats'),
+    path('analytics/prompts/', PromptAnalyticsView.as_view(), name='analytics-prompts'),
+    path('costs/daily/', DailyCostView.as_view(), name='costs-daily'),
+    path('health/ready/', ReadinessView.as_view(), name='health-ready'),
+    path('debug/memory/', MemoryDiagnosticsView.as_view(), name='debug-memory'),
     
     # Payment
     path('payment/account/', get_account_info, name='payment-account'),
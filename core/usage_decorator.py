@@ -6,18 +6,55 @@ LLM 호출 전 사용량 확인 및 모델 권한 확인
 """
 
 import logging
+import time
+import uuid
 from functools import wraps
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 
+from prompt_mate.metrics import USAGE_LIMIT_REJECTIONS
+
 from .models import UserSubscription, SubscriptionPlan
 
 logger = logging.getLogger(__name__)
 
 
+# 무료 플랜 프로세스 캐시 (익명 요청마다 get_or_create 쿼리를 피함)
+# 플랜이 바뀌면 공유 캐시의 버전을 올려 다른 워커의 프로세스 캐시도 무효화
+FREE_PLAN_CACHE_TTL = 300
+PLAN_VERSION_CACHE_KEY = 'subscription_plan:version'
+_free_plan_cache = {'plan': None, 'expires_at': 0.0, 'version': None}
+
+
 def get_or_create_free_plan():
-    """무료 플랜 가져오기 또는 생성 (플랜이 없을 경우 자동 생성)"""
+    """무료 플랜 가져오기 또는 생성 (플랜이 없을 경우 자동 생성, 플랜 버전이 같으면 FREE_PLAN_CACHE_TTL초 캐시)"""
+    now = time.monotonic()
+    version = cache.get(PLAN_VERSION_CACHE_KEY)
+    plan = _free_plan_cache['plan']
+    if plan is not None and now < _free_plan_cache['expires_at'] and version == _free_plan_cache['version']:
+        return plan
+    
+    plan = _load_free_plan()
+    # 무료 플랜을 새로 만들었으면 저장 신호가 버전을 바꾸므로 조회 후의 버전을 기록
+    _free_plan_cache.update(
+        plan=plan, expires_at=now + FREE_PLAN_CACHE_TTL, version=cache.get(PLAN_VERSION_CACHE_KEY)
+    )
+    return plan
+
+
+@receiver(post_save, sender=SubscriptionPlan)
+@receiver(post_delete, sender=SubscriptionPlan)
+def clear_plan_cache(**kwargs):
+    """플랜이 바뀌면 모든 워커의 캐시 무효화 (공유 캐시의 플랜 버전 갱신)"""
+    _free_plan_cache.update(plan=None, expires_at=0.0, version=None)
+    cache.set(PLAN_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+def _load_free_plan():
     return SubscriptionPlan.objects.get_or_create(
         name='free',
         defaults={
@@ -49,7 +86,7 @@ def get_user_subscription(user):
         free_plan = get_or_create_free_plan()
         return None, free_plan
     
-    subscription, created = UserSubscription.objects.get_or_create(
+    subscription, created = UserSubscription.objects.select_related('plan').get_or_create(
         user=user,
         defaults={'plan': get_or_create_free_plan()}
     )
@@ -95,6 +132,7 @@ def check_usage_limit(user, tokens_needed):
     
     if current_usage + tokens_needed > total_available:
         remaining = max(0, total_available - current_usage)
+        USAGE_LIMIT_REJECTIONS.inc(plan=plan.name)
         raise UsageLimitExceeded(
             f"사용량 제한을 초과했습니다. "
             f"남은 토큰: {remaining:,} / 필요 토큰: {tokens_needed:,}"
@@ -5,12 +5,19 @@ Django REST Framework Views
 API 엔드포인트를 구현합니다.
 """
 
+import json
 import logging
+import time
+from django.conf import settings
+from django.db.models import Count
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 
 from .models import (
     Session, Intent, Question, PromptHistory, Feedback,
@@ -33,7 +40,19 @@ from .session_manager import SessionManager
 from .intent_parser import get_intent_parser
 from .prompt_synthesizer import SpecificityLevel
 from .usage_decorator import check_usage_limit, update_usage, UsageLimitExceeded, can_use_model
+from llm_providers.base import ContextWindowExceededError
 from llm_providers.router import get_router, TaskType, QualityLevel
+from llm_providers.cascade import run_cascade
+from llm_providers.continuation import generate_with_continuation
+from llm_providers.hedging import HedgedProvider
+from llm_providers.instrumentation import collect_calls
+from .length_policy import get_length_policy
+from .token_estimator import get_token_estimator
+from .analytics import GROUP_FIELDS, get_analytics, parse_window
+from prompt_mate.cost_ledger import daily_costs, session_cost_summary
+from prompt_mate.memory import get_memory_diagnostics
+from prompt_mate.tracing import current_trace, span
+from prompt_mate.warmup import get_readiness
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +64,12 @@ class ConversationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """현재 사용자의 대화만 조회"""
         if self.request.user.is_authenticated:
-            return Conversation.objects.filter(user=self.request.user)
+            # 목록 직렬화 시 대화마다 user/메시지 수를 따로 조회하지 않도록 한 번에 가져옴
+            return (
+                Conversation.objects.filter(user=self.request.user)
+                .select_related('user')
+                .annotate(message_count=Count('messages'))
+            )
         return Conversation.objects.none()
     
     def perform_create(self, serializer):
@@ -109,7 +133,7 @@ class UserCustomInstructionsViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """현재 사용자의 커스텀 지침만 조회"""
         if self.request.user.is_authenticated:
-            return UserCustomInstructions.objects.filter(user=self.request.user)
+            return UserCustomInstructions.objects.filter(user=self.request.user).select_related('user')
         return UserCustomInstructions.objects.none()
     
     def perform_create(self, serializer):
@@ -138,6 +162,17 @@ class SessionViewSet(viewsets.ModelViewSet):
         serializer = SessionSummarySerializer(summary)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def cost(self, request, pk=None):
+        """세션 비용 (총액과 과금 항목/단계/모델별 내역, 본인 세션 또는 스태프만)"""
+        session = self.get_object()
+        if session.user_id and session.user_id != request.user.pk and not request.user.is_staff:
+            return Response(
+                {'error': '다른 사용자의 세션 비용은 볼 수 없습니다.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response(session_cost_summary(session.id), status=status.HTTP_200_OK)
+    
     @action(detail=True, methods=['post'])
     def set_goal(self, request, pk=None):
         """온보딩 목표 설정"""
@@ -466,15 +501,19 @@ class LLMGenerateView(APIView):
     POST /api/llm/generate
     """
     permission_classes = [AllowAny]  # 익명 사용자도 사용 가능
+    # 캐스케이드 생성 지원 여부 (스트리밍은 미지원)
+    supports_cascade = True
     
-    def post(self, request):
-        """LLM으로 응답 생성"""
-        serializer = LLMGenerateRequestSerializer(data=request.data)
-        if not serializer.is_valid():
-            logger.error(f"LLM 생성 요청 검증 실패: {serializer.errors}, 요청 데이터: {request.data}")
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    def _prepare(self, request, data):
+        """
+        생성 준비 (대화/세션, 프롬프트 합성, 인터넷 모드 강화, 제공자 선택, 사용량 확인)
         
-        data = serializer.validated_data
+        일반 생성과 스트리밍 생성이 함께 사용합니다.
+        
+        Returns:
+            준비 정보 딕셔너리, 또는 바로 돌려줄 에러 Response
+        """
+        started_at = time.perf_counter()
         session_id = str(data['session_id'])
         prompt = data.get('prompt')
         user_input = data.get('user_input')
@@ -483,106 +522,262 @@ class LLMGenerateView(APIView):
         max_tokens = data.get('max_tokens')
         internet_mode = data.get('internet_mode', False)
         specificity_level_str = data.get('specificity_level', '매우 구체적')
+        use_cascade = data.get('cascade')
+        if use_cascade is None:
+            use_cascade = settings.PROMPT_MATE.get('CASCADE_ENABLED', False)
         
-        try:
-            # 구체성 레벨 변환
-            specificity_level = SpecificityLevel(specificity_level_str)
-            
-            # 사용자 정보 가져오기
-            user = request.user if request.user.is_authenticated else None
+        # 구체성 레벨 변환
+        specificity_level = SpecificityLevel(specificity_level_str)
+        
+        # 사용자 정보 가져오기
+        user = request.user if request.user.is_authenticated else None
+        
+        # 대화 생성 또는 기존 대화 가져오기
+        conversation = None
+        if user:
+            # session_id가 있으면 해당 세션의 conversation 찾기
+            if session_id:
+                try:
+                    session = Session.objects.get(id=session_id)
+                    conversation = session.conversation
+                except Session.DoesNotExist:
+                    pass
             
-            # 대화 생성 또는 기존 대화 가져오기
-            conversation = None
-            if user:
-                # session_id가 있으면 해당 세션의 conversation 찾기
-                if session_id:
-                    try:
-                        session = Session.objects.get(id=session_id)
-                        conversation = session.conversation
-                    except Session.DoesNotExist:
-                        pass
-                
-                # conversation이 없으면 새로 생성
-                if not conversation:
-                    conversation = Conversation.objects.create(
-                        user=user,
-                        title=user_input[:50] if user_input else '새로운 대화'
+            # conversation이 없으면 새로 생성
+            if not conversation:
+                conversation = Conversation.objects.create(
+                    user=user,
+                    title=user_input[:50] if user_input else '새로운 대화'
+                )
+        
+        # Session Manager
+        session_manager = SessionManager(
+            session_id=session_id if session_id else None,
+            user=user,
+            conversation=conversation
+        )
+        
+        # 프롬프트가 없으면 자동 합성 (구체성 레벨 적용)
+        if not prompt:
+            # user_input이 없으면 세션의 task 확인
+            if not user_input or (isinstance(user_input, str) and not user_input.strip()):
+                if session_manager.session.task and session_manager.session.task.strip():
+                    user_input = session_manager.session.task
+                else:
+                    return Response(
+                        {'error': 'user_input 또는 세션의 task가 필요합니다. 프롬프트를 직접 제공하거나 사용자 입력을 포함해주세요.'},
+                        status=status.HTTP_400_BAD_REQUEST
                     )
             
-            # Session Manager
-            session_manager = SessionManager(
-                session_id=session_id if session_id else None,
-                user=user,
-                conversation=conversation
+            prompt = session_manager.synthesize_prompt(
+                user_input=user_input,
+                specificity_level=specificity_level,
+                use_rag=user is not None  # 로그인한 사용자만 RAG 사용
             )
-            
-            # 프롬프트가 없으면 자동 합성 (구체성 레벨 적용)
-            if not prompt:
-                # user_input이 없으면 세션의 task 확인
-                if not user_input or (isinstance(user_input, str) and not user_input.strip()):
-                    if session_manager.session.task and session_manager.session.task.strip():
-                        user_input = session_manager.session.task
-                    else:
-                        return Response(
-                            {'error': 'user_input 또는 세션의 task가 필요합니다. 프롬프트를 직접 제공하거나 사용자 입력을 포함해주세요.'},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                
-                prompt = session_manager.synthesize_prompt(
-                    user_input=user_input,
-                    specificity_level=specificity_level,
-                    use_rag=user is not None  # 로그인한 사용자만 RAG 사용
+        
+        # 인터넷 모드 활성화 시 프롬프트 강화
+        if internet_mode and user_input:
+            router = get_router()
+            logger.info("인터넷 모드 활성화: Perplexity Sonar로 검색 수행")
+            prompt = router.enhance_prompt_with_internet(
+                prompt=prompt,
+                user_query=user_input
+            )
+        
+        # Router로 제공자/모델 선택 (사용자 플랜 기반)
+        router = get_router()
+        quality_enum = QualityLevel(quality)
+        
+        # 사용자가 선택한 모델 확인 (request.data에서)
+        preferred_model = request.data.get('preferred_model')
+        
+        with span('router.select'):
+            try:
+                provider, model, default_temp = router.get_provider(
+                    TaskType.FINAL_GENERATION,
+                    quality=quality_enum,
+                    user=user,
+                    preferred_model=preferred_model,
+                    prompt=prompt
                 )
-            
-            # 인터넷 모드 활성화 시 프롬프트 강화
-            if internet_mode and user_input:
-                router = get_router()
-                logger.info("인터넷 모드 활성화: Perplexity Sonar로 검색 수행")
-                prompt = router.enhance_prompt_with_internet(
-                    prompt=prompt,
-                    user_query=user_input
+            except ContextWindowExceededError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # 최근 Intent의 인지적 목표 (출력 길이 예측용)
+        recent_intent = session_manager.session.intents.first()
+        cognitive_goal = recent_intent.cognitive_goal if recent_intent else None
+        
+        # 캐스케이드: 선택된 모델 아래 등급의 더 저렴한 모델부터 시도 (선호 모델 지정 시 제외)
+        ladder = []
+        if use_cascade and self.supports_cascade and not preferred_model:
+            ladder = router.get_cascade_ladder((provider, model, default_temp), user=user, prompt=prompt)
+            if len(ladder) < 2:
+                ladder = []
+        
+        # 사전 토큰 추정과 출력 길이 정책은 실제로 호출할 모델마다 계산
+        length_targets = {
+            rung_model: self._resolve_length(
+                prompt, rung_model, specificity_level.value, cognitive_goal, max_tokens
+            )
+            for _, rung_model, _ in (ladder or [(provider, model, default_temp)])
+        }
+        token_estimate, length_target = length_targets[model]
+        max_tokens = length_target.max_tokens
+        # 사용량은 처음 실행되는 단계 모델 기준으로 확인 (승격분은 실제 사용량으로 반영)
+        if ladder:
+            token_estimate = length_targets[ladder[0][1]][0]
+        
+        if user:
+            try:
+                check_usage_limit(user, token_estimate.total_tokens)
+            except UsageLimitExceeded as e:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_403_FORBIDDEN
                 )
-            
-            # Router로 제공자/모델 선택 (사용자 플랜 기반)
-            router = get_router()
-            quality_enum = QualityLevel(quality)
-            
-            # 사용자가 선택한 모델 확인 (request.data에서)
-            preferred_model = request.data.get('preferred_model')
-            
-            provider, model, default_temp = router.get_provider(
-                TaskType.FINAL_GENERATION,
-                quality=quality_enum,
-                user=user,
-                preferred_model=preferred_model
+        
+        return {
+            'session_id': session_id,
+            'user': user,
+            'session_manager': session_manager,
+            'router': router,
+            'prompt': prompt,
+            'user_input': user_input,
+            'quality': quality,
+            'quality_enum': quality_enum,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'internet_mode': internet_mode,
+            'specificity_level': specificity_level,
+            'cognitive_goal': cognitive_goal,
+            'token_estimate': token_estimate,
+            'length_target': length_target,
+            'preferred_model': preferred_model,
+            'ladder': ladder,
+            'max_tokens_by_model': {
+                rung_model: target.max_tokens for rung_model, (_, target) in length_targets.items()
+            },
+            'provider': provider,
+            'model': model,
+            'default_temp': default_temp,
+            # 이력의 latency_ms/ttft_ms 기준 시각
+            'started_at': started_at,
+            # 스트리밍 본문 종료/취소 시점에도 같은 트레이스의 단계별 시간을 저장하기 위해 보관
+            'trace': current_trace(),
+        }
+    
+    @staticmethod
+    def _resolve_length(prompt, model, specificity_level, cognitive_goal, max_tokens):
+        """
+        모델별 사전 토큰 추정과 출력 길이 설정
+        
+        입력은 토크나이저로 계산하고, 출력은 같은 모델/구체성/목표의 이력으로 예측합니다.
+        max_tokens 미지정 시 구체성/목표별 한도와 정지 시퀀스를 적용합니다.
+        
+        Returns:
+            (TokenEstimate, LengthTarget)
+        """
+        with span('token.estimate'):
+            token_estimate = get_token_estimator().estimate(
+                prompt=prompt,
+                model=model,
+                specificity_level=specificity_level,
+                cognitive_goal=cognitive_goal,
+                max_tokens=max_tokens
             )
+        length_target = get_length_policy().resolve(
+            model=model,
+            specificity_level=specificity_level,
+            cognitive_goal=cognitive_goal,
+            requested_max_tokens=max_tokens,
+            estimate=token_estimate
+        )
+        token_estimate.cap_output(length_target.max_tokens)
+        logger.debug(f"사전 토큰 추정({model}): {token_estimate.to_dict()}, 길이 정책: {length_target.to_dict()}")
+        return token_estimate, length_target
+    
+    def post(self, request):
+        """LLM으로 응답 생성"""
+        serializer = LLMGenerateRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            logger.error(f"LLM 생성 요청 검증 실패: {serializer.errors}, 요청 데이터: {request.data}")
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            prepared = self._prepare(request, serializer.validated_data)
+            if isinstance(prepared, Response):
+                return prepared
             
-            # 사용량 확인 (예상 토큰 수 - 대략적으로 입력 토큰의 3배로 추정)
-            estimated_input_tokens = len(prompt.split()) * 1.3  # 단어 수 대략 토큰 수
-            estimated_output_tokens = estimated_input_tokens * 2  # output은 보통 더 많음
-            estimated_total_tokens = int(estimated_input_tokens + estimated_output_tokens)
+            session_id = prepared['session_id']
+            user = prepared['user']
+            session_manager = prepared['session_manager']
+            router = prepared['router']
+            prompt = prepared['prompt']
+            user_input = prepared['user_input']
+            quality = prepared['quality']
+            temperature = prepared['temperature']
+            max_tokens = prepared['max_tokens']
+            internet_mode = prepared['internet_mode']
+            specificity_level = prepared['specificity_level']
+            specificity_level_str = specificity_level.value
+            provider = prepared['provider']
+            model = prepared['model']
+            default_temp = prepared['default_temp']
+            length_target = prepared['length_target']
             
-            if user:
-                try:
-                    check_usage_limit(user, estimated_total_tokens)
-                except UsageLimitExceeded as e:
-                    return Response(
-                        {'error': str(e)},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
+            cascade_result = None
+            ladder = prepared['ladder']
             
-            # 온도 설정
-            if temperature is None:
-                temperature = default_temp
+            # 캐스케이드 승격/이어쓰기까지 포함한 제공자 호출 (추가 호출 수와 비용)
+            with collect_calls() as calls:
+                if ladder:
+                    logger.info(
+                        f"LLM 캐스케이드 생성: {[m for _, m, _ in ladder]}, 구체성={specificity_level_str}, 인터넷={internet_mode}"
+                    )
+                    cascade_result = run_cascade(
+                        ladder,
+                        prompt=prompt,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        specificity_level=specificity_level.value,
+                        min_length_ratio=settings.PROMPT_MATE.get('CASCADE_MIN_LENGTH_RATIO', 0.3),
+                        stats=router.cascade_stats,
+                        stop=length_target.stop,
+                        max_continuations=length_target.max_continuations,
+                        max_tokens_by_model=prepared['max_tokens_by_model']
+                    )
+                    llm_response = cascade_result.response
+                    provider = cascade_result.provider
+                    model = cascade_result.model
+                    temperature = cascade_result.temperature
+                else:
+                    # 온도 설정
+                    if temperature is None:
+                        temperature = default_temp
+                    
+                    # LLM 호출
+                    logger.info(f"LLM 생성: {provider.__class__.__name__}, {model}, 구체성={specificity_level_str}, 인터넷={internet_mode}")
+                    # 정책 한도에서 잘린 경우에만 이어서 생성
+                    llm_response = generate_with_continuation(
+                        provider,
+                        prompt=prompt,
+                        model=model,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        stop=length_target.stop,
+                        max_continuations=length_target.max_continuations,
+                        continuation_tokens=length_target.continuation_tokens
+                    )
             
-            # LLM 호출
-            logger.info(f"LLM 생성: {provider.__class__.__name__}, {model}, 구체성={specificity_level_str}, 인터넷={internet_mode}")
-            llm_response = provider.generate(
-                prompt=prompt,
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
+            # 캐스케이드 승격 시 앞 단계 토큰도 실제 사용량에 포함
+            tokens_used = cascade_result.tokens_used if cascade_result else llm_response.tokens_used
+            latency_ms = (time.perf_counter() - prepared['started_at']) * 1000
+            if cascade_result:
+                route = 'cascade'
+            elif isinstance(provider, HedgedProvider):
+                route = 'hedged'
+            else:
+                route = 'direct'
             
             # 이력 저장
             history = session_manager.save_prompt_history(
@@ -591,14 +786,27 @@ class LLMGenerateView(APIView):
                 model_used=model,
                 provider=provider.__class__.__name__,
                 response=llm_response.content,
-                tokens_used=llm_response.tokens_used,
+                tokens_used=tokens_used,
                 temperature=temperature,
-                quality_level=quality
+                quality_level=quality,
+                finish_reason=llm_response.finish_reason,
+                prompt_tokens=llm_response.prompt_tokens,
+                completion_tokens=llm_response.completion_tokens,
+                specificity_level=specificity_level_str,
+                cognitive_goal=prepared['cognitive_goal'],
+                task_type=TaskType.FINAL_GENERATION.value,
+                route=route,
+                latency_ms=latency_ms,
+                ttft_ms=latency_ms,  # 비스트리밍은 응답 전체가 한 번에 전달됨
+                cached_tokens=llm_response.cached_tokens,
+                retries=max(0, len(calls) - 1),
+                cost_usd=sum(call.cost_usd for call in calls if call.ok) if calls else None
             )
             
             # 사용량 업데이트
             if user:
-                update_usage(user, llm_response.tokens_used, model_name=model)
+                with span('db.usage'):
+                    update_usage(user, tokens_used, model_name=model)
             
             # 인터넷 모드: 참고자료 저장
             references = []
@@ -641,9 +849,11 @@ class LLMGenerateView(APIView):
                 'model_used': model,
                 'provider': provider.__class__.__name__,
                 'response': llm_response.content,
-                'tokens_used': llm_response.tokens_used,
+                'tokens_used': tokens_used,
                 'quality_level': quality,
-                'references': references if internet_mode else []
+                'references': references if internet_mode else [],
+                'cascade': cascade_result.to_dict() if cascade_result else None,
+                'token_estimate': prepared['token_estimate'].to_dict()
             }
             
             response_serializer = LLMGenerateResponseSerializer(response_data)
@@ -657,6 +867,150 @@ class LLMGenerateView(APIView):
             )
 
 
+class LLMGenerateStreamView(LLMGenerateView):
+    """
+    LLM 스트리밍 생성 API (Server-Sent Events)
+    
+    POST /api/llm/generate/stream/
+    
+    이벤트: start(모델 정보) → delta(텍스트 조각) ... → done(이력 ID, 토큰) 또는 error
+    
+    클라이언트가 연결을 끊으면 업스트림 제공자 요청을 닫아 생성을 중단하고,
+    그때까지 생성된 부분 응답을 finish_reason='cancelled'로 저장하며
+    실제 생성된 토큰만 사용량에 반영합니다. 캐스케이드와 잘린 응답 이어쓰기는 적용하지 않습니다
+    (출력 길이 정책의 max_tokens/정지 시퀀스는 적용, 잘리면 done 이벤트의 finish_reason으로 전달).
+    """
+    supports_cascade = False
+    
+    def post(self, request):
+        """LLM 응답을 스트리밍으로 생성"""
+        serializer = LLMGenerateRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            logger.error(f"LLM 스트리밍 요청 검증 실패: {serializer.errors}, 요청 데이터: {request.data}")
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            prepared = self._prepare(request, serializer.validated_data)
+            if isinstance(prepared, Response):
+                return prepared
+            
+            provider = prepared['provider']
+            model = prepared['model']
+            temperature = prepared['temperature']
+            if temperature is None:
+                temperature = prepared['default_temp']
+            
+            logger.info(
+                f"LLM 스트리밍 생성: {provider.__class__.__name__}, {model}, "
+                f"구체성={prepared['specificity_level'].value}, 인터넷={prepared['internet_mode']}"
+            )
+            stream = provider.generate_stream(
+                prompt=prepared['prompt'],
+                model=model,
+                temperature=temperature,
+                max_tokens=prepared['max_tokens'],
+                stop=prepared['length_target'].stop
+            )
+        except Exception as e:
+            logger.error(f"LLM 스트리밍 준비 실패: {e}", exc_info=True)
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        response = StreamingHttpResponse(
+            self._events(prepared, stream, temperature),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # 프록시 버퍼링 방지
+        return response
+    
+    @staticmethod
+    def _sse(event: str, data) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    def _events(self, prepared, stream, temperature):
+        """
+        SSE 이벤트 제너레이터
+        
+        연결이 끊기면 WSGI 서버가 응답을 close()하고, 이 제너레이터에 GeneratorExit가 전달됩니다.
+        """
+        yield self._sse('start', {
+            'session_id': prepared['session_id'],
+            'model_used': prepared['model'],
+            'provider': prepared['provider'].__class__.__name__,
+            'quality_level': prepared['quality'],
+        })
+        
+        try:
+            for text in stream:
+                if prepared.get('ttft_ms') is None:
+                    prepared['ttft_ms'] = (time.perf_counter() - prepared['started_at']) * 1000
+                yield self._sse('delta', {'text': text})
+        except GeneratorExit:
+            # 클라이언트 연결 끊김 → 업스트림 요청을 닫고 부분 응답만 저장/과금
+            stream.close()
+            logger.info(
+                f"LLM 스트리밍 취소: {prepared['model']}, "
+                f"{len(stream.content)}자 생성, {stream.tokens_used} 토큰"
+            )
+            self._save(prepared, stream, temperature)
+            raise
+        except Exception as e:
+            logger.error(f"LLM 스트리밍 실패: {e}", exc_info=True)
+            stream.finish_reason = 'error'
+            stream.close()
+            self._save(prepared, stream, temperature)
+            yield self._sse('error', {'error': str(e)})
+            return
+        
+        history = self._save(prepared, stream, temperature)
+        yield self._sse('done', {
+            'prompt_history_id': str(history.id) if history else None,
+            'tokens_used': stream.tokens_used,
+            'finish_reason': stream.finish_reason,
+        })
+    
+    def _save(self, prepared, stream, temperature):
+        """(부분) 응답 이력 저장 및 실제 생성된 토큰만큼 사용량 반영"""
+        if not stream.started:
+            return None
+        
+        user = prepared['user']
+        model = prepared['model']
+        trace = prepared['trace']
+        try:
+            history = prepared['session_manager'].save_prompt_history(
+                original_prompt=prepared['user_input'] or prepared['prompt'],
+                synthesized_prompt=prepared['prompt'],
+                model_used=model,
+                provider=prepared['provider'].__class__.__name__,
+                response=stream.content,
+                tokens_used=stream.tokens_used,
+                temperature=temperature,
+                quality_level=prepared['quality'],
+                finish_reason=stream.finish_reason,
+                prompt_tokens=stream.prompt_tokens,
+                completion_tokens=stream.completion_tokens,
+                specificity_level=prepared['specificity_level'].value,
+                cognitive_goal=prepared['cognitive_goal'],
+                stage_timings=trace.stage_timings() if trace else None,
+                task_type=TaskType.FINAL_GENERATION.value,
+                route='stream',
+                latency_ms=(time.perf_counter() - prepared['started_at']) * 1000,
+                ttft_ms=prepared.get('ttft_ms'),
+                cached_tokens=stream.cached_tokens
+            )
+            if user:
+                with span('db.usage'):
+                    update_usage(user, stream.tokens_used, model_name=model)
+            return history
+        except Exception as e:
+            logger.error(f"스트리밍 이력 저장 실패: {e}", exc_info=True)
+            return None
+
+
 class FeedbackCreateView(APIView):
     """
     피드백 생성 API
@@ -697,3 +1051,186 @@ class FeedbackCreateView(APIView):
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class RouterStatsView(APIView):
+    """
+    LLM 라우터 계측 조회 API (관리자 전용)
+    
+    GET /api/llm/router/stats
+    
+    현재 워커의 모델별 지연/토큰 통계, 헤징 추가 비용 및 p99 개선, single-flight 병합 현황
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        """라우터 통계 반환"""
+        return Response(get_router().get_stats(), status=status.HTTP_200_OK)
+
+
+class PromptAnalyticsView(APIView):
+    """
+    프롬프트 이력 분석 API (관리자 전용)
+    
+    GET /api/analytics/prompts/?window=7d&group_by=model,quality&interval=day
+    
+    쿼리 파라미터:
+        window: 최근 기간 (예: 90m, 24h, 7d, 기본 24h) 또는 since/until (ISO 8601)
+        group_by: model, provider, task, quality 조합 (쉼표 구분, 기본 model, 'none'이면 전체 합계만)
+        interval: hour | day (그룹별 시계열 포함)
+    
+    그룹별 요청 수, 지연/첫 토큰 시간 p50/p95, 토큰, 추가 호출 수, 추정 비용을 반환합니다.
+    닫힌 시간대는 시간별 집계(PromptHistoryRollup)만, 열린 최근 시간대는 그 구간의 이력만 읽으므로
+    이력 테이블 크기와 무관합니다.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        """기간별 집계 반환"""
+        params = request.query_params
+        try:
+            until = self._parse_datetime(params.get('until')) or timezone.now()
+            since = self._parse_datetime(params.get('since')) or until - parse_window(params.get('window', ''))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if since >= until:
+            return Response({'error': 'since는 until보다 앞서야 합니다.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        group_by = [name.strip() for name in params.get('group_by', 'model').split(',') if name.strip()]
+        if group_by == ['none']:
+            group_by = []
+        unknown = [name for name in group_by if name not in GROUP_FIELDS]
+        if unknown:
+            return Response(
+                {'error': f'group_by는 {", ".join(GROUP_FIELDS)} 중에서 선택해야 합니다: {", ".join(unknown)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        interval = params.get('interval') or None
+        if interval not in (None, 'hour', 'day'):
+            return Response({'error': 'interval은 hour 또는 day여야 합니다.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(
+            get_analytics(since=since, until=until, group_by=group_by, interval=interval),
+            status=status.HTTP_200_OK
+        )
+    
+    @staticmethod
+    def _parse_datetime(value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f'날짜 형식이 올바르지 않습니다 (ISO 8601): {value}')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+
+class ReadinessView(APIView):
+    """
+    워커 준비 상태 API
+    
+    GET /api/health/ready/
+    
+    부팅 훅(gunicorn post_worker_init)의 워밍업이 끝났으면 200, 아니면 503과 단계별 워밍업 시간을 반환합니다.
+    프로브는 저장된 상태만 읽으며 워밍업을 수행하지 않습니다.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    
+    def get(self, request):
+        """준비 상태 반환"""
+        readiness = get_readiness()
+        return Response(
+            readiness,
+            status=status.HTTP_200_OK if readiness['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+
+class DailyCostView(APIView):
+    """
+    일별 비용 API
+    
+    GET /api/costs/daily/?days=7
+    GET /api/costs/daily/?days=30&scope=all   (스태프: 전체 사용자)
+    
+    비용 원장(CostLedgerEntry) 기준 날짜별 총액, 세션 수, 세션당 평균 비용을 반환합니다.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        """최근 N일 일별 비용"""
+        try:
+            days = int(request.query_params.get('days', 7))
+        except ValueError:
+            return Response({'error': 'days는 정수여야 합니다.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= days <= 90:
+            return Response({'error': 'days는 1~90 사이여야 합니다.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        scope = request.query_params.get('scope')
+        if scope == 'all' and not request.user.is_staff:
+            return Response({'error': '전체 비용은 관리자만 볼 수 있습니다.'}, status=status.HTTP_403_FORBIDDEN)
+        user = None if scope == 'all' else request.user
+        return Response(daily_costs(user=user, days=days), status=status.HTTP_200_OK)
+
+
+class MemoryDiagnosticsView(APIView):
+    """
+    워커 메모리 진단 API (관리자 전용)
+    
+    GET /api/debug/memory/
+    현재/최고 RSS, 워터마크 기록, tracemalloc 상태 (?objects=1이면 타입별 객체 수와 이전 조회 대비 증가분 포함)
+    
+    POST /api/debug/memory/
+    {
+        "limit": 25,
+        "key_type": "lineno" | "traceback" | "filename",
+        "reset_baseline": false
+    }
+    tracemalloc 스냅샷을 찍어 할당 위치 상위 항목과 이전/기준 스냅샷 대비 증가분, 타입별 객체 수 반환
+    (추적이 꺼져 있으면 켜고 기준 스냅샷을 저장하므로, 누수 확인은 트래픽을 보낸 뒤 한 번 더 호출)
+    
+    DELETE /api/debug/memory/
+    tracemalloc 추적 중지 및 저장된 스냅샷 삭제
+    
+    결과는 요청을 처리한 워커(pid) 하나의 값입니다.
+    """
+    permission_classes = [IsAdminUser]
+    
+    KEY_TYPES = ('lineno', 'traceback', 'filename')
+    
+    def get(self, request):
+        """메모리 상태 반환"""
+        diagnostics = get_memory_diagnostics()
+        diagnostics.ensure_watermark()
+        result = diagnostics.status()
+        if request.query_params.get('objects') in ('1', 'true'):
+            result['objects'] = diagnostics.object_growth()
+        return Response(result, status=status.HTTP_200_OK)
+    
+    def post(self, request):
+        """tracemalloc 스냅샷 비교"""
+        key_type = request.data.get('key_type', 'lineno')
+        if key_type not in self.KEY_TYPES:
+            return Response(
+                {'error': f'key_type은 {", ".join(self.KEY_TYPES)} 중 하나여야 합니다.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = max(1, min(int(request.data.get('limit', 25)), 200))
+        except (TypeError, ValueError):
+            return Response({'error': 'limit은 정수여야 합니다.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        diagnostics = get_memory_diagnostics()
+        result = diagnostics.snapshot(
+            limit=limit,
+            key_type=key_type,
+            reset_baseline=bool(request.data.get('reset_baseline', False))
+        )
+        result['objects'] = diagnostics.object_growth(limit)
+        return Response(result, status=status.HTTP_200_OK)
+    
+    def delete(self, request):
+        """tracemalloc 추적 중지"""
+        get_memory_diagnostics().stop_tracing()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 설정
+
+워커가 애플리케이션을 로드한 직후(요청을 받기 전) 워밍업을 수행해
+첫 요청이 제공자 생성, 토크나이저 로드, DB 연결 비용을 치르지 않도록 합니다.
+WARMUP_ON_BOOT=False로 끌 수 있습니다 (준비 상태만 표시).
+
+METRICS_MULTIPROC_DIR을 지정하면 마스터 시작 시 이전 실행의 워커 메트릭 스냅샷을 지웁니다.
+워커마다 RSS 워터마크 로그 스레드를 시작하고, TRACEMALLOC_ON_BOOT면 tracemalloc 추적을 켭니다.
+"""
+
+import os
+
+# 워밍업(Pinecone 인덱스 확인 등)이 기본 30초 타임아웃에 걸리지 않도록 여유
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+
+def on_starting(server):
+    directory = os.getenv('METRICS_MULTIPROC_DIR', '')
+    if directory:
+        # 마스터는 Django를 로드하지 않으므로 settings 없이 동작하는 함수만 사용
+        from prompt_mate.metrics import clear_multiproc_dir
+        clear_multiproc_dir(directory)
+
+
+def post_worker_init(worker):
+    from django.conf import settings
+    from prompt_mate.memory import get_memory_diagnostics
+    diagnostics = get_memory_diagnostics()
+    if settings.PROMPT_MATE.get('TRACEMALLOC_ON_BOOT'):
+        diagnostics.start_tracing()
+    diagnostics.ensure_watermark()
+
+    from prompt_mate.warmup import mark_ready, preload
+    if os.getenv('WARMUP_ON_BOOT', 'True') != 'True':
+        # 준비 상태 엔드포인트는 부팅 훅이 표시한 상태만 읽으므로 워밍업 없이 준비 표시
+        mark_ready()
+        return
+    readiness = preload()
+    worker.log.info(f"워커 워밍업: {readiness['status']} ({readiness['total_ms']}ms)")
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+적응형 라우팅 정책
+
+고정 전략표(TASK_MODEL_STRATEGY) 대신, 계측된 롤링 통계(지연 시간, 에러율, 실효 토큰 비용)를 보고
+작업마다 요구 품질 등급을 만족하면서 지연 SLO 안에 드는 가장 저렴한 모델을 선택합니다.
+
+- 품질 등급: 모델별 고정 등급 (1=low, 2=balanced, 3=high)
+- 비용: 관측된 1K 토큰당 실효 비용, 샘플이 없으면 가격표의 혼합 가격
+- 지연/에러율: 샘플이 min_samples 이상 쌓인 모델에만 SLO를 적용 (콜드 스타트 모델은 통과)
+- 후보가 없으면 None을 반환하고, 라우터가 고정 전략으로 폴백합니다.
+
+최근 결정은 링 버퍼에 남겨 라우터 통계(get_stats()['routing'])로 설명할 수 있게 합니다.
+결정마다 선택 모델보다 저렴했지만 제외된 후보와 사유(skipped), 샘플이 부족해
+지연/에러율 SLO를 검증하지 못한 후보(unverified)를 함께 남깁니다.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from .capabilities import MODEL_CAPABILITIES, models_for_provider
+from .instrumentation import get_model_stats
+from .pricing import blended_price_per_1k
+
+logger = logging.getLogger(__name__)
+
+
+# 모델별 품질 등급 (1=low, 2=balanced, 3=high) - 능력 레지스트리에서 파생
+MODEL_QUALITY_TIERS: Dict[str, int] = {
+    name: caps.quality_tier
+    for name, caps in MODEL_CAPABILITIES.items()
+    if caps.quality_tier is not None
+}
+
+QUALITY_TIER_BY_LEVEL = {'low': 1, 'balanced': 2, 'high': 3}
+
+
+def parse_task_map(value: str) -> Dict[str, float]:
+    """'intent_parsing=3000,final_generation=30000' 형식 설정 파싱"""
+    result = {}
+    for item in value.split(','):
+        key, _, raw = item.partition('=')
+        if key.strip() and raw.strip():
+            try:
+                result[key.strip()] = float(raw)
+            except ValueError:
+                logger.warning(f"잘못된 라우팅 설정 항목 무시: {item}")
+    return result
+
+
+class AdaptiveRoutingPolicy:
+    """
+    지연/비용 인지 라우팅 정책
+
+    Args:
+        latency_slo_ms: 작업 유형 값별 p95 지연 SLO (ms). 없는 작업은 지연 제한 없음
+        max_error_rate: 허용 최대 에러율 (최근 윈도우)
+        min_samples: 지연/에러율 SLO를 적용하기 위한 최소 샘플 수
+        history: 보관할 최근 결정 수
+    """
+
+    def __init__(
+        self,
+        latency_slo_ms: Optional[Dict[str, float]] = None,
+        max_error_rate: float = 0.2,
+        min_samples: int = 10,
+        history: int = 50
+    ):
+        self.latency_slo_ms = latency_slo_ms or {}
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self._decisions = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self.selections = 0
+        self.fallbacks = 0
+
+    def select(
+        self,
+        task: str,
+        required_tier: int,
+        providers: List[str],
+        allowed_models: Optional[List[str]] = None,
+        preferred_provider: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        조건을 만족하는 가장 저렴한 모델 선택
+
+        후보 모델은 능력 레지스트리에서 가져오므로 제공자를 생성하지 않습니다
+        (라우터는 선택된 제공자만 생성).
+
+        Args:
+            task: 작업 유형 값
+            required_tier: 요구 품질 등급
+            providers: 사용 가능한 제공자 이름 목록
+            allowed_models: 플랜에서 허용된 모델 (None이면 제한 없음)
+            preferred_provider: 선호 제공자 (지정 시 해당 제공자 모델만 후보)
+
+        Returns:
+            선택된 후보 정보 (provider, model, tier, cost_per_1k, ...) 또는 None
+        """
+        slo_ms = self.latency_slo_ms.get(task)
+        stats_registry = get_model_stats()
+        candidates = []
+
+        for provider_name in providers:
+            if preferred_provider and provider_name != preferred_provider:
+                continue
+            for model in models_for_provider(provider_name):
+                tier = MODEL_QUALITY_TIERS.get(model)
+                if tier is None:
+                    continue
+                stats = stats_registry.get(provider_name, model)
+                samples = len(stats.latency)
+                p95 = stats.latency.percentile(95)
+                error_rate = stats.error_rate
+                observed_cost = stats.cost_per_1k_tokens
+                cost = observed_cost if observed_cost is not None else blended_price_per_1k(model)
+
+                candidate = {
+                    'provider': provider_name,
+                    'model': model,
+                    'tier': tier,
+                    'cost_per_1k': cost,
+                    'cost_source': 'observed' if observed_cost is not None else 'list_price',
+                    'p95_ms': p95,
+                    'error_rate': error_rate,
+                    'samples': samples,
+                    'rejected': None,
+                    'detail': None,
+                }
+
+                if tier < required_tier:
+                    candidate['rejected'] = 'quality_tier'
+                    candidate['detail'] = f"tier {tier} < {required_tier}"
+                elif allowed_models is not None and model not in allowed_models:
+                    candidate['rejected'] = 'plan'
+                    candidate['detail'] = 'not in plan'
+                elif cost is None:
+                    candidate['rejected'] = 'unknown_price'
+                    candidate['detail'] = 'no price'
+                elif len(stats.outcomes) >= self.min_samples and error_rate > self.max_error_rate:
+                    candidate['rejected'] = 'error_rate'
+                    candidate['detail'] = f"error rate {error_rate:.2f} > {self.max_error_rate:.2f}"
+                elif slo_ms is not None and samples >= self.min_samples and p95 > slo_ms:
+                    candidate['rejected'] = 'latency_slo'
+                    candidate['detail'] = f"p95 {p95:.0f}ms > SLO {slo_ms:.0f}ms"
+                candidates.append(candidate)
+
+        eligible = [c for c in candidates if c['rejected'] is None]
+        # 비용 → 등급(낮은 쪽) → p95(샘플 없으면 뒤로) 순
+        eligible.sort(key=lambda c: (
+            c['cost_per_1k'],
+            c['tier'],
+            c['p95_ms'] if c['p95_ms'] is not None else float('inf')
+        ))
+        selected = eligible[0] if eligible else None
+
+        with self._lock:
+            if selected:
+                self.selections += 1
+            else:
+                self.fallbacks += 1
+            self._decisions.append({
+                'timestamp': time.time(),
+                'task': task,
+                'required_tier': required_tier,
+                'selected': f"{selected['provider']}:{selected['model']}" if selected else None,
+                'cost_per_1k': selected['cost_per_1k'] if selected else None,
+                'skipped': self._skipped(candidates, selected),
+                # 샘플 부족(too few samples)으로 SLO 검사 없이 통과한 후보
+                'unverified': [f"{c['provider']}:{c['model']}" for c in eligible if c['samples'] < self.min_samples],
+            })
+
+        if selected:
+            logger.debug(
+                f"적응형 라우팅: {task} (등급≥{required_tier}) → {selected['provider']}/{selected['model']} "
+                f"(${selected['cost_per_1k']:.5f}/1K, {selected['cost_source']})"
+            )
+        else:
+            logger.warning(
+                f"적응형 라우팅: {task}에 조건을 만족하는 모델이 없어 고정 전략으로 폴백 "
+                f"(제외: {', '.join(sorted({c['rejected'] for c in candidates})) or '후보 없음'})"
+            )
+        return selected
+
+    @staticmethod
+    def _skipped(candidates: List[Dict[str, Any]], selected: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """선택 모델보다 저렴했지만 제외된 후보와 사유 (선택이 없으면 제외된 후보 전체, 저렴한 순)"""
+        skipped = [
+            c for c in candidates
+            if c['rejected'] is not None and (
+                selected is None or c['cost_per_1k'] is None or c['cost_per_1k'] < selected['cost_per_1k']
+            )
+        ]
+        skipped.sort(key=lambda c: (c['cost_per_1k'] is None, c['cost_per_1k'] or 0.0))
+        return [
+            {
+                'model': f"{c['provider']}:{c['model']}",
+                'reason': c['rejected'],
+                'detail': c['detail'],
+                'samples': c['samples'],
+            }
+            for c in skipped
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """라우팅 설정과 최근 결정 (최신순)"""
+        with self._lock:
+            decisions = list(self._decisions)
+        return {
+            'mode': 'adaptive',
+            'latency_slo_ms': self.latency_slo_ms,
+            'max_error_rate': self.max_error_rate,
+            'min_samples': self.min_samples,
+            'selections': self.selections,
+            'fallbacks': self.fallbacks,
+            'recent_decisions': decisions[::-1],
+        }
+
+
+def build_routing_policy(config: Dict[str, Any]) -> Optional[AdaptiveRoutingPolicy]:
+    """settings.PROMPT_MATE 설정에서 라우팅 정책 생성 (고정 전략 모드면 None)"""
+    if config.get('ROUTING_MODE', 'static') != 'adaptive':
+        return None
+    return AdaptiveRoutingPolicy(
+        latency_slo_ms=parse_task_map(config.get('ROUTING_LATENCY_SLO_MS', '')),
+        max_error_rate=config.get('ROUTING_MAX_ERROR_RATE', 0.2),
+        min_samples=config.get('ROUTING_MIN_SAMPLES', 10),
+    )
@@ -12,11 +12,17 @@ from typing import Dict, Any, Optional, List
 from .base import (
     BaseLLMProvider,
     LLMResponse,
+    LLMStream,
     LLMProviderError,
     RateLimitError,
     InvalidResponseError,
-    ModelNotFoundError
+    ModelNotFoundError,
+    apply_stop
 )
+from .capabilities import get_capabilities, models_for_provider
+from .single_flight import coalesced
+from .structured import JSON_SYSTEM_PROMPT, check_schema, finalize_json, schema_name
+from .tokenizer import get_tokenizer
 
 logger = logging.getLogger(__name__)
 
@@ -24,13 +30,9 @@ logger = logging.getLogger(__name__)
 class AnthropicProvider(BaseLLMProvider):
     """Anthropic API Provider"""
     
-    AVAILABLE_MODELS = [
-        'claude-3-5-sonnet-20241022',
-        'claude-3-5-haiku-20241022',
-        'claude-3-opus-20240229',
-        'claude-3-sonnet-20240229',
-        'claude-3-haiku-20240307',
-    ]
+    PROVIDER_NAME = 'anthropic'
+    
+    AVAILABLE_MODELS = models_for_provider('anthropic')
     
     def __init__(self, api_key: str, default_model: str = 'claude-3-5-haiku-20241022'):
         super().__init__(api_key, default_model)
@@ -54,6 +56,7 @@ class AnthropicProvider(BaseLLMProvider):
             logger.error(f"Anthropic 클라이언트 초기화 실패: {e}")
             raise LLMProviderError(f"Anthropic 초기화 실패: {e}")
     
+    @coalesced
     def generate(
         self,
         prompt: str,
@@ -61,6 +64,7 @@ class AnthropicProvider(BaseLLMProvider):
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
         system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
         **kwargs
     ) -> LLMResponse:
         """텍스트 생성"""
@@ -85,13 +89,23 @@ class AnthropicProvider(BaseLLMProvider):
             }
             
             if system_prompt:
-                message_params["system"] = system_prompt
+                message_params["system"] = self._cached_system(system_prompt)
+            
+            native_stop, local_stop = self._split_stop(stop)
+            if native_stop:
+                message_params["stop_sequences"] = native_stop
             
-            response = self.client.messages.create(**message_params)
+            with self.observe_call(model, 'generate') as call:
+                response = self.client.messages.create(**message_params)
+                call.record_usage(**self._usage(response.usage))
+                tokens_used = call.tokens_used
             
             content = response.content[0].text
-            tokens_used = response.usage.input_tokens + response.usage.output_tokens
             finish_reason = response.stop_reason
+            if local_stop:
+                content, stopped = apply_stop(content, local_stop)
+                if stopped:
+                    finish_reason = 'stop_sequence'
             
             logger.debug(f"Anthropic 생성 완료: {tokens_used} 토큰 사용")
             
@@ -100,7 +114,10 @@ class AnthropicProvider(BaseLLMProvider):
                 model=model,
                 tokens_used=tokens_used,
                 finish_reason=finish_reason,
-                raw_response=response
+                raw_response=response,
+                prompt_tokens=call.prompt_tokens,
+                completion_tokens=call.completion_tokens,
+                cached_tokens=call.cached_tokens
             )
         
         except Exception as e:
@@ -112,6 +129,7 @@ class AnthropicProvider(BaseLLMProvider):
             else:
                 raise LLMProviderError(f"Anthropic API 호출 실패: {error_msg}")
     
+    @coalesced
     def generate_json(
         self,
         prompt: str,
@@ -126,71 +144,162 @@ class AnthropicProvider(BaseLLMProvider):
             raise LLMProviderError("Anthropic 클라이언트가 초기화되지 않았습니다.")
         
         model = model or self.default_model
+        caps = get_capabilities(model)
+        # 스키마가 주어지면 입력 스키마가 곧 출력 스키마인 도구를 강제 호출하게 해 구조를 API에서 보장
+        native_schema = bool(schema) and caps is not None and caps.json_schema
         
-        # JSON 모드 지시 추가
-        json_instruction = "\n\n반드시 유효한 JSON 형식으로만 응답하세요. ```json 마커나 다른 텍스트 없이 순수 JSON만 반환하세요."
-        full_prompt = prompt + json_instruction
-        
-        # 시스템 프롬프트에도 JSON 요청 추가
-        if system_prompt:
-            full_system_prompt = system_prompt + "\n\n당신은 항상 순수 JSON 형식으로만 응답합니다."
+        if native_schema:
+            full_prompt = prompt
         else:
-            full_system_prompt = "당신은 JSON 형식으로 응답하는 AI 어시스턴트입니다. 순수 JSON만 반환하고 다른 텍스트는 포함하지 마세요."
+            # JSON 모드 지시 추가
+            full_prompt = prompt + "\n\n반드시 유효한 JSON 형식으로만 응답하세요. ```json 마커나 다른 텍스트 없이 순수 JSON만 반환하세요."
+        
+        # 시스템 프롬프트는 바이트 그대로 캐시 블록으로 전달 (JSON 지시는 사용자 메시지 끝에)
+        full_system_prompt = system_prompt or JSON_SYSTEM_PROMPT
         
         max_tokens = kwargs.pop('max_tokens', 4096)
         
+        api_params = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": full_prompt}],
+            **kwargs
+        }
+        api_params["system"] = self._cached_system(full_system_prompt)
+        if native_schema:
+            tool_name = schema_name(schema)
+            api_params["tools"] = [{
+                "name": tool_name,
+                "description": "요청된 구조로 결과를 반환합니다.",
+                "input_schema": {key: value for key, value in schema.items() if key != 'title'},
+            }]
+            api_params["tool_choice"] = {"type": "tool", "name": tool_name}
+        
         try:
-            response = self.client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                system=full_system_prompt,
-                messages=[{"role": "user", "content": full_prompt}],
-                **kwargs
-            )
+            with self.observe_call(model, 'generate_json') as call:
+                response = self.client.messages.create(**api_params)
+                call.record_usage(**self._usage(response.usage))
             
-            content = response.content[0].text
+            if native_schema:
+                for block in response.content:
+                    if getattr(block, 'type', None) == 'tool_use':
+                        call.raw_content = json.dumps(block.input, ensure_ascii=False)
+                        return check_schema(block.input, schema)
+                logger.warning("도구 호출 블록이 없어 텍스트 응답을 JSON으로 파싱합니다.")
             
-            # JSON 파싱
-            try:
-                # ```json 마커 제거
-                content = content.strip()
-                if content.startswith('```json'):
-                    content = content[7:]
-                if content.startswith('```'):
-                    content = content[3:]
-                if content.endswith('```'):
-                    content = content[:-3]
-                content = content.strip()
-                
-                parsed_json = json.loads(content)
-                logger.debug(f"JSON 파싱 성공: {len(content)} 문자")
-                return parsed_json
-            except json.JSONDecodeError as je:
-                logger.error(f"JSON 파싱 실패: {je}")
-                # 재시도: content에서 JSON 추출 시도
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    try:
-                        return json.loads(json_match.group())
-                    except:
-                        pass
-                raise InvalidResponseError(f"JSON 파싱 실패: {content[:200]}")
+            content = ''.join(
+                block.text for block in response.content if getattr(block, 'type', None) == 'text'
+            )
+            call.raw_content = content
+            return finalize_json(content, schema)
         
         except (RateLimitError, InvalidResponseError, ModelNotFoundError):
             raise
         except Exception as e:
             raise LLMProviderError(f"Anthropic JSON 생성 실패: {str(e)}")
     
+    def generate_stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
+        **kwargs
+    ) -> LLMStream:
+        """스트리밍 텍스트 생성 (close() 시 SSE 연결을 닫아 업스트림 생성 중단)"""
+        if not self.client:
+            raise LLMProviderError("Anthropic 클라이언트가 초기화되지 않았습니다.")
+        
+        model = model or self.default_model
+        
+        if model not in self.AVAILABLE_MODELS:
+            raise ModelNotFoundError(f"모델 '{model}'을 사용할 수 없습니다. 사용 가능: {self.AVAILABLE_MODELS}")
+        
+        message_params = {
+            "model": model,
+            "max_tokens": max_tokens or 4096,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+        }
+        if system_prompt:
+            message_params["system"] = self._cached_system(system_prompt)
+        
+        native_stop, local_stop = self._split_stop(stop)
+        if native_stop:
+            message_params["stop_sequences"] = native_stop
+        
+        stream = LLMStream(prompt, model, counter=self.count_tokens, stop=local_stop)
+        
+        def chunks():
+            with self.observe_call(model, 'generate_stream') as call:
+                try:
+                    response = self.client.messages.create(**message_params)
+                except Exception as e:
+                    raise LLMProviderError(f"Anthropic 스트리밍 호출 실패: {e}")
+                try:
+                    for event in response:
+                        if event.type == 'message_start':
+                            usage = self._usage(event.message.usage)
+                            stream.prompt_tokens = usage['prompt_tokens']
+                            stream.cached_tokens = usage['cached_tokens']
+                            stream.cache_write_tokens = usage['cache_write_tokens']
+                        elif event.type == 'content_block_delta' and event.delta.type == 'text_delta':
+                            yield event.delta.text
+                        elif event.type == 'message_delta':
+                            stream.finish_reason = event.delta.stop_reason
+                            stream.completion_tokens = event.usage.output_tokens
+                except Exception as e:
+                    raise LLMProviderError(f"Anthropic 스트리밍 실패: {e}")
+                finally:
+                    # 클라이언트가 끊긴 경우(GeneratorExit) 연결을 닫아 업스트림 생성도 중단
+                    response.close()
+                    stream.record_usage(call)
+        
+        return stream.bind(chunks())
+    
+    @staticmethod
+    def _cached_system(system_prompt: str) -> List[Dict[str, Any]]:
+        """
+        시스템 프롬프트를 캐시 중단점(cache_control)이 붙은 블록으로 변환
+        
+        도구 정의와 시스템 프롬프트까지의 접두사가 캐시되어 반복 호출은 캐시 읽기 단가로 과금되고
+        첫 토큰까지의 시간이 줄어듭니다. 최소 캐시 길이보다 짧으면 API가 캐시 없이 처리합니다.
+        """
+        return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+    
+    @staticmethod
+    def _usage(usage: Any) -> Dict[str, int]:
+        """
+        Anthropic usage를 공통 형식으로 변환
+        
+        input_tokens에는 캐시 읽기/쓰기 토큰이 빠져 있으므로 합쳐서 전체 입력 토큰으로 기록합니다.
+        """
+        cached = getattr(usage, 'cache_read_input_tokens', None) or 0
+        written = getattr(usage, 'cache_creation_input_tokens', None) or 0
+        return {
+            'prompt_tokens': (getattr(usage, 'input_tokens', None) or 0) + cached + written,
+            'completion_tokens': getattr(usage, 'output_tokens', None) or 0,
+            'cached_tokens': cached,
+            'cache_write_tokens': written,
+        }
+    
+    @staticmethod
+    def _split_stop(stop: Optional[List[str]]):
+        """정지 시퀀스를 (API 전달용, 로컬 적용용)으로 분리 (API는 공백만 있는 시퀀스를 거부)"""
+        if not stop:
+            return None, None
+        native = [s for s in stop if s.strip()]
+        local = [s for s in stop if s and not s.strip()]
+        return native or None, local or None
+    
     def count_tokens(self, text: str) -> int:
         """토큰 수 계산 (근사치)"""
-        # Anthropic의 토큰 계산도 비슷한 방식
-        # 더 정확한 계산을 위해서는 anthropic의 토큰 카운터 사용 필요
-        korean_chars = len([c for c in text if '가' <= c <= '힣'])
-        other_chars = len(text) - korean_chars
-        estimated = (korean_chars * 2) + (other_chars // 4)
-        return max(1, estimated)
+        # 로컬 토크나이저가 없으므로 문자 종류별 추정
+        return get_tokenizer().estimate(text)
     
     def get_available_models(self) -> List[str]:
         """사용 가능한 모델 목록"""
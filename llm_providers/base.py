@@ -6,9 +6,12 @@ LLM Provider 추상 기본 클래스
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator, Callable, Tuple
 import logging
 
+from .capabilities import get_capabilities
+from .instrumentation import observe_call
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,13 +24,20 @@ class LLMResponse:
         model: str,
         tokens_used: int = 0,
         finish_reason: Optional[str] = None,
-        raw_response: Optional[Any] = None
+        raw_response: Optional[Any] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0
     ):
         self.content = content
         self.model = model
         self.tokens_used = tokens_used
         self.finish_reason = finish_reason
         self.raw_response = raw_response
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        # prompt_tokens 중 제공자 프롬프트 캐시에서 읽은 토큰 수
+        self.cached_tokens = cached_tokens
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -35,7 +45,181 @@ class LLMResponse:
             'model': self.model,
             'tokens_used': self.tokens_used,
             'finish_reason': self.finish_reason,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cached_tokens': self.cached_tokens,
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LLMResponse':
+        """to_dict() 결과로부터 복원 (캐시/워커 간 공유용)"""
+        return cls(
+            content=data.get('content', ''),
+            model=data.get('model', ''),
+            tokens_used=data.get('tokens_used', 0),
+            finish_reason=data.get('finish_reason'),
+            prompt_tokens=data.get('prompt_tokens', 0),
+            completion_tokens=data.get('completion_tokens', 0),
+            cached_tokens=data.get('cached_tokens', 0),
+        )
+
+
+# 능력 레지스트리에 없는 추론(reasoning) 모델 접두사:
+# 출력 토큰 한도에 추론 토큰이 포함되고 stop 파라미터를 받지 않음
+REASONING_MODEL_PREFIXES = ('gpt-5', 'o1', 'o3')
+
+
+def is_reasoning_model(model: Optional[str]) -> bool:
+    caps = get_capabilities(model)
+    if caps is not None:
+        return caps.reasoning
+    return bool(model) and model.startswith(REASONING_MODEL_PREFIXES)
+
+
+def apply_stop(content: str, stop: Optional[List[str]]) -> Tuple[str, bool]:
+    """
+    정지 시퀀스를 API에 보낼 수 없는 모델용: 가장 먼저 나온 정지 시퀀스 앞에서 자르기
+    
+    응답 앞의 공백/빈 줄은 건너뛰고 찾습니다 (빈 줄로 시작하는 응답이 '\n\n'에서 빈 응답이 되지 않도록).
+    
+    Returns:
+        (잘린 텍스트, 정지 시퀀스 발견 여부)
+    """
+    if not stop or not content:
+        return content, False
+    start = len(content) - len(content.lstrip())
+    positions = [i for i in (content.find(s, start) for s in stop if s) if i >= 0]
+    if not positions:
+        return content, False
+    return content[:min(positions)], True
+
+
+class LLMStream:
+    """
+    스트리밍 LLM 응답
+    
+    반복하면 생성된 텍스트 조각을 순서대로 돌려줍니다. 스트림이 끝나면 finish_reason과
+    토큰 사용량이 채워지고, 도중에 close()하면 업스트림 요청을 닫고
+    finish_reason을 'cancelled'로 남깁니다 (토큰은 실제 생성된 만큼만 집계).
+    
+    stop을 주면 정지 시퀀스를 로컬에서 적용합니다 (API가 정지 시퀀스를 지원하지 않는 모델용).
+    정지 시퀀스가 조각 경계에 걸칠 수 있으므로 가장 긴 시퀀스 길이만큼 출력을 늦춥니다.
+    """
+    
+    CANCELLED = 'cancelled'
+    
+    def __init__(
+        self,
+        prompt: str,
+        model: str,
+        counter: Optional[Callable[[str], int]] = None,
+        stop: Optional[List[str]] = None
+    ):
+        self.prompt = prompt
+        self.model = model
+        self.parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+        self._counter = counter
+        self._source: Optional[Iterator[str]] = None
+        self._stop = [s for s in (stop or []) if s]
+        self.started = False
+    
+    def bind(self, source: Iterator[str]) -> 'LLMStream':
+        """제공자의 텍스트 조각 제너레이터 연결"""
+        self._source = source
+        return self
+    
+    def __iter__(self) -> Iterator[str]:
+        self.started = True
+        if self._stop:
+            yield from self._iter_with_stop()
+        else:
+            for text in self._source:
+                if text:
+                    self.parts.append(text)
+                    yield text
+        if self.finish_reason is None:
+            self.finish_reason = 'stop'
+        self._fill_usage()
+    
+    def _iter_with_stop(self) -> Iterator[str]:
+        hold = max(len(s) for s in self._stop) - 1
+        emitted = 0
+        for text in self._source:
+            if not text:
+                continue
+            self.parts.append(text)
+            content, hit = apply_stop(self.content, self._stop)
+            if hit:
+                # 정지 시퀀스 이후는 버리고 업스트림 요청 종료
+                self.parts = [content]
+                self.finish_reason = 'stop'
+                if content[emitted:]:
+                    yield content[emitted:]
+                if hasattr(self._source, 'close'):
+                    self._source.close()
+                return
+            safe = len(content) - hold
+            if safe > emitted:
+                yield content[emitted:safe]
+                emitted = safe
+        content = self.content
+        if content[emitted:]:
+            yield content[emitted:]
+    
+    def close(self):
+        """업스트림 요청 취소 (이미 끝난 스트림이면 아무 것도 하지 않음)"""
+        if self.finish_reason is None:
+            self.finish_reason = self.CANCELLED
+        if self._source is not None and hasattr(self._source, 'close'):
+            self._source.close()
+        self._fill_usage()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self.finish_reason == self.CANCELLED
+    
+    @property
+    def content(self) -> str:
+        return ''.join(self.parts)
+    
+    @property
+    def tokens_used(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+    
+    def record_usage(self, call):
+        """계측 호출(ProviderCall)에 최종 사용량 기록 (제공자 제너레이터의 finally에서 호출)"""
+        self._fill_usage()
+        call.record_usage(
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            cached_tokens=self.cached_tokens,
+            cache_write_tokens=self.cache_write_tokens
+        )
+    
+    def _fill_usage(self):
+        """제공자가 사용량을 주지 않았으면(취소 등) 생성된 텍스트로 추정"""
+        if self._counter is None or not self.started:
+            return
+        if not self.prompt_tokens:
+            self.prompt_tokens = self._counter(self.prompt)
+        if not self.completion_tokens and self.parts:
+            self.completion_tokens = self._counter(self.content)
+    
+    def to_response(self) -> LLMResponse:
+        return LLMResponse(
+            content=self.content,
+            model=self.model,
+            tokens_used=self.tokens_used,
+            finish_reason=self.finish_reason,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            cached_tokens=self.cached_tokens
+        )
 
 
 class BaseLLMProvider(ABC):
@@ -46,6 +230,9 @@ class BaseLLMProvider(ABC):
     메서드를 구현해야 합니다.
     """
     
+    # 계측/라우팅에서 사용하는 제공자 이름 (예: 'openai')
+    PROVIDER_NAME = ''
+    
     def __init__(self, api_key: str, default_model: Optional[str] = None):
         """
         Args:
@@ -69,6 +256,7 @@ class BaseLLMProvider(ABC):
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
         system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
         **kwargs
     ) -> LLMResponse:
         """
@@ -80,6 +268,7 @@ class BaseLLMProvider(ABC):
             temperature: 생성 다양성 (0.0-2.0)
             max_tokens: 최대 토큰 수
             system_prompt: 시스템 프롬프트
+            stop: 정지 시퀀스 (API가 지원하지 않는 모델은 응답을 로컬에서 자름)
             **kwargs: 제공자별 추가 파라미터
         
         Returns:
@@ -113,6 +302,92 @@ class BaseLLMProvider(ABC):
         """
         pass
     
+    def generate_stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
+        **kwargs
+    ) -> LLMStream:
+        """
+        스트리밍 텍스트 생성
+        
+        기본 구현은 generate() 결과를 한 조각으로 돌려줍니다.
+        스트리밍을 지원하는 제공자는 이 메서드를 재정의해 클라이언트 연결이 끊기면
+        (LLMStream.close()) 업스트림 요청도 닫히도록 합니다.
+        
+        Returns:
+            LLMStream 객체
+        """
+        model = model or self.default_model
+        stream = LLMStream(prompt, model, counter=self.count_tokens)
+        
+        def chunks():
+            response = self.generate(
+                prompt,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                system_prompt=system_prompt,
+                stop=stop,
+                **kwargs
+            )
+            stream.finish_reason = response.finish_reason
+            stream.prompt_tokens = response.prompt_tokens
+            stream.completion_tokens = response.completion_tokens
+            stream.cached_tokens = response.cached_tokens
+            yield response.content
+        
+        return stream.bind(chunks())
+    
+    def generate_json_stream(
+        self,
+        prompt: str,
+        schema: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.3,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[Any]:
+        """
+        JSON 스트리밍 생성
+        
+        텍스트 조각이 도착할 때마다 증분 파서로 지금까지의 부분 객체를 돌려주므로
+        앞쪽 필드(예: 첫 질문)를 전체 응답 완료 전에 사용할 수 있습니다.
+        마지막으로 돌려준 값이 최종 결과이며, 완료 후 스키마를 검증합니다.
+        
+        Yields:
+            부분 JSON 값 (값이 바뀔 때만)
+        """
+        from .structured import IncrementalJSONParser, check_schema
+        
+        parser = IncrementalJSONParser()
+        stream = self.generate_stream(
+            prompt + "\n\n반드시 유효한 JSON 형식으로만 응답하세요. 다른 텍스트는 포함하지 마세요.",
+            model=model,
+            temperature=temperature,
+            system_prompt=system_prompt,
+            **kwargs
+        )
+        last = None
+        try:
+            for chunk in stream:
+                value = parser.feed(chunk)
+                if value is not None and value != last:
+                    last = value
+                    yield value
+                if parser.complete:
+                    break
+        finally:
+            stream.close()
+        
+        if last is None:
+            raise InvalidResponseError("JSON 스트림에서 값을 얻지 못했습니다.")
+        check_schema(last, schema)
+    
     @abstractmethod
     def count_tokens(self, text: str) -> int:
         """
@@ -126,6 +401,17 @@ class BaseLLMProvider(ABC):
         """
         pass
     
+    def observe_call(self, model: str, operation: str = 'generate'):
+        """
+        API 호출 계측 컨텍스트 매니저
+        
+        사용법:
+            with self.observe_call(model, 'generate') as call:
+                response = self.client.create(...)
+                call.record_usage(total_tokens=response.usage.total_tokens)
+        """
+        return observe_call(self.PROVIDER_NAME or self.__class__.__name__, model, operation)
+    
     def get_model_info(self) -> Dict[str, Any]:
         """
         현재 설정된 모델 정보 반환
@@ -169,3 +455,7 @@ class ModelNotFoundError(LLMProviderError):
     """모델을 찾을 수 없음"""
     pass
 
+
+class ContextWindowExceededError(LLMProviderError):
+    """프롬프트가 사용할 수 있는 모델의 컨텍스트 윈도우를 넘음"""
+    pass
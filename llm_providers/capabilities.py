@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+모델 능력 레지스트리
+
+모델별 고정 정보(컨텍스트 윈도우, 최대 출력, JSON/스키마 지원, temperature 지원,
+토크나이저, 1K 토큰당 가격, 스트리밍 지원, 품질 등급)를 한 곳에서 관리합니다.
+
+제공자별 모델 목록, 가격표, 품질 등급, 사용자에게 노출하는 모델 목록은 모두 이 표에서 파생되며,
+조회용 인덱스는 모듈 로드 시 한 번 만들어 O(1)로 찾습니다.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class ModelCapabilities:
+    """모델 능력 정보"""
+
+    __slots__ = (
+        'name', 'provider', 'context_window', 'max_output_tokens', 'json_mode', 'json_schema',
+        'supports_temperature', 'supports_stop', 'reasoning', 'tokenizer', 'input_price_per_1k',
+        'output_price_per_1k', 'streaming', 'quality_tier', 'default_temperature', 'selectable',
+    )
+
+    def __init__(
+        self,
+        name: str,
+        provider: str,
+        context_window: int,
+        max_output_tokens: int,
+        input_price_per_1k: float,
+        output_price_per_1k: float,
+        json_mode: bool = False,
+        json_schema: bool = False,
+        supports_temperature: bool = True,
+        supports_stop: bool = True,
+        reasoning: bool = False,
+        tokenizer: Optional[str] = None,
+        streaming: bool = True,
+        quality_tier: Optional[int] = None,
+        default_temperature: float = 0.7,
+        selectable: bool = False
+    ):
+        self.name = name
+        self.provider = provider
+        self.context_window = context_window
+        self.max_output_tokens = max_output_tokens
+        self.input_price_per_1k = input_price_per_1k
+        self.output_price_per_1k = output_price_per_1k
+        self.json_mode = json_mode
+        self.json_schema = json_schema
+        self.supports_temperature = supports_temperature
+        self.supports_stop = supports_stop
+        self.reasoning = reasoning
+        self.tokenizer = tokenizer
+        self.streaming = streaming
+        self.quality_tier = quality_tier
+        self.default_temperature = default_temperature
+        self.selectable = selectable
+
+    def blended_price_per_1k(self, output_ratio: float = 0.5) -> float:
+        """입력/출력 비율을 가정한 1K 토큰당 혼합 가격"""
+        return self.input_price_per_1k * (1 - output_ratio) + self.output_price_per_1k * output_ratio
+
+    def fits(self, prompt_tokens: int, output_tokens: int = 0) -> bool:
+        """프롬프트와 예약 출력이 컨텍스트 윈도우에 들어가는지"""
+        return prompt_tokens + min(output_tokens, self.max_output_tokens) <= self.context_window
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+def _openai_reasoning(name: str, input_price: float, output_price: float, tier: int, **kwargs) -> ModelCapabilities:
+    # GPT-5 계열: temperature/stop 미지원, 출력 한도에 추론 토큰 포함 (max_completion_tokens)
+    return ModelCapabilities(
+        name, 'openai', 400000, 128000, input_price, output_price,
+        json_mode=True, json_schema=True, supports_temperature=False, supports_stop=False,
+        reasoning=True, tokenizer='o200k_base', quality_tier=tier, **kwargs
+    )
+
+
+# 등록 순서가 제공자별 모델 목록과 사용자 노출 모델 목록의 순서가 됩니다.
+MODEL_CAPABILITIES: Dict[str, ModelCapabilities] = {m.name: m for m in [
+    # OpenAI
+    _openai_reasoning('gpt-5-nano', 0.00005, 0.0004, 1, selectable=True),
+    _openai_reasoning('gpt-5-mini', 0.00025, 0.002, 2, selectable=True),
+    _openai_reasoning('gpt-5', 0.00125, 0.01, 3, default_temperature=0.8, selectable=True),
+    ModelCapabilities(
+        'gpt-4.1', 'openai', 1047576, 32768, 0.002, 0.008,
+        json_mode=True, json_schema=True, tokenizer='o200k_base', quality_tier=3,
+        default_temperature=0.8, selectable=True
+    ),
+    ModelCapabilities(
+        'gpt-4.1-mini', 'openai', 1047576, 32768, 0.0004, 0.0016,
+        json_mode=True, json_schema=True, tokenizer='o200k_base', quality_tier=2, selectable=True
+    ),
+    ModelCapabilities(
+        'gpt-4.1-nano', 'openai', 1047576, 32768, 0.0001, 0.0004,
+        json_mode=True, json_schema=True, tokenizer='o200k_base', quality_tier=1
+    ),
+    ModelCapabilities(
+        'gpt-4o', 'openai', 128000, 16384, 0.0025, 0.01,
+        json_mode=True, json_schema=True, tokenizer='o200k_base', quality_tier=3, default_temperature=0.8
+    ),
+    ModelCapabilities(
+        'gpt-4o-mini', 'openai', 128000, 16384, 0.00015, 0.0006,
+        json_mode=True, json_schema=True, tokenizer='o200k_base', quality_tier=1
+    ),
+    ModelCapabilities(
+        'gpt-4-turbo', 'openai', 128000, 4096, 0.01, 0.03,
+        json_mode=True, tokenizer='cl100k_base'
+    ),
+    ModelCapabilities('gpt-4', 'openai', 8192, 8192, 0.03, 0.06, tokenizer='cl100k_base'),
+    # Anthropic (JSON 스키마는 도구 사용으로 강제)
+    ModelCapabilities(
+        'claude-3-5-sonnet-20241022', 'anthropic', 200000, 8192, 0.003, 0.015,
+        json_schema=True, quality_tier=3
+    ),
+    ModelCapabilities(
+        'claude-3-5-haiku-20241022', 'anthropic', 200000, 8192, 0.0008, 0.004,
+        json_schema=True, quality_tier=2
+    ),
+    ModelCapabilities(
+        'claude-3-opus-20240229', 'anthropic', 200000, 4096, 0.015, 0.075,
+        json_schema=True, quality_tier=3
+    ),
+    ModelCapabilities('claude-3-sonnet-20240229', 'anthropic', 200000, 4096, 0.003, 0.015, json_schema=True),
+    ModelCapabilities(
+        'claude-3-haiku-20240307', 'anthropic', 200000, 4096, 0.00025, 0.00125,
+        json_schema=True, quality_tier=1
+    ),
+    # Google
+    ModelCapabilities(
+        'gemini-1.5-pro', 'google', 2097152, 8192, 0.00125, 0.005,
+        json_mode=True, json_schema=True, quality_tier=2
+    ),
+    ModelCapabilities(
+        'gemini-1.5-flash', 'google', 1048576, 8192, 0.000075, 0.0003,
+        json_mode=True, json_schema=True, quality_tier=1
+    ),
+    ModelCapabilities('gemini-1.0-pro', 'google', 30720, 2048, 0.0005, 0.0015),
+    # Perplexity (정지 시퀀스 미지원)
+    ModelCapabilities('sonar-pro', 'perplexity', 200000, 8000, 0.003, 0.015, supports_stop=False, tokenizer='cl100k_base'),
+    ModelCapabilities('sonar', 'perplexity', 128000, 8000, 0.001, 0.001, supports_stop=False, tokenizer='cl100k_base'),
+]}
+
+
+# 조회용 인덱스 (모듈 로드 시 한 번 계산)
+MODELS_BY_PROVIDER: Dict[str, List[str]] = {}
+for _caps in MODEL_CAPABILITIES.values():
+    MODELS_BY_PROVIDER.setdefault(_caps.provider, []).append(_caps.name)
+
+SELECTABLE_MODELS: List[str] = [name for name, caps in MODEL_CAPABILITIES.items() if caps.selectable]
+
+# 컨텍스트 윈도우 탐색용: 혼합 가격 오름차순
+MODELS_BY_PRICE: List[ModelCapabilities] = sorted(
+    MODEL_CAPABILITIES.values(), key=lambda caps: caps.blended_price_per_1k()
+)
+
+
+def get_capabilities(model: Optional[str]) -> Optional[ModelCapabilities]:
+    """모델 능력 정보 (등록되지 않은 모델이면 None)"""
+    return MODEL_CAPABILITIES.get(model) if model else None
+
+
+def models_for_provider(provider: str) -> List[str]:
+    """제공자의 모델 목록"""
+    return list(MODELS_BY_PROVIDER.get(provider, []))
+
+
+def selectable_models() -> List[str]:
+    """사용자가 직접 선택할 수 있도록 노출하는 모델 목록"""
+    return list(SELECTABLE_MODELS)
+
+
+def find_model_for_context(
+    prompt_tokens: int,
+    output_tokens: int = 0,
+    providers: Optional[Iterable[str]] = None,
+    allowed_models: Optional[List[str]] = None,
+    min_tier: Optional[int] = None
+) -> Optional[ModelCapabilities]:
+    """
+    프롬프트가 들어가는 가장 저렴한 모델 찾기
+
+    품질 등급이 없는 모델(검색 특화 sonar, 구형 gpt-4 등)은 대체 대상에서 제외합니다.
+
+    Args:
+        prompt_tokens: 프롬프트 토큰 수
+        output_tokens: 출력용으로 남겨 둘 토큰 수
+        providers: 사용 가능한 제공자 이름 (None이면 제한 없음)
+        allowed_models: 플랜에서 허용된 모델 (None이면 제한 없음)
+        min_tier: 최소 품질 등급 (None이면 등급이 있는 모든 모델)
+
+    Returns:
+        ModelCapabilities 또는 None
+    """
+    providers = set(providers) if providers is not None else None
+    for caps in MODELS_BY_PRICE:
+        if providers is not None and caps.provider not in providers:
+            continue
+        if allowed_models is not None and caps.name not in allowed_models:
+            continue
+        if caps.quality_tier is None or (min_tier is not None and caps.quality_tier < min_tier):
+            continue
+        if caps.fits(prompt_tokens, output_tokens):
+            return caps
+    return None
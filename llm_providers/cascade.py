@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+모델 캐스케이드
+
+최종 생성(FINAL_GENERATION)을 허용된 가장 저렴한 모델로 먼저 수행하고,
+빠른 로컬 검사(잘림, 거절 패턴, JSON 유효성, 구체성 대비 길이)를 통과하지 못할 때만
+다음 품질 등급 모델로 올려 다시 생성합니다.
+
+대부분의 요청은 첫 단계(경량 모델)에서 끝나므로, 목표 등급 모델로 바로 생성했을 때와의
+비용 차이를 절감액으로 집계합니다.
+"""
+
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .base import BaseLLMProvider, LLMProviderError, LLMResponse
+from .continuation import generate_with_continuation, is_truncated
+from .pricing import estimate_cost
+from .tokenizer import get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+# 구체성 레벨별 최소 기대 출력 토큰 수
+MIN_COMPLETION_TOKENS = {
+    '짧음': 10,
+    '간결': 30,
+    '보통': 80,
+    '구체적': 150,
+    '매우 구체적': 250,
+}
+
+# 거절 응답 패턴 (응답 앞부분만 검사)
+REFUSAL_PATTERN = re.compile(
+    r"(I'?m sorry,? but I (?:can(?:no|')t|am unable)"
+    r"|I (?:cannot|can'?t|am unable to) (?:help|assist|comply|provide)"
+    r"|As an AI(?: language model)?,? I"
+    r"|죄송하지만[^.\n]{0,40}(?:할 수 없|드릴 수 없|어렵습니다)"
+    r"|(?:도와|답변해|제공해) ?드릴 수 없습니다)",
+    re.IGNORECASE
+)
+
+_JSON_FENCE = re.compile(r'^```(?:json)?\s*(.*?)\s*```$', re.DOTALL)
+
+
+def check_response(
+    response: LLMResponse,
+    specificity_level: Optional[str] = None,
+    min_length_ratio: float = 0.3
+) -> Optional[str]:
+    """
+    응답 품질 로컬 검사
+
+    Args:
+        response: LLM 응답
+        specificity_level: 구체성 레벨 값 (길이 비율 검사용)
+        min_length_ratio: 구체성 레벨 기대 길이 대비 최소 비율
+
+    Returns:
+        실패 사유 ('truncated', 'refusal', 'invalid_json', 'too_short') 또는 통과 시 None
+    """
+    content = (response.content or '').strip()
+
+    if is_truncated(response.finish_reason):
+        return 'truncated'
+
+    if REFUSAL_PATTERN.search(content[:300]):
+        return 'refusal'
+
+    # JSON으로 답하려 한 경우에만 유효성 검사
+    fenced = _JSON_FENCE.match(content)
+    candidate = fenced.group(1) if fenced else content
+    if candidate[:1] in ('{', '['):
+        try:
+            json.loads(candidate)
+        except ValueError:
+            return 'invalid_json'
+
+    expected = MIN_COMPLETION_TOKENS.get(specificity_level)
+    if expected:
+        # completion 토큰 구분이 없으면 로컬에서 계산
+        completion_tokens = response.completion_tokens or get_tokenizer().count(content, response.model)
+        if completion_tokens < expected * min_length_ratio:
+            return 'too_short'
+
+    return None
+
+
+class CascadeStats:
+    """캐스케이드 통계 (현재 워커 기준)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.served_by_depth: Dict[int, int] = {}
+        self.escalations: Dict[str, int] = {}
+        self.cost_usd = 0.0
+        self.savings_usd = 0.0
+
+    def record(self, result: 'CascadeResult'):
+        with self._lock:
+            self.requests += 1
+            self.served_by_depth[result.depth] = self.served_by_depth.get(result.depth, 0) + 1
+            for attempt in result.attempts:
+                if attempt['failed']:
+                    self.escalations[attempt['failed']] = self.escalations.get(attempt['failed'], 0) + 1
+            self.cost_usd += result.cost_usd
+            self.savings_usd += result.savings_usd
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            served_first = self.served_by_depth.get(1, 0)
+            return {
+                'requests': self.requests,
+                'served_by_depth': dict(self.served_by_depth),
+                'first_tier_rate': served_first / self.requests if self.requests else 0.0,
+                'escalations': dict(self.escalations),
+                'cost_usd': self.cost_usd,
+                'savings_usd': self.savings_usd,
+            }
+
+
+class CascadeResult:
+    """캐스케이드 실행 결과"""
+
+    def __init__(
+        self,
+        response: LLMResponse,
+        provider: BaseLLMProvider,
+        model: str,
+        temperature: float,
+        attempts: List[Dict[str, Any]],
+        baseline_model: str
+    ):
+        self.response = response
+        self.provider = provider
+        self.model = model
+        self.temperature = temperature
+        self.attempts = attempts
+        self.depth = len(attempts)
+        self.tokens_used = sum(a['tokens_used'] for a in attempts)
+        self.cost_usd = sum(a['cost_usd'] for a in attempts)
+        # 목표 등급 모델로 바로 생성했다면 들었을 비용 (최종 응답 토큰 기준)
+        self.baseline_model = baseline_model
+        self.baseline_cost_usd = estimate_cost(
+            baseline_model, response.prompt_tokens, response.completion_tokens, response.tokens_used
+        )
+        self.savings_usd = self.baseline_cost_usd - self.cost_usd
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'depth': self.depth,
+            'attempts': self.attempts,
+            'tokens_used': self.tokens_used,
+            'cost_usd': self.cost_usd,
+            'baseline_model': self.baseline_model,
+            'baseline_cost_usd': self.baseline_cost_usd,
+            'savings_usd': self.savings_usd,
+        }
+
+
+def run_cascade(
+    ladder: List[Tuple[BaseLLMProvider, str, float]],
+    prompt: str,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    specificity_level: Optional[str] = None,
+    min_length_ratio: float = 0.3,
+    stats: Optional[CascadeStats] = None,
+    stop: Optional[List[str]] = None,
+    max_continuations: int = 0,
+    max_tokens_by_model: Optional[Dict[str, Optional[int]]] = None
+) -> CascadeResult:
+    """
+    저렴한 모델부터 생성하고 검사 실패 시에만 다음 단계로 승격
+
+    Args:
+        ladder: 비용 오름차순 (provider, model, temperature) 목록 (마지막이 목표 등급)
+        prompt: 프롬프트
+        temperature: 요청 온도 (None이면 단계별 기본 온도)
+        max_tokens: 최대 토큰 수
+        specificity_level: 구체성 레벨 값
+        min_length_ratio: 길이 검사 최소 비율
+        stats: 결과를 기록할 통계 (선택적)
+        stop: 정지 시퀀스
+        max_continuations: 단계별로 잘린 응답을 이어쓸 최대 횟수 (잘림 검사 전에 적용)
+        max_tokens_by_model: 단계 모델별 최대 토큰 수 (없는 모델은 max_tokens)
+
+    Returns:
+        CascadeResult (마지막 단계 응답은 검사 결과와 관계없이 채택,
+        마지막 단계 호출이 실패하면 직전에 받은 응답을 채택)
+
+    Raises:
+        LLMProviderError: 마지막 단계까지 모두 호출에 실패했을 때
+    """
+    if not ladder:
+        raise LLMProviderError("캐스케이드에 사용할 모델이 없습니다.")
+
+    attempts = []
+    last_error = None
+    fallback = None
+    for depth, (provider, model, default_temp) in enumerate(ladder, start=1):
+        is_last = depth == len(ladder)
+        step_temperature = temperature if temperature is not None else default_temp
+        try:
+            response = generate_with_continuation(
+                provider,
+                prompt=prompt,
+                model=model,
+                temperature=step_temperature,
+                max_tokens=(max_tokens_by_model or {}).get(model, max_tokens),
+                stop=stop,
+                max_continuations=max_continuations
+            )
+        except LLMProviderError as e:
+            logger.warning(f"캐스케이드 {depth}단계 {model} 호출 실패: {e}")
+            last_error = e
+            attempts.append({
+                'model': model, 'failed': 'error', 'tokens_used': 0, 'cost_usd': 0.0,
+            })
+            continue
+
+        failed = None if is_last else check_response(response, specificity_level, min_length_ratio)
+        attempts.append({
+            'model': model,
+            'failed': failed,
+            'tokens_used': response.tokens_used,
+            'cost_usd': estimate_cost(
+                model, response.prompt_tokens, response.completion_tokens, response.tokens_used
+            ),
+        })
+        if failed is None:
+            return _finish(response, provider, model, step_temperature, attempts, ladder, stats)
+        fallback = (response, provider, model, step_temperature)
+        logger.info(f"캐스케이드 {depth}단계 {model} 검사 실패 ({failed}), 다음 단계로 승격")
+
+    if fallback is not None:
+        return _finish(*fallback, attempts, ladder, stats)
+    raise last_error
+
+
+def _finish(response, provider, model, temperature, attempts, ladder, stats) -> CascadeResult:
+    result = CascadeResult(response, provider, model, temperature, attempts, baseline_model=ladder[-1][1])
+    if stats is not None:
+        stats.record(result)
+    if result.depth > 1:
+        logger.info(f"캐스케이드: {result.depth}단계까지 진행, {model} 응답 채택")
+    return result
@@ -0,0 +1,492 @@
+# -*- coding: utf-8 -*-
+"""
+제공자 호출 녹화/재생 (카세트)
+
+실제 트래픽의 요청/응답 쌍을 지연 시간, 스트림 조각 타이밍, 토큰 사용량과 함께 gzip JSONL 카세트에
+녹화하고, 네트워크 없이 원래(또는 배율을 적용한) 지연으로 재생합니다.
+합성 가짜 응답(fake_provider)과 달리 실제 응답 길이, 토큰 수, JSON 특이사항이 그대로 재현되므로
+새 빌드에 같은 트래픽 형태를 오프라인으로 다시 흘려 지연/할당 프로파일을 비교할 수 있습니다.
+
+- PROMPT_MATE['LLM_CASSETTE_MODE'] = 'record': 레지스트리가 실제 제공자를 RecordingProvider로 감쌈
+- PROMPT_MATE['LLM_CASSETTE_MODE'] = 'replay': API 키 없이 ReplayProvider가 카세트에서 응답
+- 임베딩은 RAGManager의 OpenAI 클라이언트를 같은 방식으로 감쌈 (Recording/ReplayEmbeddingClient)
+
+카세트 파일: {LLM_CASSETTE_DIR}/{제공자}.{pid}.jsonl.gz (워커별 파일, 재생 시 같은 제공자 파일을 모두 읽음)
+요청 키: 정확 키(프롬프트, 시스템 프롬프트, 스키마, 모델, temperature, max_tokens, stop)로 먼저 찾고,
+없으면 느슨한 키(프롬프트, 시스템 프롬프트, 스키마)로 찾습니다 (새 빌드가 길이 정책 등을 바꾼 경우).
+같은 키의 녹화가 여러 개면 순서대로 돌려가며 재생합니다.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+from .base import BaseLLMProvider, LLMProviderError, LLMResponse, LLMStream
+from .capabilities import MODEL_CAPABILITIES, models_for_provider
+from .instrumentation import collect_calls, current_call_sink
+from .perplexity_provider import SEARCH_SYSTEM_PROMPT, SEARCH_TEMPERATURE
+from .single_flight import make_key
+from .structured import finalize_json
+from .tokenizer import get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+EMBEDDING_CASSETTE = 'embeddings'
+
+
+class CassetteMissError(LLMProviderError):
+    """재생 모드에서 요청에 맞는 녹화가 없음"""
+    pass
+
+
+def request_keys(kind: str, model: str, prompt: Any, system_prompt: Optional[str] = None,
+                 schema: Optional[Dict[str, Any]] = None, **params) -> tuple:
+    """(정확 키, 느슨한 키)"""
+    loose = make_key(kind, prompt, system_prompt, schema)
+    exact = make_key(kind, model, prompt, system_prompt, schema, {k: v for k, v in params.items() if v is not None})
+    return exact, loose
+
+
+class Cassette:
+    """
+    gzip JSONL 카세트 (스레드 안전)
+
+    녹화는 항목마다 gzip 멤버를 이어 붙이므로 프로세스가 중간에 종료돼도 앞선 항목은 읽을 수 있습니다.
+    """
+
+    def __init__(self, directory: str, name: str):
+        self.directory = Path(directory)
+        self.name = name
+        self._by_key: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def record_path(self) -> Path:
+        return self.directory / f"{self.name}.{os.getpid()}.jsonl.gz"
+
+    def load(self) -> int:
+        """같은 이름의 카세트 파일을 모두 읽어 색인 (읽은 항목 수 반환)"""
+        count = 0
+        for path in sorted(self.directory.glob(f"{self.name}.*jsonl.gz")):
+            try:
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            self._index(json.loads(line))
+                            count += 1
+            except (OSError, EOFError, ValueError) as e:
+                # 녹화 중 끊긴 마지막 멤버 등: 읽은 데까지만 사용
+                logger.warning(f"카세트 일부를 읽지 못했습니다 ({path}): {e}")
+        logger.info(f"카세트 로드: {self.name} {count}건")
+        return count
+
+    def _index(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._count += 1
+            self._by_key.setdefault(entry['key'], []).append(entry)
+            if entry.get('loose_key') and entry['loose_key'] != entry['key']:
+                self._by_key.setdefault(entry['loose_key'], []).append(entry)
+
+    def record(self, entry: Dict[str, Any]):
+        """항목 녹화 (파일에 추가하고 색인)"""
+        entry.setdefault('recorded_at', time.time())
+        line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with gzip.open(self.record_path, 'at', encoding='utf-8') as f:
+                f.write(line)
+        self._index(entry)
+
+    def find(self, key: str, loose_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """정확 키 → 느슨한 키 순으로 찾아 녹화를 순서대로 돌려가며 반환"""
+        for candidate in (key, loose_key):
+            if not candidate:
+                continue
+            with self._lock:
+                entries = self._by_key.get(candidate)
+                if entries:
+                    position = self._cursor.get(candidate, 0)
+                    self._cursor[candidate] = position + 1
+                    return entries[position % len(entries)]
+        return None
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class RecordingProvider(BaseLLMProvider):
+    """실제 제공자를 감싸 호출을 카세트에 녹화 (호출 동작은 그대로)"""
+
+    def __init__(self, inner: BaseLLMProvider, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+        self.PROVIDER_NAME = inner.PROVIDER_NAME
+        super().__init__(inner.api_key, inner.default_model)
+
+    def __getattr__(self, name: str):
+        # 녹화 대상이 아닌 제공자 고유 메서드는 그대로 위임
+        if name == 'inner':
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def search_internet(self, query: str, model: Optional[str] = None,
+                        max_tokens: Optional[int] = 1000) -> Dict[str, Any]:
+        """
+        PerplexityProvider.search_internet 녹화
+
+        내부 제공자의 search_internet은 자신의 generate를 직접 호출해 녹화를 거치지 않으므로,
+        같은 요청을 이 래퍼의 generate로 보내 ReplayProvider.search_internet이 찾는 키로 녹화합니다.
+        """
+        if not hasattr(self.inner, 'search_internet'):
+            raise AttributeError('search_internet')
+        response = self.generate(
+            prompt=query,
+            model=model or self.default_model,
+            temperature=SEARCH_TEMPERATURE,
+            max_tokens=max_tokens,
+            system_prompt=SEARCH_SYSTEM_PROMPT
+        )
+        return {'content': response.content, 'tokens_used': response.tokens_used, 'model': response.model}
+
+    def _entry(self, kind: str, model: str, prompt: str, system_prompt: Optional[str],
+               schema: Optional[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
+        key, loose_key = request_keys(kind, model, prompt, system_prompt, schema, **params)
+        return {
+            'key': key,
+            'loose_key': loose_key,
+            'kind': kind,
+            'provider': self.PROVIDER_NAME,
+            'model': model,
+            'request': {'prompt': prompt, 'system_prompt': system_prompt, 'schema': schema, **params},
+        }
+
+    def generate(self, prompt: str, model: Optional[str] = None, temperature: float = 0.7,
+                 max_tokens: Optional[int] = None, system_prompt: Optional[str] = None,
+                 stop: Optional[List[str]] = None, **kwargs) -> LLMResponse:
+        model = model or self.default_model
+        started = time.perf_counter()
+        response = self.inner.generate(
+            prompt, model=model, temperature=temperature, max_tokens=max_tokens,
+            system_prompt=system_prompt, stop=stop, **kwargs
+        )
+        latency_ms = (time.perf_counter() - started) * 1000
+        entry = self._entry('text', model, prompt, system_prompt, None,
+                            {'temperature': temperature, 'max_tokens': max_tokens, 'stop': stop})
+        entry.update({'operation': 'generate', 'latency_ms': latency_ms, 'response': response.to_dict()})
+        self.cassette.record(entry)
+        return response
+
+    def generate_json(self, prompt: str, schema: Optional[Dict[str, Any]] = None, model: Optional[str] = None,
+                      temperature: float = 0.3, system_prompt: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """JSON 생성 녹화 (파싱 결과와 함께 파싱 전 원문과 토큰 사용량을 녹화)"""
+        model = model or self.default_model
+        outer = current_call_sink()
+        started = time.perf_counter()
+        with collect_calls() as calls:
+            try:
+                value = self.inner.generate_json(
+                    prompt, schema=schema, model=model, temperature=temperature, system_prompt=system_prompt,
+                    **kwargs
+                )
+            finally:
+                if outer is not None:
+                    outer.extend(calls)
+        latency_ms = (time.perf_counter() - started) * 1000
+        call = calls[-1] if calls else None
+        response = {'value': value}
+        if call is not None:
+            response.update({
+                'content': call.raw_content,
+                'prompt_tokens': call.prompt_tokens,
+                'completion_tokens': call.completion_tokens,
+                'cached_tokens': call.cached_tokens,
+            })
+        entry = self._entry('json', model, prompt, system_prompt, schema, {'temperature': temperature})
+        entry.update({'operation': 'generate_json', 'latency_ms': latency_ms, 'response': response})
+        self.cassette.record(entry)
+        return value
+
+    def generate_stream(self, prompt: str, model: Optional[str] = None, temperature: float = 0.7,
+                        max_tokens: Optional[int] = None, system_prompt: Optional[str] = None,
+                        stop: Optional[List[str]] = None, **kwargs) -> LLMStream:
+        model = model or self.default_model
+        inner = self.inner.generate_stream(
+            prompt, model=model, temperature=temperature, max_tokens=max_tokens,
+            system_prompt=system_prompt, stop=stop, **kwargs
+        )
+        stream = LLMStream(prompt, model, counter=self.inner.count_tokens)
+        entry = self._entry('text', model, prompt, system_prompt, None,
+                            {'temperature': temperature, 'max_tokens': max_tokens, 'stop': stop})
+
+        def chunks() -> Iterator[str]:
+            started = time.perf_counter()
+            recorded = []
+            finished = False
+            try:
+                for text in inner:
+                    recorded.append([(time.perf_counter() - started) * 1000, text])
+                    yield text
+                finished = True
+            finally:
+                if not finished:
+                    inner.close()
+                stream.finish_reason = inner.finish_reason
+                stream.prompt_tokens = inner.prompt_tokens
+                stream.completion_tokens = inner.completion_tokens
+                stream.cached_tokens = inner.cached_tokens
+                stream.cache_write_tokens = inner.cache_write_tokens
+                # 취소된 스트림은 응답이 불완전하므로 녹화하지 않음
+                if finished:
+                    response = inner.to_response()
+                    entry.update({
+                        'operation': 'generate_stream',
+                        'latency_ms': (time.perf_counter() - started) * 1000,
+                        'ttft_ms': recorded[0][0] if recorded else None,
+                        'chunks': recorded,
+                        'response': response.to_dict(),
+                    })
+                    self.cassette.record(entry)
+
+        return stream.bind(chunks())
+
+    def count_tokens(self, text: str) -> int:
+        return self.inner.count_tokens(text)
+
+    def get_available_models(self) -> List[str]:
+        return self.inner.get_available_models()
+
+    def get_model_info(self) -> Dict[str, Any]:
+        info = self.inner.get_model_info()
+        info['cassette'] = 'record'
+        return info
+
+
+class ReplayProvider(BaseLLMProvider):
+    """
+    카세트 재생 Provider
+
+    Args:
+        provider_name: 재생할 제공자 이름 (계측/가격이 해당 제공자 모델로 기록됨)
+        cassette: 로드된 카세트
+        latency_scale: 녹화 지연에 곱할 배율 (0이면 대기 없음)
+    """
+
+    def __init__(self, provider_name: str, cassette: Cassette, latency_scale: float = 1.0):
+        self.PROVIDER_NAME = provider_name
+        self.AVAILABLE_MODELS = models_for_provider(provider_name) or list(MODEL_CAPABILITIES)
+        super().__init__('replay', self.AVAILABLE_MODELS[0])
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+
+    def _find(self, kind: str, model: str, prompt: str, system_prompt: Optional[str],
+              schema: Optional[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
+        key, loose_key = request_keys(kind, model, prompt, system_prompt, schema, **params)
+        entry = self.cassette.find(key, loose_key)
+        if entry is None:
+            raise CassetteMissError(f"카세트에 녹화된 응답이 없습니다: {self.PROVIDER_NAME}/{model} {prompt[:50]}...")
+        return entry
+
+    def _sleep(self, ms: Optional[float]):
+        if ms and self.latency_scale > 0:
+            time.sleep(ms * self.latency_scale / 1000.0)
+
+    def generate(self, prompt: str, model: Optional[str] = None, temperature: float = 0.7,
+                 max_tokens: Optional[int] = None, system_prompt: Optional[str] = None,
+                 stop: Optional[List[str]] = None, **kwargs) -> LLMResponse:
+        model = model or self.default_model
+        with self.observe_call(model, 'generate') as call:
+            entry = self._find('text', model, prompt, system_prompt, None,
+                               {'temperature': temperature, 'max_tokens': max_tokens, 'stop': stop})
+            self._sleep(entry.get('latency_ms'))
+            response = LLMResponse.from_dict(entry['response'])
+            call.record_usage(
+                prompt_tokens=response.prompt_tokens,
+                completion_tokens=response.completion_tokens,
+                total_tokens=response.tokens_used,
+                cached_tokens=response.cached_tokens
+            )
+        return response
+
+    def generate_json(self, prompt: str, schema: Optional[Dict[str, Any]] = None, model: Optional[str] = None,
+                      temperature: float = 0.3, system_prompt: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """
+        녹화된 원문을 제공자와 같은 복구 파싱/스키마 검증으로 재생 (녹화된 토큰 사용량 기록)
+
+        원문/사용량이 없는 이전 카세트는 파싱 결과를 그대로 돌려주고 토큰은 로컬에서 셉니다.
+        """
+        model = model or self.default_model
+        with self.observe_call(model, 'generate_json') as call:
+            entry = self._find('json', model, prompt, system_prompt, schema, {'temperature': temperature})
+            self._sleep(entry.get('latency_ms'))
+            response = entry['response']
+            content = response.get('content')
+            if content is None:
+                content = json.dumps(response['value'], ensure_ascii=False)
+            call.raw_content = content
+            if 'prompt_tokens' in response:
+                call.record_usage(
+                    prompt_tokens=response['prompt_tokens'],
+                    completion_tokens=response.get('completion_tokens', 0),
+                    cached_tokens=response.get('cached_tokens', 0)
+                )
+            else:
+                call.record_usage(
+                    prompt_tokens=self.count_tokens(f"{system_prompt}\n\n{prompt}" if system_prompt else prompt),
+                    completion_tokens=self.count_tokens(content)
+                )
+        if response.get('content') is None:
+            return response['value']
+        return finalize_json(content, schema)
+
+    def generate_stream(self, prompt: str, model: Optional[str] = None, temperature: float = 0.7,
+                        max_tokens: Optional[int] = None, system_prompt: Optional[str] = None,
+                        stop: Optional[List[str]] = None, **kwargs) -> LLMStream:
+        """녹화된 조각 타이밍대로 재생 (generate로 녹화된 항목은 전체 지연 후 한 조각)"""
+        model = model or self.default_model
+        entry = self._find('text', model, prompt, system_prompt, None,
+                           {'temperature': temperature, 'max_tokens': max_tokens, 'stop': stop})
+        response = entry['response']
+        chunks_recorded = entry.get('chunks') or [[entry.get('latency_ms') or 0, response.get('content', '')]]
+        stream = LLMStream(prompt, model, counter=self.count_tokens)
+
+        def chunks() -> Iterator[str]:
+            with self.observe_call(model, 'generate_stream') as call:
+                try:
+                    elapsed = 0.0
+                    for offset_ms, text in chunks_recorded:
+                        self._sleep(offset_ms - elapsed)
+                        elapsed = offset_ms
+                        yield text
+                    stream.finish_reason = response.get('finish_reason')
+                    stream.prompt_tokens = response.get('prompt_tokens', 0)
+                    stream.completion_tokens = response.get('completion_tokens', 0)
+                    stream.cached_tokens = response.get('cached_tokens', 0)
+                finally:
+                    stream.record_usage(call)
+
+        return stream.bind(chunks())
+
+    def search_internet(self, query: str, model: Optional[str] = None,
+                        max_tokens: Optional[int] = 1000) -> Dict[str, Any]:
+        """PerplexityProvider.search_internet 호환 (같은 시스템 프롬프트로 녹화된 generate 재생)"""
+        response = self.generate(
+            prompt=query,
+            model=model or self.default_model,
+            temperature=SEARCH_TEMPERATURE,
+            max_tokens=max_tokens,
+            system_prompt=SEARCH_SYSTEM_PROMPT
+        )
+        return {'content': response.content, 'tokens_used': response.tokens_used, 'model': response.model}
+
+    def count_tokens(self, text: str) -> int:
+        return get_tokenizer().count(text, self.default_model)
+
+    def get_available_models(self) -> List[str]:
+        return list(self.AVAILABLE_MODELS)
+
+    def get_model_info(self) -> Dict[str, Any]:
+        info = super().get_model_info()
+        info.update({'cassette': 'replay', 'entries': len(self.cassette), 'latency_scale': self.latency_scale})
+        return info
+
+
+class RecordingEmbeddingClient:
+    """OpenAI 클라이언트를 감싸 embeddings.create 호출을 녹화"""
+
+    def __init__(self, client: Any, cassette: Cassette):
+        self._client = client
+        self.cassette = cassette
+        self.embeddings = self
+
+    def create(self, model: str, input: Any, **kwargs):
+        started = time.perf_counter()
+        response = self._client.embeddings.create(model=model, input=input, **kwargs)
+        key = make_key('embedding', model, input)
+        usage = getattr(response, 'usage', None)
+        self.cassette.record({
+            'key': key,
+            'kind': 'embedding',
+            'model': model,
+            'latency_ms': (time.perf_counter() - started) * 1000,
+            'response': {
+                'embeddings': [item.embedding for item in response.data],
+                'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+                'total_tokens': getattr(usage, 'total_tokens', 0) or 0,
+            },
+        })
+        return response
+
+
+class ReplayEmbeddingClient:
+    """녹화된 임베딩을 embeddings.create 형식으로 재생"""
+
+    def __init__(self, cassette: Cassette, latency_scale: float = 1.0):
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self.embeddings = self
+
+    def create(self, model: str, input: Any, **kwargs):
+        entry = self.cassette.find(make_key('embedding', model, input))
+        if entry is None:
+            raise CassetteMissError(f"카세트에 녹화된 임베딩이 없습니다: {str(input)[:50]}...")
+        if entry.get('latency_ms') and self.latency_scale > 0:
+            time.sleep(entry['latency_ms'] * self.latency_scale / 1000.0)
+        response = entry['response']
+        return SimpleNamespace(
+            model=model,
+            data=[SimpleNamespace(index=i, embedding=e) for i, e in enumerate(response['embeddings'])],
+            usage=SimpleNamespace(
+                prompt_tokens=response.get('prompt_tokens', 0),
+                total_tokens=response.get('total_tokens', response.get('prompt_tokens', 0)),
+            ),
+        )
+
+
+# 이름별 카세트 (프로세스 전역, 재생 모드는 처음 사용할 때 로드)
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(name: str, config: Dict[str, Any]) -> Cassette:
+    """이름별 Cassette 인스턴스 가져오기 (재생 모드면 파일에서 로드)"""
+    cassette = _cassettes.get(name)
+    if cassette is None:
+        with _cassettes_lock:
+            cassette = _cassettes.get(name)
+            if cassette is None:
+                cassette = Cassette(config.get('LLM_CASSETTE_DIR', 'cassettes'), name)
+                if config.get('LLM_CASSETTE_MODE') == 'replay':
+                    cassette.load()
+                _cassettes[name] = cassette
+    return cassette
+
+
+def wrap_provider(name: str, provider: Optional[BaseLLMProvider], config: Dict[str, Any]) -> Optional[BaseLLMProvider]:
+    """카세트 모드에 맞게 제공자 감싸기/대체 (모드가 없으면 그대로)"""
+    mode = config.get('LLM_CASSETTE_MODE', '')
+    if mode == 'replay':
+        return ReplayProvider(name, get_cassette(name, config), config.get('LLM_CASSETTE_LATENCY_SCALE', 1.0))
+    if mode == 'record' and provider is not None:
+        return RecordingProvider(provider, get_cassette(name, config))
+    return provider
+
+
+def wrap_embedding_client(client: Any, config: Dict[str, Any]) -> Any:
+    """카세트 모드에 맞게 임베딩 클라이언트 감싸기/대체"""
+    mode = config.get('LLM_CASSETTE_MODE', '')
+    if mode == 'replay':
+        return ReplayEmbeddingClient(
+            get_cassette(EMBEDDING_CASSETTE, config), config.get('LLM_CASSETTE_LATENCY_SCALE', 1.0)
+        )
+    if mode == 'record' and client is not None:
+        return RecordingEmbeddingClient(client, get_cassette(EMBEDDING_CASSETTE, config))
+    return client
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+잘린 응답 이어서 생성
+
+출력 길이 정책으로 max_tokens를 좁게 잡으면 드물게 응답이 한도에서 잘립니다.
+잘림(finish_reason)이 감지된 경우에만 앞 응답을 붙여 이어서 생성하고 결과를 하나의
+LLMResponse로 합칩니다. 잘리지 않은 대부분의 요청은 추가 호출이 없습니다.
+
+API에 보낸 정지 시퀀스('\n\n' 등)에 응답 첫머리부터 걸려 빈 응답이 오면
+정지 시퀀스 없이 한 번 다시 생성해 로컬에서 자릅니다 (apply_stop은 앞 공백을 건너뜀).
+"""
+
+import logging
+from typing import List, Optional
+
+from .base import BaseLLMProvider, LLMResponse, apply_stop
+
+logger = logging.getLogger(__name__)
+
+
+# finish_reason 중 출력 잘림을 뜻하는 값 (OpenAI: length, Anthropic: max_tokens, Gemini: MAX_TOKENS)
+TRUNCATED_FINISH_REASONS = ('length', 'max_tokens')
+
+CONTINUATION_INSTRUCTION = (
+    "위 답변은 출력 한도에서 중간에 끊겼습니다. "
+    "끊긴 지점 바로 다음부터 이어서 작성하세요. 앞 내용을 반복하거나 요약하지 마세요."
+)
+
+
+def is_truncated(finish_reason: Optional[str]) -> bool:
+    """finish_reason이 출력 한도 도달(잘림)인지 여부"""
+    reason = (finish_reason or '').lower()
+    return any(truncated in reason for truncated in TRUNCATED_FINISH_REASONS)
+
+
+def build_continuation_prompt(prompt: str, partial: str) -> str:
+    """원래 프롬프트와 지금까지의 답변으로 이어쓰기 프롬프트 구성"""
+    return f"{prompt}\n\n[지금까지의 답변]\n{partial}\n\n{CONTINUATION_INSTRUCTION}"
+
+
+def _merge(first: LLMResponse, second: LLMResponse, content: str, finish_reason: Optional[str]) -> LLMResponse:
+    """두 호출의 토큰 사용량을 합친 응답"""
+    return LLMResponse(
+        content=content,
+        model=first.model,
+        tokens_used=first.tokens_used + second.tokens_used,
+        finish_reason=finish_reason,
+        raw_response=first.raw_response,
+        prompt_tokens=first.prompt_tokens + second.prompt_tokens,
+        completion_tokens=first.completion_tokens + second.completion_tokens,
+        cached_tokens=first.cached_tokens + second.cached_tokens
+    )
+
+
+def generate_with_continuation(
+    provider: BaseLLMProvider,
+    prompt: str,
+    model: str,
+    temperature: float,
+    max_tokens: Optional[int] = None,
+    stop: Optional[List[str]] = None,
+    max_continuations: int = 0,
+    continuation_tokens: Optional[int] = None
+) -> LLMResponse:
+    """
+    생성 후 잘렸을 때만 이어서 생성
+
+    Args:
+        provider: LLM 제공자
+        prompt: 프롬프트
+        model: 모델
+        temperature: 온도
+        max_tokens: 첫 생성의 최대 출력 토큰 수
+        stop: 정지 시퀀스
+        max_continuations: 최대 이어쓰기 횟수 (0이면 이어쓰지 않음)
+        continuation_tokens: 이어쓰기 1회의 최대 출력 토큰 수 (None이면 max_tokens)
+
+    Returns:
+        LLMResponse (이어쓴 경우 내용과 토큰 사용량을 합친 응답)
+    """
+    response = provider.generate(
+        prompt=prompt,
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stop=stop
+    )
+
+    if stop and not response.content.strip() and not is_truncated(response.finish_reason):
+        # 응답이 빈 줄로 시작해 API 정지 시퀀스에 바로 걸림 → 정지 시퀀스 없이 다시 생성해 로컬에서 자름
+        logger.info(f"정지 시퀀스로 빈 응답 ({model}), 정지 시퀀스 없이 다시 생성")
+        retry = provider.generate(
+            prompt=prompt,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stop=None
+        )
+        content, stopped = apply_stop(retry.content, stop)
+        response = _merge(response, retry, content, 'stop' if stopped else retry.finish_reason)
+
+    continuations = 0
+    while continuations < max_continuations and is_truncated(response.finish_reason) and response.content:
+        continuations += 1
+        logger.info(f"응답 잘림 감지 ({model}, {response.completion_tokens} 토큰), 이어서 생성 {continuations}회차")
+        following = provider.generate(
+            prompt=build_continuation_prompt(prompt, response.content),
+            model=model,
+            temperature=temperature,
+            max_tokens=continuation_tokens or max_tokens,
+            stop=stop
+        )
+        response = _merge(response, following, response.content + following.content, following.finish_reason)
+
+    return response
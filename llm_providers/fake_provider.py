@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+"""
+Fake LLM / 임베딩 Provider
+
+네트워크와 API 키 없이 파이프라인 전체를 부하 테스트/벤치마크하기 위한 결정적 가짜 백엔드입니다.
+PROMPT_MATE['FAKE_LLM_MODE']가 켜지면 ProviderRegistry가 모든 제공자 이름(openai, anthropic, ...)에
+FakeProvider를 대신 생성하므로 라우팅, 능력 레지스트리, 가격/계측 코드는 실제와 같은 경로로 동작합니다.
+
+- 출력: (모델, 프롬프트) 해시로 정해지는 결정적 텍스트, 스키마가 주어지면 스키마를 만족하는 JSON
+  (의도 파싱/질문 생성은 각 모듈의 스키마로, 합성/최종 생성/개선은 텍스트로 응답)
+- 지연: 고정(fixed) 또는 로그정규(lognormal) 기본 지연 + 출력 토큰당 지연 + 확률적 꼬리 스파이크
+- 에러 주입: rate_limit(429), timeout, malformed_json (비율 0-1)
+- 토큰: 로컬 추정으로 입력/출력 토큰을 계산해 계측(observe_call)에 기록
+
+RAGManager용으로 OpenAI embeddings 호환 FakeEmbeddingClient와 Pinecone 호환 InMemoryVectorIndex도 제공합니다.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .adaptive_routing import parse_task_map
+from .base import (
+    BaseLLMProvider,
+    LLMResponse,
+    LLMStream,
+    LLMProviderError,
+    RateLimitError,
+    apply_stop
+)
+from .capabilities import MODEL_CAPABILITIES, models_for_provider
+from .structured import finalize_json
+from .tokenizer import get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+# 결정적 텍스트 생성용 어휘
+_WORDS = [
+    '프롬프트', '사용자', '요청', '목표', '결과', '구조', '단계', '예시', '설명', '방법',
+    '핵심', '정리', '검토', '데이터', '모델', '품질', '맥락', '제약', '형식', '분석',
+    '먼저', '다음으로', '마지막으로', '따라서', '예를 들어', '중요한', '구체적인', '간단한', '명확한', '효율적인',
+]
+
+# 텍스트 응답 길이 범위 (토큰 근사, max_tokens가 더 작으면 잘림)
+MIN_OUTPUT_WORDS = 60
+MAX_OUTPUT_WORDS = 400
+
+ERROR_KINDS = ('rate_limit', 'timeout', 'malformed_json')
+
+
+class LatencyProfile:
+    """
+    가짜 호출 지연 분포
+
+    Args:
+        kind: 'fixed' (항상 base_ms) 또는 'lognormal' (중앙값 base_ms, 로그 표준편차 sigma)
+        base_ms: 첫 토큰까지의 기본 지연 (ms)
+        sigma: lognormal 분포의 로그 표준편차
+        per_token_ms: 출력 토큰당 추가 지연 (ms)
+        spike_rate: 꼬리 스파이크 확률 (0-1)
+        spike_ms: 스파이크 시 추가 지연 (ms)
+    """
+
+    def __init__(
+        self,
+        kind: str = 'lognormal',
+        base_ms: float = 300.0,
+        sigma: float = 0.5,
+        per_token_ms: float = 2.0,
+        spike_rate: float = 0.0,
+        spike_ms: float = 5000.0
+    ):
+        if kind not in ('fixed', 'lognormal'):
+            raise ValueError(f"알 수 없는 지연 분포: {kind}")
+        self.kind = kind
+        self.base_ms = base_ms
+        self.sigma = sigma
+        self.per_token_ms = per_token_ms
+        self.spike_rate = spike_rate
+        self.spike_ms = spike_ms
+
+    def first_token_ms(self, rng: random.Random) -> float:
+        """첫 토큰까지의 지연 (스파이크 포함)"""
+        if self.kind == 'lognormal' and self.base_ms > 0:
+            latency = rng.lognormvariate(math.log(self.base_ms), self.sigma)
+        else:
+            latency = self.base_ms
+        if self.spike_rate and rng.random() < self.spike_rate:
+            latency += self.spike_ms
+        return latency
+
+    def total_ms(self, rng: random.Random, output_tokens: int) -> float:
+        """출력 토큰 수를 포함한 전체 지연"""
+        return self.first_token_ms(rng) + self.per_token_ms * output_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'kind': self.kind,
+            'base_ms': self.base_ms,
+            'sigma': self.sigma,
+            'per_token_ms': self.per_token_ms,
+            'spike_rate': self.spike_rate,
+            'spike_ms': self.spike_ms,
+        }
+
+
+def fake_value(schema: Optional[Dict[str, Any]], rng: random.Random, name: str = 'value') -> Any:
+    """
+    JSON Schema를 만족하는 결정적 값 생성
+
+    type/enum/properties/required/items와 minimum/maximum, minLength/maxLength, minItems/maxItems를 따릅니다.
+    """
+    schema = schema or {}
+    if 'enum' in schema:
+        return rng.choice(schema['enum'])
+
+    json_type = schema.get('type', 'string')
+    if isinstance(json_type, list):
+        json_type = next((t for t in json_type if t != 'null'), 'null')
+
+    if json_type == 'object':
+        properties = schema.get('properties', {})
+        value = {key: fake_value(sub_schema, rng, key) for key, sub_schema in properties.items()}
+        # properties에 없는 필수 필드는 문자열로 채움
+        for key in schema.get('required', []):
+            if key not in value:
+                value[key] = fake_value(None, rng, key)
+        return value
+    if json_type == 'array':
+        low = schema.get('minItems', min(2, schema.get('maxItems', 2)))
+        high = schema.get('maxItems', max(low, 3))
+        return [fake_value(schema.get('items'), rng, name) for _ in range(rng.randint(low, high))]
+    if json_type == 'integer':
+        low, high = _bounds(schema, 1, 5)
+        return rng.randint(math.ceil(low), math.floor(high))
+    if json_type == 'number':
+        low, high = _bounds(schema, 0.5, 1.0)
+        return min(high, max(low, round(rng.uniform(low, high), 2)))
+    if json_type == 'boolean':
+        return rng.random() < 0.5
+    if json_type == 'null':
+        return None
+
+    text = f"{name} {' '.join(rng.choice(_WORDS) for _ in range(3))}"
+    while len(text) < schema.get('minLength', 0):
+        text += ' ' + rng.choice(_WORDS)
+    if 'maxLength' in schema:
+        text = text[:schema['maxLength']]
+    return text
+
+
+def _bounds(schema: Dict[str, Any], low: float, high: float) -> Tuple[float, float]:
+    """minimum/maximum(exclusive 포함)을 반영한 숫자 범위 (한쪽만 있으면 기본 폭 유지)"""
+    width = high - low
+    minimum = schema.get('minimum')
+    maximum = schema.get('maximum')
+    if 'exclusiveMinimum' in schema:
+        minimum = schema['exclusiveMinimum'] + (1 if schema.get('type') == 'integer' else 0.01)
+    if 'exclusiveMaximum' in schema:
+        maximum = schema['exclusiveMaximum'] - (1 if schema.get('type') == 'integer' else 0.01)
+    if minimum is not None and maximum is not None:
+        return minimum, maximum
+    if minimum is not None:
+        return minimum, max(high, minimum + width)
+    if maximum is not None:
+        return min(low, maximum - width), maximum
+    return low, high
+
+
+def _seeded_rng(*parts: str) -> random.Random:
+    digest = hashlib.md5('\x00'.join(parts).encode('utf-8')).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+
+class FakeProvider(BaseLLMProvider):
+    """
+    결정적 가짜 LLM Provider
+
+    Args:
+        api_key: 사용하지 않음 (레지스트리 호환용)
+        provider_name: 대신할 제공자 이름 (계측/가격이 해당 제공자 모델로 기록됨)
+        default_model: 기본 모델 (None이면 제공자의 첫 모델)
+        latency: 지연 분포
+        error_rates: 에러 종류별 주입 비율 {'rate_limit': 0.01, 'timeout': 0.0, 'malformed_json': 0.05}
+        timeout_ms: timeout 주입 시 실패 전까지 대기 시간
+        seed: 지연/에러 샘플링 시드 (출력 내용은 항상 프롬프트로 결정)
+    """
+
+    PROVIDER_NAME = 'fake'
+
+    def __init__(
+        self,
+        api_key: str = 'fake',
+        provider_name: Optional[str] = None,
+        default_model: Optional[str] = None,
+        latency: Optional[LatencyProfile] = None,
+        error_rates: Optional[Dict[str, float]] = None,
+        timeout_ms: float = 30000.0,
+        seed: int = 0
+    ):
+        self.PROVIDER_NAME = provider_name or self.PROVIDER_NAME
+        models = models_for_provider(provider_name) if provider_name else []
+        self.AVAILABLE_MODELS = models or list(MODEL_CAPABILITIES)
+        super().__init__(api_key, default_model or self.AVAILABLE_MODELS[0])
+        self.latency = latency or LatencyProfile()
+        self.error_rates = {kind: float((error_rates or {}).get(kind, 0.0)) for kind in ERROR_KINDS}
+        self.timeout_ms = timeout_ms
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    # 샘플링 (스레드 간 공유 난수 생성기)
+
+    def _roll(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _sleep_ms(self, output_tokens: int = 0, first_token_only: bool = False):
+        with self._rng_lock:
+            if first_token_only:
+                delay = self.latency.first_token_ms(self._rng)
+            else:
+                delay = self.latency.total_ms(self._rng, output_tokens)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    def _inject_errors(self, model: str):
+        """설정된 비율로 429/타임아웃 주입"""
+        if self.error_rates['rate_limit'] and self._roll() < self.error_rates['rate_limit']:
+            raise RateLimitError(f"Rate limit 초과: 429 (fake {self.PROVIDER_NAME}/{model})")
+        if self.error_rates['timeout'] and self._roll() < self.error_rates['timeout']:
+            time.sleep(self.timeout_ms / 1000.0)
+            raise LLMProviderError(f"요청 시간 초과: {self.timeout_ms:.0f}ms (fake {self.PROVIDER_NAME}/{model})")
+
+    # 출력
+
+    def _text(self, prompt: str, model: str, max_tokens: Optional[int]) -> Tuple[str, str]:
+        """(결정적 텍스트, finish_reason)"""
+        rng = _seeded_rng(model, prompt)
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(MIN_OUTPUT_WORDS, MAX_OUTPUT_WORDS))]
+        # 문장/문단 구분 (정지 시퀀스 '\n\n' 동작 확인용)
+        parts = []
+        for i, word in enumerate(words, 1):
+            parts.append(word)
+            if i % 12 == 0:
+                parts.append('.\n\n' if i % 36 == 0 else '. ')
+            else:
+                parts.append(' ')
+        content = ''.join(parts).strip()
+
+        if max_tokens is not None and self.count_tokens(content) > max_tokens:
+            # 토큰 한도에 맞춰 자르고 잘림으로 보고
+            while len(content) > 1 and self.count_tokens(content) > max_tokens:
+                ratio = max_tokens / self.count_tokens(content)
+                content = content[:max(1, min(len(content) - 1, int(len(content) * ratio)))]
+            return content, 'length'
+        return content, 'stop'
+
+    def _check_model(self, model: Optional[str]) -> str:
+        model = model or self.default_model
+        if model not in self.AVAILABLE_MODELS:
+            raise LLMProviderError(f"모델 '{model}'을 사용할 수 없습니다. 사용 가능: {self.AVAILABLE_MODELS}")
+        return model
+
+    def generate(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
+        **kwargs
+    ) -> LLMResponse:
+        """결정적 텍스트 생성"""
+        model = self._check_model(model)
+        full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+
+        with self.observe_call(model, 'generate') as call:
+            self._inject_errors(model)
+            content, finish_reason = self._text(prompt, model, max_tokens)
+            content, stopped = apply_stop(content, stop)
+            if stopped:
+                finish_reason = 'stop'
+            completion_tokens = self.count_tokens(content)
+            self._sleep_ms(completion_tokens)
+            call.record_usage(prompt_tokens=self.count_tokens(full_prompt), completion_tokens=completion_tokens)
+
+        return LLMResponse(
+            content=content,
+            model=model,
+            tokens_used=call.tokens_used,
+            finish_reason=finish_reason,
+            prompt_tokens=call.prompt_tokens,
+            completion_tokens=call.completion_tokens
+        )
+
+    def generate_json(
+        self,
+        prompt: str,
+        schema: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.3,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """스키마를 만족하는 결정적 JSON 생성 (malformed_json 주입 시 잘린 JSON을 복구 파서로 처리)"""
+        model = self._check_model(model)
+        full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+
+        rng = _seeded_rng(model, prompt, json.dumps(schema or {}, sort_keys=True))
+        value = fake_value(schema, rng) if schema else {'result': self._text(prompt, model, 200)[0]}
+        content = json.dumps(value, ensure_ascii=False)
+
+        with self.observe_call(model, 'generate_json') as call:
+            self._inject_errors(model)
+            if self.error_rates['malformed_json'] and self._roll() < self.error_rates['malformed_json']:
+                # 출력 중간에서 잘리고 설명이 앞에 붙은 응답
+                content = "다음은 요청하신 JSON입니다:\n```json\n" + content[:max(1, len(content) * 2 // 3)]
+            completion_tokens = self.count_tokens(content)
+            self._sleep_ms(completion_tokens)
+            call.record_usage(prompt_tokens=self.count_tokens(full_prompt), completion_tokens=completion_tokens)
+            call.raw_content = content
+
+        return finalize_json(content, schema)
+
+    def generate_stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
+        **kwargs
+    ) -> LLMStream:
+        """단어 단위 스트리밍 (첫 토큰 지연 후 토큰당 지연)"""
+        model = self._check_model(model)
+        stream = LLMStream(prompt, model, counter=self.count_tokens, stop=stop)
+
+        def chunks() -> Iterator[str]:
+            with self.observe_call(model, 'generate_stream') as call:
+                try:
+                    self._inject_errors(model)
+                    content, finish_reason = self._text(prompt, model, max_tokens)
+                    self._sleep_ms(first_token_only=True)
+                    for word in content.split(' '):
+                        piece = word + ' '
+                        delay = self.latency.per_token_ms * self.count_tokens(piece)
+                        if delay > 0:
+                            time.sleep(delay / 1000.0)
+                        yield piece
+                    stream.finish_reason = finish_reason
+                finally:
+                    stream.record_usage(call)
+
+        return stream.bind(chunks())
+
+    def search_internet(
+        self,
+        query: str,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = 1000
+    ) -> Dict[str, Any]:
+        """PerplexityProvider.search_internet 호환"""
+        response = self.generate(prompt=query, model=model, temperature=0.2, max_tokens=max_tokens)
+        return {
+            'content': response.content,
+            'tokens_used': response.tokens_used,
+            'model': response.model
+        }
+
+    def count_tokens(self, text: str) -> int:
+        """토큰 수 계산 (로컬 추정)"""
+        return get_tokenizer().estimate(text)
+
+    def get_available_models(self) -> List[str]:
+        return list(self.AVAILABLE_MODELS)
+
+    def get_model_info(self) -> Dict[str, Any]:
+        info = super().get_model_info()
+        info.update({
+            'fake': True,
+            'latency': self.latency.to_dict(),
+            'error_rates': dict(self.error_rates),
+        })
+        return info
+
+
+class FakeEmbeddingClient:
+    """
+    OpenAI embeddings 호환 결정적 임베딩 클라이언트 (client.embeddings.create(model=, input=))
+
+    단어 해시를 차원에 흩뿌린 정규화 벡터라, 단어를 공유하는 텍스트는 코사인 유사도가 높습니다.
+    """
+
+    def __init__(self, dim: int = 1536, latency: Optional[LatencyProfile] = None, seed: int = 0):
+        self.dim = dim
+        self.latency = latency
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.embeddings = self
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in (text or '').lower().split() or ['']:
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            for i in range(0, 8, 2):
+                index = int.from_bytes(digest[i:i + 2], 'big') % self.dim
+                vector[index] += 1.0 if digest[i + 8] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def create(self, model: str, input: Any, **kwargs):
+        texts = input if isinstance(input, list) else [input]
+        if self.latency is not None:
+            with self._rng_lock:
+                delay = self.latency.first_token_ms(self._rng)
+            time.sleep(delay / 1000.0)
+        return SimpleNamespace(
+            model=model,
+            data=[SimpleNamespace(index=i, embedding=self.embed(text)) for i, text in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=sum(get_tokenizer().estimate(t) for t in texts)),
+        )
+
+
+class InMemoryVectorIndex:
+    """Pinecone Index 호환 메모리 벡터 인덱스 (upsert/query/delete, 코사인 유사도)"""
+
+    def __init__(self):
+        self._namespaces: Dict[str, Dict[str, tuple]] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: List[tuple], namespace: str = '', **kwargs):
+        with self._lock:
+            store = self._namespaces.setdefault(namespace, {})
+            for vector_id, values, *rest in vectors:
+                store[str(vector_id)] = (values, rest[0] if rest else {})
+        return SimpleNamespace(upserted_count=len(vectors))
+
+    def query(self, vector: List[float], top_k: int = 5, namespace: str = '',
+              include_metadata: bool = False, **kwargs):
+        with self._lock:
+            items = list(self._namespaces.get(namespace, {}).items())
+        scored = []
+        for vector_id, (values, metadata) in items:
+            score = sum(a * b for a, b in zip(vector, values))
+            scored.append(SimpleNamespace(
+                id=vector_id,
+                score=score,
+                metadata=metadata if include_metadata else None
+            ))
+        scored.sort(key=lambda match: match.score, reverse=True)
+        return SimpleNamespace(matches=scored[:top_k])
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: str = '', **kwargs):
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace, None)
+            else:
+                store = self._namespaces.get(namespace, {})
+                for vector_id in ids or []:
+                    store.pop(str(vector_id), None)
+
+
+def build_latency_profile(config: Dict[str, Any]) -> LatencyProfile:
+    """settings.PROMPT_MATE 설정에서 지연 분포 생성"""
+    return LatencyProfile(
+        kind=config.get('FAKE_LLM_LATENCY_PROFILE', 'lognormal'),
+        base_ms=config.get('FAKE_LLM_LATENCY_MS', 300.0),
+        sigma=config.get('FAKE_LLM_LATENCY_SIGMA', 0.5),
+        per_token_ms=config.get('FAKE_LLM_PER_TOKEN_MS', 2.0),
+        spike_rate=config.get('FAKE_LLM_SPIKE_RATE', 0.0),
+        spike_ms=config.get('FAKE_LLM_SPIKE_MS', 5000.0),
+    )
+
+
+def build_fake_provider(provider_name: str, config: Dict[str, Any]) -> FakeProvider:
+    """settings.PROMPT_MATE 설정으로 제공자 이름을 대신하는 FakeProvider 생성"""
+    return FakeProvider(
+        provider_name=provider_name,
+        latency=build_latency_profile(config),
+        error_rates=parse_task_map(config.get('FAKE_LLM_ERROR_RATES', '')),
+        timeout_ms=config.get('FAKE_LLM_TIMEOUT_MS', 30000.0),
+        seed=config.get('FAKE_LLM_SEED', 0),
+    )
+
+
+# 프로세스 전역 가짜 벡터 인덱스 (RAGManager 인스턴스 간 공유)
+_vector_index: Optional[InMemoryVectorIndex] = None
+
+
+def get_fake_vector_index() -> InMemoryVectorIndex:
+    """전역 InMemoryVectorIndex 인스턴스 가져오기 (싱글톤)"""
+    global _vector_index
+    if _vector_index is None:
+        _vector_index = InMemoryVectorIndex()
+    return _vector_index
@@ -7,32 +7,44 @@ Google Generative AI (Gemini) API를 위한 Provider 구현
 
 import json
 import logging
-from typing import Dict, Any, Optional, List
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
 
 from .base import (
     BaseLLMProvider,
     LLMResponse,
+    LLMStream,
     LLMProviderError,
     RateLimitError,
     InvalidResponseError,
     ModelNotFoundError
 )
+from .capabilities import get_capabilities, models_for_provider
+from .single_flight import coalesced
+from .structured import JSON_SYSTEM_PROMPT, finalize_json, to_gemini_schema
+from .tokenizer import get_tokenizer
 
 logger = logging.getLogger(__name__)
 
 
+# GenerativeModel 핸들 풀 최대 크기 ((모델, 생성 설정) 조합 수)
+MODEL_POOL_SIZE = 32
+
+
 class GoogleProvider(BaseLLMProvider):
     """Google Generative AI (Gemini) Provider"""
     
-    AVAILABLE_MODELS = [
-        'gemini-1.5-pro',
-        'gemini-1.5-flash',
-        'gemini-1.0-pro',
-    ]
+    PROVIDER_NAME = 'google'
+    
+    AVAILABLE_MODELS = models_for_provider('google')
     
     def __init__(self, api_key: str, default_model: str = 'gemini-1.5-flash'):
         super().__init__(api_key, default_model)
         self.genai = None
+        # (모델, 생성 설정) → GenerativeModel (LRU)
+        self._models: OrderedDict = OrderedDict()
+        self._models_lock = threading.Lock()
         self._initialize_client()
     
     def _initialize_client(self):
@@ -53,6 +65,47 @@ class GoogleProvider(BaseLLMProvider):
             logger.error(f"Google 클라이언트 초기화 실패: {e}")
             raise LLMProviderError(f"Google 초기화 실패: {e}")
     
+    def _get_model(self, model_name: str, generation_config: Dict[str, Any]):
+        """
+        (모델, 생성 설정)별 GenerativeModel 핸들 재사용
+        
+        핸들은 설정만 담은 가벼운 객체라 요청 간 공유해도 안전하며,
+        호출마다 새로 만들지 않도록 최근 사용 순으로 MODEL_POOL_SIZE개까지 보관합니다.
+        """
+        key = (model_name, json.dumps(generation_config, sort_keys=True, ensure_ascii=False))
+        with self._models_lock:
+            model_instance = self._models.get(key)
+            if model_instance is not None:
+                self._models.move_to_end(key)
+                return model_instance
+        
+        model_instance = self.genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=generation_config
+        )
+        with self._models_lock:
+            self._models[key] = model_instance
+            while len(self._models) > MODEL_POOL_SIZE:
+                self._models.popitem(last=False)
+        return model_instance
+    
+    def _usage(self, response: Any, prompt: str, content: str) -> Tuple[int, int, int]:
+        """
+        응답의 usage_metadata에서 (입력, 출력, 캐시) 토큰 수
+        
+        usage_metadata가 없는 응답(구버전 SDK 등)만 로컬 추정으로 보완합니다.
+        """
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+        completion_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+        cached_tokens = getattr(usage, 'cached_content_token_count', 0) or 0
+        if not prompt_tokens:
+            prompt_tokens = self.count_tokens(prompt)
+        if not completion_tokens and content:
+            completion_tokens = self.count_tokens(content)
+        return prompt_tokens, completion_tokens, cached_tokens
+    
+    @coalesced
     def generate(
         self,
         prompt: str,
@@ -60,6 +113,7 @@ class GoogleProvider(BaseLLMProvider):
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
         system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
         **kwargs
     ) -> LLMResponse:
         """텍스트 생성"""
@@ -78,22 +132,27 @@ class GoogleProvider(BaseLLMProvider):
             }
             if max_tokens:
                 generation_config["max_output_tokens"] = max_tokens
+            if stop:
+                generation_config["stop_sequences"] = stop
             
-            model_instance = self.genai.GenerativeModel(
-                model_name=model_name,
-                generation_config=generation_config
-            )
+            model_instance = self._get_model(model_name, generation_config)
             
             # 시스템 프롬프트 처리 (Gemini는 system instruction 지원)
             full_prompt = prompt
             if system_prompt:
                 full_prompt = f"{system_prompt}\n\n{prompt}"
             
-            response = model_instance.generate_content(full_prompt)
-            
-            content = response.text
-            # Gemini API는 토큰 사용량을 제공하지 않을 수 있음
-            tokens_used = self.count_tokens(prompt) + self.count_tokens(content)
+            with self.observe_call(model_name, 'generate') as call:
+                response = model_instance.generate_content(full_prompt)
+                
+                content = response.text
+                prompt_tokens, completion_tokens, cached_tokens = self._usage(response, full_prompt, content)
+                call.record_usage(
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    cached_tokens=cached_tokens
+                )
+                tokens_used = call.tokens_used
             finish_reason = getattr(response.candidates[0], 'finish_reason', None) if response.candidates else None
             
             logger.debug(f"Google 생성 완료: 약 {tokens_used} 토큰 사용")
@@ -103,7 +162,10 @@ class GoogleProvider(BaseLLMProvider):
                 model=model_name,
                 tokens_used=tokens_used,
                 finish_reason=str(finish_reason) if finish_reason else None,
-                raw_response=response
+                raw_response=response,
+                prompt_tokens=call.prompt_tokens,
+                completion_tokens=call.completion_tokens,
+                cached_tokens=call.cached_tokens
             )
         
         except Exception as e:
@@ -115,6 +177,7 @@ class GoogleProvider(BaseLLMProvider):
             else:
                 raise LLMProviderError(f"Google API 호출 실패: {error_msg}")
     
+    @coalesced
     def generate_json(
         self,
         prompt: str,
@@ -129,71 +192,118 @@ class GoogleProvider(BaseLLMProvider):
             raise LLMProviderError("Google 클라이언트가 초기화되지 않았습니다.")
         
         model_name = model or self.default_model
+        caps = get_capabilities(model_name)
+        # 스키마가 주어지고 모델이 지원하면 response_schema로 출력 구조를 API에서 강제
+        native_schema = bool(schema) and caps is not None and caps.json_schema
         
-        # JSON 모드 지시 추가
-        json_instruction = "\n\n반드시 유효한 JSON 형식으로만 응답하세요. 마크다운이나 다른 텍스트 없이 순수 JSON만 반환하세요."
-        full_prompt = prompt + json_instruction
-        
-        # 시스템 프롬프트에도 JSON 요청 추가
-        if system_prompt:
-            full_system_prompt = system_prompt + "\n\n당신은 항상 순수 JSON 형식으로만 응답합니다."
+        if native_schema:
+            full_prompt = prompt
         else:
-            full_system_prompt = "당신은 JSON 형식으로 응답하는 AI 어시스턴트입니다."
+            # JSON 모드 지시 추가
+            full_prompt = prompt + "\n\n반드시 유효한 JSON 형식으로만 응답하세요. 마크다운이나 다른 텍스트 없이 순수 JSON만 반환하세요."
+        
+        # 시스템 프롬프트는 바이트 그대로 맨 앞에 둬 프롬프트 접두사를 호출 간 동일하게 유지
+        full_system_prompt = system_prompt or JSON_SYSTEM_PROMPT
         
         try:
             generation_config = {
                 "temperature": temperature,
-                "response_mime_type": "application/json",  # Gemini 1.5는 JSON 모드 지원
             }
+            # Gemini 1.5는 JSON 모드와 응답 스키마 지원
+            if caps is not None and caps.json_mode:
+                generation_config["response_mime_type"] = "application/json"
+            if native_schema:
+                generation_config["response_schema"] = to_gemini_schema(schema)
             
-            model_instance = self.genai.GenerativeModel(
-                model_name=model_name,
-                generation_config=generation_config
-            )
+            model_instance = self._get_model(model_name, generation_config)
             
             full_input = f"{full_system_prompt}\n\n{full_prompt}"
-            response = model_instance.generate_content(full_input)
+            with self.observe_call(model_name, 'generate_json') as call:
+                response = model_instance.generate_content(full_input)
+                content = response.text
+                prompt_tokens, completion_tokens, cached_tokens = self._usage(response, full_input, content)
+                call.record_usage(
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    cached_tokens=cached_tokens
+                )
+                call.raw_content = content
             
-            content = response.text
-            
-            # JSON 파싱
-            try:
-                parsed_json = json.loads(content)
-                logger.debug(f"JSON 파싱 성공: {len(content)} 문자")
-                return parsed_json
-            except json.JSONDecodeError as je:
-                logger.error(f"JSON 파싱 실패: {je}")
-                # 재시도: content에서 JSON 추출 시도
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    try:
-                        return json.loads(json_match.group())
-                    except:
-                        pass
-                raise InvalidResponseError(f"JSON 파싱 실패: {content[:200]}")
+            return finalize_json(content, schema)
         
         except (RateLimitError, InvalidResponseError, ModelNotFoundError):
             raise
         except Exception as e:
             raise LLMProviderError(f"Google JSON 생성 실패: {str(e)}")
     
+    def generate_stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
+        **kwargs
+    ) -> LLMStream:
+        """
+        스트리밍 텍스트 생성
+        
+        Gemini SDK 스트림은 명시적으로 닫을 수 없으므로, close() 시 더 이상 청크를 읽지 않고
+        응답 객체를 버려 연결이 정리되도록 합니다.
+        """
+        if not self.genai:
+            raise LLMProviderError("Google 클라이언트가 초기화되지 않았습니다.")
+        
+        model_name = model or self.default_model
+        
+        if model_name not in self.AVAILABLE_MODELS:
+            raise ModelNotFoundError(f"모델 '{model_name}'을 사용할 수 없습니다. 사용 가능: {self.AVAILABLE_MODELS}")
+        
+        generation_config = {
+            "temperature": temperature,
+        }
+        if max_tokens:
+            generation_config["max_output_tokens"] = max_tokens
+        if stop:
+            generation_config["stop_sequences"] = stop
+        
+        full_prompt = prompt
+        if system_prompt:
+            full_prompt = f"{system_prompt}\n\n{prompt}"
+        
+        stream = LLMStream(prompt, model_name, counter=self.count_tokens)
+        
+        def chunks():
+            with self.observe_call(model_name, 'generate_stream') as call:
+                try:
+                    model_instance = self._get_model(model_name, generation_config)
+                    response = model_instance.generate_content(full_prompt, stream=True)
+                    for chunk in response:
+                        if chunk.candidates and getattr(chunk.candidates[0], 'finish_reason', None):
+                            stream.finish_reason = str(chunk.candidates[0].finish_reason)
+                        usage = getattr(chunk, 'usage_metadata', None)
+                        if usage:
+                            stream.prompt_tokens = usage.prompt_token_count
+                            stream.completion_tokens = usage.candidates_token_count
+                            stream.cached_tokens = getattr(usage, 'cached_content_token_count', 0) or 0
+                        if chunk.parts:
+                            yield chunk.text
+                except Exception as e:
+                    raise LLMProviderError(f"Google 스트리밍 실패: {e}")
+                finally:
+                    stream.record_usage(call)
+        
+        return stream.bind(chunks())
+    
     def count_tokens(self, text: str) -> int:
-        """토큰 수 계산 (근사치)"""
-        # Gemini도 비슷한 방식으로 근사
-        if self.genai:
-            try:
-                model = self.genai.GenerativeModel(self.default_model)
-                result = model.count_tokens(text)
-                return result.total_tokens
-            except:
-                pass
-        
-        # 폴백: 간단 추정
-        korean_chars = len([c for c in text if '가' <= c <= '힣'])
-        other_chars = len(text) - korean_chars
-        estimated = (korean_chars * 2) + (other_chars // 4)
-        return max(1, estimated)
+        """
+        토큰 수 계산 (로컬 추정)
+        
+        Gemini 토크나이저는 로컬에서 쓸 수 없고 count_tokens API는 호출마다 HTTP 왕복이 필요하므로
+        문자 종류별 추정을 사용합니다. 실제 과금 토큰은 응답의 usage_metadata로 기록합니다.
+        """
+        return get_tokenizer().estimate(text)
     
     def get_available_models(self) -> List[str]:
         """사용 가능한 모델 목록"""
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+헤징(Hedged Request) 정책
+
+지연 시간 꼬리가 긴 경량 모델 작업(의도 파싱, 질문 생성)에서,
+호출이 최근 지연 시간의 특정 백분위(p95 등) 안에 끝나지 않으면
+같은 제공자 또는 대체 제공자로 중복 요청을 보내고 먼저 성공한 결과를 사용합니다.
+
+두 요청은 각각 전용 스레드에서 실행하며, 호출자는 먼저 성공한 결과를 받는 즉시 반환합니다.
+텍스트 생성(generate)은 generate_stream으로 보내 진 쪽 스트림을 닫아(LLMStream.close())
+업스트림 생성을 중단합니다. 취소는 다음 조각을 받을 때 적용되므로 첫 토큰 전에는 중단되지 않습니다.
+JSON 생성(generate_json)은 동기 SDK 호출이라 강제로 중단할 수 없어 진 쪽 요청이 끝날 때까지 실행됩니다.
+진 쪽 요청이 사용한 토큰은 요청의 비용 원장에 청구하고, 추가 비용과 낭비된 시간으로 집계합니다.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional, List, Callable
+
+from django.db import connections
+
+from prompt_mate import cost_ledger
+
+from .base import BaseLLMProvider, LLMResponse, LLMStream
+from .instrumentation import (
+    LatencyWindow, ProviderCall, collect_calls, current_call_sink, get_model_stats, percentile
+)
+
+logger = logging.getLogger(__name__)
+
+
+class HedgePolicy:
+    """
+    헤징 정책 및 통계
+
+    Args:
+        tasks: 헤징을 적용할 작업 유형 값 목록 (예: ['intent_parsing'])
+        percentile: 헤지 지연으로 사용할 최근 지연 시간 백분위
+        min_samples: 백분위를 신뢰하기 위한 최소 샘플 수 (부족하면 default_delay_ms 사용)
+        default_delay_ms: 샘플이 부족할 때의 헤지 지연
+        min_delay_ms: 헤지 지연 하한 (과도한 중복 요청 방지)
+        alternate: 중복 요청을 보낼 대체 대상 'provider:model' (비어 있으면 같은 제공자/모델)
+    """
+
+    def __init__(
+        self,
+        tasks: List[str],
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        default_delay_ms: float = 2000.0,
+        min_delay_ms: float = 200.0,
+        alternate: str = ''
+    ):
+        self.tasks = set(tasks)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay_ms = default_delay_ms
+        self.min_delay_ms = min_delay_ms
+        self.alternate_provider, _, self.alternate_model = alternate.partition(':')
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        self.extra_tokens = 0
+        # 진 요청: 취소된 수, 호출자에게 결과를 돌려준 뒤 더 실행된 시간 합계
+        self.losers_cancelled = 0
+        self.loser_wasted_ms = 0.0
+        # 호출자가 실제로 기다린 시간 vs 원 요청만 기다렸다면 걸렸을 시간
+        self.effective_latency = LatencyWindow(1000)
+        self.primary_latency = LatencyWindow(1000)
+
+    def applies_to(self, task_type) -> bool:
+        return getattr(task_type, 'value', task_type) in self.tasks
+
+    def hedge_delay_ms(self, provider_name: str, model: str) -> float:
+        """최근 지연 시간 기준 헤지 지연 계산"""
+        window = get_model_stats().get(provider_name, model).latency
+        if len(window) < self.min_samples:
+            return self.default_delay_ms
+        return max(self.min_delay_ms, window.percentile(self.percentile))
+
+    def record(self, effective_ms: float, primary_ms: Optional[float], hedged: bool, hedge_won: bool):
+        with self._lock:
+            self.calls += 1
+            if hedged:
+                self.hedges_fired += 1
+            if hedge_won:
+                self.hedge_wins += 1
+        self.effective_latency.add(effective_ms)
+        if primary_ms is not None:
+            self.primary_latency.add(primary_ms)
+
+    def add_extra_tokens(self, tokens: int):
+        with self._lock:
+            self.extra_tokens += tokens
+
+    def record_loser(self, wasted_ms: float, cancelled: bool):
+        with self._lock:
+            if cancelled:
+                self.losers_cancelled += 1
+            self.loser_wasted_ms += wasted_ms
+
+    def get_stats(self) -> Dict[str, Any]:
+        """헤징 효과 지표 (추가 비용, p99 개선)"""
+        effective = self.effective_latency.values()
+        primary = self.primary_latency.values()
+        effective_p99 = percentile(effective, 99)
+        primary_p99 = percentile(primary, 99)
+        return {
+            'tasks': sorted(self.tasks),
+            'percentile': self.percentile,
+            'calls': self.calls,
+            'hedges_fired': self.hedges_fired,
+            'hedge_rate': self.hedges_fired / self.calls if self.calls else 0.0,
+            'hedge_wins': self.hedge_wins,
+            'extra_tokens': self.extra_tokens,
+            'losers_cancelled': self.losers_cancelled,
+            'loser_wasted_ms': self.loser_wasted_ms,
+            'effective_p99_ms': effective_p99,
+            'primary_p99_ms': primary_p99,
+            'p99_improvement_ms': (
+                primary_p99 - effective_p99
+                if primary_p99 is not None and effective_p99 is not None else None
+            ),
+        }
+
+
+class _Leg:
+    """
+    헤징 요청 한 갈래 (원 요청 또는 중복 요청)
+
+    갈래마다 전용 스레드에서 실행합니다 (공유 스레드 풀의 작업자 수 제한/대기열 없음).
+    제공자 호출 기록은 갈래 안에서 모았다가 호출자가 요청의 호출 목록과 비용 원장으로 넘깁니다.
+    fn이 LLMStream을 돌려주면 갈래 스레드에서 끝까지 읽어 LLMResponse로 바꾸고,
+    cancel()되면 다음 조각에서 스트림을 닫습니다 (다른 스레드에서 실행 중인 제너레이터는 닫을 수 없음).
+    """
+
+    def __init__(self, fn: Callable[[], Any], finished: threading.Event):
+        self.fn = fn
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.calls: List[ProviderCall] = []
+        self.stream: Optional[LLMStream] = None
+        self.done = threading.Event()
+        self.cancelled = threading.Event()
+        self._finished = finished
+        self._callbacks: List[Callable[['_Leg'], None]] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> '_Leg':
+        # 현재 컨텍스트(트레이스 등)를 복사해 실행, 원장 기록은 호출자가 넘겨받아 처리
+        ctx = contextvars.copy_context()
+        threading.Thread(target=ctx.run, args=(self._run,), name='llm-hedge', daemon=True).start()
+        return self
+
+    @property
+    def ok(self) -> bool:
+        return self.done.is_set() and self.error is None
+
+    @property
+    def was_cancelled(self) -> bool:
+        return self.stream is not None and self.stream.cancelled
+
+    def cancel(self):
+        """스트리밍 갈래 중단 요청 (동기 호출 갈래는 끝날 때까지 실행)"""
+        self.cancelled.set()
+
+    def then(self, callback: Callable[['_Leg'], None]):
+        """완료 시 callback 호출 (이미 끝났으면 바로 호출)"""
+        with self._lock:
+            if not self.done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _run(self):
+        cost_ledger.activate(None)
+        try:
+            with collect_calls() as calls:
+                try:
+                    result = self.fn()
+                    if isinstance(result, LLMStream):
+                        result = self._drain(result)
+                    self.result = result
+                except BaseException as e:
+                    self.error = e
+            self.calls = calls
+            with self._lock:
+                self.done.set()
+                callbacks, self._callbacks = self._callbacks, []
+            self._finished.set()
+            for callback in callbacks:
+                try:
+                    callback(self)
+                except Exception as e:
+                    logger.warning(f"헤지 요청 완료 처리 실패: {e}")
+        finally:
+            connections.close_all()
+
+    def _drain(self, stream: LLMStream) -> LLMResponse:
+        self.stream = stream
+        if self.cancelled.is_set():
+            stream.close()
+            return stream.to_response()
+        for _ in stream:
+            if self.cancelled.is_set():
+                stream.close()
+                break
+        return stream.to_response()
+
+
+class HedgedProvider(BaseLLMProvider):
+    """
+    헤징을 적용하는 Provider 래퍼
+
+    ModelRouter가 헤징 대상 작업에 대해 원래 제공자 대신 반환합니다.
+    두 갈래의 제공자 호출은 모두 요청의 호출 목록(collect_calls)과 비용 원장에 기록되며,
+    호출자에게 결과를 돌려준 뒤 끝난 진 쪽 요청도 완료 시점에 원장에 청구합니다.
+    generate는 두 갈래 모두 generate_stream으로 보내 진 쪽을 취소할 수 있게 합니다.
+    """
+
+    def __init__(
+        self,
+        primary: BaseLLMProvider,
+        policy: HedgePolicy,
+        alternate: Optional[BaseLLMProvider] = None,
+        alternate_model: Optional[str] = None
+    ):
+        self.primary = primary
+        self.policy = policy
+        self.alternate = alternate
+        self.alternate_model = alternate_model
+        self.PROVIDER_NAME = primary.PROVIDER_NAME
+        super().__init__(primary.api_key, primary.default_model)
+
+    def generate(self, prompt: str, model: Optional[str] = None, **kwargs) -> LLMResponse:
+        # 스트림은 single-flight 병합 대상이 아니므로 coalesce 인자는 쓰지 않음
+        kwargs.pop('coalesce', None)
+        return self._hedged('generate_stream', prompt, model, kwargs)
+
+    def generate_json(self, prompt: str, schema: Optional[Dict[str, Any]] = None,
+                      model: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        kwargs['schema'] = schema
+        return self._hedged('generate_json', prompt, model, kwargs)
+
+    def count_tokens(self, text: str) -> int:
+        return self.primary.count_tokens(text)
+
+    def get_available_models(self) -> List[str]:
+        return self.primary.get_available_models()
+
+    def get_model_info(self) -> Dict[str, Any]:
+        info = self.primary.get_model_info()
+        info['hedged'] = True
+        return info
+
+    @staticmethod
+    def _forward(leg: _Leg, sink: Optional[List[ProviderCall]], ledger):
+        """갈래의 제공자 호출을 요청의 호출 목록과 비용 원장으로 넘김"""
+        if sink is not None:
+            sink.extend(leg.calls)
+        for call in leg.calls:
+            cost_ledger.record_call(call, ledger=ledger)
+
+    def _hedged(self, method: str, prompt: str, model: Optional[str], kwargs: Dict[str, Any]):
+        model = model or self.primary.default_model
+        delay_ms = self.policy.hedge_delay_ms(self.primary.PROVIDER_NAME, model)
+        sink = current_call_sink()
+        ledger = cost_ledger.current_ledger()
+        started = time.perf_counter()
+
+        finished = threading.Event()
+        primary = _Leg(lambda: getattr(self.primary, method)(prompt, model=model, **kwargs), finished).start()
+        if primary.done.wait(delay_ms / 1000.0) and primary.error is None:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.policy.record(elapsed, elapsed, hedged=False, hedge_won=False)
+            self._forward(primary, sink, ledger)
+            return primary.result
+
+        # 원 요청이 늦거나 실패 → 중복 요청 발사
+        if self.alternate is not None:
+            hedge_provider = self.alternate
+            hedge_model = self.alternate_model or self.alternate.default_model
+        else:
+            hedge_provider, hedge_model = self.primary, model
+        logger.info(
+            f"헤지 요청 발사: {self.primary.PROVIDER_NAME}/{model} "
+            f"{delay_ms:.0f}ms 초과 → {hedge_provider.PROVIDER_NAME}/{hedge_model}"
+        )
+        # 같은 요청을 다시 보내므로 single-flight 병합을 우회 (스트림은 병합하지 않음)
+        hedge_kwargs = kwargs if method == 'generate_stream' else {**kwargs, 'coalesce': False}
+        hedge = _Leg(
+            lambda: getattr(hedge_provider, method)(prompt, model=hedge_model, **hedge_kwargs),
+            finished
+        ).start()
+
+        while True:
+            winner = primary if primary.ok else hedge if hedge.ok else None
+            if winner is not None or (primary.done.is_set() and hedge.done.is_set()):
+                break
+            finished.wait()
+            finished.clear()
+
+        effective_ms = (time.perf_counter() - started) * 1000
+        if winner is None:
+            self._forward(primary, sink, ledger)
+            self._forward(hedge, sink, ledger)
+            self.policy.record(effective_ms, None, hedged=True, hedge_won=False)
+            raise hedge.error or primary.error
+
+        hedge_won = winner is hedge
+        self._forward(winner, sink, ledger)
+        self._settle_loser(primary if hedge_won else hedge, sink, ledger, started, is_primary=hedge_won)
+        # 원 요청이 이겼다면 그 지연이 곧 원 요청 지연 (졌다면 완료 시 _settle_loser에서 기록)
+        self.policy.record(
+            effective_ms,
+            None if hedge_won else effective_ms,
+            hedged=True,
+            hedge_won=hedge_won
+        )
+        return winner.result
+
+    def _settle_loser(self, loser: _Leg, sink, ledger, started: float, is_primary: bool):
+        """
+        진 요청 정산
+
+        스트리밍 갈래는 취소하고, 동기 SDK 호출(generate_json)은 중단할 수 없으므로 완료를 기다립니다.
+        끝나면 사용한 토큰을 원장에 청구하고 추가 비용, 결과 반환 뒤 더 실행된 시간, 원 요청 지연을 집계합니다.
+        취소된 원 요청의 지연은 취소 시점까지(하한)입니다.
+        호출 목록에는 호출자에게 돌아가기 전에 끝난 경우만 들어갑니다.
+        """
+        returned = threading.Event()
+        returned_at = time.perf_counter()
+
+        def on_done(leg: _Leg):
+            now = time.perf_counter()
+            if not returned.is_set() and sink is not None:
+                sink.extend(leg.calls)
+            for call in leg.calls:
+                cost_ledger.record_call(call, ledger=ledger)
+            self.policy.add_extra_tokens(sum(c.tokens_used for c in leg.calls))
+            self.policy.record_loser(max(0.0, (now - returned_at) * 1000), cancelled=leg.was_cancelled)
+            if is_primary and leg.error is None:
+                self.policy.primary_latency.add((now - started) * 1000)
+
+        loser.cancel()
+        loser.then(on_done)
+        returned.set()
+
+
+def build_hedge_policy(config: Dict[str, Any]) -> Optional[HedgePolicy]:
+    """settings.PROMPT_MATE 설정에서 헤징 정책 생성 (비활성화 시 None)"""
+    if not config.get('HEDGING_ENABLED', False):
+        return None
+    return HedgePolicy(
+        tasks=[t.strip() for t in config.get('HEDGING_TASKS', '').split(',') if t.strip()],
+        percentile=config.get('HEDGING_PERCENTILE', 95.0),
+        min_samples=config.get('HEDGING_MIN_SAMPLES', 20),
+        default_delay_ms=config.get('HEDGING_DEFAULT_DELAY_MS', 2000.0),
+        alternate=config.get('HEDGING_ALTERNATE', ''),
+    )
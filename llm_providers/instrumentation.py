@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 호출 계측
+
+각 제공자/모델별로 최근 호출의 지연 시간, 성공 여부, 토큰 수, 비용을 롤링 윈도우로 추적합니다.
+헤징 지연 계산, 적응형 라우팅 등이 이 데이터를 사용합니다.
+"""
+
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from prompt_mate.metrics import (
+    PROVIDER_COST, PROVIDER_ERRORS, PROVIDER_LATENCY, PROVIDER_REQUESTS, PROVIDER_TOKENS
+)
+from prompt_mate.cost_ledger import record_call
+from prompt_mate.tracing import current_span_name, span
+
+from .pricing import estimate_cost
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """
+    최근접 순위(nearest-rank) 방식의 백분위수
+
+    Args:
+        values: 값 리스트
+        pct: 백분위 (0-100)
+
+    Returns:
+        백분위 값 (값이 없으면 None)
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LatencyWindow:
+    """최근 N개 샘플의 롤링 윈도우 (스레드 안전)"""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, value: float):
+        with self._lock:
+            self._samples.append(value)
+
+    def values(self) -> List[float]:
+        with self._lock:
+            return list(self._samples)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        return percentile(self.values(), pct)
+
+
+class ModelStats:
+    """제공자/모델 하나의 롤링 통계"""
+
+    def __init__(self, provider: str, model: str, window: int = 200):
+        self.provider = provider
+        self.model = model
+        self.latency = LatencyWindow(window)
+        # 최근 호출 결과 (1=에러, 0=성공)
+        self.outcomes = LatencyWindow(window)
+        # 최근 성공 호출의 (토큰 수, 비용)
+        self._usage = deque(maxlen=window)
+        self.total_calls = 0
+        self.total_errors = 0
+        self.total_cancelled = 0
+        self.total_tokens = 0
+        self.total_cost = 0.0
+        # 프롬프트 캐시 적중률 계산용 (성공 호출 기준)
+        self.total_prompt_tokens = 0
+        self.total_cached_tokens = 0
+
+    def record(self, latency_ms: float, ok: bool, tokens: int = 0, cost: float = 0.0,
+               prompt_tokens: int = 0, cached_tokens: int = 0):
+        self.total_calls += 1
+        self.outcomes.add(0 if ok else 1)
+        if ok:
+            self.latency.add(latency_ms)
+            self.total_tokens += tokens
+            self.total_cost += cost
+            self.total_prompt_tokens += prompt_tokens
+            self.total_cached_tokens += cached_tokens
+            self._usage.append((tokens, cost))
+        else:
+            self.total_errors += 1
+
+    def record_cancelled(self, tokens: int = 0, cost: float = 0.0):
+        """취소된 호출 (지연/에러율 윈도우에는 넣지 않고 사용량만 누적)"""
+        self.total_calls += 1
+        self.total_cancelled += 1
+        self.total_tokens += tokens
+        self.total_cost += cost
+
+    @property
+    def error_rate(self) -> float:
+        """최근 윈도우의 에러율"""
+        outcomes = self.outcomes.values()
+        return sum(outcomes) / len(outcomes) if outcomes else 0.0
+
+    @property
+    def cost_per_1k_tokens(self) -> Optional[float]:
+        """최근 윈도우의 실효 1K 토큰당 비용 (실제 입력/출력 비율 반영)"""
+        usage = list(self._usage)
+        tokens = sum(u[0] for u in usage)
+        if not tokens:
+            return None
+        return sum(u[1] for u in usage) / tokens * 1000
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        """입력 토큰 중 프롬프트 캐시에서 읽은 비율"""
+        if not self.total_prompt_tokens:
+            return None
+        return self.total_cached_tokens / self.total_prompt_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        samples = self.latency.values()
+        return {
+            'provider': self.provider,
+            'model': self.model,
+            'calls': self.total_calls,
+            'errors': self.total_errors,
+            'cancelled': self.total_cancelled,
+            'error_rate': self.error_rate,
+            'tokens': self.total_tokens,
+            'cost_usd': self.total_cost,
+            'cost_per_1k_tokens': self.cost_per_1k_tokens,
+            'cached_tokens': self.total_cached_tokens,
+            'cache_hit_ratio': self.cache_hit_ratio,
+            'samples': len(samples),
+            'p50_ms': percentile(samples, 50),
+            'p95_ms': percentile(samples, 95),
+            'p99_ms': percentile(samples, 99),
+        }
+
+
+class ModelStatsRegistry:
+    """프로세스 전역 모델 통계 저장소"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._stats: Dict[tuple, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, model: str) -> ModelStats:
+        key = (provider, model)
+        stats = self._stats.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(key, ModelStats(provider, model, self.window))
+        return stats
+
+    def record(self, provider: str, model: str, latency_ms: float, ok: bool,
+               tokens: int = 0, cost: float = 0.0, prompt_tokens: int = 0, cached_tokens: int = 0):
+        self.get(provider, model).record(latency_ms, ok, tokens, cost, prompt_tokens, cached_tokens)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            stats = list(self._stats.values())
+        return [s.to_dict() for s in stats]
+
+
+class ProviderCall:
+    """
+    제공자 호출 한 번의 계측 정보
+
+    BaseLLMProvider.observe_call() 컨텍스트 매니저가 생성하며,
+    제공자는 응답을 받은 뒤 tokens_used(가능하면 prompt/completion 구분)를 채웁니다.
+    """
+
+    def __init__(self, provider: str, model: str, operation: str):
+        self.provider = provider
+        self.model = model
+        self.operation = operation
+        self.tokens_used = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # 프롬프트 캐시 읽기/쓰기 토큰 (prompt_tokens에 포함)
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+        self.started_at = time.perf_counter()
+        self.latency_ms: Optional[float] = None
+        self.error: Optional[BaseException] = None
+        self.cancelled = False
+        # 호출한 요청 단계 (비용 원장 기록용)
+        self.stage = ''
+        # generate_json의 파싱 전 응답 원문 (카세트 녹화용, 제공자가 채움)
+        self.raw_content: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def record_usage(self, prompt_tokens: int = 0, completion_tokens: int = 0, total_tokens: int = 0,
+                     cached_tokens: int = 0, cache_write_tokens: int = 0):
+        """
+        응답의 토큰 사용량 기록
+
+        prompt_tokens는 캐시 토큰을 포함한 전체 입력 토큰입니다
+        (Anthropic처럼 따로 보고하는 제공자는 합쳐서 전달).
+        """
+        self.prompt_tokens = prompt_tokens or 0
+        self.completion_tokens = completion_tokens or 0
+        self.cached_tokens = cached_tokens or 0
+        self.cache_write_tokens = cache_write_tokens or 0
+        self.tokens_used = total_tokens or (self.prompt_tokens + self.completion_tokens)
+
+    @property
+    def cost_usd(self) -> float:
+        return estimate_cost(
+            self.model, self.prompt_tokens, self.completion_tokens, self.tokens_used,
+            self.cached_tokens, self.cache_write_tokens
+        )
+
+
+# 현재 컨텍스트의 호출을 모으는 수집기 (헤징 등에서 사용)
+_call_sink: contextvars.ContextVar = contextvars.ContextVar('llm_call_sink', default=None)
+
+
+def current_call_sink() -> Optional[List[ProviderCall]]:
+    """현재 컨텍스트의 호출 수집 목록 (collect_calls 블록 밖이면 None)"""
+    return _call_sink.get()
+
+
+@contextmanager
+def collect_calls():
+    """
+    블록 안에서 완료된 ProviderCall을 리스트로 수집
+
+    사용법:
+        with collect_calls() as calls:
+            provider.generate(...)
+        tokens = sum(c.tokens_used for c in calls)
+    """
+    calls: List[ProviderCall] = []
+    token = _call_sink.set(calls)
+    try:
+        yield calls
+    finally:
+        _call_sink.reset(token)
+
+
+@contextmanager
+def observe_call(provider: str, model: str, operation: str):
+    """
+    제공자 API 호출을 계측하는 컨텍스트 매니저
+
+    지연 시간과 성공 여부를 모델 통계에 기록합니다.
+    스트리밍 중 클라이언트가 끊어 취소된 호출(GeneratorExit)은 에러로 보지 않으며,
+    지연 통계를 왜곡하지 않도록 토큰/비용만 기록합니다.
+    요청 트레이스가 있으면 llm.{operation} span으로도 기록하고,
+    토큰을 쓴 호출은 호출한 단계 이름과 함께 요청 비용 원장에 기록합니다.
+    """
+    call = ProviderCall(provider, model, operation)
+    # 단계 span 밖의 호출(최종 생성 등)은 호출 자체의 span 이름
+    call.stage = current_span_name() or f'llm.{operation}'
+    with span(f'llm.{operation}', **{'llm.provider': provider, 'llm.model': model}) as trace_span:
+        try:
+            yield call
+        except GeneratorExit:
+            call.cancelled = True
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            call.latency_ms = (time.perf_counter() - call.started_at) * 1000
+            stats = get_model_stats()
+            if call.cancelled:
+                stats.get(provider, model).record_cancelled(call.tokens_used, call.cost_usd)
+            else:
+                stats.record(
+                    provider, model, call.latency_ms, call.ok,
+                    call.tokens_used, call.cost_usd if call.ok else 0.0,
+                    call.prompt_tokens, call.cached_tokens
+                )
+            _record_metrics(call)
+            if trace_span is not None:
+                trace_span.set_attribute('llm.prompt_tokens', call.prompt_tokens)
+                trace_span.set_attribute('llm.completion_tokens', call.completion_tokens)
+                trace_span.set_attribute('llm.cached_tokens', call.cached_tokens)
+            record_call(call)
+            sink = _call_sink.get()
+            if sink is not None:
+                sink.append(call)
+
+
+def _record_metrics(call: ProviderCall):
+    """Prometheus 메트릭 기록 (/metrics)"""
+    status = 'cancelled' if call.cancelled else ('ok' if call.ok else 'error')
+    PROVIDER_REQUESTS.inc(provider=call.provider, model=call.model, operation=call.operation, status=status)
+    if call.error is not None:
+        PROVIDER_ERRORS.inc(provider=call.provider, model=call.model, error=type(call.error).__name__)
+    elif not call.cancelled:
+        PROVIDER_LATENCY.observe(call.latency_ms / 1000, provider=call.provider, model=call.model,
+                                 operation=call.operation)
+    for kind, tokens in (('prompt', call.prompt_tokens), ('completion', call.completion_tokens),
+                         ('cached', call.cached_tokens)):
+        if tokens:
+            PROVIDER_TOKENS.inc(tokens, provider=call.provider, model=call.model, kind=kind)
+    if call.ok and call.tokens_used:
+        PROVIDER_COST.inc(call.cost_usd, provider=call.provider, model=call.model)
+
+
+# 전역 통계 인스턴스
+_model_stats_instance: Optional[ModelStatsRegistry] = None
+
+
+def get_model_stats() -> ModelStatsRegistry:
+    """전역 ModelStatsRegistry 인스턴스 가져오기 (싱글톤)"""
+    global _model_stats_instance
+    if _model_stats_instance is None:
+        _model_stats_instance = ModelStatsRegistry()
+    return _model_stats_instance
@@ -5,18 +5,25 @@ OpenAI LLM Provider
 OpenAI API (GPT-4o, GPT-4o-mini, GPT-3.5-turbo 등)를 위한 Provider 구현
 """
 
-import json
+import hashlib
 import logging
 from typing import Dict, Any, Optional, List
 
 from .base import (
     BaseLLMProvider,
     LLMResponse,
+    LLMStream,
     LLMProviderError,
     RateLimitError,
     InvalidResponseError,
-    ModelNotFoundError
+    ModelNotFoundError,
+    apply_stop,
+    is_reasoning_model
 )
+from .capabilities import get_capabilities, models_for_provider
+from .single_flight import coalesced
+from .structured import JSON_SYSTEM_PROMPT, finalize_json, openai_response_format
+from .tokenizer import get_tokenizer
 
 logger = logging.getLogger(__name__)
 
@@ -24,15 +31,9 @@ logger = logging.getLogger(__name__)
 class OpenAIProvider(BaseLLMProvider):
     """OpenAI API Provider"""
     
-    AVAILABLE_MODELS = [
-        'gpt-5-mini',
-        'gpt-5-nano',
-        'gpt-4o',
-        'gpt-4o-mini',
-        'gpt-4-turbo',
-        'gpt-4',
-        'gpt-4.1-nano',
-    ]
+    PROVIDER_NAME = 'openai'
+    
+    AVAILABLE_MODELS = models_for_provider('openai')
     
     def __init__(self, api_key: str, default_model: str = 'gpt-4o-mini'):
         super().__init__(api_key, default_model)
@@ -56,6 +57,7 @@ class OpenAIProvider(BaseLLMProvider):
             logger.error(f"OpenAI 클라이언트 초기화 실패: {e}")
             raise LLMProviderError(f"OpenAI 초기화 실패: {e}")
     
+    @coalesced
     def generate(
         self,
         prompt: str,
@@ -63,6 +65,7 @@ class OpenAIProvider(BaseLLMProvider):
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
         system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
         **kwargs
     ) -> LLMResponse:
         """텍스트 생성"""
@@ -84,23 +87,44 @@ class OpenAIProvider(BaseLLMProvider):
         api_params = {
             "model": model,
             "messages": messages,
+            **self._cache_params(system_prompt),
             **kwargs
         }
         
-        # GPT-5 nano/mini 모델은 temperature를 지원하지 않음 (기본값 1만 사용)
-        if model not in ['gpt-5-nano', 'gpt-5-mini']:
+        # GPT-5 계열은 temperature를 지원하지 않음 (기본값 1만 사용)
+        if get_capabilities(model).supports_temperature:
             api_params["temperature"] = temperature
         
         # max_tokens가 None이 아닐 때만 추가
         if max_tokens is not None:
-            api_params["max_tokens"] = max_tokens
+            api_params[self._max_tokens_param(model)] = max_tokens
+        
+        # 정지 시퀀스 (추론 모델은 지원하지 않으므로 응답을 로컬에서 자름)
+        local_stop = None
+        if stop:
+            if self._supports_stop(model):
+                api_params["stop"] = stop
+            else:
+                local_stop = stop
         
         try:
-            response = self.client.chat.completions.create(**api_params)
+            with self.observe_call(model, 'generate') as call:
+                response = self.client.chat.completions.create(**api_params)
+                usage = response.usage
+                tokens_used = usage.total_tokens if usage else 0
+                call.record_usage(
+                    prompt_tokens=usage.prompt_tokens if usage else 0,
+                    completion_tokens=usage.completion_tokens if usage else 0,
+                    total_tokens=tokens_used,
+                    cached_tokens=self._cached_tokens(usage)
+                )
             
             content = response.choices[0].message.content
-            tokens_used = response.usage.total_tokens if response.usage else 0
             finish_reason = response.choices[0].finish_reason
+            if local_stop:
+                content, stopped = apply_stop(content, local_stop)
+                if stopped:
+                    finish_reason = 'stop'
             
             logger.debug(f"OpenAI 생성 완료: {tokens_used} 토큰 사용")
             
@@ -109,7 +133,10 @@ class OpenAIProvider(BaseLLMProvider):
                 model=model,
                 tokens_used=tokens_used,
                 finish_reason=finish_reason,
-                raw_response=response
+                raw_response=response,
+                prompt_tokens=call.prompt_tokens,
+                completion_tokens=call.completion_tokens,
+                cached_tokens=call.cached_tokens
             )
         
         except Exception as e:
@@ -121,6 +148,7 @@ class OpenAIProvider(BaseLLMProvider):
             else:
                 raise LLMProviderError(f"OpenAI API 호출 실패: {error_msg}")
     
+    @coalesced
     def generate_json(
         self,
         prompt: str,
@@ -135,16 +163,18 @@ class OpenAIProvider(BaseLLMProvider):
             raise LLMProviderError("OpenAI 클라이언트가 초기화되지 않았습니다.")
         
         model = model or self.default_model
+        caps = get_capabilities(model)
+        # 스키마가 주어지고 모델이 지원하면 strict json_schema로 출력 형식을 API에서 강제
+        native_schema = bool(schema) and caps is not None and caps.json_schema
         
-        # JSON 모드 지시 추가
-        json_instruction = "\n\n반드시 유효한 JSON 형식으로만 응답하세요. 다른 텍스트는 포함하지 마세요."
-        full_prompt = prompt + json_instruction
-        
-        # 시스템 프롬프트에도 JSON 요청 추가
-        if system_prompt:
-            full_system_prompt = system_prompt + "\n\n당신은 항상 JSON 형식으로 응답합니다."
+        if native_schema:
+            full_prompt = prompt
         else:
-            full_system_prompt = "당신은 JSON 형식으로 응답하는 AI 어시스턴트입니다."
+            # JSON 모드 지시 추가
+            full_prompt = prompt + "\n\n반드시 유효한 JSON 형식으로만 응답하세요. 다른 텍스트는 포함하지 마세요."
+        
+        # 시스템 프롬프트는 바이트 그대로 맨 앞에 둬 프롬프트 캐시 접두사를 유지 (JSON 지시는 사용자 메시지 끝에)
+        full_system_prompt = system_prompt or JSON_SYSTEM_PROMPT
         
         # 메시지 구성
         messages = [
@@ -153,64 +183,156 @@ class OpenAIProvider(BaseLLMProvider):
         ]
         
         try:
-            # JSON 모드 지원 (GPT-5, GPT-4o, GPT-4-turbo 등)
             api_params = {
                 "model": model,
                 "messages": messages,
+                **self._cache_params(full_system_prompt),
                 **kwargs
             }
             
-            # GPT-5 nano/mini 모델은 temperature를 지원하지 않음
-            if model not in ['gpt-5-nano', 'gpt-5-mini']:
+            # GPT-5 계열은 temperature를 지원하지 않음
+            if caps is None or caps.supports_temperature:
                 api_params["temperature"] = temperature
             
-            # JSON 모드 지원 모델인 경우 response_format 추가
-            if model in ['gpt-5-mini', 'gpt-5-nano', 'gpt-4o', 'gpt-4o-mini', 'gpt-4-turbo']:
+            # 출력 형식: 스키마 > JSON 모드 (지원 여부는 능력 레지스트리 기준)
+            if native_schema:
+                api_params["response_format"] = openai_response_format(schema)
+            elif caps is not None and caps.json_mode:
                 api_params["response_format"] = {"type": "json_object"}
             
-            response = self.client.chat.completions.create(**api_params)
+            with self.observe_call(model, 'generate_json') as call:
+                response = self.client.chat.completions.create(**api_params)
+                if response.usage:
+                    call.record_usage(
+                        prompt_tokens=response.usage.prompt_tokens,
+                        completion_tokens=response.usage.completion_tokens,
+                        cached_tokens=self._cached_tokens(response.usage)
+                    )
             
-            content = response.choices[0].message.content
+            message = response.choices[0].message
+            if getattr(message, 'refusal', None):
+                raise InvalidResponseError(f"모델이 응답을 거부했습니다: {message.refusal[:200]}")
             
-            # JSON 파싱
-            try:
-                parsed_json = json.loads(content)
-                logger.debug(f"JSON 파싱 성공: {len(content)} 문자")
-                return parsed_json
-            except json.JSONDecodeError as je:
-                logger.error(f"JSON 파싱 실패: {je}")
-                # 재시도: content에서 JSON 추출 시도
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    try:
-                        return json.loads(json_match.group())
-                    except:
-                        pass
-                raise InvalidResponseError(f"JSON 파싱 실패: {content[:200]}")
+            call.raw_content = message.content
+            return finalize_json(message.content, schema)
         
         except (RateLimitError, InvalidResponseError, ModelNotFoundError):
             raise
         except Exception as e:
             raise LLMProviderError(f"OpenAI JSON 생성 실패: {str(e)}")
     
+    def generate_stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
+        **kwargs
+    ) -> LLMStream:
+        """스트리밍 텍스트 생성 (close() 시 HTTP 스트림을 닫아 업스트림 생성 중단)"""
+        if not self.client:
+            raise LLMProviderError("OpenAI 클라이언트가 초기화되지 않았습니다.")
+        
+        model = model or self.default_model
+        
+        if model not in self.AVAILABLE_MODELS:
+            raise ModelNotFoundError(f"모델 '{model}'을 사용할 수 없습니다. 사용 가능: {self.AVAILABLE_MODELS}")
+        
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        api_params = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            **self._cache_params(system_prompt),
+            **kwargs
+        }
+        
+        # GPT-5 계열은 temperature를 지원하지 않음
+        if get_capabilities(model).supports_temperature:
+            api_params["temperature"] = temperature
+        
+        if max_tokens is not None:
+            api_params[self._max_tokens_param(model)] = max_tokens
+        
+        local_stop = None
+        if stop:
+            if self._supports_stop(model):
+                api_params["stop"] = stop
+            else:
+                local_stop = stop
+        
+        stream = LLMStream(prompt, model, counter=self.count_tokens, stop=local_stop)
+        
+        def chunks():
+            with self.observe_call(model, 'generate_stream') as call:
+                try:
+                    response = self.client.chat.completions.create(**api_params)
+                except Exception as e:
+                    raise LLMProviderError(f"OpenAI 스트리밍 호출 실패: {e}")
+                try:
+                    for chunk in response:
+                        if chunk.usage:
+                            stream.prompt_tokens = chunk.usage.prompt_tokens
+                            stream.completion_tokens = chunk.usage.completion_tokens
+                            stream.cached_tokens = self._cached_tokens(chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        if choice.finish_reason:
+                            stream.finish_reason = choice.finish_reason
+                        if choice.delta and choice.delta.content:
+                            yield choice.delta.content
+                except Exception as e:
+                    raise LLMProviderError(f"OpenAI 스트리밍 실패: {e}")
+                finally:
+                    # 클라이언트가 끊긴 경우(GeneratorExit) 연결을 닫아 업스트림 생성도 중단
+                    response.close()
+                    stream.record_usage(call)
+        
+        return stream.bind(chunks())
+    
+    @staticmethod
+    def _cache_params(system_prompt: Optional[str]) -> Dict[str, Any]:
+        """
+        프롬프트 캐시 라우팅 키
+        
+        OpenAI는 1024 토큰 이상의 동일 접두사를 자동 캐시하며, 같은 prompt_cache_key 요청을
+        같은 캐시로 보내 적중률을 높입니다. 정적 시스템 프롬프트의 해시를 키로 사용합니다.
+        """
+        if not system_prompt:
+            return {}
+        key = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()[:32]
+        return {"extra_body": {"prompt_cache_key": key}}
+    
+    @staticmethod
+    def _cached_tokens(usage: Any) -> int:
+        """usage.prompt_tokens_details.cached_tokens (캐시 미적중/미보고 시 0)"""
+        details = getattr(usage, 'prompt_tokens_details', None) if usage else None
+        return getattr(details, 'cached_tokens', None) or 0
+    
+    @staticmethod
+    def _supports_stop(model: str) -> bool:
+        """GPT-5/o 계열 추론 모델은 stop 파라미터를 지원하지 않음"""
+        caps = get_capabilities(model)
+        return caps.supports_stop if caps is not None else not is_reasoning_model(model)
+    
+    @staticmethod
+    def _max_tokens_param(model: str) -> str:
+        """GPT-5/o 계열 추론 모델은 max_tokens 대신 max_completion_tokens 사용"""
+        if is_reasoning_model(model):
+            return "max_completion_tokens"
+        return "max_tokens"
+    
     def count_tokens(self, text: str) -> int:
-        """토큰 수 계산 (근사치)"""
-        # 간단한 근사: 4 문자 ≈ 1 토큰 (영어 기준)
-        # 한글은 더 많은 토큰 사용 (약 1.5배)
-        # 정확한 계산은 tiktoken 라이브러리 필요
-        try:
-            import tiktoken
-            encoding = tiktoken.encoding_for_model(self.default_model)
-            return len(encoding.encode(text))
-        except ImportError:
-            # tiktoken 없으면 간단 추정
-            # 한글/영문 혼합 고려
-            korean_chars = len([c for c in text if '가' <= c <= '힣'])
-            other_chars = len(text) - korean_chars
-            # 한글 1글자 ≈ 2 토큰, 영문 4글자 ≈ 1 토큰
-            estimated = (korean_chars * 2) + (other_chars // 4)
-            return max(1, estimated)
+        """토큰 수 계산 (tiktoken, 미설치 시 추정치)"""
+        return get_tokenizer().count(text, self.default_model)
     
     def get_available_models(self) -> List[str]:
         """사용 가능한 모델 목록"""
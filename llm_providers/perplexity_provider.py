@@ -6,29 +6,37 @@ Perplexity Sonar API (sonar-pro, sonar)를 위한 Provider 구현
 인터넷 검색 기반 응답 생성
 """
 
-import json
 import logging
 from typing import Dict, Any, Optional, List
 
 from .base import (
     BaseLLMProvider,
     LLMResponse,
+    LLMStream,
     LLMProviderError,
     RateLimitError,
     InvalidResponseError,
-    ModelNotFoundError
+    ModelNotFoundError,
+    apply_stop
 )
+from .capabilities import models_for_provider
+from .single_flight import coalesced
+from .structured import JSON_SYSTEM_PROMPT, finalize_json
+from .tokenizer import get_tokenizer
 
 logger = logging.getLogger(__name__)
 
+# 인터넷 검색 요청 설정 (카세트 녹화/재생도 같은 값으로 요청 키를 만듦)
+SEARCH_SYSTEM_PROMPT = "당신은 웹 검색 결과를 바탕으로 정확하고 최신 정보를 제공하는 AI입니다."
+SEARCH_TEMPERATURE = 0.2  # 검색 결과는 정확성 우선
+
 
 class PerplexityProvider(BaseLLMProvider):
     """Perplexity Sonar API Provider"""
     
-    AVAILABLE_MODELS = [
-        'sonar-pro',
-        'sonar',
-    ]
+    PROVIDER_NAME = 'perplexity'
+    
+    AVAILABLE_MODELS = models_for_provider('perplexity')
     
     def __init__(self, api_key: str, default_model: str = 'sonar'):
         super().__init__(api_key, default_model)
@@ -56,6 +64,7 @@ class PerplexityProvider(BaseLLMProvider):
             logger.error(f"Perplexity 클라이언트 초기화 실패: {e}")
             raise LLMProviderError(f"Perplexity 초기화 실패: {e}")
     
+    @coalesced
     def generate(
         self,
         prompt: str,
@@ -63,6 +72,7 @@ class PerplexityProvider(BaseLLMProvider):
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
         system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
         **kwargs
     ) -> LLMResponse:
         """
@@ -98,11 +108,22 @@ class PerplexityProvider(BaseLLMProvider):
             api_params["max_tokens"] = max_tokens
         
         try:
-            response = self.client.chat.completions.create(**api_params)
+            with self.observe_call(model, 'generate') as call:
+                response = self.client.chat.completions.create(**api_params)
+                usage = response.usage
+                tokens_used = usage.total_tokens if usage else 0
+                call.record_usage(
+                    prompt_tokens=usage.prompt_tokens if usage else 0,
+                    completion_tokens=usage.completion_tokens if usage else 0,
+                    total_tokens=tokens_used
+                )
             
             content = response.choices[0].message.content
-            tokens_used = response.usage.total_tokens if response.usage else 0
             finish_reason = response.choices[0].finish_reason
+            # Perplexity API는 정지 시퀀스를 받지 않으므로 로컬에서 적용
+            content, stopped = apply_stop(content, stop)
+            if stopped:
+                finish_reason = 'stop'
             
             # Perplexity는 citations를 제공할 수 있음
             citations = []
@@ -116,7 +137,9 @@ class PerplexityProvider(BaseLLMProvider):
                 model=model,
                 tokens_used=tokens_used,
                 finish_reason=finish_reason,
-                raw_response=response
+                raw_response=response,
+                prompt_tokens=call.prompt_tokens,
+                completion_tokens=call.completion_tokens
             )
         
         except Exception as e:
@@ -128,6 +151,7 @@ class PerplexityProvider(BaseLLMProvider):
             else:
                 raise LLMProviderError(f"Perplexity API 호출 실패: {error_msg}")
     
+    @coalesced
     def generate_json(
         self,
         prompt: str,
@@ -152,11 +176,8 @@ class PerplexityProvider(BaseLLMProvider):
         json_instruction = "\n\n반드시 유효한 JSON 형식으로만 응답하세요. 다른 텍스트는 포함하지 마세요."
         full_prompt = prompt + json_instruction
         
-        # 시스템 프롬프트에도 JSON 요청 추가
-        if system_prompt:
-            full_system_prompt = system_prompt + "\n\n당신은 항상 JSON 형식으로 응답합니다."
-        else:
-            full_system_prompt = "당신은 JSON 형식으로 응답하는 AI 어시스턴트입니다."
+        # 시스템 프롬프트는 바이트 그대로 맨 앞에 둬 프롬프트 접두사를 호출 간 동일하게 유지
+        full_system_prompt = system_prompt or JSON_SYSTEM_PROMPT
         
         # 메시지 구성
         messages = [
@@ -172,26 +193,17 @@ class PerplexityProvider(BaseLLMProvider):
                 **kwargs
             }
             
-            response = self.client.chat.completions.create(**api_params)
+            with self.observe_call(model, 'generate_json') as call:
+                response = self.client.chat.completions.create(**api_params)
+                if response.usage:
+                    call.record_usage(
+                        prompt_tokens=response.usage.prompt_tokens,
+                        completion_tokens=response.usage.completion_tokens
+                    )
             
-            content = response.choices[0].message.content
-            
-            # JSON 파싱
-            try:
-                parsed_json = json.loads(content)
-                logger.debug(f"JSON 파싱 성공: {len(content)} 문자")
-                return parsed_json
-            except json.JSONDecodeError as je:
-                logger.error(f"JSON 파싱 실패: {je}")
-                # 재시도: content에서 JSON 추출 시도
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    try:
-                        return json.loads(json_match.group())
-                    except:
-                        pass
-                raise InvalidResponseError(f"JSON 파싱 실패: {content[:200]}")
+            # 스키마 모드가 없으므로 복구 파서로 파싱 후 스키마 검증
+            call.raw_content = response.choices[0].message.content
+            return finalize_json(call.raw_content, schema)
         
         except (RateLimitError, InvalidResponseError, ModelNotFoundError):
             raise
@@ -223,14 +235,12 @@ class PerplexityProvider(BaseLLMProvider):
         logger.info(f"인터넷 검색 시작: {query[:50]}...")
         
         # Sonar API로 검색 수행
-        system_prompt = "당신은 웹 검색 결과를 바탕으로 정확하고 최신 정보를 제공하는 AI입니다."
-        
         response = self.generate(
             prompt=query,
             model=model or self.default_model,
-            temperature=0.2,  # 검색 결과는 정확성 우선
+            temperature=SEARCH_TEMPERATURE,
             max_tokens=max_tokens,
-            system_prompt=system_prompt
+            system_prompt=SEARCH_SYSTEM_PROMPT
         )
         
         return {
@@ -239,19 +249,75 @@ class PerplexityProvider(BaseLLMProvider):
             'model': response.model
         }
     
+    def generate_stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        stop: Optional[List[str]] = None,
+        **kwargs
+    ) -> LLMStream:
+        """스트리밍 텍스트 생성 (사용량은 마지막 청크에 포함, close() 시 HTTP 스트림을 닫아 업스트림 생성 중단)"""
+        if not self.client:
+            raise LLMProviderError("Perplexity 클라이언트가 초기화되지 않았습니다.")
+        
+        model = model or self.default_model
+        
+        if model not in self.AVAILABLE_MODELS:
+            raise ModelNotFoundError(f"모델 '{model}'을 사용할 수 없습니다. 사용 가능: {self.AVAILABLE_MODELS}")
+        
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        api_params = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True,
+            **kwargs
+        }
+        
+        if max_tokens is not None:
+            api_params["max_tokens"] = max_tokens
+        
+        # 정지 시퀀스는 로컬에서 적용 (도달 시 HTTP 스트림을 닫음)
+        stream = LLMStream(prompt, model, counter=self.count_tokens, stop=stop)
+        
+        def chunks():
+            with self.observe_call(model, 'generate_stream') as call:
+                try:
+                    response = self.client.chat.completions.create(**api_params)
+                except Exception as e:
+                    raise LLMProviderError(f"Perplexity 스트리밍 호출 실패: {e}")
+                try:
+                    for chunk in response:
+                        if chunk.usage:
+                            stream.prompt_tokens = chunk.usage.prompt_tokens
+                            stream.completion_tokens = chunk.usage.completion_tokens
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        if choice.finish_reason:
+                            stream.finish_reason = choice.finish_reason
+                        if choice.delta and choice.delta.content:
+                            yield choice.delta.content
+                except Exception as e:
+                    raise LLMProviderError(f"Perplexity 스트리밍 실패: {e}")
+                finally:
+                    # 클라이언트가 끊긴 경우(GeneratorExit) 연결을 닫아 업스트림 생성도 중단
+                    response.close()
+                    stream.record_usage(call)
+        
+        return stream.bind(chunks())
+    
     def count_tokens(self, text: str) -> int:
         """토큰 수 계산 (근사치)"""
-        # Perplexity는 OpenAI와 유사한 토큰 계산 사용
-        try:
-            import tiktoken
-            encoding = tiktoken.encoding_for_model("gpt-4")
-            return len(encoding.encode(text))
-        except ImportError:
-            # tiktoken 없으면 간단 추정
-            korean_chars = len([c for c in text if '가' <= c <= '힣'])
-            other_chars = len(text) - korean_chars
-            estimated = (korean_chars * 2) + (other_chars // 4)
-            return max(1, estimated)
+        # Perplexity는 OpenAI와 유사한 토큰 계산 사용 (sonar → cl100k_base)
+        return get_tokenizer().count(text, self.default_model)
     
     def get_available_models(self) -> List[str]:
         """사용 가능한 모델 목록"""
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+모델 가격표
+
+모델별 1K 토큰당 가격 (USD, 입력/출력). 라우팅 비용 계산 및 통계에 사용합니다.
+가격 자체는 능력 레지스트리(capabilities.py)에서 관리합니다.
+"""
+
+from typing import Dict, Optional, Tuple
+
+from .capabilities import MODEL_CAPABILITIES
+
+# 모델명: (입력 1K 토큰당 USD, 출력 1K 토큰당 USD) - 능력 레지스트리에서 파생
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    name: (caps.input_price_per_1k, caps.output_price_per_1k)
+    for name, caps in MODEL_CAPABILITIES.items()
+}
+
+# 제공자별 프롬프트 캐시 가격 배수 (입력 단가 대비): 캐시 읽기 / 캐시 쓰기
+CACHE_READ_PRICE_RATIO = {'openai': 0.5, 'anthropic': 0.1, 'google': 0.25}
+CACHE_WRITE_PRICE_RATIO = {'anthropic': 1.25}
+
+# 모델명: (캐시 읽기 배수, 캐시 쓰기 배수)
+MODEL_CACHE_RATIOS: Dict[str, Tuple[float, float]] = {
+    name: (CACHE_READ_PRICE_RATIO.get(caps.provider, 1.0), CACHE_WRITE_PRICE_RATIO.get(caps.provider, 1.0))
+    for name, caps in MODEL_CAPABILITIES.items()
+}
+
+
+def get_price(model: str) -> Optional[Tuple[float, float]]:
+    """모델의 (입력, 출력) 1K 토큰당 가격"""
+    return MODEL_PRICES.get(model)
+
+
+def blended_price_per_1k(model: str, output_ratio: float = 0.5) -> Optional[float]:
+    """입력/출력 비율을 가정한 1K 토큰당 혼합 가격"""
+    price = MODEL_PRICES.get(model)
+    if price is None:
+        return None
+    return price[0] * (1 - output_ratio) + price[1] * output_ratio
+
+
+def estimate_cost(
+    model: str,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    total_tokens: int = 0,
+    cached_tokens: int = 0,
+    cache_write_tokens: int = 0
+) -> float:
+    """
+    호출 비용 추정 (USD)
+
+    입력/출력 토큰 구분이 없으면 total_tokens에 혼합 가격을 적용합니다.
+    prompt_tokens는 캐시 읽기/쓰기 토큰을 포함한 전체 입력 토큰이며,
+    그중 캐시 토큰에는 제공자별 캐시 가격 배수를 적용합니다.
+    가격표에 없는 모델은 0을 반환합니다.
+    """
+    price = MODEL_PRICES.get(model)
+    if price is None:
+        return 0.0
+    if prompt_tokens or completion_tokens:
+        read_ratio, write_ratio = MODEL_CACHE_RATIOS.get(model, (1.0, 1.0))
+        uncached = max(0, prompt_tokens - cached_tokens - cache_write_tokens)
+        input_units = uncached + cached_tokens * read_ratio + cache_write_tokens * write_ratio
+        return (input_units * price[0] + completion_tokens * price[1]) / 1000.0
+    return total_tokens * blended_price_per_1k(model) / 1000.0
+
+
+# 임베딩 모델 1K 토큰당 가격 (USD)
+EMBEDDING_PRICES: Dict[str, float] = {
+    'text-embedding-3-small': 0.00002,
+    'text-embedding-3-large': 0.00013,
+    'text-embedding-ada-002': 0.0001,
+}
+
+# 검색 모델 요청당 검색 수수료 (USD, 토큰 가격과 별도, 검색 컨텍스트 low 기준)
+SEARCH_REQUEST_PRICES: Dict[str, float] = {
+    'sonar': 0.005,
+    'sonar-pro': 0.006,
+}
+
+
+def estimate_embedding_cost(model: str, tokens: int) -> float:
+    """임베딩 호출 비용 추정 (USD, 가격표에 없는 모델은 0)"""
+    return tokens * EMBEDDING_PRICES.get(model, 0.0) / 1000.0
+
+
+def search_request_cost(model: str) -> float:
+    """검색 요청 1회 수수료 (USD, 가격표에 없는 모델은 0)"""
+    return SEARCH_REQUEST_PRICES.get(model, 0.0)
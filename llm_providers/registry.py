@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+LLM Provider 레지스트리
+
+제공자 모듈 임포트와 SDK 클라이언트 생성을 처음 사용할 때까지 미룹니다.
+(google.generativeai 등 SDK 임포트가 무거워 모든 관리 명령/워커 부팅 비용을 늘리기 때문)
+
+API 키가 설정된 제공자만 대상이며, 제공자별로 한 번만 생성하도록 잠금으로 보호합니다.
+생성에 실패한 제공자는 기록해 두고 다시 시도하지 않습니다.
+
+PROMPT_MATE['FAKE_LLM_MODE']가 켜지면 API 키와 관계없이 모든 제공자 이름에 FakeProvider를 생성합니다
+(부하 테스트/벤치마크용, llm_providers.fake_provider).
+PROMPT_MATE['LLM_CASSETTE_MODE']가 record면 생성한 제공자를 녹화 래퍼로 감싸고,
+replay면 API 키 없이 카세트 재생 제공자를 생성합니다 (llm_providers.cassette).
+"""
+
+import importlib
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from .base import BaseLLMProvider
+
+logger = logging.getLogger(__name__)
+
+
+# 제공자 이름: (모듈 경로, 클래스 이름, API 키 설정 이름, 표시 이름)
+PROVIDER_SPECS: Dict[str, Tuple[str, str, str, str]] = {
+    'openai': ('llm_providers.openai_provider', 'OpenAIProvider', 'OPENAI_API_KEY', 'OpenAI'),
+    'anthropic': ('llm_providers.anthropic_provider', 'AnthropicProvider', 'ANTHROPIC_API_KEY', 'Anthropic'),
+    'google': ('llm_providers.google_provider', 'GoogleProvider', 'GOOGLE_API_KEY', 'Google'),
+    'perplexity': ('llm_providers.perplexity_provider', 'PerplexityProvider', 'PERPLEXITY_API_KEY', 'Perplexity'),
+}
+
+
+class ProviderRegistry:
+    """
+    지연 생성 Provider 레지스트리 (스레드 안전)
+
+    ModelRouter가 사용하던 제공자 딕셔너리와 같은 방식(get/items/in)으로 사용할 수 있습니다.
+    """
+
+    def __init__(
+        self,
+        specs: Optional[Dict[str, Tuple[str, str, str, str]]] = None,
+        fake_mode: Optional[bool] = None
+    ):
+        self._specs = specs if specs is not None else PROVIDER_SPECS
+        if fake_mode is None:
+            fake_mode = settings.PROMPT_MATE.get('FAKE_LLM_MODE', False)
+        self.fake_mode = fake_mode
+        self.cassette_mode = settings.PROMPT_MATE.get('LLM_CASSETTE_MODE', '')
+        self._instances: Dict[str, BaseLLMProvider] = {}
+        self._failed: Dict[str, str] = {}
+        self._locks = {name: threading.Lock() for name in self._specs}
+
+    def _api_key(self, name: str) -> str:
+        if self.fake_mode:
+            return 'fake'
+        if self.cassette_mode == 'replay':
+            return 'replay'
+        return getattr(settings, self._specs[name][2], '') or ''
+
+    def configured(self) -> List[str]:
+        """API 키가 설정된 제공자 이름 (생성하지 않음)"""
+        return [name for name in self._specs if self._api_key(name)]
+
+    def get(self, name: str) -> Optional[BaseLLMProvider]:
+        """제공자 가져오기 (처음 호출 시 모듈 임포트 및 클라이언트 생성)"""
+        provider = self._instances.get(name)
+        if provider is not None or name not in self._specs or name in self._failed:
+            return provider
+
+        api_key = self._api_key(name)
+        if not api_key:
+            return None
+
+        with self._locks[name]:
+            # 다른 스레드가 먼저 생성했는지 확인
+            provider = self._instances.get(name)
+            if provider is not None or name in self._failed:
+                return provider
+
+            module_path, class_name, _, display_name = self._specs[name]
+            try:
+                if self.fake_mode:
+                    fake_provider = importlib.import_module('llm_providers.fake_provider')
+                    provider = fake_provider.build_fake_provider(name, settings.PROMPT_MATE)
+                    display_name = f"{display_name} (fake)"
+                elif self.cassette_mode != 'replay':
+                    provider_class = getattr(importlib.import_module(module_path), class_name)
+                    provider = provider_class(api_key=api_key)
+                else:
+                    provider = None
+                if self.cassette_mode:
+                    cassette = importlib.import_module('llm_providers.cassette')
+                    provider = cassette.wrap_provider(name, provider, settings.PROMPT_MATE)
+                    display_name = f"{display_name} (cassette {self.cassette_mode})"
+            except Exception as e:
+                logger.warning(f"{display_name} Provider 초기화 실패: {e}")
+                self._failed[name] = str(e)
+                return None
+
+            self._instances[name] = provider
+            logger.info(f"{display_name} Provider 초기화 완료")
+            return provider
+
+    def items(self) -> Iterator[Tuple[str, BaseLLMProvider]]:
+        """사용 가능한 (이름, 제공자) 순회 (필요한 제공자를 생성)"""
+        for name in self.configured():
+            provider = self.get(name)
+            if provider is not None:
+                yield name, provider
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __bool__(self) -> bool:
+        return bool(self.configured())
+
+    def loaded(self) -> List[str]:
+        """이미 생성된 제공자 이름"""
+        return list(self._instances)
+
+    def failed(self) -> Dict[str, str]:
+        """생성에 실패한 제공자와 에러 메시지"""
+        return dict(self._failed)
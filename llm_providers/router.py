@@ -6,17 +6,23 @@ LLM Model Router
 """
 
 import logging
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, List, Tuple
 from enum import Enum
 
 from django.conf import settings
 
-from .base import BaseLLMProvider, LLMProviderError
-from .openai_provider import OpenAIProvider
-from .anthropic_provider import AnthropicProvider
-from .google_provider import GoogleProvider
-from .perplexity_provider import PerplexityProvider
+from .base import BaseLLMProvider, ContextWindowExceededError, LLMProviderError
+from .adaptive_routing import MODEL_QUALITY_TIERS, QUALITY_TIER_BY_LEVEL, build_routing_policy
+from .capabilities import find_model_for_context, get_capabilities, models_for_provider
+from .cascade import CascadeStats
+from .hedging import HedgedProvider, build_hedge_policy
+from .instrumentation import get_model_stats
+from .pricing import blended_price_per_1k, search_request_cost
+from .registry import ProviderRegistry
+from .single_flight import get_single_flight
+from .tokenizer import get_tokenizer
 from core.usage_decorator import can_use_model, get_user_subscription
+from prompt_mate.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -91,48 +97,19 @@ class ModelRouter:
     
     def __init__(self):
         """Router 초기화"""
-        self._providers: Dict[str, BaseLLMProvider] = {}
+        self._providers = ProviderRegistry()
         self._initialize_providers()
+        self.hedge_policy = build_hedge_policy(settings.PROMPT_MATE)
+        self.routing_policy = build_routing_policy(settings.PROMPT_MATE)
+        self.cascade_stats = CascadeStats()
     
     def _initialize_providers(self):
-        """사용 가능한 제공자 초기화"""
-        # OpenAI
-        openai_key = settings.OPENAI_API_KEY
-        if openai_key:
-            try:
-                self._providers['openai'] = OpenAIProvider(api_key=openai_key)
-                logger.info("OpenAI Provider 초기화 완료")
-            except Exception as e:
-                logger.warning(f"OpenAI Provider 초기화 실패: {e}")
-        
-        # Anthropic
-        anthropic_key = settings.ANTHROPIC_API_KEY
-        if anthropic_key:
-            try:
-                self._providers['anthropic'] = AnthropicProvider(api_key=anthropic_key)
-                logger.info("Anthropic Provider 초기화 완료")
-            except Exception as e:
-                logger.warning(f"Anthropic Provider 초기화 실패: {e}")
-        
-        # Google
-        google_key = settings.GOOGLE_API_KEY
-        if google_key:
-            try:
-                self._providers['google'] = GoogleProvider(api_key=google_key)
-                logger.info("Google Provider 초기화 완료")
-            except Exception as e:
-                logger.warning(f"Google Provider 초기화 실패: {e}")
-        
-        # Perplexity
-        perplexity_key = settings.PERPLEXITY_API_KEY
-        if perplexity_key:
-            try:
-                self._providers['perplexity'] = PerplexityProvider(api_key=perplexity_key)
-                logger.info("Perplexity Provider 초기화 완료")
-            except Exception as e:
-                logger.warning(f"Perplexity Provider 초기화 실패: {e}")
-        
-        if not self._providers:
+        """
+        사용 가능한 제공자 확인
+        
+        SDK 임포트와 클라이언트 생성은 각 제공자를 처음 사용할 때 레지스트리가 수행합니다.
+        """
+        if not self._providers.configured():
             logger.error("사용 가능한 LLM 제공자가 없습니다! API 키를 확인하세요.")
     
     def get_provider(
@@ -141,7 +118,8 @@ class ModelRouter:
         quality: QualityLevel = QualityLevel.BALANCED,
         preferred_provider: Optional[str] = None,
         user=None,
-        preferred_model: Optional[str] = None
+        preferred_model: Optional[str] = None,
+        prompt: Optional[str] = None
     ) -> Tuple[BaseLLMProvider, str, float]:
         """
         작업 유형에 맞는 제공자와 모델 선택
@@ -152,6 +130,7 @@ class ModelRouter:
             preferred_provider: 선호 제공자 (선택적)
             user: 사용자 객체 (플랜 확인용)
             preferred_model: 선호 모델 (FINAL_GENERATION에서만 사용 가능)
+            prompt: 프롬프트 (적응형 라우팅의 복잡도 계산과 컨텍스트 윈도우 확인에 사용, 선택적)
         
         Returns:
             (provider, model, temperature) 튜플
@@ -165,8 +144,15 @@ class ModelRouter:
         if not strategy:
             raise LLMProviderError(f"알 수 없는 작업 유형: {task_type}")
         
+        # 적응형 라우팅 (선호 모델을 직접 지정한 경우 제외)
+        selection = None
+        if self.routing_policy and not (task_type == TaskType.FINAL_GENERATION and preferred_model):
+            selection = self._select_adaptive(task_type, quality, preferred_provider, user, prompt)
+        
+        if selection:
+            provider_name, model, temperature = selection
         # FINAL_GENERATION은 품질 수준별 전략
-        if task_type == TaskType.FINAL_GENERATION:
+        elif task_type == TaskType.FINAL_GENERATION:
             # 사용자가 모델을 선택한 경우
             if preferred_model and user:
                 # 플랜 기반 권한 확인
@@ -235,42 +221,312 @@ class ModelRouter:
                     model = 'gpt-5-nano'
                     provider_name = 'openai'
         
+        # 세션/일 비용 예산을 넘었으면 플랜이 허용하는 가장 저렴한 모델로 낮춤
+        provider_name, model, temperature = self._apply_cost_budget(
+            provider_name, model, temperature, user, self._required_tier(task_type, quality)
+        )
+        
+        # 프롬프트가 컨텍스트 윈도우를 넘으면 들어가는 모델로 변경 (호출 실패 후 재시도 방지)
+        if prompt:
+            provider_name, model, temperature = self._fit_context(
+                provider_name, model, temperature, prompt, user
+            )
+        
         # 제공자 가져오기
         provider = self._providers.get(provider_name)
         
         if not provider:
             # 폴백: 사용 가능한 다른 제공자 선택
             logger.warning(f"선호 제공자 '{provider_name}'를 사용할 수 없습니다. 폴백 시도...")
-            provider = self._get_fallback_provider()
-            if not provider:
+            provider_name = self._get_fallback_provider()
+            if not provider_name:
                 raise LLMProviderError("사용 가능한 LLM 제공자가 없습니다.")
+            provider = self._providers.get(provider_name)
             
             # 폴백 제공자에 맞는 모델 선택
-            provider_name = [k for k, v in self._providers.items() if v == provider][0]
             model = self._get_fallback_model(provider_name, task_type, quality)
         
+        # 헤징 정책 적용 (opt-in, 지연 민감 작업만)
+        if self.hedge_policy and self.hedge_policy.applies_to(task_type):
+            provider = self._wrap_with_hedging(provider, model, user)
+        
         logger.debug(f"선택된 제공자: {provider_name}, 모델: {model}, 온도: {temperature}")
         return provider, model, temperature
     
-    def _get_strategy_for_model(self, model_name: str, quality: QualityLevel) -> Optional[Dict]:
-        """특정 모델에 대한 전략 가져오기"""
-        # 모델 이름에 따른 기본 전략
-        model_strategies = {
-            'gpt-5-nano': {'provider': 'openai', 'temperature': 0.7},
-            'gpt-5-mini': {'provider': 'openai', 'temperature': 0.7},
-            'gpt-5': {'provider': 'openai', 'temperature': 0.8},
-            'gpt-4.1': {'provider': 'openai', 'temperature': 0.8},
-            'gpt-4.1-mini': {'provider': 'openai', 'temperature': 0.7},
+    def _fit_context(
+        self,
+        provider_name: str,
+        model: str,
+        temperature: float,
+        prompt: str,
+        user
+    ) -> Tuple[str, str, float]:
+        """
+        프롬프트와 출력 예약분이 선택된 모델의 컨텍스트 윈도우를 넘으면,
+        사용 가능한 제공자와 플랜 허용 모델 중 충분히 큰 가장 저렴한 모델로 변경
+        (같은 품질 등급 이상을 우선, 없으면 더 낮은 등급, 품질 등급이 없는 모델은 제외)
+        
+        Raises:
+            ContextWindowExceededError: 프롬프트가 들어가는 대체 모델이 없을 때
+        """
+        caps = get_capabilities(model)
+        if caps is None:
+            return provider_name, model, temperature
+        
+        prompt_tokens = get_tokenizer().count(prompt, model)
+        output_reserve = settings.PROMPT_MATE.get('CONTEXT_OUTPUT_RESERVE', 4096)
+        if caps.fits(prompt_tokens, output_reserve):
+            return provider_name, model, temperature
+        
+        allowed_models = self._allowed_models(user)
+        providers = [name for name, ok in self.get_available_providers().items() if ok]
+        
+        replacement = None
+        for min_tier in ((caps.quality_tier, None) if caps.quality_tier else (None,)):
+            replacement = find_model_for_context(
+                prompt_tokens, output_reserve,
+                providers=providers,
+                allowed_models=allowed_models,
+                min_tier=min_tier
+            )
+            if replacement:
+                break
+        
+        if not replacement:
+            raise ContextWindowExceededError(
+                f"프롬프트({prompt_tokens} 토큰)가 너무 길어 사용할 수 있는 모델의 컨텍스트 윈도우에 들어가지 않습니다 "
+                f"({model}: {caps.context_window} 토큰). 프롬프트를 줄여주세요."
+            )
+        
+        message = (
+            f"프롬프트({prompt_tokens} 토큰)가 {model} 컨텍스트 윈도우({caps.context_window})를 넘어 "
+            f"{replacement.name}({replacement.context_window})로 변경"
+        )
+        if caps.quality_tier and replacement.quality_tier < caps.quality_tier:
+            logger.warning(f"{message} (품질 등급 {caps.quality_tier} → {replacement.quality_tier})")
+        else:
+            logger.info(message)
+        return replacement.provider, replacement.name, temperature
+    
+    def _apply_cost_budget(
+        self,
+        provider_name: str,
+        model: str,
+        temperature: float,
+        user,
+        min_tier: Optional[int] = None
+    ) -> Tuple[str, str, float]:
+        """
+        비용 예산(COST_SESSION_BUDGET_USD / COST_DAILY_BUDGET_USD)을 넘었으면
+        사용 가능한 제공자의 능력 레지스트리 모델 중 작업의 최소 품질 등급(min_tier) 이상이고
+        플랜이 허용하는 가장 저렴한 모델로 변경 (지금 모델보다 싼 경우만, 제공자는 생성하지 않음)
+        """
+        from prompt_mate.cost_ledger import get_cost_budget_policy
+        
+        policy = get_cost_budget_policy()
+        if not policy.enabled:
+            return provider_name, model, temperature
+        reason = policy.exceeded(user)
+        if reason is None:
+            return provider_name, model, temperature
+        
+        allowed_models = self._allowed_models(user)
+        
+        current_price = blended_price_per_1k(model)
+        cheapest = None
+        for name, ok in self.get_available_providers().items():
+            if not ok:
+                continue
+            for candidate in models_for_provider(name):
+                tier = MODEL_QUALITY_TIERS.get(candidate)
+                price = blended_price_per_1k(candidate)
+                if tier is None or price is None or (min_tier is not None and tier < min_tier):
+                    continue
+                if allowed_models is not None and candidate not in allowed_models:
+                    continue
+                if cheapest is None or price < cheapest[0]:
+                    cheapest = (price, name, candidate)
+        
+        if cheapest is None or (current_price is not None and cheapest[0] >= current_price):
+            return provider_name, model, temperature
+        
+        from prompt_mate.metrics import COST_BUDGET_DOWNGRADES
+        
+        price, cheapest_provider, cheapest_model = cheapest
+        COST_BUDGET_DOWNGRADES.inc(reason=reason)
+        logger.info(f"{'세션' if reason == 'session' else '일'} 비용 예산 초과로 {model} 대신 {cheapest_model} 사용")
+        return cheapest_provider, cheapest_model, temperature
+    
+    @staticmethod
+    def _required_tier(task_type: TaskType, quality: QualityLevel) -> int:
+        """작업의 최소 품질 등급 (FINAL_GENERATION은 요청 품질 수준, 보조 작업은 최저 등급)"""
+        if task_type == TaskType.FINAL_GENERATION:
+            return QUALITY_TIER_BY_LEVEL[quality.value]
+        return QUALITY_TIER_BY_LEVEL[QualityLevel.LOW.value]
+    
+    def _select_adaptive(
+        self,
+        task_type: TaskType,
+        quality: QualityLevel,
+        preferred_provider: Optional[str],
+        user,
+        prompt: Optional[str]
+    ) -> Optional[Tuple[str, str, float]]:
+        """적응형 라우팅으로 (provider_name, model, temperature) 선택 (후보가 없으면 None)"""
+        strategy = self.TASK_MODEL_STRATEGY[task_type]
+        allowed_models = None
+        plan = None
+        if user:
+            subscription, plan = get_user_subscription(user)
+            if plan and plan.plan_type == 'free':
+                # 무료 플랜은 모든 작업에서 gpt-5-nano
+                allowed_models = ['gpt-5-nano']
+        
+        if task_type == TaskType.FINAL_GENERATION:
+            # 요청 품질을 상한으로, 프롬프트 복잡도가 낮으면 더 낮은 등급 허용
+            if prompt:
+                complexity = self.calculate_complexity(prompt)
+                if QUALITY_TIER_BY_LEVEL[complexity.value] < QUALITY_TIER_BY_LEVEL[quality.value]:
+                    quality = complexity
+            strategy = strategy.get(quality, strategy[QualityLevel.BALANCED])
+            required_tier = QUALITY_TIER_BY_LEVEL[quality.value]
+            if plan and allowed_models is None:
+                allowed_models = plan.allowed_models
+        else:
+            # 보조 작업은 최저 등급으로 충분
+            required_tier = QUALITY_TIER_BY_LEVEL[QualityLevel.LOW.value]
+        
+        selected = self.routing_policy.select(
+            task=task_type.value,
+            required_tier=required_tier,
+            providers=[name for name, ok in self.get_available_providers().items() if ok],
+            allowed_models=allowed_models,
+            preferred_provider=preferred_provider
+        )
+        if not selected:
+            return None
+        return selected['provider'], selected['model'], strategy['temperature']
+    
+    def get_cascade_ladder(
+        self,
+        target: Tuple[BaseLLMProvider, str, float],
+        user=None,
+        prompt: Optional[str] = None,
+        preferred_provider: Optional[str] = None
+    ) -> List[Tuple[BaseLLMProvider, str, float]]:
+        """
+        FINAL_GENERATION 캐스케이드 단계 목록
+        
+        get_provider가 고른 target(플랜, 비용 예산, 컨텍스트 윈도우를 거친 모델)을 마지막 단계로 두고,
+        그보다 낮은 각 품질 등급에서 같은 조건(플랜 허용, 선호 제공자, 컨텍스트 윈도우)을 만족하면서
+        target보다 저렴한 가장 싼 모델을 하나씩 골라 등급 오름차순으로 앞에 둡니다.
+        후보는 사용 가능한 제공자의 능력 레지스트리 모델이며, 단계로 선택된 제공자만 생성합니다.
+        
+        Args:
+            target: get_provider가 반환한 (provider, model, temperature)
+            user: 사용자 (플랜 허용 모델)
+            prompt: 최종 프롬프트 (있으면 컨텍스트 윈도우에 들어가는 모델만)
+            preferred_provider: 선호 제공자 (지정 시 해당 제공자 모델만)
+        
+        Returns:
+            (provider, model, temperature) 리스트 (낮은 단계가 없으면 [target])
+        """
+        target_provider, target_model, target_temperature = target
+        target_tier = MODEL_QUALITY_TIERS.get(target_model)
+        target_price = blended_price_per_1k(target_model)
+        if target_tier is None or target_price is None:
+            return [target]
+        
+        allowed_models = self._allowed_models(user)
+        prompt_tokens = get_tokenizer().count(prompt, target_model) if prompt else None
+        output_reserve = settings.PROMPT_MATE.get('CONTEXT_OUTPUT_RESERVE', 4096)
+        strategies = self.TASK_MODEL_STRATEGY[TaskType.FINAL_GENERATION]
+        temperature_by_tier = {
+            QUALITY_TIER_BY_LEVEL[level.value]: strategy['temperature']
+            for level, strategy in strategies.items()
         }
-        return model_strategies.get(model_name)
+        
+        cheapest: Dict[int, Tuple[float, str, str]] = {}
+        for provider_name, ok in self.get_available_providers().items():
+            if not ok or (preferred_provider and provider_name != preferred_provider):
+                continue
+            for model in models_for_provider(provider_name):
+                tier = MODEL_QUALITY_TIERS.get(model)
+                price = blended_price_per_1k(model)
+                if tier is None or price is None or tier >= target_tier or price >= target_price:
+                    continue
+                if allowed_models is not None and model not in allowed_models:
+                    continue
+                caps = get_capabilities(model)
+                if prompt_tokens is not None and caps is not None and not caps.fits(prompt_tokens, output_reserve):
+                    continue
+                if tier not in cheapest or price < cheapest[tier][0]:
+                    cheapest[tier] = (price, provider_name, model)
+        
+        ladder = []
+        for tier, (price, provider_name, model) in sorted(cheapest.items()):
+            provider = self._providers.get(provider_name)
+            if provider is not None:
+                ladder.append((provider, model, temperature_by_tier.get(tier, target_temperature)))
+        ladder.append(target)
+        return ladder
     
-    def _get_fallback_provider(self) -> Optional[BaseLLMProvider]:
-        """폴백 제공자 선택 (우선순위: OpenAI > Anthropic > Google)"""
+    def _allowed_models(self, user) -> Optional[List[str]]:
+        """사용자 플랜이 허용하는 모델 목록 (무료 플랜은 gpt-5-nano, 제한 없으면 None)"""
+        if not user:
+            return None
+        subscription, plan = get_user_subscription(user)
+        if not plan:
+            return None
+        return ['gpt-5-nano'] if plan.plan_type == 'free' else plan.allowed_models
+    
+    def _wrap_with_hedging(self, provider: BaseLLMProvider, model: str, user=None) -> BaseLLMProvider:
+        """
+        헤징 래퍼 적용
+        
+        대체 제공자가 설정되어 있고 사용 가능하며 그 모델을 사용자 플랜이 허용하면 그쪽으로,
+        아니면 같은 제공자/모델로 중복 요청합니다.
+        """
+        alternate = None
+        alternate_model = None
+        if self.hedge_policy.alternate_provider:
+            alternate = self._providers.get(self.hedge_policy.alternate_provider)
+            if alternate:
+                alternate_model = self.hedge_policy.alternate_model or None
+                allowed_models = self._allowed_models(user)
+                hedge_model = alternate_model or alternate.default_model
+                if allowed_models is not None and hedge_model not in allowed_models:
+                    logger.info(
+                        f"헤징 대체 모델 {hedge_model}을 사용자 플랜이 허용하지 않아 "
+                        f"같은 모델({model})로 중복 요청합니다."
+                    )
+                    alternate = None
+                    alternate_model = None
+            else:
+                logger.warning(
+                    f"헤징 대체 제공자 '{self.hedge_policy.alternate_provider}'를 사용할 수 없어 "
+                    f"같은 제공자로 중복 요청합니다."
+                )
+        return HedgedProvider(
+            provider,
+            self.hedge_policy,
+            alternate=alternate,
+            alternate_model=alternate_model
+        )
+    
+    def _get_strategy_for_model(self, model_name: str, quality: QualityLevel) -> Optional[Dict]:
+        """특정 모델에 대한 전략 가져오기 (능력 레지스트리의 제공자/기본 온도)"""
+        caps = get_capabilities(model_name)
+        if caps is None:
+            return None
+        return {'provider': caps.provider, 'temperature': caps.default_temperature}
+    
+    def _get_fallback_provider(self) -> Optional[str]:
+        """폴백 제공자 이름 선택 (우선순위: OpenAI > Anthropic > Google, 선택한 제공자만 생성)"""
         for provider_name in ['openai', 'anthropic', 'google']:
-            provider = self._providers.get(provider_name)
-            if provider:
+            if self._providers.get(provider_name):
                 logger.info(f"폴백 제공자로 {provider_name} 선택")
-                return provider
+                return provider_name
         return None
     
     def _get_fallback_model(
@@ -286,26 +542,24 @@ class ModelRouter:
         
         available_models = provider.get_available_models()
         
-        # 작업 유형에 따른 모델 선택
-        if task_type in [TaskType.INTENT_PARSING, TaskType.CONTEXT_QUESTIONS, TaskType.PROMPT_SYNTHESIS]:
-            # 초경량 모델 선호
-            for model in ['gpt-5-nano', 'gpt-4.1-nano', 'gpt-4o-mini', 'claude-3-5-haiku-20241022', 'gemini-1.5-flash']:
-                if model in available_models:
-                    return model
-        elif task_type == TaskType.FINAL_GENERATION:
-            # 품질에 따라
-            if quality == QualityLevel.HIGH:
-                for model in ['gpt-4o', 'claude-3-5-sonnet-20241022', 'gemini-1.5-pro']:
-                    if model in available_models:
-                        return model
-            elif quality == QualityLevel.BALANCED:
-                for model in ['gpt-5-mini', 'gpt-4o-mini', 'claude-3-5-haiku-20241022', 'gemini-1.5-flash']:
-                    if model in available_models:
-                        return model
-            elif quality == QualityLevel.LOW:
-                for model in ['gpt-5-nano', 'gpt-4.1-nano', 'gpt-4o-mini', 'claude-3-5-haiku-20241022']:
-                    if model in available_models:
-                        return model
+        # 보조 작업은 최저 등급, FINAL_GENERATION은 품질 수준 등급
+        if task_type == TaskType.FINAL_GENERATION:
+            target_tier = QUALITY_TIER_BY_LEVEL[quality.value]
+        else:
+            target_tier = QUALITY_TIER_BY_LEVEL[QualityLevel.LOW.value]
+        
+        # 목표 등급 이상 중 (가장 낮은 등급, 가장 저렴한) 모델, 없으면 목표 미만 중 가장 높은 등급
+        tiered = []
+        for model in available_models:
+            caps = get_capabilities(model)
+            if caps is not None and caps.quality_tier is not None:
+                tiered.append((caps.quality_tier, caps.blended_price_per_1k(), model))
+        above = sorted(t for t in tiered if t[0] >= target_tier)
+        if above:
+            return above[0][2]
+        below = sorted(((-t[0], t[1], t[2]) for t in tiered))
+        if below:
+            return below[0][2]
         
         # 기본: 사용 가능한 첫 번째 모델
         return available_models[0] if available_models else 'gpt-4o-mini'
@@ -334,7 +588,7 @@ class ModelRouter:
         complexity_score = 0
         
         # 길이 기반
-        prompt_tokens = len(prompt) // 4  # 근사치
+        prompt_tokens = get_tokenizer().count(prompt)
         if prompt_tokens > 2000:
             complexity_score += 3
         elif prompt_tokens > 1000:
@@ -364,9 +618,31 @@ class ModelRouter:
         else:
             return QualityLevel.LOW
     
+    def preload_providers(self) -> Dict[str, BaseLLMProvider]:
+        """설정된 모든 제공자를 미리 생성 (워커 워밍업용)"""
+        return dict(self._providers.items())
+    
     def get_available_providers(self) -> Dict[str, bool]:
-        """사용 가능한 제공자 목록"""
-        return {name: (provider is not None) for name, provider in self._providers.items()}
+        """사용 가능한 제공자 목록 (API 키가 설정되고 초기화에 실패하지 않은 제공자)"""
+        failed = self._providers.failed()
+        return {name: name not in failed for name in self._providers.configured()}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        라우터 계측 정보 (현재 워커 기준)
+        
+        Returns:
+            제공자 가용성, 모델별 지연/에러율/비용 통계, 라우팅 결정, 헤징 효과, 캐스케이드 절감액, single-flight 병합 통계
+        """
+        return {
+            'providers': self.get_available_providers(),
+            'fake_mode': self._providers.fake_mode,
+            'models': get_model_stats().snapshot(),
+            'routing': self.routing_policy.get_stats() if self.routing_policy else {'mode': 'static'},
+            'hedging': self.hedge_policy.get_stats() if self.hedge_policy else None,
+            'cascade': self.cascade_stats.get_stats(),
+            'single_flight': dict(get_single_flight().stats),
+        }
     
     def search_internet(
         self,
@@ -394,9 +670,16 @@ class ModelRouter:
                 "PERPLEXITY_API_KEY를 설정했는지 확인하세요."
             )
         
+        from prompt_mate.cost_ledger import record_cost
+        
         logger.info(f"Perplexity Sonar로 인터넷 검색: {query[:50]}...")
         
-        return perplexity.search_internet(query=query, max_tokens=max_tokens)
+        with span('search.internet'):
+            result = perplexity.search_internet(query=query, max_tokens=max_tokens)
+            # 토큰 비용은 observe_call이 기록, 요청당 검색 수수료는 따로 기록
+            record_cost('search', 'perplexity', result['model'], 'search_request',
+                        search_request_cost(result['model']))
+            return result
     
     def enhance_prompt_with_internet(
         self,
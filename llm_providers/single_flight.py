@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Single-flight (요청 병합) 레이어
+
+동일한 요청(같은 안정 키)이 동시에 여러 번 들어오면 하나의 호출만 실제로
+수행하고, 나머지는 그 결과를 기다렸다가 공유합니다.
+
+- 같은 프로세스 안에서는 threading.Event로 대기합니다.
+- 워커(프로세스) 간에는 Django 캐시의 cache.add() 락으로 리더를 정하고,
+  리더가 캐시에 올린 결과를 팔로워가 폴링해서 가져갑니다.
+  (LocMem 캐시는 프로세스별이므로 워커 간 병합은 Redis 캐시에서만 동작)
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from prompt_mate.metrics import CACHE_REQUESTS, QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts: Any) -> str:
+    """
+    안정적인 요청 키 생성
+
+    Python의 hash()는 프로세스마다 달라지므로 워커 간에 공유할 수 없습니다.
+    인자를 정렬된 JSON으로 직렬화한 뒤 SHA256으로 해시합니다.
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _InFlightCall:
+    """프로세스 내 진행 중인 호출"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Single-flight 코디네이터
+
+    do(key, fn)을 호출하면 같은 key로 진행 중인 호출이 있을 때 그 결과를 공유합니다.
+    """
+
+    LOCK_PREFIX = 'sf:lock:'
+    RESULT_PREFIX = 'sf:result:'
+
+    def __init__(
+        self,
+        wait_timeout: float = 60.0,
+        result_ttl: int = 30,
+        poll_interval: float = 0.05
+    ):
+        """
+        Args:
+            wait_timeout: 팔로워가 리더를 기다리는 최대 시간 (초)
+            result_ttl: 워커 간 공유 결과의 캐시 유지 시간 (초)
+            poll_interval: 다른 워커의 결과를 확인하는 간격 (초)
+        """
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _InFlightCall] = {}
+        # follower: 진행 중인 호출에 합류한 요청, fallback: 대기 실패 후 직접 호출
+        self.stats = {'leader': 0, 'follower': 0, 'shared_local': 0, 'shared_remote': 0, 'fallback': 0}
+        QUEUE_DEPTH.set_function(lambda: len(self._calls), queue='single_flight_inflight')
+        QUEUE_DEPTH.set_function(self._waiting, queue='single_flight_waiters')
+
+    def _waiting(self) -> int:
+        """진행 중인 호출을 기다리는 팔로워 수"""
+        with self._lock:
+            return sum(call.waiters for call in self._calls.values())
+
+    def _count(self, result: str):
+        """병합 결과 집계 (stats와 cache_requests_total 메트릭)"""
+        with self._lock:
+            self.stats[result] += 1
+        CACHE_REQUESTS.inc(cache='single_flight', result=result)
+
+    def do(
+        self,
+        key: str,
+        fn: Callable[[], Any],
+        encode: Optional[Callable[[Any], Any]] = None,
+        decode: Optional[Callable[[Any], Any]] = None
+    ) -> Any:
+        """
+        key 단위로 병합된 호출 수행
+
+        Args:
+            key: 안정 요청 키 (make_key 사용 권장)
+            fn: 실제 호출
+            encode: 결과를 캐시에 저장 가능한 형태로 변환 (워커 간 공유용)
+            decode: 캐시에서 읽은 값을 결과로 복원
+
+        Returns:
+            fn()의 결과 (다른 호출과 공유될 수 있음)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats['follower'] += 1
+                is_leader = False
+            else:
+                call = _InFlightCall()
+                self._calls[key] = call
+                is_leader = True
+
+        if not is_leader:
+            CACHE_REQUESTS.inc(cache='single_flight', result='follower')
+            # 같은 프로세스의 리더를 기다림
+            if not call.event.wait(self.wait_timeout):
+                logger.warning(f"Single-flight 대기 시간 초과, 직접 호출: {key[:12]}")
+                self._count('fallback')
+                return fn()
+            self._count('shared_local')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_across_workers(key, fn, encode, decode)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+            if call.waiters:
+                logger.debug(f"Single-flight: {call.waiters}개 요청이 결과 공유 ({key[:12]})")
+
+    def _do_across_workers(self, key, fn, encode, decode) -> Any:
+        """캐시 락으로 워커 간 리더 선출 후 호출"""
+        lock_key = self.LOCK_PREFIX + key
+        result_key = self.RESULT_PREFIX + key
+        token = uuid.uuid4().hex
+
+        try:
+            acquired = cache.add(lock_key, token, int(self.wait_timeout) + 1)
+        except Exception as e:
+            # 캐시 장애 시 병합 없이 진행
+            logger.warning(f"Single-flight 락 획득 실패, 병합 없이 호출: {e}")
+            return fn()
+
+        if not acquired:
+            self._count('follower')
+            shared = self._wait_for_remote(lock_key, result_key, decode)
+            if shared is not None:
+                self._count('shared_remote')
+                return shared
+            # 리더가 실패했거나 시간 초과 → 직접 호출
+            self._count('fallback')
+            return fn()
+
+        self._count('leader')
+        try:
+            result = fn()
+            try:
+                cache.set(result_key, encode(result) if encode else result, self.result_ttl)
+            except Exception as e:
+                logger.warning(f"Single-flight 결과 공유 실패: {e}")
+            return result
+        finally:
+            try:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+            except Exception:
+                pass
+
+    def _wait_for_remote(self, lock_key, result_key, decode) -> Any:
+        """다른 워커의 리더가 결과를 올릴 때까지 폴링"""
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            cached = cache.get(result_key)
+            if cached is not None:
+                return decode(cached) if decode else cached
+            if cache.get(lock_key) is None:
+                # 락이 풀렸는데 결과가 없으면 리더 실패 (결과가 막 올라갔을 수 있어 한 번 더 확인)
+                cached = cache.get(result_key)
+                if cached is not None:
+                    return decode(cached) if decode else cached
+                return None
+            time.sleep(self.poll_interval)
+        logger.warning("Single-flight: 다른 워커의 결과 대기 시간 초과")
+        return None
+
+
+def coalesced(method):
+    """
+    Provider 메서드용 single-flight 데코레이터
+
+    provider 클래스, 메서드 이름, 모든 인자로 안정 키를 만들어 동일한 동시 요청을 병합합니다.
+    coalesce=False 인자를 주면 병합을 건너뜁니다 (헤징 중복 요청 등).
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        coalesce = kwargs.pop('coalesce', True)
+        if not coalesce or not settings.PROMPT_MATE.get('SINGLE_FLIGHT_ENABLED', True):
+            return method(self, *args, **kwargs)
+
+        key = make_key(self.__class__.__name__, method.__name__, args, kwargs)
+        from .base import LLMResponse
+        return get_single_flight().do(
+            key,
+            lambda: method(self, *args, **kwargs),
+            encode=lambda r: r.to_dict() if isinstance(r, LLMResponse) else r,
+            decode=lambda d: LLMResponse.from_dict(d) if method.__name__ == 'generate' else d
+        )
+    return wrapper
+
+
+# 전역 SingleFlight 인스턴스
+_single_flight_instance: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> SingleFlight:
+    """전역 SingleFlight 인스턴스 가져오기 (싱글톤)"""
+    global _single_flight_instance
+    if _single_flight_instance is None:
+        _single_flight_instance = SingleFlight(
+            wait_timeout=settings.PROMPT_MATE.get('SINGLE_FLIGHT_WAIT_TIMEOUT', 60.0),
+            result_ttl=settings.PROMPT_MATE.get('SINGLE_FLIGHT_RESULT_TTL', 30)
+        )
+    return _single_flight_instance
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+구조화 출력 (JSON) 유틸리티
+
+- 제공자별 네이티브 스키마 모드용 스키마 변환 (OpenAI strict json_schema, Gemini response_schema)
+- 네이티브 스키마 모드가 없는 모델용 JSON 복구 파서
+  (코드 펜스/앞뒤 설명 제거, 뒤따르는 쉼표 제거, 잘린 문자열/괄호 닫기)
+- 스트리밍 응답을 조각마다 받아 지금까지의 부분 객체를 돌려주는 증분 파서
+- JSON Schema 부분 집합(type/enum/required/properties/items) 검증
+"""
+
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .base import InvalidResponseError
+
+logger = logging.getLogger(__name__)
+
+_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$', re.IGNORECASE)
+
+# 시스템 프롬프트가 없을 때의 JSON 응답용 기본 시스템 프롬프트
+JSON_SYSTEM_PROMPT = "당신은 JSON 형식으로 응답하는 AI 어시스턴트입니다. 순수 JSON만 반환하고 다른 텍스트는 포함하지 마세요."
+
+# 복구 시 되돌아갈 최대 절단 지점 수 (잘린 키/값 제거용)
+MAX_CUT_ATTEMPTS = 4
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class IncrementalJSONParser:
+    """
+    증분 JSON 파서
+
+    feed()로 텍스트 조각을 넣으면 새로 들어온 문자만 스캔하여 문자열/괄호 상태를 갱신하고,
+    지금까지의 입력을 유효한 JSON으로 닫아 파싱한 부분 값을 돌려줍니다.
+    첫 '{' 또는 '[' 이전의 텍스트(설명, 코드 펜스)는 무시하고, 최상위 값이 닫히면 이후 입력도 무시합니다.
+
+    사용 예:
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            partial = parser.feed(chunk)   # {'questions': [{'text': '...'}]} 처럼 점점 채워짐
+        result = parser.value
+    """
+
+    def __init__(self):
+        self._out: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self.complete = False
+        # (출력 길이, 스택 깊이): 이 지점에서 자르고 괄호를 닫으면 유효한 접두사
+        self._cuts: List[Tuple[int, int]] = []
+        self.value: Any = None
+
+    def feed(self, text: str) -> Any:
+        """조각 추가 후 현재까지의 부분 값 반환 (아직 파싱할 수 없으면 직전 값)"""
+        if self.complete or not text:
+            return self.value
+        for ch in text:
+            if not self._consume(ch):
+                break
+        value = self._parse_partial()
+        if value is not None:
+            self.value = value
+        return self.value
+
+    def _consume(self, ch: str) -> bool:
+        """문자 하나 처리 (최상위 값이 끝나면 False)"""
+        out = self._out
+        if not self._started:
+            if ch not in '{[':
+                return True
+            self._started = True
+
+        if self._in_string:
+            out.append(ch)
+            if self._escape:
+                self._escape = False
+            elif ch == '\\':
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+            return True
+
+        if ch == '"':
+            self._in_string = True
+            out.append(ch)
+        elif ch in '{[':
+            out.append(ch)
+            self._stack.append(ch)
+            self._cuts.append((len(out), len(self._stack)))
+        elif ch in '}]':
+            if not self._stack:
+                return False
+            # 뒤따르는 쉼표 제거 ({"a": 1,} → {"a": 1})
+            while out and out[-1] in ' \t\r\n':
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            out.append(_CLOSERS[self._stack.pop()])
+            self._cuts = [cut for cut in self._cuts if cut[1] <= len(self._stack)]
+            if not self._stack:
+                self.complete = True
+                return False
+        elif ch == ',':
+            self._cuts.append((len(out), len(self._stack)))
+            out.append(ch)
+        else:
+            out.append(ch)
+        return True
+
+    def _closing(self, depth: int) -> str:
+        return ''.join(_CLOSERS[opener] for opener in reversed(self._stack[:depth]))
+
+    def _parse_partial(self) -> Any:
+        if not self._started:
+            return None
+        text = ''.join(self._out)
+
+        candidates = []
+        if self._in_string:
+            # 끝의 미완성 이스케이프는 버리고 문자열 닫기
+            body = text[:-1] if self._escape else text
+            candidates.append(body + '"' + self._closing(len(self._stack)))
+        else:
+            candidates.append(text + self._closing(len(self._stack)))
+        for position, depth in reversed(self._cuts[-MAX_CUT_ATTEMPTS:]):
+            candidates.append(text[:position] + self._closing(depth))
+
+        for candidate in candidates:
+            try:
+                return json.loads(candidate)
+            except ValueError:
+                continue
+        return None
+
+
+def parse_json(content: str) -> Any:
+    """
+    LLM 응답 텍스트를 JSON으로 파싱 (실패 시 복구 시도)
+
+    Raises:
+        InvalidResponseError: 복구 후에도 JSON 객체/배열을 얻지 못했을 때
+    """
+    text = (content or '').strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    parser = IncrementalJSONParser()
+    value = parser.feed(_FENCE.sub('', text))
+    if value is None:
+        raise InvalidResponseError(f"JSON 파싱 실패: {text[:200]}")
+    return value
+
+
+def finalize_json(content: str, schema: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    generate_json 공통 후처리: 복구 파싱 후 스키마 검증
+
+    스키마 위반은 경고만 남기고 값을 그대로 돌려줍니다.
+    (호출 측이 타입 변환 단계에서 기본값으로 보정)
+    """
+    return check_schema(parse_json(content), schema)
+
+
+def check_schema(value: Any, schema: Optional[Dict[str, Any]] = None) -> Any:
+    """스키마 위반 시 경고 로그를 남기고 값을 그대로 반환"""
+    errors = validate_json(value, schema)
+    if errors:
+        logger.warning(f"JSON 스키마 불일치 {len(errors)}건: {'; '.join(errors[:3])}")
+    return value
+
+
+def schema_name(schema: Dict[str, Any]) -> str:
+    """스키마 이름 (OpenAI json_schema 이름, Anthropic 도구 이름)"""
+    return schema.get('title') or 'structured_output'
+
+
+def validate_json(value: Any, schema: Optional[Dict[str, Any]], path: str = '$') -> List[str]:
+    """
+    JSON Schema 부분 집합으로 검증
+
+    Returns:
+        오류 메시지 리스트 (유효하면 빈 리스트)
+    """
+    if not schema:
+        return []
+
+    expected = schema.get('type')
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_is_type(value, t) for t in types):
+            return [f"{path}: {'/'.join(types)} 필요, {type(value).__name__} 받음"]
+
+    errors = []
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f"{path}: {schema['enum']} 중 하나여야 함, {value!r} 받음")
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if 'minimum' in schema and value < schema['minimum']:
+            errors.append(f"{path}: {schema['minimum']} 이상이어야 함, {value!r} 받음")
+        if 'maximum' in schema and value > schema['maximum']:
+            errors.append(f"{path}: {schema['maximum']} 이하여야 함, {value!r} 받음")
+    elif isinstance(value, str):
+        if len(value) < schema.get('minLength', 0):
+            errors.append(f"{path}: 최소 {schema['minLength']}자 필요, {len(value)}자 받음")
+        if 'maxLength' in schema and len(value) > schema['maxLength']:
+            errors.append(f"{path}: 최대 {schema['maxLength']}자, {len(value)}자 받음")
+    elif isinstance(value, list):
+        if len(value) < schema.get('minItems', 0):
+            errors.append(f"{path}: 최소 {schema['minItems']}개 필요, {len(value)}개 받음")
+        if 'maxItems' in schema and len(value) > schema['maxItems']:
+            errors.append(f"{path}: 최대 {schema['maxItems']}개, {len(value)}개 받음")
+
+    if isinstance(value, dict):
+        for key in schema.get('required', []):
+            if key not in value:
+                errors.append(f"{path}.{key}: 필수 필드 누락")
+        for key, sub_schema in schema.get('properties', {}).items():
+            if key in value:
+                errors.extend(validate_json(value[key], sub_schema, f"{path}.{key}"))
+    elif isinstance(value, list) and 'items' in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate_json(item, schema['items'], f"{path}[{i}]"))
+    return errors
+
+
+def _is_type(value: Any, json_type: str) -> bool:
+    if json_type == 'object':
+        return isinstance(value, dict)
+    if json_type == 'array':
+        return isinstance(value, list)
+    if json_type == 'string':
+        return isinstance(value, str)
+    if json_type == 'integer':
+        return isinstance(value, int) and not isinstance(value, bool)
+    if json_type == 'number':
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if json_type == 'boolean':
+        return isinstance(value, bool)
+    if json_type == 'null':
+        return value is None
+    return True
+
+
+def openai_response_format(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenAI strict json_schema response_format (스키마는 모든 속성 required, additionalProperties false)"""
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': schema_name(schema),
+            'schema': {key: value for key, value in schema.items() if key != 'title'},
+            'strict': True,
+        },
+    }
+
+
+def to_gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    JSON Schema를 Gemini response_schema(OpenAPI 부분 집합)로 변환
+
+    additionalProperties 등 지원하지 않는 키워드는 제거하고, ["string", "null"] 형식은 nullable로 바꿉니다.
+    """
+    converted: Dict[str, Any] = {}
+    json_type = schema.get('type')
+    if isinstance(json_type, list):
+        non_null = [t for t in json_type if t != 'null']
+        if len(non_null) < len(json_type):
+            converted['nullable'] = True
+        json_type = non_null[0] if non_null else 'string'
+    if json_type:
+        converted['type'] = json_type.upper()
+    for key in ('description', 'enum', 'required'):
+        if key in schema:
+            converted[key] = schema[key]
+    if 'properties' in schema:
+        converted['properties'] = {
+            name: to_gemini_schema(sub_schema) for name, sub_schema in schema['properties'].items()
+        }
+    if 'items' in schema:
+        converted['items'] = to_gemini_schema(schema['items'])
+    return converted
@@ -1,3 +1,1080 @@
-from django.test import TestCase
+# -*- coding: utf-8 -*-
+"""
+llm_providers 동작 테스트
 
-# Create your tests here.
+네트워크 없이 실행됩니다 (제공자 호출은 테스트 안의 가짜 함수로 대체).
+"""
+
+import hashlib
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from prompt_mate import cost_ledger
+
+from . import single_flight
+from .adaptive_routing import AdaptiveRoutingPolicy
+from .cassette import (
+    Cassette, RecordingEmbeddingClient, RecordingProvider, ReplayEmbeddingClient, ReplayProvider, request_keys
+)
+from .base import (
+    BaseLLMProvider, ContextWindowExceededError, InvalidResponseError, LLMProviderError, LLMResponse, LLMStream,
+    RateLimitError, apply_stop
+)
+from .capabilities import find_model_for_context, get_capabilities
+from .cascade import run_cascade
+from .continuation import generate_with_continuation
+from .fake_provider import FakeEmbeddingClient, FakeProvider, LatencyProfile
+from .hedging import HedgedProvider, HedgePolicy
+from .instrumentation import ModelStatsRegistry, collect_calls
+from .google_provider import GoogleProvider
+from .openai_provider import OpenAIProvider
+from .registry import ProviderRegistry
+from .router import ModelRouter, TaskType
+from .single_flight import SingleFlight, coalesced
+from .structured import IncrementalJSONParser, finalize_json, parse_json, to_gemini_schema, validate_json
+from .tokenizer import TokenizerService, estimate_tokens
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('조건을 기다리다 시간 초과')
+        time.sleep(0.005)
+
+
+class SingleFlightTests(SimpleTestCase):
+    """동시에 들어온 같은 키의 호출이 하나로 병합되는지 확인"""
+
+    def setUp(self):
+        cache.clear()
+        self.flight = SingleFlight(wait_timeout=5.0, poll_interval=0.01)
+
+    def _run_concurrently(self, fn):
+        """리더 호출이 진행 중일 때 팔로워가 합류하도록 두 스레드로 같은 키 호출"""
+        outcomes = [None, None]
+
+        def worker(index):
+            try:
+                outcomes[index] = ('ok', self.flight.do('same-key', fn))
+            except Exception as e:
+                outcomes[index] = ('error', e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(2)]
+        threads[0].start()
+        _wait_until(lambda: self.started.is_set())
+        threads[1].start()
+        _wait_until(lambda: self.flight._waiting() == 1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def _blocking(self, result=None, error=None):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+        def fn():
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            if error is not None:
+                raise error
+            return result
+
+        return fn
+
+    def test_concurrent_identical_calls_make_single_call(self):
+        result = {'content': '응답'}
+        outcomes = self._run_concurrently(self._blocking(result=result))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(outcomes, [('ok', result), ('ok', result)])
+        self.assertIs(outcomes[0][1], outcomes[1][1])
+        self.assertEqual(self.flight.stats['leader'], 1)
+        self.assertEqual(self.flight.stats['follower'], 1)
+        self.assertEqual(self.flight.stats['shared_local'], 1)
+        self.assertEqual(self.flight._waiting(), 0)
+
+    def test_concurrent_identical_calls_share_single_exception(self):
+        error = RuntimeError('rate limited')
+        outcomes = self._run_concurrently(self._blocking(error=error))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([kind for kind, _ in outcomes], ['error', 'error'])
+        self.assertIs(outcomes[0][1], error)
+        self.assertIs(outcomes[1][1], error)
+
+    def test_follower_timeout_falls_back_to_direct_call(self):
+        self.flight.wait_timeout = 0.05
+        fn = self._blocking(result='leader')
+        leader = threading.Thread(target=lambda: self.flight.do('same-key', fn))
+        leader.start()
+        _wait_until(lambda: self.started.is_set())
+
+        self.assertEqual(self.flight.do('same-key', lambda: 'direct'), 'direct')
+        self.release.set()
+        leader.join(5)
+        self.assertEqual(self.flight.stats['fallback'], 1)
+
+    def test_sequential_calls_are_not_shared(self):
+        self.assertEqual(self.flight.do('key', lambda: 1), 1)
+        self.assertEqual(self.flight.do('key', lambda: 2), 2)
+        self.assertEqual(self.flight.stats['leader'], 2)
+
+
+class _Provider:
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    @coalesced
+    def embed(self, text):
+        self.calls += 1
+        self.release.wait(5)
+        return [len(text)]
+
+
+@override_settings(PROMPT_MATE={'SINGLE_FLIGHT_ENABLED': True})
+class CoalescedDecoratorTests(SimpleTestCase):
+    """@coalesced 제공자 메서드의 병합/우회"""
+
+    def setUp(self):
+        cache.clear()
+        single_flight._single_flight_instance = None
+
+    def tearDown(self):
+        single_flight._single_flight_instance = None
+
+    def test_identical_arguments_share_one_provider_call(self):
+        provider = _Provider()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(provider.embed('같은 입력'))) for _ in range(2)]
+        threads[0].start()
+        _wait_until(lambda: provider.calls == 1)
+        threads[1].start()
+        _wait_until(lambda: single_flight.get_single_flight()._waiting() == 1)
+        provider.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(provider.calls, 1)
+        self.assertEqual(results, [[5], [5]])
+
+    def test_coalesce_false_bypasses_single_flight(self):
+        provider = _Provider()
+        provider.release.set()
+        provider.embed('입력', coalesce=False)
+        provider.embed('입력', coalesce=False)
+        self.assertEqual(provider.calls, 2)
+        self.assertIsNone(single_flight._single_flight_instance)
+
+
+class _TimedProvider(BaseLLMProvider):
+    """모델별로 정한 시간만큼 기다렸다가 응답하는 계측 제공자 (시간이 None이면 실패)"""
+
+    PROVIDER_NAME = 'openai'
+
+    def __init__(self, delays, default_model='gpt-5-nano'):
+        super().__init__('test', default_model)
+        self.delays = delays
+        self.threads = []
+
+    def generate(self, prompt, model=None, coalesce=True, **kwargs):
+        model = model or self.default_model
+        self.threads.append(threading.current_thread().name)
+        with self.observe_call(model) as call:
+            delay = self.delays.get(model, 0)
+            if delay is None:
+                raise RuntimeError('upstream error')
+            time.sleep(delay)
+            call.record_usage(prompt_tokens=100, completion_tokens=50)
+        return LLMResponse(content=model, model=model, tokens_used=150)
+
+    def generate_json(self, prompt, schema=None, model=None, **kwargs):
+        raise NotImplementedError
+
+    def count_tokens(self, text):
+        return len(text)
+
+    def get_available_models(self):
+        return list(self.delays)
+
+
+class _ChunkedProvider(_TimedProvider):
+    """조각마다 정한 시간만큼 기다리며 스트리밍하는 제공자 (닫힌 시점까지 보낸 조각 수 기록)"""
+
+    CHUNKS = 20
+
+    def __init__(self, delays, default_model='gpt-5-nano'):
+        super().__init__(delays, default_model)
+        self.sent = None
+
+    def generate_stream(self, prompt, model=None, **kwargs):
+        model = model or self.default_model
+        stream = LLMStream(prompt, model, counter=self.count_tokens)
+
+        def chunks():
+            sent = 0
+            with self.observe_call(model, 'generate_stream') as call:
+                try:
+                    for _ in range(self.CHUNKS):
+                        time.sleep(self.delays[model])
+                        sent += 1
+                        yield model
+                    stream.finish_reason = 'stop'
+                finally:
+                    self.sent = sent
+                    stream.record_usage(call)
+
+        return stream.bind(chunks())
+
+
+class LLMStreamTests(SimpleTestCase):
+    """스트림 취소와 로컬 정지 시퀀스"""
+
+    def _source(self, pieces, log):
+        try:
+            for piece in pieces:
+                log.append(piece)
+                yield piece
+        finally:
+            log.append('closed')
+
+    def test_close_mid_stream_closes_source_and_counts_generated_tokens(self):
+        log = []
+        stream = LLMStream('질문', 'gpt-5-nano', counter=len).bind(self._source(['ab', 'cd', 'ef'], log))
+        chunks = iter(stream)
+        self.assertEqual(next(chunks), 'ab')
+        stream.close()
+
+        self.assertEqual(log, ['ab', 'closed'])
+        self.assertTrue(stream.cancelled)
+        self.assertEqual((stream.prompt_tokens, stream.completion_tokens), (2, 2))
+
+    def test_stop_sequence_split_across_chunks(self):
+        log = []
+        stream = LLMStream('질문', 'gpt-5-nano', counter=len, stop=['END']).bind(
+            self._source(['hello E', 'N', 'D tail', 'never'], log)
+        )
+
+        self.assertEqual(''.join(stream), 'hello ')
+        self.assertEqual(stream.content, 'hello ')
+        self.assertEqual(stream.finish_reason, 'stop')
+        # 정지 시퀀스를 찾으면 나머지 조각을 받지 않고 업스트림을 닫음
+        self.assertEqual(log, ['hello E', 'N', 'D tail', 'closed'])
+
+    def test_held_back_text_is_flushed_at_end(self):
+        stream = LLMStream('질문', 'gpt-5-nano', stop=['END']).bind(iter(['abc', 'E', 'N']))
+        self.assertEqual(list(stream), ['a', 'b', 'c', 'EN'])
+
+
+class HedgedProviderTests(SimpleTestCase):
+    """헤징 요청의 결과/호출 기록/비용 청구"""
+
+    def setUp(self):
+        self.policy = HedgePolicy(tasks=['intent_parsing'], min_samples=1000, default_delay_ms=20, min_delay_ms=0)
+        self.ledger = cost_ledger.CostLedger('hedge-test')
+        self.token = cost_ledger.activate(self.ledger)
+
+    def tearDown(self):
+        cost_ledger.deactivate(self.token)
+
+    def test_fast_primary_does_not_hedge_and_records_call(self):
+        primary = _TimedProvider({'gpt-5-nano': 0})
+        with collect_calls() as calls:
+            response = HedgedProvider(primary, self.policy).generate('질문')
+
+        self.assertEqual(response.content, 'gpt-5-nano')
+        self.assertEqual(self.policy.hedges_fired, 0)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(self.ledger.records), 1)
+        # 공유 스레드 풀이 아닌 호출마다의 전용 스레드에서 실행
+        self.assertEqual(primary.threads, ['llm-hedge'])
+
+    def test_hedge_win_records_winner_and_bills_late_loser(self):
+        primary = _TimedProvider({'gpt-5-nano': 0.3})
+        alternate = _TimedProvider({'gpt-4o-mini': 0})
+        hedged = HedgedProvider(primary, self.policy, alternate=alternate, alternate_model='gpt-4o-mini')
+
+        with collect_calls() as calls:
+            response = hedged.generate('질문')
+
+        self.assertEqual(response.content, 'gpt-4o-mini')
+        self.assertEqual(self.policy.hedge_wins, 1)
+        self.assertEqual([call.model for call in calls], ['gpt-4o-mini'])
+
+        # 진 원 요청은 끝나는 대로 같은 요청 원장에 청구
+        _wait_until(lambda: len(self.ledger.records) == 2)
+        self.assertEqual(
+            sorted(record.model for record in self.ledger.records), ['gpt-4o-mini', 'gpt-5-nano']
+        )
+        _wait_until(lambda: self.policy.extra_tokens == 150)
+
+    def test_losing_stream_is_cancelled(self):
+        primary = _ChunkedProvider({'gpt-5-nano': 0.05})
+        alternate = _ChunkedProvider({'gpt-4o-mini': 0})
+        hedged = HedgedProvider(primary, self.policy, alternate=alternate, alternate_model='gpt-4o-mini')
+
+        response = hedged.generate('질문')
+
+        self.assertEqual(response.content, 'gpt-4o-mini' * _ChunkedProvider.CHUNKS)
+        # 진 원 요청은 다음 조각에서 닫히고, 생성된 만큼만 청구
+        _wait_until(lambda: primary.sent is not None)
+        self.assertLess(primary.sent, _ChunkedProvider.CHUNKS)
+        _wait_until(lambda: self.policy.losers_cancelled == 1)
+        loser = [record for record in self.ledger.records if record.model == 'gpt-5-nano']
+        self.assertEqual(loser[0].completion_tokens, len('gpt-5-nano') * primary.sent)
+        self.assertGreater(self.policy.get_stats()['loser_wasted_ms'], 0)
+
+    def test_failed_primary_call_is_collected_with_hedge(self):
+        primary = _TimedProvider({'gpt-5-nano': None})
+        alternate = _TimedProvider({'gpt-4o-mini': 0})
+        hedged = HedgedProvider(primary, self.policy, alternate=alternate, alternate_model='gpt-4o-mini')
+
+        with collect_calls() as calls:
+            response = hedged.generate('질문')
+
+        self.assertEqual(response.content, 'gpt-4o-mini')
+        self.assertEqual([(call.model, call.ok) for call in calls], [('gpt-4o-mini', True), ('gpt-5-nano', False)])
+        # 토큰을 쓰지 않은 실패 호출은 청구하지 않음
+        self.assertEqual([record.model for record in self.ledger.records], ['gpt-4o-mini'])
+
+
+class HedgeAlternatePlanTests(SimpleTestCase):
+    """헤징 대체 모델의 플랜 허용 여부 확인"""
+
+    def _router(self, alternate):
+        router = ModelRouter.__new__(ModelRouter)
+        router.hedge_policy = HedgePolicy(tasks=['intent_parsing'], alternate=alternate)
+        router._providers = {'anthropic': _TimedProvider({'claude-sonnet-4-5': 0}, 'claude-sonnet-4-5')}
+        return router
+
+    def test_alternate_outside_plan_falls_back_to_same_model(self):
+        router = self._router('anthropic:claude-sonnet-4-5')
+        free_plan = SimpleNamespace(plan_type='free', allowed_models=['gpt-5-nano'])
+        with mock.patch('llm_providers.router.get_user_subscription', return_value=(None, free_plan)):
+            hedged = router._wrap_with_hedging(_TimedProvider({'gpt-5-nano': 0}), 'gpt-5-nano', user=object())
+
+        self.assertIsNone(hedged.alternate)
+
+    def test_alternate_allowed_by_plan_is_kept(self):
+        router = self._router('anthropic:claude-sonnet-4-5')
+        plan = SimpleNamespace(plan_type='pro', allowed_models=['gpt-5-nano', 'claude-sonnet-4-5'])
+        with mock.patch('llm_providers.router.get_user_subscription', return_value=(None, plan)):
+            hedged = router._wrap_with_hedging(_TimedProvider({'gpt-5-nano': 0}), 'gpt-5-nano', user=object())
+
+        self.assertEqual(hedged.alternate_model, 'claude-sonnet-4-5')
+
+
+class AdaptiveRoutingPolicyTests(SimpleTestCase):
+    """적응형 라우팅 선택과 결정 기록"""
+
+    def test_selects_cheapest_allowed_model_by_provider_name(self):
+        policy = AdaptiveRoutingPolicy()
+        selected = policy.select(
+            task='intent_parsing',
+            required_tier=1,
+            providers=['openai', 'anthropic'],
+            allowed_models=['gpt-5-nano', 'claude-sonnet-4-5'],
+        )
+
+        self.assertEqual((selected['provider'], selected['model']), ('openai', 'gpt-5-nano'))
+        decision = policy.get_stats()['recent_decisions'][0]
+        self.assertEqual(decision['selected'], 'openai:gpt-5-nano')
+        self.assertEqual(decision['cost_per_1k'], selected['cost_per_1k'])
+        self.assertNotIn('candidates', decision)
+
+    def test_decision_explains_skipped_cheaper_models(self):
+        registry = ModelStatsRegistry()
+        for _ in range(10):
+            registry.record('openai', 'gpt-5-nano', 5000, ok=True)
+        policy = AdaptiveRoutingPolicy(latency_slo_ms={'intent_parsing': 3000}, min_samples=10)
+        with mock.patch('llm_providers.adaptive_routing.get_model_stats', return_value=registry):
+            selected = policy.select(
+                'intent_parsing', 1, providers=['openai'], allowed_models=['gpt-5-nano', 'gpt-5-mini']
+            )
+
+        self.assertEqual(selected['model'], 'gpt-5-mini')
+        decision = policy.get_stats()['recent_decisions'][0]
+        skipped = {entry['model']: entry for entry in decision['skipped']}
+        self.assertEqual(skipped['openai:gpt-5-nano']['reason'], 'latency_slo')
+        self.assertEqual(skipped['openai:gpt-5-nano']['detail'], 'p95 5000ms > SLO 3000ms')
+        self.assertEqual(skipped['openai:gpt-5-nano']['samples'], 10)
+        # 선택보다 비싼 후보는 설명 대상이 아님
+        others = [entry['reason'] for model, entry in skipped.items() if model != 'openai:gpt-5-nano']
+        self.assertTrue(all(reason == 'plan' for reason in others))
+        self.assertEqual(decision['unverified'], ['openai:gpt-5-mini'])
+
+    def test_no_eligible_model_falls_back(self):
+        policy = AdaptiveRoutingPolicy()
+        self.assertIsNone(policy.select('final_generation', 3, providers=['openai'], allowed_models=['gpt-5-nano']))
+        self.assertEqual(policy.fallbacks, 1)
+        decision = policy.get_stats()['recent_decisions'][0]
+        self.assertIsNone(decision['selected'])
+        reasons = {entry['model']: entry['reason'] for entry in decision['skipped']}
+        self.assertEqual(reasons['openai:gpt-5-nano'], 'quality_tier')
+
+
+class _StubRegistry:
+    """ProviderRegistry 대역 (생성한 제공자 이름 기록)"""
+
+    def __init__(self, providers):
+        self.providers = providers
+        self.constructed = []
+
+    def configured(self):
+        return list(self.providers)
+
+    def failed(self):
+        return {}
+
+    def get(self, name):
+        self.constructed.append(name)
+        return self.providers.get(name)
+
+
+class LazyProviderRegistryTests(SimpleTestCase):
+    """라우터 생성 시에는 제공자를 만들지 않고 처음 사용할 때 생성"""
+
+    PROMPT_MATE = {
+        **settings.PROMPT_MATE,
+        'FAKE_LLM_MODE': True,
+        'LLM_CASSETTE_MODE': '',
+        'ROUTING_MODE': 'static',
+        'HEDGING_ENABLED': False,
+    }
+
+    def test_router_builds_providers_on_first_use(self):
+        with override_settings(PROMPT_MATE=self.PROMPT_MATE):
+            router = ModelRouter()
+            self.assertEqual(router._providers.loaded(), [])
+            self.assertEqual(list(router.get_available_providers()), ['openai', 'anthropic', 'google', 'perplexity'])
+            self.assertEqual(router._providers.loaded(), [])
+
+            provider, model, _ = router.get_provider(TaskType.INTENT_PARSING)
+
+        self.assertEqual((provider.PROVIDER_NAME, model), ('openai', 'gpt-5-nano'))
+        self.assertEqual(router._providers.loaded(), ['openai'])
+
+    def test_only_configured_keys_are_candidates(self):
+        prompt_mate = {**self.PROMPT_MATE, 'FAKE_LLM_MODE': False}
+        with override_settings(PROMPT_MATE=prompt_mate, OPENAI_API_KEY='sk-test', ANTHROPIC_API_KEY='',
+                               GOOGLE_API_KEY='', PERPLEXITY_API_KEY=''):
+            registry = ProviderRegistry()
+            self.assertEqual(registry.configured(), ['openai'])
+            self.assertEqual(registry.loaded(), [])
+            self.assertIsNone(registry.get('google'))
+            self.assertEqual(registry.loaded(), [])
+
+
+class CascadeLadderTests(SimpleTestCase):
+    """선택된 모델을 목표로 한 캐스케이드 단계 구성"""
+
+    def setUp(self):
+        self.openai = _TimedProvider({'gpt-5-nano': 0, 'gpt-5-mini': 0, 'gpt-5': 0})
+        self.google = _TimedProvider({'gemini-1.5-flash': 0}, 'gemini-1.5-flash')
+        self.router = ModelRouter.__new__(ModelRouter)
+        self.router._providers = _StubRegistry({'openai': self.openai, 'google': self.google})
+        self.plan = SimpleNamespace(
+            plan_type='pro', allowed_models=['gpt-5-nano', 'gpt-5-mini', 'gpt-5', 'gemini-1.5-flash']
+        )
+
+    def _ladder(self, target, **kwargs):
+        with mock.patch('llm_providers.router.get_user_subscription', return_value=(None, self.plan)):
+            ladder = self.router.get_cascade_ladder(target, user=object(), **kwargs)
+        return [model for _, model, _ in ladder]
+
+    def test_cheaper_lower_tiers_lead_to_selected_target(self):
+        self.assertEqual(
+            self._ladder((self.openai, 'gpt-5', 0.7)), ['gemini-1.5-flash', 'gpt-5-mini', 'gpt-5']
+        )
+
+    def test_preferred_provider_and_plan_limit_rungs(self):
+        self.assertEqual(
+            self._ladder((self.openai, 'gpt-5', 0.7), preferred_provider='openai'),
+            ['gpt-5-nano', 'gpt-5-mini', 'gpt-5']
+        )
+        self.assertNotIn('google', self.router._providers.constructed)
+
+    def test_cheapest_target_has_no_lower_rungs(self):
+        # 비용 예산/무료 플랜으로 가장 싼 모델이 선택되면 캐스케이드 없음
+        self.assertEqual(self._ladder((self.openai, 'gpt-5-nano', 0.7)), ['gpt-5-nano'])
+        self.assertEqual(self.router._providers.constructed, [])
+
+    def test_prompt_over_context_window_skips_small_models(self):
+        small = SimpleNamespace(fits=lambda prompt_tokens, output_tokens: False)
+        with mock.patch('llm_providers.router.get_capabilities', return_value=small):
+            self.assertEqual(self._ladder((self.openai, 'gpt-5', 0.7), prompt='긴 프롬프트'), ['gpt-5'])
+
+
+class CostBudgetDowngradeTests(SimpleTestCase):
+    """비용 예산 초과 시 작업의 최소 등급을 지키는 가장 싼 모델로 변경"""
+
+    def setUp(self):
+        self.router = ModelRouter.__new__(ModelRouter)
+        self.router._providers = _StubRegistry({
+            'openai': _TimedProvider({'gpt-5-nano': 0, 'gpt-5-mini': 0, 'gpt-5': 0}),
+            'google': _TimedProvider({'gemini-1.5-flash': 0}, 'gemini-1.5-flash'),
+        })
+        self.policy = SimpleNamespace(enabled=True, exceeded=lambda user=None: 'daily')
+
+    def _apply(self, model, min_tier, user=None):
+        with mock.patch('prompt_mate.cost_ledger.get_cost_budget_policy', return_value=self.policy):
+            return self.router._apply_cost_budget('openai', model, 0.7, user, min_tier)
+
+    def test_keeps_minimum_tier_without_constructing_providers(self):
+        # 후보는 능력 레지스트리의 제공자별 모델 (gpt-4.1 계열 포함)
+        self.assertEqual(self._apply('gpt-5', 3), ('openai', 'gpt-4.1', 0.7))
+        self.assertEqual(self._apply('gpt-5', 2), ('openai', 'gpt-4.1-mini', 0.7))
+        self.assertEqual(self._apply('gpt-5', 1), ('google', 'gemini-1.5-flash', 0.7))
+        # 최소 등급 안에 더 싼 모델이 없으면 그대로
+        self.assertEqual(self._apply('gpt-4.1', 3), ('openai', 'gpt-4.1', 0.7))
+        self.assertEqual(self.router._providers.constructed, [])
+
+    def test_plan_limits_candidates(self):
+        plan = SimpleNamespace(plan_type='pro', allowed_models=['gpt-5-nano', 'gpt-5'])
+        with mock.patch('llm_providers.router.get_user_subscription', return_value=(None, plan)):
+            self.assertEqual(self._apply('gpt-5', 1, user=object()), ('openai', 'gpt-5-nano', 0.7))
+
+
+class _ScriptedProvider(_TimedProvider):
+    """모델별로 정한 응답을 돌려주고 받은 max_tokens를 기록하는 제공자"""
+
+    def __init__(self, contents):
+        super().__init__({model: 0 for model in contents})
+        self.contents = contents
+        self.max_tokens = {}
+
+    def generate(self, prompt, model=None, max_tokens=None, **kwargs):
+        self.max_tokens[model] = max_tokens
+        with self.observe_call(model) as call:
+            call.record_usage(prompt_tokens=10, completion_tokens=300)
+        return LLMResponse(
+            content=self.contents[model], model=model, tokens_used=310,
+            finish_reason='stop', prompt_tokens=10, completion_tokens=300
+        )
+
+
+class _QueuedProvider(_TimedProvider):
+    """정해진 (내용, finish_reason) 순서대로 응답하고 호출 인자를 기록하는 제공자"""
+
+    def __init__(self, responses):
+        super().__init__({'gpt-5-nano': 0})
+        self.responses = list(responses)
+        self.requests = []
+
+    def generate(self, prompt, model=None, max_tokens=None, stop=None, **kwargs):
+        self.requests.append({'prompt': prompt, 'max_tokens': max_tokens, 'stop': stop})
+        content, finish_reason = self.responses.pop(0)
+        return LLMResponse(
+            content=content, model=model, tokens_used=10 + len(content), finish_reason=finish_reason,
+            prompt_tokens=10, completion_tokens=len(content)
+        )
+
+
+class ContinuationTests(SimpleTestCase):
+    """잘린 응답 이어쓰기와 정지 시퀀스"""
+
+    def _generate(self, provider, **kwargs):
+        options = {'max_tokens': 300, 'max_continuations': 1, 'continuation_tokens': 256}
+        options.update(kwargs)
+        return generate_with_continuation(provider, prompt='질문', model='gpt-5-nano', temperature=0.7, **options)
+
+    def test_complete_response_is_not_continued(self):
+        provider = _QueuedProvider([('완결된 답변', 'stop')])
+        self.assertEqual(self._generate(provider).content, '완결된 답변')
+        self.assertEqual(len(provider.requests), 1)
+
+    def test_truncated_response_continues_up_to_limit(self):
+        provider = _QueuedProvider([('앞부분', 'length'), ('중간', 'max_tokens'), ('뒷부분', 'length')])
+        response = self._generate(provider, max_continuations=2)
+
+        self.assertEqual(response.content, '앞부분중간뒷부분')
+        self.assertEqual(response.finish_reason, 'length')
+        self.assertEqual(len(provider.requests), 3)
+        self.assertIn('[지금까지의 답변]\n앞부분중간', provider.requests[2]['prompt'])
+        self.assertEqual([request['max_tokens'] for request in provider.requests], [300, 256, 256])
+        self.assertEqual(response.completion_tokens, len('앞부분중간뒷부분'))
+        self.assertEqual(response.prompt_tokens, 30)
+
+    def test_request_max_tokens_is_not_continued(self):
+        # 클라이언트가 max_tokens를 지정하면 정책 이어쓰기 횟수가 0
+        provider = _QueuedProvider([('앞부분', 'length')])
+        self.assertEqual(self._generate(provider, max_continuations=0).content, '앞부분')
+        self.assertEqual(len(provider.requests), 1)
+
+    def test_leading_blank_line_does_not_empty_response(self):
+        self.assertEqual(apply_stop('\n\n첫 문단\n\n둘째 문단', ['\n\n']), ('\n\n첫 문단', True))
+        self.assertEqual(apply_stop('\n\n', ['\n\n']), ('\n\n', False))
+
+        # API 정지 시퀀스에 첫머리부터 걸린 빈 응답은 정지 시퀀스 없이 다시 생성해 로컬에서 자름
+        provider = _QueuedProvider([('', 'stop'), ('\n\n첫 문단\n\n둘째 문단', 'stop')])
+        response = self._generate(provider, stop=['\n\n'])
+
+        self.assertEqual(response.content.strip(), '첫 문단')
+        self.assertEqual([request['stop'] for request in provider.requests], [['\n\n'], None])
+        self.assertEqual(response.prompt_tokens, 20)
+
+
+class RunCascadeTests(SimpleTestCase):
+    """캐스케이드 승격과 단계별 출력 한도"""
+
+    def test_failed_check_escalates_with_per_model_max_tokens(self):
+        provider = _ScriptedProvider({
+            'gpt-5-nano': "I'm sorry, but I can't help with that.",
+            'gpt-5': '충분히 구체적인 답변',
+        })
+        result = run_cascade(
+            [(provider, 'gpt-5-nano', 0.7), (provider, 'gpt-5', 0.7)],
+            prompt='질문',
+            max_tokens=1000,
+            max_tokens_by_model={'gpt-5-nano': 400},
+        )
+
+        self.assertEqual(result.model, 'gpt-5')
+        self.assertEqual([a['failed'] for a in result.attempts], ['refusal', None])
+        self.assertEqual(result.tokens_used, 620)
+        self.assertEqual(provider.max_tokens, {'gpt-5-nano': 400, 'gpt-5': 1000})
+
+    def test_passing_first_rung_is_served(self):
+        provider = _ScriptedProvider({'gpt-5-nano': '답변', 'gpt-5': '답변'})
+        result = run_cascade([(provider, 'gpt-5-nano', 0.7), (provider, 'gpt-5', 0.7)], prompt='질문')
+
+        self.assertEqual((result.model, result.depth), ('gpt-5-nano', 1))
+        self.assertGreater(result.savings_usd, 0)
+
+
+def _byte_encoding():
+    """네트워크 없이 만들 수 있는 바이트 단위 tiktoken 인코딩 (토큰 수 = UTF-8 바이트 수)"""
+    import tiktoken
+
+    return tiktoken.Encoding(
+        name='test_bytes',
+        pat_str=r'\S+|\s+',
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={},
+    )
+
+
+class TokenizerServiceTests(SimpleTestCase):
+    """tiktoken 정확 계산 경로와 추정 경로"""
+
+    def test_exact_count_uses_tiktoken_encoding_and_memoizes(self):
+        tokenizer = TokenizerService()
+        with mock.patch('tiktoken.get_encoding', return_value=_byte_encoding()) as get_encoding:
+            self.assertEqual(tokenizer.count('hello', 'gpt-5'), 5)
+            self.assertEqual(tokenizer.count_batch(['ab', '', '안녕'], 'gpt-4o'), [2, 0, 6])
+            self.assertEqual(tokenizer.count('hello', 'gpt-5'), 5)
+
+        # 인코딩은 한 번만 로드하고 같은 문자열은 메모이즈
+        get_encoding.assert_called_once_with('o200k_base')
+        self.assertEqual(tokenizer.hits, 1)
+        self.assertEqual(tokenizer.get_stats()['encodings'], ['o200k_base'])
+
+    def test_falls_back_to_estimate_when_encoding_unavailable(self):
+        tokenizer = TokenizerService()
+        with mock.patch('tiktoken.get_encoding', side_effect=OSError('download failed')) as get_encoding:
+            self.assertEqual(tokenizer.count('hello world', 'gpt-5'), estimate_tokens('hello world'))
+            tokenizer.count('다시', 'gpt-5')
+            # 실패한 인코딩은 다시 로드하지 않음
+            get_encoding.assert_called_once()
+            self.assertEqual(tokenizer.load_encodings(), [])
+
+    def test_models_without_local_tokenizer_use_estimate(self):
+        tokenizer = TokenizerService()
+        with mock.patch('tiktoken.get_encoding') as get_encoding:
+            self.assertEqual(tokenizer.count('안녕하세요', 'claude-3-5-haiku-20241022'), estimate_tokens('안녕하세요'))
+        self.assertFalse(get_encoding.called)
+
+
+class ContextFitTests(SimpleTestCase):
+    """컨텍스트 윈도우를 넘는 프롬프트의 대체 모델 선택"""
+
+    def test_untiered_models_are_never_replacements(self):
+        for min_tier in (None, 1):
+            caps = find_model_for_context(1000, providers=['perplexity', 'google'], min_tier=min_tier)
+            self.assertIsNotNone(caps.quality_tier)
+            self.assertEqual(caps.name, 'gemini-1.5-flash')
+        self.assertIsNone(find_model_for_context(1000, providers=['perplexity']))
+
+    def _router(self, providers):
+        router = ModelRouter.__new__(ModelRouter)
+        router._providers = _StubRegistry({name: None for name in providers})
+        return router
+
+    def test_oversized_prompt_moves_to_larger_tiered_model(self):
+        window = get_capabilities('gpt-5-nano').context_window
+        with mock.patch('llm_providers.router.get_tokenizer') as tokenizer:
+            tokenizer.return_value.count.return_value = window
+            provider_name, model, _ = self._router(['openai', 'google'])._fit_context(
+                'openai', 'gpt-5-nano', 0.7, '긴 프롬프트', None
+            )
+        caps = get_capabilities(model)
+        self.assertGreater(caps.context_window, window)
+        self.assertIsNotNone(caps.quality_tier)
+
+    def test_prompt_that_fits_no_tiered_model_fails_clearly(self):
+        with mock.patch('llm_providers.router.get_tokenizer') as tokenizer:
+            tokenizer.return_value.count.return_value = 10 ** 8
+            with self.assertRaises(ContextWindowExceededError):
+                self._router(['openai', 'perplexity'])._fit_context('openai', 'gpt-5', 0.7, '긴 프롬프트', None)
+
+
+QUESTIONS_SCHEMA = {
+    'title': 'questions',
+    'type': 'object',
+    'additionalProperties': False,
+    'required': ['questions'],
+    'properties': {
+        'questions': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['text', 'priority'],
+                'properties': {
+                    'text': {'type': 'string'},
+                    'priority': {'type': 'integer'},
+                    'category': {'type': ['string', 'null'], 'enum': ['goal', 'format', None]},
+                },
+            },
+        },
+    },
+}
+
+
+class StructuredOutputTests(SimpleTestCase):
+    """JSON 복구 파싱, 증분 파싱, 스키마 검증/변환"""
+
+    def test_parse_json_strips_fence_and_explanation(self):
+        content = '다음은 결과입니다:\n```json\n{"questions": [{"text": "목표는?", "priority": 1},]}\n```\n끝.'
+        self.assertEqual(parse_json(content), {'questions': [{'text': '목표는?', 'priority': 1}]})
+
+    def test_parse_json_repairs_truncated_output(self):
+        # 문자열 중간에서 잘린 응답은 문자열과 괄호를 닫아 복구
+        self.assertEqual(
+            parse_json('{"questions": [{"text": "대상 독자는'),
+            {'questions': [{'text': '대상 독자는'}]}
+        )
+        # 키 중간에서 잘리면 마지막 완성된 항목까지만 사용
+        self.assertEqual(
+            parse_json('{"questions": [{"text": "a", "priority": 1}, {"te'),
+            {'questions': [{'text': 'a', 'priority': 1}, {}]}
+        )
+
+    def test_parse_json_without_object_raises(self):
+        with self.assertRaises(InvalidResponseError):
+            parse_json('죄송하지만 JSON으로 답할 수 없습니다.')
+
+    def test_incremental_parser_returns_growing_partial_values(self):
+        parser = IncrementalJSONParser()
+        chunks = ['```json\n{"questions": [', '{"text": "형식', '은?", "priority": 2}', ']} 추가 설명 {"x": 1}']
+        values = [parser.feed(chunk) for chunk in chunks]
+
+        self.assertEqual(values[0], {'questions': []})
+        self.assertEqual(values[1], {'questions': [{'text': '형식'}]})
+        self.assertEqual(values[3], {'questions': [{'text': '형식은?', 'priority': 2}]})
+        self.assertTrue(parser.complete)
+        # 최상위 값이 닫힌 뒤의 입력은 무시
+        self.assertEqual(parser.feed('{"y": 2}'), values[3])
+
+    def test_schema_validation_reports_each_violation(self):
+        value = {'questions': [{'text': 1, 'priority': True, 'category': 'other'}, {'priority': 1}]}
+        errors = validate_json(value, QUESTIONS_SCHEMA)
+
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(any(error.startswith('$.questions[0].text: string') for error in errors))
+        self.assertTrue(any(error.startswith('$.questions[0].priority: integer') for error in errors))
+        self.assertTrue(any(error.startswith('$.questions[0].category:') for error in errors))
+        self.assertIn('$.questions[1].text: 필수 필드 누락', errors)
+        self.assertEqual(validate_json({'questions': []}, QUESTIONS_SCHEMA), [])
+
+    def test_finalize_json_logs_schema_mismatch_and_keeps_value(self):
+        with self.assertLogs('llm_providers.structured', level='WARNING') as logs:
+            value = finalize_json('{"questions": "없음"}', QUESTIONS_SCHEMA)
+        self.assertEqual(value, {'questions': '없음'})
+        self.assertIn('스키마 불일치 1건', logs.output[0])
+
+    def test_to_gemini_schema_converts_types_and_drops_unsupported_keywords(self):
+        converted = to_gemini_schema(QUESTIONS_SCHEMA)
+
+        self.assertEqual(converted['type'], 'OBJECT')
+        self.assertNotIn('additionalProperties', converted)
+        self.assertNotIn('title', converted)
+        item = converted['properties']['questions']['items']
+        self.assertEqual(item['properties']['priority'], {'type': 'INTEGER'})
+        self.assertEqual(
+            item['properties']['category'], {'nullable': True, 'type': 'STRING', 'enum': ['goal', 'format', None]}
+        )
+
+
+class _SearchProvider(_TimedProvider):
+    """PerplexityProvider처럼 search_internet이 자신의 generate를 직접 호출하는 제공자"""
+
+    PROVIDER_NAME = 'perplexity'
+
+    def __init__(self):
+        super().__init__({'sonar': 0}, 'sonar')
+        self.requests = []
+
+    def generate(self, prompt, model=None, **kwargs):
+        self.requests.append(kwargs)
+        return LLMResponse(content=f'검색 결과: {prompt}', model=model or self.default_model, tokens_used=42)
+
+    def search_internet(self, query, model=None, max_tokens=1000):
+        response = self.generate(query, model=model, max_tokens=max_tokens)
+        return {'content': response.content, 'tokens_used': response.tokens_used, 'model': response.model}
+
+
+class OpenAIRequestTests(SimpleTestCase):
+    """OpenAI 요청 파라미터 (프롬프트 캐시 키, 추론 모델 temperature)"""
+
+    def setUp(self):
+        self.provider = OpenAIProvider(api_key='sk-test')
+        self.provider.client = mock.Mock()
+        usage = SimpleNamespace(
+            prompt_tokens=1200, completion_tokens=30, total_tokens=1230,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=1024)
+        )
+        message = SimpleNamespace(content='응답')
+        self.provider.client.chat.completions.create.return_value = SimpleNamespace(
+            usage=usage, choices=[SimpleNamespace(message=message, finish_reason='stop')]
+        )
+
+    def _request(self, model, **kwargs):
+        response = self.provider.generate('질문', model=model, coalesce=False, **kwargs)
+        return response, self.provider.client.chat.completions.create.call_args.kwargs
+
+    def test_static_system_prompt_sends_cache_key(self):
+        system_prompt = '긴 정적 시스템 프롬프트'
+        response, request = self._request('gpt-4.1', system_prompt=system_prompt)
+
+        key = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()[:32]
+        self.assertEqual(request['extra_body'], {'prompt_cache_key': key})
+        self.assertEqual(request['messages'][0], {'role': 'system', 'content': system_prompt})
+        self.assertEqual(response.cached_tokens, 1024)
+        # 시스템 프롬프트가 같으면 키도 같음
+        _, other = self._request('gpt-5-nano', system_prompt=system_prompt)
+        self.assertEqual(other['extra_body'], request['extra_body'])
+        self.assertNotIn('extra_body', self._request('gpt-4.1')[1])
+
+    def test_reasoning_model_omits_temperature(self):
+        _, request = self._request('gpt-5-nano', temperature=0.2, max_tokens=100, stop=['\n\n'])
+        self.assertNotIn('temperature', request)
+        self.assertNotIn('stop', request)
+        self.assertEqual(request['max_completion_tokens'], 100)
+
+        _, request = self._request('gpt-4.1', temperature=0.2, max_tokens=100, stop=['\n\n'])
+        self.assertEqual(request['temperature'], 0.2)
+        self.assertEqual(request['stop'], ['\n\n'])
+
+
+class GoogleModelPoolTests(SimpleTestCase):
+    """Gemini GenerativeModel 핸들 재사용과 usage_metadata 토큰"""
+
+    def setUp(self):
+        # SDK 없이 genai 모듈 대역으로 교체
+        self.provider = GoogleProvider(api_key='')
+        self.provider.genai = mock.Mock()
+        self.provider.genai.GenerativeModel.side_effect = lambda **kwargs: mock.Mock(name=kwargs['model_name'])
+
+    def test_handles_reused_per_model_and_config(self):
+        first = self.provider._get_model('gemini-1.5-flash', {'temperature': 0.7})
+        self.assertIs(self.provider._get_model('gemini-1.5-flash', {'temperature': 0.7}), first)
+        self.assertIsNot(self.provider._get_model('gemini-1.5-flash', {'temperature': 0.2}), first)
+        self.assertEqual(self.provider.genai.GenerativeModel.call_count, 2)
+
+    def test_pool_evicts_least_recently_used(self):
+        with mock.patch('llm_providers.google_provider.MODEL_POOL_SIZE', 2):
+            first = self.provider._get_model('gemini-1.5-flash', {'temperature': 0.1})
+            self.provider._get_model('gemini-1.5-flash', {'temperature': 0.2})
+            self.provider._get_model('gemini-1.5-flash', {'temperature': 0.1})
+            self.provider._get_model('gemini-1.5-flash', {'temperature': 0.3})
+
+            # 최근에 쓴 0.1은 남고 0.2가 밀려남
+            self.assertIs(self.provider._get_model('gemini-1.5-flash', {'temperature': 0.1}), first)
+            self.assertEqual(len(self.provider._models), 2)
+            self.provider._get_model('gemini-1.5-flash', {'temperature': 0.2})
+        self.assertEqual(self.provider.genai.GenerativeModel.call_count, 4)
+
+    def test_generate_uses_usage_metadata(self):
+        response = SimpleNamespace(
+            text='응답', candidates=[SimpleNamespace(finish_reason='STOP')],
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=120, candidates_token_count=7, cached_content_token_count=100
+            )
+        )
+        self.provider.genai.GenerativeModel.side_effect = None
+        self.provider.genai.GenerativeModel.return_value.generate_content.return_value = response
+
+        result = self.provider.generate('질문', model='gemini-1.5-flash', coalesce=False)
+        self.provider.generate('다른 질문', model='gemini-1.5-flash', coalesce=False)
+
+        self.assertEqual((result.prompt_tokens, result.completion_tokens, result.cached_tokens), (120, 7, 100))
+        self.assertEqual(self.provider.genai.GenerativeModel.call_count, 1)
+
+
+class CassetteSearchTests(SimpleTestCase):
+    """인터넷 검색 녹화 → 재생 왕복"""
+
+    def test_recorded_search_replays_with_same_result(self):
+        with tempfile.TemporaryDirectory() as directory:
+            inner = _SearchProvider()
+            recorder = RecordingProvider(inner, Cassette(directory, 'perplexity'))
+            recorded = recorder.search_internet('오늘의 환율', max_tokens=500)
+
+            cassette = Cassette(directory, 'perplexity')
+            self.assertEqual(cassette.load(), 1)
+            replayed = ReplayProvider('perplexity', cassette, latency_scale=0).search_internet(
+                '오늘의 환율', max_tokens=500
+            )
+
+        self.assertEqual(recorded['content'], '검색 결과: 오늘의 환율')
+        self.assertEqual(replayed['content'], recorded['content'])
+        self.assertEqual(replayed['model'], 'sonar')
+        self.assertEqual(len(inner.requests), 1)
+
+    def test_providers_without_search_do_not_record_search(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cassette = Cassette(directory, 'openai')
+            recorder = RecordingProvider(_TimedProvider({'gpt-5-nano': 0}), cassette)
+            with self.assertRaises(AttributeError):
+                recorder.search_internet('질문')
+            self.assertEqual(len(cassette), 0)
+
+
+class FakeProviderTests(SimpleTestCase):
+    """가짜 제공자의 결정성, 에러 주입 비율, 스키마 준수"""
+
+    SCHEMA = {
+        'type': 'object',
+        'properties': {
+            'goal': {'type': 'string', 'minLength': 40, 'maxLength': 60},
+            'confidence': {'type': 'number', 'minimum': 0, 'maximum': 0.3},
+            'priority': {'type': 'integer', 'minimum': 10},
+            'rank': {'type': 'integer', 'maximum': -1},
+            'tags': {'type': 'array', 'items': {'type': 'string', 'minLength': 1}, 'minItems': 4, 'maxItems': 5},
+            'single': {'type': 'array', 'items': {'type': 'integer'}, 'maxItems': 1},
+            'level': {'enum': ['low', 'high']},
+        },
+        'required': ['goal', 'confidence', 'priority', 'summary'],
+    }
+
+    def _provider(self, seed=0, **error_rates):
+        return FakeProvider(
+            provider_name='openai', latency=LatencyProfile('lognormal', 0, per_token_ms=0),
+            error_rates=error_rates, timeout_ms=0, seed=seed
+        )
+
+    def _outcomes(self, provider, calls=50):
+        outcomes = []
+        for i in range(calls):
+            try:
+                outcomes.append(provider.generate(f'질문 {i}').content)
+            except RateLimitError:
+                outcomes.append('rate_limit')
+            except LLMProviderError:
+                outcomes.append('timeout')
+        return outcomes
+
+    def test_same_seed_is_deterministic(self):
+        first = self._outcomes(self._provider(seed=7, rate_limit=0.3, timeout=0.1))
+        second = self._outcomes(self._provider(seed=7, rate_limit=0.3, timeout=0.1))
+        other = self._outcomes(self._provider(seed=8, rate_limit=0.3, timeout=0.1))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        # 출력 내용은 시드와 무관하게 (모델, 프롬프트)로 결정
+        ok = [i for i, (a, b) in enumerate(zip(first, other)) if a not in ('rate_limit', 'timeout')
+              and b not in ('rate_limit', 'timeout')]
+        self.assertTrue(ok)
+        self.assertTrue(all(first[i] == other[i] for i in ok))
+
+    def test_error_injection_rates(self):
+        calls = 1000
+        outcomes = self._outcomes(self._provider(rate_limit=0.2, timeout=0.1), calls)
+        self.assertAlmostEqual(outcomes.count('rate_limit') / calls, 0.2, delta=0.04)
+        # timeout은 rate_limit에 걸리지 않은 호출 중 10%
+        self.assertAlmostEqual(outcomes.count('timeout') / calls, 0.8 * 0.1, delta=0.03)
+
+        provider = self._provider(malformed_json=0.5)
+        with collect_calls() as calls_made:
+            for i in range(200):
+                provider.generate_json(f'질문 {i}', schema=self.SCHEMA)
+        malformed = sum(call.raw_content.startswith('다음은 요청하신 JSON') for call in calls_made)
+        self.assertAlmostEqual(malformed / 200, 0.5, delta=0.1)
+
+    def test_json_output_satisfies_schema(self):
+        provider = self._provider()
+        for i in range(30):
+            value = provider.generate_json(f'질문 {i}', schema=self.SCHEMA)
+            self.assertEqual(validate_json(value, self.SCHEMA), [], value)
+            self.assertIn('summary', value)
+            self.assertLessEqual(len(value['single']), 1)
+
+    def test_validate_json_checks_bounds(self):
+        value = {'goal': '짧음', 'confidence': 0.9, 'priority': 1, 'rank': 0, 'tags': [], 'single': [1, 2]}
+        errors = validate_json(value, self.SCHEMA)
+        for field in ('goal', 'confidence', 'priority', 'rank', 'tags', 'single', 'summary'):
+            self.assertTrue(any(error.startswith(f'$.{field}') for error in errors), field)
+
+
+class CassetteJSONTests(SimpleTestCase):
+    """JSON/임베딩 녹화는 원문과 토큰 사용량까지 재현"""
+
+    SCHEMA = {
+        'type': 'object',
+        'properties': {'goal': {'type': 'string'}, 'score': {'type': 'integer'}},
+        'required': ['goal', 'score'],
+    }
+
+    def test_json_replays_raw_content_and_usage(self):
+        inner = FakeProvider(
+            provider_name='openai', latency=LatencyProfile('fixed', 0, per_token_ms=0),
+            error_rates={'malformed_json': 1.0}
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = RecordingProvider(inner, Cassette(directory, 'openai'))
+            with collect_calls() as recorded_calls:
+                recorded = recorder.generate_json('목표 분석', schema=self.SCHEMA, system_prompt='분석가')
+
+            cassette = Cassette(directory, 'openai')
+            cassette.load()
+            entry = cassette.find(*request_keys(
+                'json', inner.default_model, '목표 분석', '분석가', self.SCHEMA, temperature=0.3
+            ))
+            with collect_calls() as replayed_calls:
+                replayed = ReplayProvider('openai', cassette, latency_scale=0).generate_json(
+                    '목표 분석', schema=self.SCHEMA, system_prompt='분석가'
+                )
+
+        # 잘린 JSON 원문이 그대로 녹화되고 재생 시 같은 복구 파싱을 거침
+        self.assertTrue(entry['response']['content'].startswith('다음은 요청하신 JSON입니다'))
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(len(recorded_calls), 1)
+        self.assertEqual(
+            (replayed_calls[0].prompt_tokens, replayed_calls[0].completion_tokens),
+            (recorded_calls[0].prompt_tokens, recorded_calls[0].completion_tokens)
+        )
+
+    def test_embedding_replays_usage(self):
+        with tempfile.TemporaryDirectory() as directory:
+            RecordingEmbeddingClient(FakeEmbeddingClient(dim=8), Cassette(directory, 'embeddings')).create(
+                model='text-embedding-3-small', input='임베딩 문장'
+            )
+            cassette = Cassette(directory, 'embeddings')
+            cassette.load()
+            response = ReplayEmbeddingClient(cassette, latency_scale=0).create(
+                model='text-embedding-3-small', input='임베딩 문장'
+            )
+
+        self.assertEqual(len(response.data[0].embedding), 8)
+        self.assertEqual(response.usage.prompt_tokens, estimate_tokens('임베딩 문장'))
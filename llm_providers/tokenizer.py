@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+공용 토크나이저 서비스
+
+- 모델 계열별 tiktoken 인코딩을 한 번만 로드해 재사용 (o200k_base / cl100k_base)
+- 같은 문자열의 토큰 수는 LRU로 메모이즈
+- 여러 텍스트를 한 번에 세는 count_batch (tiktoken 배치 인코딩)
+- 로컬 토크나이저가 없는 모델(Claude, Gemini)이나 tiktoken 미설치 시
+  문자 종류별 가중치 표를 이용한 빠른 추정 (문자 단위 파이썬 루프 없음)
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+from .capabilities import get_capabilities
+
+logger = logging.getLogger(__name__)
+
+
+# 능력 레지스트리에 없는 모델용: 모델명 접두사 → tiktoken 인코딩 (앞에서부터 먼저 일치하는 항목 사용)
+MODEL_FAMILY_ENCODINGS = [
+    ('gpt-5', 'o200k_base'),
+    ('gpt-4.1', 'o200k_base'),
+    ('gpt-4o', 'o200k_base'),
+    ('o1', 'o200k_base'),
+    ('o3', 'o200k_base'),
+    ('gpt-4', 'cl100k_base'),
+    ('gpt-3.5', 'cl100k_base'),
+    ('text-embedding', 'cl100k_base'),
+    ('sonar', 'cl100k_base'),
+]
+
+# 모델을 지정하지 않았을 때 사용할 인코딩 (기본 모델 gpt-5 계열)
+DEFAULT_ENCODING = 'o200k_base'
+
+# 추정기: 문자 종류별 토큰 가중치
+# 한글 음절은 BPE에서 대부분 1~2 토큰, 한자/가나는 약 1.3, ASCII는 약 4자당 1 토큰
+ESTIMATE_WEIGHTS = [
+    (re.compile(r'[가-힣ᄀ-ᇿ㄰-㆏]'), 1.5),
+    (re.compile(r'[぀-ヿ一-鿿]'), 1.3),
+]
+ASCII_WEIGHT = 0.25
+OTHER_WEIGHT = 1.0
+
+# 이보다 긴 텍스트는 메모이즈하지 않음 (캐시가 큰 문자열을 붙잡지 않도록)
+MEMO_MAX_CHARS = 32768
+
+
+def estimate_tokens(text: str) -> int:
+    """문자 종류별 가중치 표로 토큰 수 추정 (정규식 치환은 C 수준에서 처리)"""
+    if not text:
+        return 0
+    if text.isascii():
+        return max(1, int(len(text) * ASCII_WEIGHT))
+
+    remaining = text
+    estimated = 0.0
+    for pattern, weight in ESTIMATE_WEIGHTS:
+        stripped = pattern.sub('', remaining)
+        estimated += (len(remaining) - len(stripped)) * weight
+        remaining = stripped
+    ascii_chars = len(remaining.encode('ascii', 'ignore'))
+    estimated += ascii_chars * ASCII_WEIGHT + (len(remaining) - ascii_chars) * OTHER_WEIGHT
+    return max(1, int(estimated))
+
+
+class TokenizerService:
+    """
+    모델 계열별 토큰 수 계산 서비스 (스레드 안전)
+
+    Args:
+        cache_size: 메모이즈할 (인코딩, 텍스트) 쌍의 수
+    """
+
+    def __init__(self, cache_size: int = 4096):
+        self.cache_size = cache_size
+        self._encodings: Dict[str, object] = {}
+        self._unavailable: set = set()
+        self._lock = threading.Lock()
+        self._memo: OrderedDict = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def encoding_name_for(model: Optional[str]) -> Optional[str]:
+        """모델의 tiktoken 인코딩 이름 (로컬 토크나이저가 없는 모델이면 None)"""
+        if not model:
+            return DEFAULT_ENCODING
+        caps = get_capabilities(model)
+        if caps is not None:
+            return caps.tokenizer
+        for prefix, encoding_name in MODEL_FAMILY_ENCODINGS:
+            if model.startswith(prefix):
+                return encoding_name
+        return None
+
+    def get_encoding(self, encoding_name: str):
+        """인코딩 가져오기 (처음 한 번 로드, tiktoken이 없으면 None)"""
+        encoding = self._encodings.get(encoding_name)
+        if encoding is not None or encoding_name in self._unavailable:
+            return encoding
+
+        with self._lock:
+            encoding = self._encodings.get(encoding_name)
+            if encoding is not None or encoding_name in self._unavailable:
+                return encoding
+            try:
+                import tiktoken
+                encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:
+                # tiktoken 미설치/인코딩 파일 다운로드 실패 → 추정기 사용
+                logger.warning(f"tiktoken 인코딩 {encoding_name} 로드 실패, 추정치 사용: {e}")
+                self._unavailable.add(encoding_name)
+                return None
+            self._encodings[encoding_name] = encoding
+            return encoding
+
+    def load_encodings(self) -> List[str]:
+        """모든 모델 계열의 인코딩을 미리 로드 (워밍업용), 로드된 인코딩 이름 반환"""
+        names = {DEFAULT_ENCODING} | {name for _, name in MODEL_FAMILY_ENCODINGS}
+        return sorted(name for name in names if self.get_encoding(name) is not None)
+
+    def _memo_get(self, key) -> Optional[int]:
+        with self._memo_lock:
+            count = self._memo.get(key)
+            if count is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._memo.move_to_end(key)
+            return count
+
+    def _memo_put(self, key, count: int):
+        with self._memo_lock:
+            self._memo[key] = count
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+
+    def count(self, text: str, model: Optional[str] = None) -> int:
+        """
+        토큰 수 계산
+
+        Args:
+            text: 텍스트
+            model: 모델명 (None이면 기본 인코딩)
+
+        Returns:
+            토큰 수 (로컬 토크나이저가 없으면 추정치)
+        """
+        return self.count_batch([text], model)[0]
+
+    def count_batch(self, texts: Sequence[str], model: Optional[str] = None) -> List[int]:
+        """
+        여러 텍스트의 토큰 수를 한 번에 계산
+
+        메모이즈되지 않은 텍스트만 모아 tiktoken 배치 인코딩으로 처리합니다.
+        """
+        encoding_name = self.encoding_name_for(model)
+        encoding = self.get_encoding(encoding_name) if encoding_name else None
+        if encoding is None:
+            return [estimate_tokens(text) for text in texts]
+
+        results: List[Optional[int]] = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            if not text:
+                results[i] = 0
+                continue
+            if len(text) <= MEMO_MAX_CHARS:
+                results[i] = self._memo_get((encoding_name, text))
+            if results[i] is None:
+                pending.append(i)
+
+        if len(pending) == 1:
+            encoded = [encoding.encode_ordinary(texts[pending[0]])]
+        elif pending:
+            encoded = encoding.encode_ordinary_batch([texts[i] for i in pending])
+        else:
+            encoded = []
+        for i, tokens in zip(pending, encoded):
+            results[i] = len(tokens)
+            if len(texts[i]) <= MEMO_MAX_CHARS:
+                self._memo_put((encoding_name, texts[i]), results[i])
+        return results
+
+    def estimate(self, text: str) -> int:
+        """로컬 토크나이저 없이 빠른 추정"""
+        return estimate_tokens(text)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """토크나이저 상태 (로드된 인코딩, 메모이즈 적중률)"""
+        return {
+            'encodings': sorted(self._encodings),
+            'memo_size': len(self._memo),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# 전역 토크나이저 인스턴스
+_tokenizer_instance: Optional[TokenizerService] = None
+
+
+def get_tokenizer() -> TokenizerService:
+    """전역 TokenizerService 인스턴스 가져오기 (싱글톤)"""
+    global _tokenizer_instance
+    if _tokenizer_instance is None:
+        _tokenizer_instance = TokenizerService()
+    return _tokenizer_instance
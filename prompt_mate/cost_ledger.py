@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+요청 비용 원장과 비용 집계 (Cost Tracker)
+
+요청 하나에서 발생한 과금 호출을 컨텍스트 변수의 CostLedger에 모았다가
+CostLedgerMiddleware가 요청이 끝날 때 core.models.CostLedgerEntry로 한 번에 저장합니다.
+- LLM 호출: llm_providers.instrumentation.observe_call이 모든 제공자 호출을 기록
+  (의도 분석, 질문 생성, 프롬프트 합성, 최종 생성, 인터넷 검색 요약 포함)
+- 임베딩: RAGManager.create_embedding (캐시 적중은 과금 없음)
+- 검색 수수료: ModelRouter.search_internet (토큰 가격과 별도인 요청당 수수료)
+
+stage에는 호출 당시 열린 트레이스 span 이름(예: intent.parse)이 들어갑니다.
+단계 span 밖의 LLM 호출은 llm.{operation}, 트레이싱이 꺼져 있으면 LLM 외 호출은 빈 값입니다.
+
+예산 (CostBudgetPolicy):
+PROMPT_MATE의 COST_SESSION_BUDGET_USD(세션 누적) 또는 COST_DAILY_BUDGET_USD(사용자 일 누적)를 넘으면
+라우터가 플랜이 허용하는 가장 저렴한 모델로 낮춥니다. 0이면 해당 예산은 확인하지 않습니다.
+
+집계 (비용 API):
+- 세션 비용: 총액과 과금 항목/요청 단계/모델별 내역
+- 일별 비용: 날짜별 총액, 세션 수, 세션당 평균 비용 (plainplan §9.3 KPI: 세션당 $0.05 미만)
+"""
+
+import threading
+from contextvars import ContextVar
+from datetime import datetime, time as dt_time, timedelta
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+_current_ledger: ContextVar[Optional['CostLedger']] = ContextVar('cost_ledger', default=None)
+
+# 사용자 일 누적 비용 캐시 (마이크로 USD 정수, 캐시 백엔드 incr 호환)
+DAILY_COST_CACHE_KEY = 'cost_daily:{user_id}:{day}'
+DAILY_COST_CACHE_TIMEOUT = 2 * 24 * 3600
+MICRO_USD = 1_000_000
+
+
+class CostRecord:
+    """과금 호출 한 건"""
+
+    __slots__ = ('category', 'stage', 'provider', 'model', 'operation',
+                 'prompt_tokens', 'completion_tokens', 'cached_tokens', 'cost_usd')
+
+    def __init__(self, category: str, provider: str, model: str, operation: str, cost_usd: float,
+                 prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0, stage: str = ''):
+        self.category = category
+        self.stage = stage
+        self.provider = provider
+        self.model = model
+        self.operation = operation
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cached_tokens = cached_tokens
+        self.cost_usd = cost_usd
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CostLedger:
+    """요청 하나의 과금 호출 모음 (헤징 스레드에서도 기록하므로 잠금 사용)"""
+
+    def __init__(self, request_id: str = ''):
+        self.request_id = request_id
+        self.records: List[CostRecord] = []
+        self.session_id: Optional[str] = None
+        self.user_id: Optional[int] = None
+        # 이 요청 이전까지의 세션 누적 비용 (세션 예산 확인 시 한 번 조회)
+        self.session_cost_before: Optional[float] = None
+        # 요청이 끝나 저장된 뒤에 들어온 기록(늦게 끝난 헤지 요청 등)은 바로 저장
+        self.closed = False
+        self._saved = 0
+        self._lock = threading.Lock()
+
+    def add(self, record: CostRecord):
+        with self._lock:
+            self.records.append(record)
+
+    @property
+    def total_usd(self) -> float:
+        with self._lock:
+            return sum(record.cost_usd for record in self.records)
+
+    def attach(self, session_id=None, user_id=None):
+        """기록을 세션/사용자에 연결 (SessionManager가 세션을 정한 뒤 호출)"""
+        if session_id is not None and str(session_id) != self.session_id:
+            self.session_id = str(session_id)
+            self.session_cost_before = None
+        if user_id is not None:
+            self.user_id = user_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            records = [record.to_dict() for record in self.records]
+        return {
+            'request_id': self.request_id,
+            'session_id': self.session_id,
+            'user_id': self.user_id,
+            'total_usd': round(sum(record['cost_usd'] for record in records), 6),
+            'records': records,
+        }
+
+
+def current_ledger() -> Optional[CostLedger]:
+    return _current_ledger.get()
+
+
+def activate(ledger: Optional[CostLedger]):
+    """원장을 현재 컨텍스트에 설정 (반환된 토큰으로 deactivate)"""
+    return _current_ledger.set(ledger)
+
+
+def deactivate(token):
+    try:
+        _current_ledger.reset(token)
+    except ValueError:
+        # 스트리밍 본문처럼 다른 컨텍스트에서 닫히는 경우
+        _current_ledger.set(None)
+
+
+def attach(session_id=None, user_id=None):
+    """현재 요청 원장을 세션/사용자에 연결 (원장이 없으면 무시)"""
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.attach(session_id=session_id, user_id=user_id)
+
+
+def record_cost(category: str, provider: str, model: str, operation: str, cost_usd: float,
+                prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0,
+                stage: Optional[str] = None, ledger: Optional[CostLedger] = None):
+    """
+    요청 원장에 과금 호출 기록 (ledger가 없으면 현재 요청 원장, 요청 밖의 호출은 기록하지 않음)
+
+    이미 저장된 원장(요청이 끝난 뒤 완료된 헤지 요청 등)에 들어온 기록은 바로 저장합니다.
+    """
+    ledger = ledger or _current_ledger.get()
+    if ledger is None:
+        return
+    if stage is None:
+        from .tracing import current_span_name
+        stage = current_span_name() or ''
+    ledger.add(CostRecord(
+        category=category,
+        provider=provider,
+        model=model,
+        operation=operation,
+        cost_usd=cost_usd,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cached_tokens=cached_tokens,
+        stage=stage[:50],
+    ))
+    if ledger.closed:
+        save_ledger(ledger)
+
+
+def record_call(call, ledger: Optional[CostLedger] = None):
+    """완료된 제공자 호출(ProviderCall) 기록 (토큰을 쓰지 않은 실패 호출은 제외)"""
+    if not call.tokens_used:
+        return
+    stage = call.stage
+    record_cost(
+        category='search' if stage == 'search.internet' else 'llm',
+        provider=call.provider,
+        model=call.model,
+        operation=call.operation,
+        cost_usd=call.cost_usd,
+        prompt_tokens=call.prompt_tokens,
+        completion_tokens=call.completion_tokens,
+        cached_tokens=call.cached_tokens,
+        stage=stage,
+        ledger=ledger,
+    )
+
+
+def _day_start(moment: Optional[datetime] = None) -> datetime:
+    moment = timezone.localtime(moment or timezone.now())
+    return timezone.make_aware(datetime.combine(moment.date(), dt_time.min), moment.tzinfo)
+
+
+def _daily_cache_key(user_id, moment: Optional[datetime] = None) -> str:
+    return DAILY_COST_CACHE_KEY.format(user_id=user_id, day=_day_start(moment).date().isoformat())
+
+
+def save_ledger(ledger: CostLedger, user=None) -> int:
+    """
+    원장 기록을 CostLedgerEntry로 저장하고 사용자 일 누적 캐시를 갱신
+
+    과금 호출이 없는 요청은 쿼리 없이 원장만 닫습니다 (request.user도 평가하지 않음).
+
+    Returns:
+        저장한 행 수
+    """
+    with ledger._lock:
+        records = ledger.records[ledger._saved:]
+        ledger._saved = len(ledger.records)
+        ledger.closed = True
+    if not records:
+        return 0
+
+    from core.models import CostLedgerEntry
+
+    if ledger.user_id is None and user is not None and user.is_authenticated:
+        ledger.user_id = user.pk
+    user_id = ledger.user_id
+    CostLedgerEntry.objects.bulk_create([
+        CostLedgerEntry(
+            user_id=user_id,
+            session_id=ledger.session_id,
+            request_id=ledger.request_id,
+            category=record.category,
+            stage=record.stage,
+            provider=record.provider,
+            model=record.model,
+            operation=record.operation,
+            prompt_tokens=record.prompt_tokens,
+            completion_tokens=record.completion_tokens,
+            cached_tokens=record.cached_tokens,
+            cost_usd=record.cost_usd,
+        )
+        for record in records
+    ])
+
+    if user_id is not None:
+        # 캐시에 없으면 다음 조회 때 DB에서 (이번 기록 포함) 다시 계산
+        try:
+            cache.incr(_daily_cache_key(user_id), round(sum(r.cost_usd for r in records) * MICRO_USD))
+        except ValueError:
+            pass
+    return len(records)
+
+
+def get_user_daily_cost(user_id) -> float:
+    """사용자의 오늘 누적 비용 (저장된 원장 기준, 캐시 사용)"""
+    key = _daily_cache_key(user_id)
+    micros = cache.get(key)
+    if micros is None:
+        from core.models import CostLedgerEntry
+
+        total = CostLedgerEntry.objects.filter(
+            user_id=user_id, created_at__gte=_day_start()
+        ).aggregate(total=Sum('cost_usd'))['total'] or 0.0
+        micros = round(total * MICRO_USD)
+        cache.set(key, micros, DAILY_COST_CACHE_TIMEOUT)
+    return micros / MICRO_USD
+
+
+def get_session_cost(session_id) -> float:
+    """세션 누적 비용 (저장된 원장 기준)"""
+    from core.models import CostLedgerEntry
+
+    return CostLedgerEntry.objects.filter(session_id=session_id).aggregate(total=Sum('cost_usd'))['total'] or 0.0
+
+
+def _breakdown(rows: List[Dict[str, Any]], field: str) -> List[Dict[str, Any]]:
+    totals: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        entry = totals.setdefault(row[field] or '', {'key': row[field] or '', 'calls': 0, 'cost_usd': 0.0})
+        entry['calls'] += row['calls']
+        entry['cost_usd'] += row['cost'] or 0.0
+    for entry in totals.values():
+        entry['cost_usd'] = round(entry['cost_usd'], 6)
+    return sorted(totals.values(), key=lambda entry: entry['cost_usd'], reverse=True)
+
+
+def session_cost_summary(session_id) -> Dict[str, Any]:
+    """
+    세션 비용 요약 ((항목, 단계, 모델) 묶음 한 번 조회 후 기준별로 합산)
+
+    Returns:
+        {'session_id', 'total_usd', 'calls', 'budget_usd', 'by_category', 'by_stage', 'by_model'}
+    """
+    from core.models import CostLedgerEntry
+
+    rows = list(
+        CostLedgerEntry.objects.filter(session_id=session_id).order_by()
+        .values('category', 'stage', 'model')
+        .annotate(calls=Count('id'), cost=Sum('cost_usd'))
+    )
+    return {
+        'session_id': str(session_id),
+        'total_usd': round(sum(row['cost'] or 0.0 for row in rows), 6),
+        'calls': sum(row['calls'] for row in rows),
+        'budget_usd': settings.PROMPT_MATE.get('COST_SESSION_BUDGET_USD', 0.0) or None,
+        'by_category': _breakdown(rows, 'category'),
+        'by_stage': _breakdown(rows, 'stage'),
+        'by_model': _breakdown(rows, 'model'),
+    }
+
+
+def daily_costs(user=None, days: int = 7) -> Dict[str, Any]:
+    """
+    최근 days일의 일별 비용 (user가 없으면 전체 사용자)
+
+    세션 수는 그날 비용이 기록된 세션 수이며, 세션에 연결되지 않은 호출은 총액에만 포함됩니다.
+    """
+    from core.models import CostLedgerEntry
+
+    since = _day_start() - timedelta(days=days - 1)
+    entries = CostLedgerEntry.objects.filter(created_at__gte=since).order_by()
+    if user is not None:
+        entries = entries.filter(user=user)
+
+    rows = entries.annotate(day=TruncDate('created_at')).values('day').annotate(
+        cost=Sum('cost_usd'),
+        calls=Count('id'),
+        sessions=Count('session', distinct=True),
+    ).order_by('day')
+
+    result: List[Dict[str, Any]] = []
+    for row in rows:
+        cost = row['cost'] or 0.0
+        result.append({
+            'date': row['day'].isoformat(),
+            'cost_usd': round(cost, 6),
+            'calls': row['calls'],
+            'sessions': row['sessions'],
+            'cost_per_session': round(cost / row['sessions'], 6) if row['sessions'] else None,
+        })
+
+    total = sum(row['cost_usd'] for row in result)
+    # 여러 날에 걸친 세션은 한 번만 셈
+    sessions = entries.aggregate(sessions=Count('session', distinct=True))['sessions'] if result else 0
+    return {
+        'since': since.date().isoformat(),
+        'days': days,
+        'total_usd': round(total, 6),
+        'sessions': sessions,
+        'cost_per_session': round(total / sessions, 6) if sessions else None,
+        'daily_budget_usd': settings.PROMPT_MATE.get('COST_DAILY_BUDGET_USD', 0.0) or None,
+        'daily': result,
+    }
+
+
+class CostBudgetPolicy:
+    """
+    비용 예산 설정
+
+    세션 예산은 현재 요청 원장에 연결된 세션의 누적 비용 + 이번 요청에서 쓴 비용,
+    일 예산은 사용자의 오늘 누적 비용 + 이번 요청에서 쓴 비용으로 확인합니다.
+    """
+
+    def __init__(self, session_budget_usd: float = 0.0, daily_budget_usd: float = 0.0):
+        self.session_budget_usd = max(0.0, session_budget_usd)
+        self.daily_budget_usd = max(0.0, daily_budget_usd)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.session_budget_usd or self.daily_budget_usd)
+
+    def exceeded(self, user=None) -> Optional[str]:
+        """넘은 예산 종류('session' | 'daily'), 넘지 않았으면 None"""
+        if not self.enabled:
+            return None
+        ledger = _current_ledger.get()
+        spent = ledger.total_usd if ledger is not None else 0.0
+
+        if self.session_budget_usd and ledger is not None and ledger.session_id:
+            if ledger.session_cost_before is None:
+                ledger.session_cost_before = get_session_cost(ledger.session_id)
+            if ledger.session_cost_before + spent >= self.session_budget_usd:
+                return 'session'
+
+        if self.daily_budget_usd:
+            user_id = ledger.user_id if ledger is not None else None
+            if user_id is None and user is not None and getattr(user, 'is_authenticated', False):
+                user_id = user.pk
+            if user_id is not None and get_user_daily_cost(user_id) + spent >= self.daily_budget_usd:
+                return 'daily'
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'session_budget_usd': self.session_budget_usd,
+            'daily_budget_usd': self.daily_budget_usd,
+        }
+
+
+def build_cost_budget_policy(config: Dict[str, Any]) -> CostBudgetPolicy:
+    """PROMPT_MATE 설정에서 비용 예산 정책 생성"""
+    return CostBudgetPolicy(
+        session_budget_usd=config.get('COST_SESSION_BUDGET_USD', 0.0),
+        daily_budget_usd=config.get('COST_DAILY_BUDGET_USD', 0.0),
+    )
+
+
+_policy: Optional[CostBudgetPolicy] = None
+
+
+def get_cost_budget_policy() -> CostBudgetPolicy:
+    global _policy
+    if _policy is None:
+        _policy = build_cost_budget_policy(settings.PROMPT_MATE)
+    return _policy
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Cost Ledger Middleware
+
+요청마다 비용 원장(prompt_mate.cost_ledger)을 활성화하고,
+요청이 끝나면 기록된 과금 호출을 CostLedgerEntry로 한 번에 저장합니다 (과금 호출이 없으면 쿼리 없음).
+
+PROMPT_MATE['COST_LEDGER_ENABLED']가 꺼져 있으면 미들웨어를 로드하지 않습니다.
+스트리밍 응답은 본문을 내보내는 동안에도 원장을 유지했다가 스트림이 끝나면 저장합니다.
+클라이언트가 스트림을 끊으면 Django가 응답을 close()하면서 뷰의 제너레이터를 이 래퍼보다 먼저 닫으므로,
+close() 전체를 원장을 활성화한 채 실행해 취소된 호출의 비용도 같은 원장에 기록합니다.
+request.user가 필요하므로 AuthenticationMiddleware 뒤에 둡니다.
+"""
+
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .cost_ledger import CostLedger, activate, deactivate, save_ledger
+from .tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+
+class CostLedgerMiddleware:
+    """요청 단위 비용 원장"""
+
+    def __init__(self, get_response):
+        if not settings.PROMPT_MATE.get('COST_LEDGER_ENABLED', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace = current_trace()
+        ledger = CostLedger(request_id=trace.trace_id if trace is not None else uuid.uuid4().hex)
+        token = activate(ledger)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self._save(request, ledger)
+            raise
+        finally:
+            deactivate(token)
+
+        if getattr(response, 'streaming', False) and not getattr(response, 'is_async', False):
+            response.streaming_content = self._recorded(request, ledger, response.streaming_content)
+            response.close = self._closing(request, ledger, response.close)
+        else:
+            self._save(request, ledger)
+        return response
+
+    def _recorded(self, request, ledger, content):
+        """청크마다 원장을 활성화해 스트림 안의 호출도 같은 원장에 기록"""
+        iterator = iter(content)
+        try:
+            while True:
+                token = activate(ledger)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    deactivate(token)
+                yield chunk
+        finally:
+            self._save(request, ledger)
+
+    def _closing(self, request, ledger, close):
+        """응답 close()를 원장을 활성화한 채 실행 (취소된 스트림의 업스트림 호출 기록)"""
+        def closing():
+            token = activate(ledger)
+            try:
+                close()
+            finally:
+                deactivate(token)
+                self._save(request, ledger)
+        return closing
+
+    @staticmethod
+    def _save(request, ledger):
+        try:
+            save_ledger(ledger, user=getattr(request, 'user', None))
+        except Exception as e:
+            logger.warning(f"비용 원장 저장 실패 ({request.method} {request.path}): {e}")
@@ -0,0 +1,278 @@
+"""
+워커 메모리 진단
+
+- RSS 워터마크: 워커마다 MEMORY_WATERMARK_SECONDS 간격으로 현재/최고 RSS와 시작 대비 증가량을 로그로 남기고
+  process_resident_memory_bytes 게이지로 내보냅니다. 천천히 새는 메모리를 워커 재시작(max_requests) 전에 발견하는 용도입니다.
+- tracemalloc 스냅샷: 관리자 API(/api/debug/memory/)로 추적을 켜고 스냅샷을 찍어
+  할당 위치 상위 항목과 이전/기준 스냅샷 대비 증가분을 비교합니다.
+- 타입별 객체 수: gc가 추적하는 객체를 타입별로 세고 이전 집계 대비 증가분을 보여줍니다.
+
+진단 결과는 요청을 처리한 워커(pid) 하나의 값입니다.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from .metrics import PROCESS_RSS, PROCESS_RSS_PEAK
+
+logger = logging.getLogger(__name__)
+
+# 스냅샷에서 제외할 할당 위치 (진단 자체의 할당)
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def rss_bytes() -> int:
+    """현재 RSS (리눅스 /proc, 그 외에는 최고 RSS로 대체)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """프로세스 최고 RSS"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS는 바이트, 리눅스는 KB
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def _mb(value: float) -> float:
+    return round(value / (1024 * 1024), 1)
+
+
+def object_counts() -> Counter:
+    """gc가 추적하는 객체의 타입별 개수"""
+    counts = Counter()
+    for obj in gc.get_objects():
+        cls = type(obj)
+        counts[f'{cls.__module__}.{cls.__qualname__}'] += 1
+    return counts
+
+
+class MemoryDiagnostics:
+    """워커 하나의 tracemalloc 스냅샷/객체 수/RSS 워터마크 상태"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_counts: Optional[Counter] = None
+        self._watermark_pid: Optional[int] = None
+        self.started_rss = 0
+        self.high_watermark = 0
+        self.history: List[Dict[str, Any]] = []
+
+    # --- tracemalloc ---
+
+    def start_tracing(self, frames: int = 0):
+        """tracemalloc 추적 시작 (이미 켜져 있으면 그대로). 켠 이후의 할당만 스냅샷에 나타납니다."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or settings.PROMPT_MATE.get('TRACEMALLOC_FRAMES', 10))
+            logger.info(f"tracemalloc 추적 시작 (pid {os.getpid()})")
+
+    def stop_tracing(self):
+        """추적을 끄고 저장된 스냅샷 삭제 (추적 중에는 할당마다 오버헤드가 있음)"""
+        with self._lock:
+            self._baseline = None
+            self._previous = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info(f"tracemalloc 추적 중지 (pid {os.getpid()})")
+
+    def snapshot(self, limit: int = 25, key_type: str = 'lineno', reset_baseline: bool = False) -> Dict[str, Any]:
+        """
+        스냅샷을 찍어 할당 위치 상위 항목과 증가분 반환
+
+        Args:
+            limit: 항목 수
+            key_type: 'lineno' (줄 단위) | 'traceback' (호출 스택 단위) | 'filename'
+            reset_baseline: 이번 스냅샷을 새 기준으로 사용
+
+        Returns:
+            {'top': [...], 'since_previous': [...], 'since_baseline': [...], ...}
+            이전/기준 스냅샷이 없으면 증가분은 빈 목록
+        """
+        self.start_tracing()
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+        with self._lock:
+            previous = self._previous
+            if self._baseline is None or reset_baseline:
+                self._baseline = snapshot
+            baseline = self._baseline
+            self._previous = snapshot
+
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'pid': os.getpid(),
+            'traced_mb': _mb(current),
+            'traced_peak_mb': _mb(peak),
+            'tracemalloc_overhead_mb': _mb(tracemalloc.get_tracemalloc_memory()),
+            'key_type': key_type,
+            'top': [_stat_to_dict(stat) for stat in snapshot.statistics(key_type)[:limit]],
+            'since_previous': _diff(snapshot, previous, key_type, limit),
+            'since_baseline': _diff(snapshot, baseline, key_type, limit) if baseline is not snapshot else [],
+        }
+
+    # --- 객체 수 ---
+
+    def object_growth(self, limit: int = 30) -> Dict[str, Any]:
+        """타입별 객체 수 상위 항목과 이전 호출 대비 증가한 타입"""
+        gc.collect()
+        counts = object_counts()
+        with self._lock:
+            previous = self._previous_counts
+            self._previous_counts = counts
+        growth = []
+        if previous is not None:
+            delta = counts.copy()
+            delta.subtract(previous)
+            growth = [
+                {'type': name, 'count': counts[name], 'delta': change}
+                for name, change in delta.most_common(limit) if change > 0
+            ]
+        return {
+            'total': sum(counts.values()),
+            'top': [{'type': name, 'count': count} for name, count in counts.most_common(limit)],
+            'growth': growth,
+        }
+
+    # --- RSS 워터마크 ---
+
+    def ensure_watermark(self):
+        """이 워커의 RSS 워터마크 로그 스레드 시작 (fork 후 워커마다 한 번, MEMORY_WATERMARK_SECONDS=0이면 끔)"""
+        interval = settings.PROMPT_MATE.get('MEMORY_WATERMARK_SECONDS', 60.0)
+        if not interval or self._watermark_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watermark_pid == os.getpid():
+                return
+            self._watermark_pid = os.getpid()
+            self.started_rss = rss_bytes()
+            self.high_watermark = self.started_rss
+            self.history = []
+        pid = os.getpid()
+        PROCESS_RSS.set_function(rss_bytes, pid=pid)
+        PROCESS_RSS_PEAK.set_function(peak_rss_bytes, pid=pid)
+        thread = threading.Thread(target=self._watermark_loop, args=(interval,), name='rss-watermark', daemon=True)
+        thread.start()
+
+    def _watermark_loop(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.record_watermark()
+            except Exception as e:
+                logger.warning(f"RSS 워터마크 기록 실패: {e}")
+
+    def record_watermark(self) -> Dict[str, Any]:
+        """현재 RSS를 기록하고 로그 (MEMORY_RSS_WARN_MB를 넘으면 warning)"""
+        rss = rss_bytes()
+        with self._lock:
+            self.high_watermark = max(self.high_watermark, rss)
+            entry = {
+                'time': time.time(),
+                'rss_mb': _mb(rss),
+                'high_watermark_mb': _mb(self.high_watermark),
+                'growth_mb': _mb(rss - self.started_rss),
+            }
+            self.history.append(entry)
+            # 최근 기록만 보관 (기본 간격 60초 기준 하루치)
+            del self.history[:-1440]
+
+        warn_mb = settings.PROMPT_MATE.get('MEMORY_RSS_WARN_MB', 0)
+        message = (
+            f"워커 {os.getpid()} RSS {entry['rss_mb']}MB "
+            f"(최고 {entry['high_watermark_mb']}MB, 시작 대비 {entry['growth_mb']:+}MB)"
+        )
+        if warn_mb and entry['rss_mb'] >= warn_mb:
+            logger.warning(f"{message} - 경고 기준 {warn_mb}MB 초과")
+        else:
+            logger.info(message)
+        return entry
+
+    def status(self) -> Dict[str, Any]:
+        """현재 RSS, 워터마크 기록, tracemalloc 상태"""
+        rss = rss_bytes()
+        with self._lock:
+            history = list(self.history[-60:])
+            has_baseline = self._baseline is not None
+        status = {
+            'pid': os.getpid(),
+            'rss_mb': _mb(rss),
+            'peak_rss_mb': _mb(peak_rss_bytes()),
+            'started_rss_mb': _mb(self.started_rss),
+            'growth_mb': _mb(rss - self.started_rss) if self.started_rss else None,
+            'high_watermark_mb': _mb(max(self.high_watermark, rss)),
+            'watermark_history': history,
+            'gc_counts': gc.get_count(),
+            'tracemalloc': {
+                'tracing': tracemalloc.is_tracing(),
+                'frames': tracemalloc.get_traceback_limit(),
+                'has_baseline': has_baseline,
+            },
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            status['tracemalloc'].update({'traced_mb': _mb(current), 'traced_peak_mb': _mb(peak)})
+        return status
+
+
+def _stat_to_dict(stat) -> Dict[str, Any]:
+    frames = stat.traceback.format() if len(stat.traceback) > 1 else []
+    frame = stat.traceback[0]
+    return {
+        'location': f'{frame.filename}:{frame.lineno}',
+        'size_kb': round(stat.size / 1024, 1),
+        'count': stat.count,
+        'traceback': frames,
+    }
+
+
+def _diff(snapshot, other, key_type: str, limit: int) -> List[Dict[str, Any]]:
+    """other 대비 크기가 늘어난 할당 위치"""
+    if other is None:
+        return []
+    result = []
+    for stat in snapshot.compare_to(other, key_type):
+        if stat.size_diff <= 0:
+            continue
+        frame = stat.traceback[0]
+        result.append({
+            'location': f'{frame.filename}:{frame.lineno}',
+            'size_kb': round(stat.size / 1024, 1),
+            'size_diff_kb': round(stat.size_diff / 1024, 1),
+            'count_diff': stat.count_diff,
+        })
+        if len(result) >= limit:
+            break
+    return result
+
+
+_diagnostics: Optional[MemoryDiagnostics] = None
+
+
+def get_memory_diagnostics() -> MemoryDiagnostics:
+    global _diagnostics
+    if _diagnostics is None:
+        _diagnostics = MemoryDiagnostics()
+    return _diagnostics
@@ -0,0 +1,390 @@
+"""
+프로세스 내 메트릭 레지스트리 (Prometheus 텍스트 형식)
+
+카운터/게이지/히스토그램을 메모리에 모으고 /metrics에서 Prometheus 텍스트 형식(0.0.4)으로 내보냅니다.
+
+gunicorn처럼 워커가 여러 개면 PROMPT_MATE['METRICS_MULTIPROC_DIR']를 지정합니다.
+각 워커가 METRICS_FLUSH_SECONDS마다 자신의 스냅샷을 `metrics_{pid}.json`으로 쓰고,
+/metrics를 처리하는 워커가 모든 파일을 합칩니다.
+- 카운터/히스토그램: 종료된 워커 것까지 합산 (누적 값이 줄지 않도록)
+- 게이지: 살아 있는 워커 것만 합산
+디렉터리는 마스터 시작 시(gunicorn on_starting) 비웁니다.
+
+사용법:
+    from prompt_mate.metrics import CACHE_REQUESTS
+    CACHE_REQUESTS.inc(cache='embedding', result='hit')
+"""
+
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 초 단위 지연 히스토그램 기본 구간
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Metric:
+    """라벨 값 튜플별 샘플을 가진 메트릭"""
+
+    TYPE = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name}: 라벨 {self.labelnames}가 필요합니다 (받은 라벨: {tuple(labels)})')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            return [(key, _copy(value)) for key, value in self._values.items()]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+def _copy(value):
+    return dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value
+
+
+class Counter(Metric):
+    """누적 카운터"""
+
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError('카운터는 감소할 수 없습니다.')
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """현재 값 게이지 (값 또는 수집 시점에 호출하는 함수)"""
+
+    TYPE = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, func: Callable[[], float], **labels):
+        """수집할 때마다 func()로 값을 읽음 (큐 길이 등)"""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = func
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, func in functions.items():
+            try:
+                values[key] = float(func())
+            except Exception as e:
+                logger.debug(f"게이지 {self.name} 값 수집 실패: {e}")
+        return list(values.items())
+
+
+class Histogram(Metric):
+    """구간별 누적 히스토그램"""
+
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data['buckets'][i] += 1
+                    break
+            data['sum'] += value
+            data['count'] += 1
+
+
+class MetricsRegistry:
+    """메트릭 모음 + 워커 간 스냅샷 병합"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self._flusher_pid: Optional[int] = None
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """이 프로세스의 메트릭 (JSON 직렬화 가능)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {
+                'type': metric.TYPE,
+                'help': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', [])),
+                'samples': [[list(key), value] for key, value in metric.samples()],
+            }
+            for metric in metrics
+        }
+
+    def clear(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    # --- 멀티프로세스 ---
+
+    @staticmethod
+    def _multiproc_dir() -> str:
+        return settings.PROMPT_MATE.get('METRICS_MULTIPROC_DIR', '')
+
+    def ensure_flusher(self):
+        """멀티프로세스 모드면 이 워커의 주기적 스냅샷 쓰기 스레드 시작 (fork 후 워커마다 한 번)"""
+        directory = self._multiproc_dir()
+        if not directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        interval = settings.PROMPT_MATE.get('METRICS_FLUSH_SECONDS', 5.0)
+        thread = threading.Thread(target=self._flush_loop, args=(directory, interval), name='metrics-flusher', daemon=True)
+        thread.start()
+
+    def _flush_loop(self, directory: str, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush(directory)
+            except Exception as e:
+                logger.warning(f"메트릭 스냅샷 쓰기 실패: {e}")
+
+    def flush(self, directory: Optional[str] = None):
+        """이 프로세스의 스냅샷을 metrics_{pid}.json으로 원자적 저장"""
+        directory = directory or self._multiproc_dir()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics_{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pid': os.getpid(), 'metrics': self.snapshot()}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def collect(self) -> Dict[str, Any]:
+        """모든 워커의 스냅샷을 합친 메트릭 (단일 프로세스면 이 프로세스 것)"""
+        directory = self._multiproc_dir()
+        if not directory:
+            return self.snapshot()
+
+        # 이 워커는 최신 값으로 덮어쓴 뒤 함께 읽음
+        self.flush(directory)
+        merged: Dict[str, Any] = {}
+        for path in sorted(glob.glob(os.path.join(directory, 'metrics_*.json'))):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"메트릭 스냅샷 읽기 실패 ({path}): {e}")
+                continue
+            alive = _pid_alive(data.get('pid'))
+            for name, metric in data.get('metrics', {}).items():
+                if metric['type'] == 'gauge' and not alive:
+                    continue
+                _merge(merged, name, metric)
+        return merged
+
+    def render(self) -> str:
+        """Prometheus 텍스트 형식"""
+        return render_text(self.collect())
+
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(merged: Dict[str, Any], name: str, metric: Dict[str, Any]):
+    target = merged.setdefault(name, dict(metric, samples=[]))
+    index = {tuple(labels): i for i, (labels, _) in enumerate(target['samples'])}
+    for labels, value in metric['samples']:
+        i = index.get(tuple(labels))
+        if i is None:
+            index[tuple(labels)] = len(target['samples'])
+            target['samples'].append([labels, _copy(value)])
+            continue
+        current = target['samples'][i][1]
+        if isinstance(value, dict):
+            current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+            current['sum'] += value['sum']
+            current['count'] += value['count']
+        else:
+            target['samples'][i][1] = current + value
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def render_text(metrics: Dict[str, Any]) -> str:
+    lines = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        names = metric['labelnames']
+        for labels, value in sorted(metric['samples'], key=lambda s: s[0]):
+            if metric['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric['buckets'], value['buckets']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(names, labels, ("le", _number(bound)))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(names, labels, ("le", "+Inf"))} {value["count"]}')
+                lines.append(f'{name}_sum{_labels(names, labels)} {_number(value["sum"])}')
+                lines.append(f'{name}_count{_labels(names, labels)} {value["count"]}')
+            else:
+                lines.append(f'{name}{_labels(names, labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def clear_multiproc_dir(directory: str):
+    """이전 실행의 워커 스냅샷 삭제 (gunicorn 마스터 시작 시)"""
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json*')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+# --- 메트릭 정의 ---
+
+# LLM 제공자
+PROVIDER_REQUESTS = _registry.counter(
+    'llm_provider_requests_total', 'LLM 제공자 호출 수', ['provider', 'model', 'operation', 'status'])
+PROVIDER_LATENCY = _registry.histogram(
+    'llm_provider_latency_seconds', 'LLM 제공자 호출 지연 (성공 호출)', ['provider', 'model', 'operation'])
+PROVIDER_TOKENS = _registry.counter(
+    'llm_provider_tokens_total', 'LLM 토큰 사용량 (kind=prompt|completion|cached)', ['provider', 'model', 'kind'])
+PROVIDER_COST = _registry.counter(
+    'llm_provider_cost_usd_total', 'LLM 추정 비용 (USD)', ['provider', 'model'])
+PROVIDER_ERRORS = _registry.counter(
+    'llm_provider_errors_total', 'LLM 제공자 에러 (예외 클래스별)', ['provider', 'model', 'error'])
+
+# 캐시/병합
+CACHE_REQUESTS = _registry.counter(
+    'cache_requests_total', '캐시 조회 결과 (result=hit|miss, single_flight는 leader|follower|shared_local|shared_remote|fallback)',
+    ['cache', 'result'])
+
+# 요청 단계 (tracing.span과 같은 이름, RAG 임베딩/검색 포함)
+STAGE_LATENCY = _registry.histogram(
+    'request_stage_duration_seconds', '요청 처리 단계별 소요 시간', ['stage'])
+
+# 큐/진행 중 작업
+QUEUE_DEPTH = _registry.gauge('queue_depth', '대기 중인 항목 수', ['queue'])
+
+# 워커 메모리 (prompt_mate.memory 워터마크 스레드가 워커마다 등록)
+PROCESS_RSS = _registry.gauge('process_resident_memory_bytes', '워커 현재 RSS', ['pid'])
+PROCESS_RSS_PEAK = _registry.gauge('process_resident_memory_peak_bytes', '워커 최고 RSS', ['pid'])
+
+# HTTP/DB
+HTTP_REQUESTS = _registry.counter(
+    'http_requests_total', 'HTTP 요청 수', ['method', 'route', 'status'])
+HTTP_LATENCY = _registry.histogram(
+    'http_request_duration_seconds', 'HTTP 요청 처리 시간 (스트리밍은 헤더 반환까지)', ['method', 'route'])
+DB_QUERIES = _registry.counter('db_queries_total', '실행된 DB 쿼리 수', ['route'])
+DB_QUERY_TIME = _registry.histogram(
+    'db_query_duration_seconds', '요청당 DB 쿼리 시간 합계', ['route'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+
+# 사용량 제한
+USAGE_LIMIT_REJECTIONS = _registry.counter(
+    'usage_limit_rejections_total', '사용량 제한으로 거절된 요청', ['plan'])
+
+# 비용 예산 (prompt_mate.cost_ledger, reason=session|daily)
+COST_BUDGET_DOWNGRADES = _registry.counter(
+    'cost_budget_downgrades_total', '비용 예산 초과로 더 저렴한 모델로 낮춘 호출', ['reason'])
@@ -0,0 +1,53 @@
+"""
+Metrics Middleware
+
+요청마다 HTTP 요청 수/처리 시간과 DB 쿼리 수/시간을 라우트(URL 패턴)별로 집계합니다.
+라우트 라벨은 URL 패턴(예: api/sessions/<pk>/summary/)이라 경로 파라미터로 카디널리티가 늘지 않습니다.
+
+PROMPT_MATE['METRICS_ENABLED']가 꺼져 있으면 미들웨어를 로드하지 않습니다.
+"""
+
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import DB_QUERIES, DB_QUERY_TIME, HTTP_LATENCY, HTTP_REQUESTS, get_metrics_registry
+from .query_count_middleware import QueryCounter
+
+
+def _route(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.route or match.view_name or 'unmatched'
+
+
+class MetricsMiddleware:
+    """라우트별 HTTP/DB 메트릭 기록"""
+
+    def __init__(self, get_response):
+        if not settings.PROMPT_MATE.get('METRICS_ENABLED', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        get_metrics_registry().ensure_flusher()
+        counter = QueryCounter()
+        started = time.perf_counter()
+        status = 500
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(counter))
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            route = _route(request)
+            HTTP_REQUESTS.inc(method=request.method, route=route, status=status)
+            HTTP_LATENCY.observe(time.perf_counter() - started, method=request.method, route=route)
+            DB_QUERIES.inc(counter.count, route=route)
+            DB_QUERY_TIME.observe(counter.duration, route=route)
@@ -0,0 +1,123 @@
+"""
+Profiler Middleware
+
+선택된 요청만 프로파일러(prompt_mate.profiling)로 감싸 실행하고 결과를 ProfileReport로 저장합니다.
+- 스태프 사용자: X-Profile 헤더 또는 ?__profile=1 (값으로 sampling/cprofile 지정 가능)
+- 무작위 샘플: PROMPT_MATE['PROFILE_SAMPLE_RATE'] 비율
+
+PROMPT_MATE['PROFILER_ENABLED']가 꺼져 있으면 미들웨어를 로드하지 않습니다 (오버헤드 없음).
+request.user가 필요하므로 AuthenticationMiddleware 뒤에 둡니다.
+저장된 리포트는 Django Admin(프로파일 리포트)에서 보고, speedscope JSON을 내려받을 수 있습니다.
+"""
+
+import logging
+import uuid
+
+from django.core.exceptions import MiddlewareNotUsed
+
+from .profiling import get_profile_policy
+from .tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_QUERY_PARAM = '__profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+
+class ProfilerMiddleware:
+    """요청 단위 opt-in 프로파일링"""
+
+    def __init__(self, get_response):
+        self.policy = get_profile_policy()
+        if not self.policy.enabled:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger, mode = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = self.policy.build_profiler(mode)
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profiler.stop()
+            self._save(request, profiler, trigger, None)
+            raise
+
+        if getattr(response, 'streaming', False) and not getattr(response, 'is_async', False):
+            report_id = uuid.uuid4()
+            response.streaming_content = self._profiled(
+                request, profiler, trigger, response, report_id, response.streaming_content
+            )
+            response[PROFILE_ID_HEADER] = str(report_id)
+            return response
+
+        profiler.stop()
+        report = self._save(request, profiler, trigger, response.status_code)
+        if report is not None:
+            response[PROFILE_ID_HEADER] = str(report.id)
+        return response
+
+    def _trigger(self, request):
+        """(프로파일링 사유, 요청한 프로파일러) 또는 (None, '')"""
+        requested = request.META.get(PROFILE_HEADER)
+        trigger = 'header'
+        if requested is None:
+            requested = request.GET.get(PROFILE_QUERY_PARAM)
+            trigger = 'query'
+        if requested is not None:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated and user.is_staff:
+                return trigger, requested.strip().lower()
+        if self.policy.sampled():
+            return 'sample', ''
+        return None, ''
+
+    def _profiled(self, request, profiler, trigger, response, report_id, content):
+        """스트림이 끝날 때까지 프로파일링한 뒤 저장"""
+        try:
+            yield from content
+        finally:
+            profiler.stop()
+            self._save(request, profiler, trigger, response.status_code, report_id)
+
+    def _save(self, request, profiler, trigger, status_code, report_id=None):
+        from core.models import ProfileReport
+
+        trace = current_trace()
+        user = getattr(request, 'user', None)
+        name = f'{request.method} {request.path}'
+        try:
+            report = ProfileReport.objects.create(
+                id=report_id or uuid.uuid4(),
+                request_id=trace.trace_id if trace is not None else uuid.uuid4().hex,
+                user=user if user is not None and user.is_authenticated else None,
+                method=request.method,
+                path=request.path[:500],
+                status_code=status_code,
+                profiler=profiler.name,
+                trigger=trigger,
+                duration_ms=profiler.duration_ms,
+                sample_count=profiler.sample_count,
+                summary=profiler.summary(),
+                speedscope=profiler.to_speedscope(name),
+            )
+            self._prune(ProfileReport)
+            return report
+        except Exception as e:
+            logger.warning(f"프로파일 리포트 저장 실패 ({name}): {e}")
+            return None
+
+    def _prune(self, model):
+        """보관 개수(PROFILE_RETENTION)를 넘는 오래된 리포트 삭제"""
+        retention = self.policy.retention
+        if retention <= 0:
+            return
+        cutoff = model.objects.order_by('-created_at').values_list('created_at', flat=True)[retention:retention + 1]
+        cutoff = list(cutoff)
+        if cutoff:
+            model.objects.filter(created_at__lte=cutoff[0]).delete()
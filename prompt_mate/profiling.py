@@ -0,0 +1,239 @@
+"""
+요청 프로파일러
+
+ProfilerMiddleware가 요청 하나를 감싸 실행하는 프로파일러입니다.
+- SamplingProfiler: 별도 스레드가 대상 스레드의 스택을 주기적으로 샘플링 (오버헤드가 작아 운영 트래픽용)
+  결과는 speedscope(https://www.speedscope.app) 파일 형식 플레임 그래프와 상위 함수 요약
+- CProfileProfiler: cProfile 결정적 프로파일링 (정확한 호출 수/시간, 오버헤드 큼)
+  결과는 pstats 누적 시간순 요약
+
+둘 다 표준 라이브러리만 사용합니다.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+# 요약에 표시할 상위 함수 수
+SUMMARY_LIMIT = 40
+
+Frame = Tuple[str, str, int]  # (함수 이름, 파일, 정의 줄)
+
+
+def _short_path(filename: str) -> str:
+    """프로젝트/사이트 패키지 접두어를 떼어 읽기 쉬운 경로로"""
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+class SamplingProfiler:
+    """
+    스택 샘플링 프로파일러
+
+    sys._current_frames()로 대상 스레드의 현재 스택을 interval마다 기록합니다.
+    샘플 가중치는 실제 경과 시간(ms)이라 샘플링 간격이 밀려도 시간 합계가 맞습니다.
+    """
+
+    name = 'sampling'
+
+    def __init__(self, interval_ms: float = 5.0, max_samples: int = 20000):
+        self.interval = interval_ms / 1000
+        self.max_samples = max_samples
+        self.samples: List[Tuple[Frame, ...]] = []
+        self.weights: List[float] = []
+        self._target_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = 0.0
+        self.duration_ms = 0.0
+
+    def start(self):
+        self._target_id = threading.get_ident()
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration_ms = (time.perf_counter() - self.started_at) * 1000
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_id)
+            now = time.perf_counter()
+            if frame is None or self._stop.is_set():
+                # stop()이 샘플링 도중 불린 경우 프로파일러 자신의 대기 스택은 버림
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(tuple(stack))
+            self.weights.append((now - last) * 1000)
+            last = now
+            if len(self.samples) >= self.max_samples:
+                break
+
+    @property
+    def sample_count(self) -> int:
+        return len(self.samples)
+
+    def summary(self, limit: int = SUMMARY_LIMIT) -> str:
+        """자체(스택 맨 위) 시간과 누적 시간 기준 상위 함수"""
+        total = sum(self.weights) or 1.0
+        self_time: Counter = Counter()
+        cumulative: Counter = Counter()
+        for stack, weight in zip(self.samples, self.weights):
+            if not stack:
+                continue
+            self_time[stack[-1]] += weight
+            for frame in set(stack):
+                cumulative[frame] += weight
+
+        lines = [f'샘플 {self.sample_count}개, {self.duration_ms:.1f}ms', '', '[자체 시간]']
+        for (func, filename, line), ms in self_time.most_common(limit):
+            lines.append(f'{ms:10.1f}ms {ms / total * 100:5.1f}%  {func}  {_short_path(filename)}:{line}')
+        lines += ['', '[누적 시간]']
+        for (func, filename, line), ms in cumulative.most_common(limit):
+            lines.append(f'{ms:10.1f}ms {ms / total * 100:5.1f}%  {func}  {_short_path(filename)}:{line}')
+        return '\n'.join(lines)
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        """speedscope 'sampled' 프로파일"""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Frame, int] = {}
+        samples = []
+        for stack in self.samples:
+            ids = []
+            for frame in stack:
+                i = index.get(frame)
+                if i is None:
+                    i = index[frame] = len(frames)
+                    func, filename, line = frame
+                    frames.append({'name': func, 'file': _short_path(filename), 'line': line})
+                ids.append(i)
+            samples.append(ids)
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'prompt-mate',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(sum(self.weights), 3),
+                'samples': samples,
+                'weights': [round(w, 3) for w in self.weights],
+            }],
+        }
+
+
+class CProfileProfiler:
+    """cProfile 결정적 프로파일러 (이 스레드의 모든 함수 호출 기록)"""
+
+    name = 'cprofile'
+    sample_count = 0
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self.started_at = 0.0
+        self.duration_ms = 0.0
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        self.duration_ms = (time.perf_counter() - self.started_at) * 1000
+
+    def summary(self, limit: int = SUMMARY_LIMIT) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def to_speedscope(self, name: str) -> Optional[Dict[str, Any]]:
+        return None
+
+
+class ProfilePolicy:
+    """
+    요청 프로파일링 설정
+
+    스태프 사용자는 X-Profile 헤더나 ?__profile=1로 자기 요청을 프로파일링할 수 있고,
+    sample_rate를 지정하면 일반 트래픽도 그 비율만큼 무작위로 프로파일링합니다.
+    헤더/쿼리 값으로 프로파일러를 고를 수 있습니다 (예: X-Profile: cprofile).
+    """
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 0.0, mode: str = 'sampling',
+                 interval_ms: float = 5.0, retention: int = 500):
+        self.enabled = enabled
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.mode = mode if mode in PROFILERS else 'sampling'
+        self.interval_ms = max(1.0, interval_ms)
+        self.retention = retention
+
+    def build_profiler(self, mode: str = ''):
+        """요청한 종류('sampling' | 'cprofile')의 프로파일러, 모르는 값이면 기본값"""
+        mode = mode if mode in PROFILERS else self.mode
+        if mode == 'cprofile':
+            return CProfileProfiler()
+        return SamplingProfiler(interval_ms=self.interval_ms)
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'mode': self.mode,
+            'interval_ms': self.interval_ms,
+            'retention': self.retention,
+        }
+
+
+PROFILERS = (SamplingProfiler.name, CProfileProfiler.name)
+
+
+def build_profile_policy(config: Dict[str, Any]) -> ProfilePolicy:
+    """PROMPT_MATE 설정에서 프로파일링 정책 생성"""
+    return ProfilePolicy(
+        enabled=config.get('PROFILER_ENABLED', False),
+        sample_rate=config.get('PROFILE_SAMPLE_RATE', 0.0),
+        mode=config.get('PROFILER_MODE', 'sampling'),
+        interval_ms=config.get('PROFILE_SAMPLE_INTERVAL_MS', 5.0),
+        retention=config.get('PROFILE_RETENTION', 500),
+    )
+
+
+_policy: Optional[ProfilePolicy] = None
+
+
+def get_profile_policy() -> ProfilePolicy:
+    global _policy
+    if _policy is None:
+        _policy = build_profile_policy(settings.PROMPT_MATE)
+    return _policy
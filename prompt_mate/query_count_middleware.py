@@ -0,0 +1,54 @@
+"""
+DB Query Count Middleware
+
+요청마다 실행된 DB 쿼리 수와 쿼리 시간을 응답 헤더로 내보냅니다.
+(부하 테스트 명령 `loadtest`가 엔드포인트별 쿼리 수를 집계할 때 사용)
+
+PROMPT_MATE['QUERY_COUNT_HEADER']가 꺼져 있으면 미들웨어를 로드하지 않습니다.
+스트리밍 응답은 헤더를 보내는 시점까지(본문 생성 전)의 쿼리만 포함합니다.
+"""
+
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+QUERY_COUNT_HEADER = 'X-DB-Query-Count'
+QUERY_TIME_HEADER = 'X-DB-Query-Ms'
+
+
+class QueryCounter:
+    """connection.execute_wrapper용 쿼리 수/시간 집계"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class QueryCountMiddleware:
+    """모든 DB 연결의 쿼리를 세어 X-DB-Query-Count / X-DB-Query-Ms 헤더로 반환"""
+
+    def __init__(self, get_response):
+        if not settings.PROMPT_MATE.get('QUERY_COUNT_HEADER', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        response[QUERY_COUNT_HEADER] = str(counter.count)
+        response[QUERY_TIME_HEADER] = f'{counter.duration * 1000:.1f}'
+        return response
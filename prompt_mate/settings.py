@@ -67,6 +67,9 @@ AUTH_USER_MODEL = 'core.CustomUser'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'prompt_mate.query_count_middleware.QueryCountMiddleware',  # QUERY_COUNT_HEADER 켜진 경우만 (부하 테스트용)
+    'prompt_mate.metrics_middleware.MetricsMiddleware',  # 라우트별 HTTP/DB 메트릭 (/metrics)
+    'prompt_mate.tracing_middleware.TracingMiddleware',  # 단계별 span, OTLP 내보내기, Server-Timing 헤더 (스태프/SERVER_TIMING_ENABLED)
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Railway 배포용 정적 파일 처리
     'corsheaders.middleware.CorsMiddleware',  # CORS 처리를 최상단에
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -76,6 +79,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'prompt_mate.cost_ledger_middleware.CostLedgerMiddleware',  # 요청별 과금 호출 원장 (request.user 필요)
+    'prompt_mate.profiler_middleware.ProfilerMiddleware',  # PROFILER_ENABLED 켜진 경우만 (request.user 필요)
 ]
 
 ROOT_URLCONF = 'prompt_mate.urls'
@@ -127,6 +132,8 @@ elif all([
             'PASSWORD': os.getenv('PGPASSWORD'),
             'HOST': os.getenv('PGHOST'),
             'PORT': os.getenv('PGPORT', '5432'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
         }
     }
 else:
@@ -138,6 +145,21 @@ else:
         }
     }
 
+# Cache 설정
+# REDIS_URL이 있으면 Redis 캐시 사용 (워커 간 single-flight 병합 등 공유 상태에 필요)
+# 없으면 Django 기본 LocMem 캐시 (프로세스별)
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+
 # Railway 영구 볼륨 경로 (FAISS 인덱스 파일 저장용, PostgreSQL이 아닌 경우만 사용)
 RAILWAY_VOLUME_PATH = os.getenv('RAILWAY_VOLUME_MOUNT_PATH', '')
 
@@ -227,6 +249,92 @@ PROMPT_MATE = {
     'TOKEN_BUDGET': int(os.getenv('TOKEN_BUDGET', '1500')),
     'INTENT_PARSER_MODEL': os.getenv('INTENT_PARSER_MODEL', 'gpt-4o-mini'),
     'CONTEXT_ELICITOR_MODEL': os.getenv('CONTEXT_ELICITOR_MODEL', 'gpt-4o-mini'),
+    # Single-flight: 동일한 동시 LLM/임베딩 요청을 하나의 호출로 병합
+    'SINGLE_FLIGHT_ENABLED': os.getenv('SINGLE_FLIGHT_ENABLED', 'True') == 'True',
+    'SINGLE_FLIGHT_WAIT_TIMEOUT': float(os.getenv('SINGLE_FLIGHT_WAIT_TIMEOUT', '60')),
+    'SINGLE_FLIGHT_RESULT_TTL': int(os.getenv('SINGLE_FLIGHT_RESULT_TTL', '30')),
+    # 헤징: 지연 민감 작업이 최근 지연 백분위를 넘기면 중복 요청 (opt-in)
+    'HEDGING_ENABLED': os.getenv('HEDGING_ENABLED', 'False') == 'True',
+    'HEDGING_TASKS': os.getenv('HEDGING_TASKS', 'intent_parsing,context_questions'),
+    'HEDGING_PERCENTILE': float(os.getenv('HEDGING_PERCENTILE', '95')),
+    'HEDGING_MIN_SAMPLES': int(os.getenv('HEDGING_MIN_SAMPLES', '20')),
+    'HEDGING_DEFAULT_DELAY_MS': float(os.getenv('HEDGING_DEFAULT_DELAY_MS', '2000')),
+    'HEDGING_ALTERNATE': os.getenv('HEDGING_ALTERNATE', ''),  # 예: 'anthropic:claude-3-5-haiku-20241022'
+    # 라우팅: 'static'(고정 전략표) 또는 'adaptive'(지연 SLO/품질 등급을 만족하는 최저 비용 모델)
+    'ROUTING_MODE': os.getenv('ROUTING_MODE', 'static'),
+    'ROUTING_LATENCY_SLO_MS': os.getenv(
+        'ROUTING_LATENCY_SLO_MS',
+        'intent_parsing=3000,context_questions=4000,prompt_synthesis=5000,refinement=8000,final_generation=30000'
+    ),
+    'ROUTING_MAX_ERROR_RATE': float(os.getenv('ROUTING_MAX_ERROR_RATE', '0.2')),
+    'ROUTING_MIN_SAMPLES': int(os.getenv('ROUTING_MIN_SAMPLES', '10')),
+    # 캐스케이드: 최종 생성을 저렴한 모델부터 시도하고 로컬 검사 실패 시에만 승격 (요청별 cascade로 재정의)
+    'CASCADE_ENABLED': os.getenv('CASCADE_ENABLED', 'False') == 'True',
+    'CASCADE_MIN_LENGTH_RATIO': float(os.getenv('CASCADE_MIN_LENGTH_RATIO', '0.3')),
+    # 사전 토큰 추정: 이력 기반 출력 길이 예측 (사용량 확인 및 max_tokens 제안)
+    'TOKEN_ESTIMATE_HISTORY': int(os.getenv('TOKEN_ESTIMATE_HISTORY', '200')),
+    'TOKEN_ESTIMATE_MIN_SAMPLES': int(os.getenv('TOKEN_ESTIMATE_MIN_SAMPLES', '20')),
+    'TOKEN_ESTIMATE_CACHE_TTL': int(os.getenv('TOKEN_ESTIMATE_CACHE_TTL', '300')),
+    # 생성 길이 정책: 구체성/인지적 목표별 max_tokens·정지 시퀀스, 정책 한도에서 잘릴 때만 이어쓰기
+    'LENGTH_POLICY_ENABLED': os.getenv('LENGTH_POLICY_ENABLED', 'True') == 'True',
+    'LENGTH_MAX_CONTINUATIONS': int(os.getenv('LENGTH_MAX_CONTINUATIONS', '1')),
+    # 컨텍스트 윈도우 확인 시 출력용으로 남겨 둘 토큰 수 (모자라면 더 큰 윈도우 모델로 라우팅)
+    'CONTEXT_OUTPUT_RESERVE': int(os.getenv('CONTEXT_OUTPUT_RESERVE', '4096')),
+    # 가짜 LLM/임베딩 모드: 네트워크 없이 결정적 응답 (부하 테스트/벤치마크용, 운영 금지)
+    'FAKE_LLM_MODE': os.getenv('LLM_FAKE_MODE', 'False') == 'True',
+    'FAKE_LLM_LATENCY_PROFILE': os.getenv('FAKE_LLM_LATENCY_PROFILE', 'lognormal'),  # fixed | lognormal
+    'FAKE_LLM_LATENCY_MS': float(os.getenv('FAKE_LLM_LATENCY_MS', '300')),
+    'FAKE_LLM_LATENCY_SIGMA': float(os.getenv('FAKE_LLM_LATENCY_SIGMA', '0.5')),
+    'FAKE_LLM_PER_TOKEN_MS': float(os.getenv('FAKE_LLM_PER_TOKEN_MS', '2')),
+    'FAKE_LLM_SPIKE_RATE': float(os.getenv('FAKE_LLM_SPIKE_RATE', '0')),
+    'FAKE_LLM_SPIKE_MS': float(os.getenv('FAKE_LLM_SPIKE_MS', '5000')),
+    'FAKE_LLM_ERROR_RATES': os.getenv('FAKE_LLM_ERROR_RATES', 'rate_limit=0,timeout=0,malformed_json=0'),
+    'FAKE_LLM_TIMEOUT_MS': float(os.getenv('FAKE_LLM_TIMEOUT_MS', '30000')),
+    'FAKE_LLM_SEED': int(os.getenv('FAKE_LLM_SEED', '0')),
+    'FAKE_EMBEDDING_LATENCY_MS': float(os.getenv('FAKE_EMBEDDING_LATENCY_MS', '50')),
+    # 제공자 호출 녹화/재생 카세트: '' | record | replay (재생은 API 키 없이 녹화된 응답/지연 사용)
+    'LLM_CASSETTE_MODE': os.getenv('LLM_CASSETTE_MODE', ''),
+    'LLM_CASSETTE_DIR': os.getenv('LLM_CASSETTE_DIR', str(BASE_DIR / 'cassettes')),
+    'LLM_CASSETTE_LATENCY_SCALE': float(os.getenv('LLM_CASSETTE_LATENCY_SCALE', '1.0')),
+    # 요청별 DB 쿼리 수/시간 응답 헤더 (X-DB-Query-Count, X-DB-Query-Ms, 부하 테스트용)
+    'QUERY_COUNT_HEADER': os.getenv('QUERY_COUNT_HEADER', 'False') == 'True',
+    # 요청 트레이싱: 단계별 span을 PromptHistory.stage_timings와 내보내기에 기록
+    'TRACING_ENABLED': os.getenv('TRACING_ENABLED', 'True') == 'True',
+    # Server-Timing 응답 헤더를 모든 요청에 보냄 (끄면 스태프 요청에만, 개발/부하 테스트용)
+    'SERVER_TIMING_ENABLED': os.getenv('SERVER_TIMING_ENABLED', 'False') == 'True',
+    # OTLP/HTTP JSON 내보내기 (파일 경로 또는 수집기 주소, 둘 다 비면 내보내지 않음)
+    'TRACE_EXPORT_PATH': os.getenv('TRACE_EXPORT_PATH', ''),
+    'TRACE_OTLP_ENDPOINT': os.getenv('TRACE_OTLP_ENDPOINT', ''),  # 예: http://localhost:4318
+    'TRACE_SERVICE_NAME': os.getenv('TRACE_SERVICE_NAME', 'prompt-mate'),
+    # 내보내기 샘플링: 비율 + 느린 요청(ms 이상)은 항상 내보냄 (0이면 끔)
+    'TRACE_SAMPLE_RATE': float(os.getenv('TRACE_SAMPLE_RATE', '0.01')),
+    'TRACE_SLOW_MS': float(os.getenv('TRACE_SLOW_MS', '5000')),
+    # Prometheus 메트릭 (/metrics): Authorization: Bearer <토큰> 또는 스태프 로그인 필요 (토큰이 비면 스태프만)
+    'METRICS_ENABLED': os.getenv('METRICS_ENABLED', 'True') == 'True',
+    'METRICS_TOKEN': os.getenv('METRICS_TOKEN', ''),
+    # 멀티 워커 집계: 워커별 스냅샷 디렉터리 (비우면 워커 자신의 값만 보임)
+    'METRICS_MULTIPROC_DIR': os.getenv('METRICS_MULTIPROC_DIR', ''),
+    'METRICS_FLUSH_SECONDS': float(os.getenv('METRICS_FLUSH_SECONDS', '5')),
+    # 요청 프로파일러: 스태프의 X-Profile 헤더/?__profile=1 요청과 무작위 샘플을 ProfileReport로 저장 (Admin에서 확인)
+    'PROFILER_ENABLED': os.getenv('PROFILER_ENABLED', 'False') == 'True',
+    'PROFILE_SAMPLE_RATE': float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+    # 기본 프로파일러: sampling (스택 샘플링, speedscope 플레임 그래프) | cprofile (pstats 요약)
+    'PROFILER_MODE': os.getenv('PROFILER_MODE', 'sampling'),
+    'PROFILE_SAMPLE_INTERVAL_MS': float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5')),
+    # 보관할 최신 리포트 수 (넘으면 오래된 것부터 삭제)
+    'PROFILE_RETENTION': int(os.getenv('PROFILE_RETENTION', '500')),
+    # 워커 RSS 워터마크 로그 간격(초, 0이면 끔)과 경고 기준(MB, 0이면 경고 없음)
+    'MEMORY_WATERMARK_SECONDS': float(os.getenv('MEMORY_WATERMARK_SECONDS', '60')),
+    'MEMORY_RSS_WARN_MB': float(os.getenv('MEMORY_RSS_WARN_MB', '0')),
+    # tracemalloc: 워커 시작부터 추적(누수 확인용, 할당 오버헤드 있음)과 할당 위치별 보관할 스택 깊이
+    'TRACEMALLOC_ON_BOOT': os.getenv('TRACEMALLOC_ON_BOOT', 'False') == 'True',
+    'TRACEMALLOC_FRAMES': int(os.getenv('TRACEMALLOC_FRAMES', '10')),
+    # 비용 원장: 요청마다 LLM/임베딩/검색 과금 호출을 CostLedgerEntry로 저장 (세션/일별 비용 API)
+    'COST_LEDGER_ENABLED': os.getenv('COST_LEDGER_ENABLED', 'True') == 'True',
+    # 세션 누적 비용 예산 (USD, 넘으면 가장 저렴한 허용 모델로 낮춤, 0이면 끔, 예: plainplan §9.3 KPI 0.05)
+    'COST_SESSION_BUDGET_USD': float(os.getenv('COST_SESSION_BUDGET_USD', '0')),
+    # 사용자 일 누적 비용 예산 (USD, 0이면 끔)
+    'COST_DAILY_BUDGET_USD': float(os.getenv('COST_DAILY_BUDGET_USD', '0')),
 }
 
 # LLM API Keys
@@ -0,0 +1,391 @@
+"""
+요청 단위 단계별 트레이싱
+
+요청마다 Trace를 만들고, 각 단계(Intent 파싱, RAG 임베딩/벡터 검색, 인터넷 검색, LLM 호출, DB 저장)를
+span()으로 감싸 소요 시간을 기록합니다. 기록된 단계별 시간은
+- Server-Timing 응답 헤더 (TracingMiddleware)
+- PromptHistory.stage_timings (SessionManager.save_prompt_history)
+로 남고, 샘플링된 트레이스는 OTLP/HTTP JSON 형식으로 파일(JSON Lines) 또는 수집기에 내보냅니다.
+
+현재 트레이스가 없으면 (관리 명령, 셸 등) span()은 단계 지연 메트릭만 기록합니다.
+
+사용법:
+    with span('rag.embedding', model='text-embedding-3-small'):
+        embedding = client.embeddings.create(...)
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from .metrics import QUEUE_DEPTH, STAGE_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# 요청 단위 트레이스와 현재 열린 span (부모 연결용)
+_current_trace: ContextVar[Optional['Trace']] = ContextVar('current_trace', default=None)
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+# OTLP span kind
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+
+class Span:
+    """단계 하나의 시간 구간"""
+
+    __slots__ = ('name', 'span_id', 'parent_id', 'kind', 'attributes', 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, name: str, parent_id: Optional[str] = None, kind: int = SPAN_KIND_INTERNAL,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self, trace_id: str) -> Dict[str, Any]:
+        data = {
+            'traceId': trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns if self.end_ns is not None else time.time_ns()),
+            'attributes': _otlp_attributes(self.attributes),
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1},
+        }
+        if self.parent_id:
+            data['parentSpanId'] = self.parent_id
+        return data
+
+
+class Trace:
+    """요청 하나의 span 모음 (루트 span + 단계 span)"""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = secrets.token_hex(16)
+        self.root = Span(name, kind=SPAN_KIND_SERVER, attributes=attributes)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, parent: Optional[Span] = None,
+                   attributes: Optional[Dict[str, Any]] = None) -> Span:
+        span = Span(name, parent_id=(parent or self.root).span_id, attributes=attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def end(self):
+        self.root.end()
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ms
+
+    def stage_timings(self) -> Dict[str, float]:
+        """단계 이름별 소요 시간 합계(ms, 끝난 span만, 처음 시작한 순서)"""
+        timings: Dict[str, float] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            if span.end_ns is not None:
+                timings[span.name] = timings.get(span.name, 0.0) + span.duration_ms
+        return {name: round(ms, 1) for name, ms in timings.items()}
+
+    def server_timing(self, extra: Optional[Dict[str, float]] = None) -> str:
+        """Server-Timing 헤더 값 (예: intent.parse;dur=12.3, llm.generate;dur=820.1, total;dur=901.4)"""
+        timings = self.stage_timings()
+        if extra:
+            timings.update({name: round(ms, 1) for name, ms in extra.items()})
+        timings['total'] = round(self.duration_ms, 1)
+        return ', '.join(f'{_metric_name(name)};dur={ms}' for name, ms in timings.items())
+
+    def to_otlp(self, service_name: str) -> Dict[str, Any]:
+        """OTLP/HTTP JSON ExportTraceServiceRequest"""
+        with self._lock:
+            spans = [self.root] + list(self.spans)
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': _otlp_attributes({'service.name': service_name})},
+                'scopeSpans': [{
+                    'scope': {'name': 'prompt_mate.tracing'},
+                    'spans': [span.to_otlp(self.trace_id) for span in spans],
+                }],
+            }],
+        }
+
+
+def _metric_name(name: str) -> str:
+    """Server-Timing 메트릭 이름은 token 문자만 허용"""
+    return ''.join(c if c.isalnum() or c in '._-' else '_' for c in name)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_span_name() -> Optional[str]:
+    """현재 열린 단계 span 이름 (트레이스나 열린 span이 없으면 None)"""
+    current = _current_span.get()
+    return current.name if current is not None else None
+
+
+def stage_timings() -> Dict[str, float]:
+    """현재 트레이스의 단계별 시간 (트레이스가 없으면 빈 dict)"""
+    trace = _current_trace.get()
+    return trace.stage_timings() if trace else {}
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    현재 트레이스에 단계 span 기록
+
+    예외는 span에 에러로 표시하고 다시 올립니다. 트레이스가 없으면 None을 yield합니다.
+    단계 소요 시간은 트레이스 유무와 관계없이 request_stage_duration_seconds 메트릭에 기록합니다.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        started = time.perf_counter()
+        try:
+            yield None
+        finally:
+            STAGE_LATENCY.observe(time.perf_counter() - started, stage=name)
+        return
+
+    parent = _current_span.get()
+    current = trace.start_span(name, parent=parent, attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except GeneratorExit:
+        current.set_attribute('cancelled', True)
+        raise
+    except BaseException as e:
+        current.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        current.end()
+        STAGE_LATENCY.observe(current.duration_ms / 1000, stage=name)
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # 제너레이터 안의 span이 다른 컨텍스트에서 닫히는 경우 (스트리밍)
+            _current_span.set(parent)
+
+
+def activate(trace: Optional[Trace]):
+    """트레이스를 현재 컨텍스트에 설정 (반환된 토큰으로 deactivate)"""
+    return _current_trace.set(trace), _current_span.set(None)
+
+
+def deactivate(tokens):
+    trace_token, span_token = tokens
+    try:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+    except ValueError:
+        _current_span.set(None)
+        _current_trace.set(None)
+
+
+class TracePolicy:
+    """
+    트레이싱/내보내기 설정
+
+    stage_timings는 모든 요청에 기록하고, Server-Timing 헤더는 server_timing이 켜져 있거나
+    스태프 요청일 때만 보냅니다 (단계 구성/시간이 외부에 노출되지 않도록).
+    OTLP 내보내기는 sample_rate 비율 또는 slow_ms 이상 걸린 요청만 합니다 (꼬리 샘플링).
+    """
+
+    def __init__(self, enabled: bool = True, sample_rate: float = 0.0, slow_ms: float = 0.0,
+                 export_path: str = '', otlp_endpoint: str = '', service_name: str = 'prompt-mate',
+                 queue_size: int = 1000, server_timing: bool = False):
+        self.enabled = enabled
+        self.server_timing = server_timing
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.slow_ms = slow_ms
+        self.export_path = export_path
+        self.otlp_endpoint = otlp_endpoint.rstrip('/')
+        self.service_name = service_name
+        self.queue_size = queue_size
+
+    @property
+    def exporting(self) -> bool:
+        return bool(self.export_path or self.otlp_endpoint)
+
+    def should_export(self, trace: Trace) -> bool:
+        if not self.exporting:
+            return False
+        if self.slow_ms and trace.duration_ms >= self.slow_ms:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'server_timing': self.server_timing,
+            'sample_rate': self.sample_rate,
+            'slow_ms': self.slow_ms,
+            'export_path': self.export_path,
+            'otlp_endpoint': self.otlp_endpoint,
+            'service_name': self.service_name,
+        }
+
+
+def build_trace_policy(config: Dict[str, Any]) -> TracePolicy:
+    """PROMPT_MATE 설정에서 트레이싱 정책 생성"""
+    return TracePolicy(
+        enabled=config.get('TRACING_ENABLED', True),
+        sample_rate=config.get('TRACE_SAMPLE_RATE', 0.0),
+        slow_ms=config.get('TRACE_SLOW_MS', 0.0),
+        export_path=config.get('TRACE_EXPORT_PATH', ''),
+        otlp_endpoint=config.get('TRACE_OTLP_ENDPOINT', ''),
+        service_name=config.get('TRACE_SERVICE_NAME', 'prompt-mate'),
+        server_timing=config.get('SERVER_TIMING_ENABLED', False),
+    )
+
+
+class TraceExporter:
+    """
+    OTLP/HTTP JSON 내보내기 (백그라운드 스레드)
+
+    요청 스레드는 큐에 넣기만 하고, 큐가 가득 차면 트레이스를 버립니다 (요청 지연에 영향 없음).
+    파일은 한 줄에 ExportTraceServiceRequest 하나 (JSON Lines), 수집기는 {endpoint}/v1/traces로 POST합니다.
+    """
+
+    def __init__(self, policy: TracePolicy):
+        self.policy = policy
+        self._queue: queue.Queue = queue.Queue(maxsize=policy.queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        QUEUE_DEPTH.set_function(self._queue.qsize, queue='trace_export')
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, trace: Trace):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            trace = self._queue.get()
+            try:
+                self.export(trace)
+                self.exported += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"트레이스 내보내기 실패: {e}")
+            finally:
+                self._queue.task_done()
+
+    def export(self, trace: Trace):
+        payload = json.dumps(trace.to_otlp(self.policy.service_name), ensure_ascii=False)
+        if self.policy.export_path:
+            directory = os.path.dirname(self.policy.export_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.policy.export_path, 'a', encoding='utf-8') as f:
+                f.write(payload + '\n')
+        if self.policy.otlp_endpoint:
+            request = urllib.request.Request(
+                f'{self.policy.otlp_endpoint}/v1/traces',
+                data=payload.encode('utf-8'),
+                headers={'Content-Type': 'application/json'},
+                method='POST'
+            )
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+
+    def flush(self, timeout: float = 5.0):
+        """큐가 빌 때까지 대기 (테스트/종료용)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'queued': self._queue.qsize(),
+            'exported': self.exported,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+_policy: Optional[TracePolicy] = None
+_exporter: Optional[TraceExporter] = None
+
+
+def get_trace_policy() -> TracePolicy:
+    global _policy
+    if _policy is None:
+        _policy = build_trace_policy(settings.PROMPT_MATE)
+    return _policy
+
+
+def get_trace_exporter() -> TraceExporter:
+    global _exporter
+    if _exporter is None:
+        _exporter = TraceExporter(get_trace_policy())
+    return _exporter
+
+
+def finish_trace(trace: Trace):
+    """트레이스를 닫고 샘플링되면 내보내기"""
+    trace.end()
+    policy = get_trace_policy()
+    if policy.should_export(trace):
+        get_trace_exporter().submit(trace)
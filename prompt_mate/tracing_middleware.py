@@ -0,0 +1,85 @@
+"""
+Tracing Middleware
+
+요청마다 트레이스를 시작하고, 샘플링된 트레이스는 prompt_mate.tracing의 내보내기로 전달합니다.
+단계별 시간과 DB 쿼리 시간은 스태프 요청(또는 PROMPT_MATE['SERVER_TIMING_ENABLED']가 켜진 경우)에만
+Server-Timing 헤더로 반환합니다. 익명/일반 사용자에게는 내부 단계 구성을 노출하지 않습니다.
+
+PROMPT_MATE['TRACING_ENABLED']가 꺼져 있으면 미들웨어를 로드하지 않습니다.
+스트리밍 응답은 헤더를 보내는 시점까지의 단계만 헤더에 포함하고,
+본문을 내보내는 동안에도 트레이스를 유지했다가 스트림이 끝나면 닫습니다.
+"""
+
+from contextlib import ExitStack
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .query_count_middleware import QueryCounter
+from .tracing import Trace, activate, deactivate, finish_trace, get_trace_policy
+
+SERVER_TIMING_HEADER = 'Server-Timing'
+
+
+class TracingMiddleware:
+    """요청 단위 트레이스 + Server-Timing 헤더"""
+
+    def __init__(self, get_response):
+        self.policy = get_trace_policy()
+        if not self.policy.enabled:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace = Trace(f'{request.method} {request.path}', {
+            'http.method': request.method,
+            'http.target': request.path,
+        })
+        counter = QueryCounter()
+        tokens = activate(trace)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(counter))
+                response = self.get_response(request)
+        except BaseException:
+            trace.root.error = 'unhandled exception'
+            finish_trace(trace)
+            raise
+        finally:
+            deactivate(tokens)
+
+        trace.root.set_attribute('http.status_code', response.status_code)
+        trace.root.set_attribute('db.queries', counter.count)
+        if self._exposes_timing(request):
+            response[SERVER_TIMING_HEADER] = trace.server_timing({'db': counter.duration * 1000})
+
+        if getattr(response, 'streaming', False) and not getattr(response, 'is_async', False):
+            response.streaming_content = self._traced(trace, response.streaming_content)
+        else:
+            finish_trace(trace)
+        return response
+
+    def _exposes_timing(self, request) -> bool:
+        """Server-Timing 헤더를 보낼지 (설정으로 전체 허용 또는 스태프 요청)"""
+        if self.policy.server_timing:
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_authenticated and user.is_staff
+
+    @staticmethod
+    def _traced(trace, content):
+        """청크마다 트레이스를 활성화해 스트림 안의 span도 같은 트레이스에 기록"""
+        iterator = iter(content)
+        try:
+            while True:
+                tokens = activate(trace)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    deactivate(tokens)
+                yield chunk
+        finally:
+            finish_trace(trace)
@@ -0,0 +1,33 @@
+"""
+프로젝트 수준 뷰 (앱에 속하지 않는 운영용 엔드포인트)
+"""
+
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from django.views.decorators.http import require_GET
+
+from .metrics import CONTENT_TYPE, get_metrics_registry
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus 스크레이프 엔드포인트
+
+    GET /metrics
+    Authorization: Bearer <PROMPT_MATE['METRICS_TOKEN']> 또는 스태프 로그인이 필요합니다.
+    토큰이 설정되지 않았으면 스태프만 볼 수 있습니다 (라우트/모델별 트래픽을 공개하지 않음).
+    """
+    if not settings.PROMPT_MATE.get('METRICS_ENABLED', True):
+        return HttpResponseNotFound()
+
+    user = getattr(request, 'user', None)
+    if not (user is not None and user.is_authenticated and user.is_staff):
+        token = settings.PROMPT_MATE.get('METRICS_TOKEN', '')
+        provided = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not token or not hmac.compare_digest(provided, token):
+            return HttpResponseForbidden()
+
+    return HttpResponse(get_metrics_registry().render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+워커 워밍업
+
+새 워커가 첫 요청에서 치르던 초기화 비용(제공자/SDK 클라이언트 생성, tiktoken 인코딩 로드,
+DB/캐시 연결, Pinecone 인덱스 확인, 구독 플랜 조회)을 부팅 시점에 미리 치릅니다.
+
+gunicorn은 gunicorn.conf.py의 post_worker_init 훅에서 preload()를 호출합니다
+(WARMUP_ON_BOOT=False면 워밍업 없이 mark_ready()로 준비 상태만 표시).
+준비 상태 엔드포인트(api/health/ready/)는 상태만 읽으며, 부팅 훅이 준비 상태를 표시하기 전까지 503입니다.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 실패하면 준비되지 않은 것으로 보는 단계
+CRITICAL_STEPS = ('database', 'router')
+
+_state: Dict[str, Any] = {
+    'status': 'pending',  # pending → warming → ready / degraded
+    'pid': None,
+    'started_at': None,
+    'finished_at': None,
+    'total_ms': None,
+    'steps': [],
+}
+_lock = threading.Lock()
+
+
+def _warm_database() -> Dict[str, Any]:
+    from django.db import connections
+    connection = connections['default']
+    connection.ensure_connection()
+    return {'vendor': connection.vendor, 'persistent': bool(connection.settings_dict.get('CONN_MAX_AGE'))}
+
+
+def _warm_cache() -> Dict[str, Any]:
+    from django.core.cache import caches
+    cache = caches['default']
+    cache.get('warmup:ping')
+    return {'backend': cache.__class__.__name__}
+
+
+def _warm_router() -> Dict[str, Any]:
+    from llm_providers.router import get_router
+    return {'providers': list(get_router().preload_providers())}
+
+
+def _warm_tokenizers() -> Dict[str, Any]:
+    from llm_providers.router import get_router
+    from llm_providers.tokenizer import get_tokenizer
+    # 모델 계열별 tiktoken 인코딩을 미리 로드하고, 제공자별 토큰 계산 경로도 한 번 실행
+    encodings = get_tokenizer().load_encodings()
+    providers = get_router().preload_providers()
+    for provider in providers.values():
+        provider.count_tokens('warm-up')
+    return {'encodings': encodings, 'providers': list(providers)}
+
+
+def _warm_subscription_plans() -> Dict[str, Any]:
+    from core.models import SubscriptionPlan
+    from core.usage_decorator import get_or_create_free_plan
+    get_or_create_free_plan()
+    return {'active_plans': SubscriptionPlan.objects.filter(is_active=True).count()}
+
+
+def _warm_vector_index() -> Dict[str, Any]:
+    from django.conf import settings
+    if not (os.getenv('PINECONE_API_KEY') or getattr(settings, 'PINECONE_API_KEY', '')):
+        return {'skipped': 'PINECONE_API_KEY 없음'}
+    from core.rag_manager import get_rag_manager
+    return {'index_ready': get_rag_manager().index is not None}
+
+
+WARMUP_STEPS: List[tuple] = [
+    ('database', _warm_database),
+    ('cache', _warm_cache),
+    ('router', _warm_router),
+    ('tokenizers', _warm_tokenizers),
+    ('subscription_plans', _warm_subscription_plans),
+    ('vector_index', _warm_vector_index),
+]
+
+
+def _run_step(name: str, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    step = {'name': name, 'ok': True}
+    try:
+        step['detail'] = fn()
+    except Exception as e:
+        logger.warning(f"워밍업 단계 실패: {name}: {e}")
+        step['ok'] = False
+        step['error'] = str(e)
+    step['ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return step
+
+
+def preload(force: bool = False) -> Dict[str, Any]:
+    """
+    워커 워밍업 실행 (프로세스당 한 번)
+
+    Args:
+        force: 이미 실행했더라도 다시 실행
+
+    Returns:
+        준비 상태 (get_readiness()와 동일)
+    """
+    with _lock:
+        if _state['status'] != 'pending' and _state['pid'] == os.getpid() and not force:
+            return get_readiness()
+
+        _state.update(status='warming', pid=os.getpid(), started_at=time.time(), steps=[])
+        started = time.perf_counter()
+        steps = [_run_step(name, fn) for name, fn in WARMUP_STEPS]
+        failed_critical = [s['name'] for s in steps if not s['ok'] and s['name'] in CRITICAL_STEPS]
+        _state.update(
+            status='degraded' if failed_critical else 'ready',
+            finished_at=time.time(),
+            total_ms=round((time.perf_counter() - started) * 1000, 1),
+            steps=steps,
+        )
+
+    logger.info(
+        f"워커 워밍업 완료 (pid={os.getpid()}, {_state['total_ms']}ms): "
+        + ', '.join(f"{s['name']}={s['ms']}ms{'' if s['ok'] else '(실패)'}" for s in steps)
+    )
+    return get_readiness()
+
+
+def mark_ready():
+    """워밍업 없이 현재 워커를 준비 상태로 표시 (부팅 워밍업을 끈 경우)"""
+    with _lock:
+        _state.update(status='ready', pid=os.getpid(), started_at=time.time(),
+                      finished_at=time.time(), total_ms=0.0, steps=[])
+
+
+def get_readiness() -> Dict[str, Any]:
+    """현재 워커의 준비 상태와 단계별 워밍업 시간"""
+    state = dict(_state)
+    state['ready'] = state['status'] == 'ready' and state['pid'] == os.getpid()
+    return state